@@ -7,4 +7,8 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
     label = 'core'
-    verbose_name = 'Core'
\ No newline at end of file
+    verbose_name = 'Core'
+
+    def ready(self):
+        """Import signals when the app is ready"""
+        from . import signals  # noqa: F401
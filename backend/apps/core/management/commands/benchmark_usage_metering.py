@@ -0,0 +1,76 @@
+# apps/core/management/commands/benchmark_usage_metering.py
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django_tenants.utils import get_tenant_model
+import time
+import statistics
+
+
+class Command(BaseCommand):
+    """
+    Measure TenantUsageTrackingMiddleware request overhead with API usage
+    metering enabled and disabled, plus the cost of one flush.
+    
+    Usage:
+        python manage.py benchmark_usage_metering --tenant acme --iterations 5000
+    """
+    
+    help = 'Benchmark request latency with API usage metering on and off'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            required=True,
+            help='Slug of the tenant to meter against'
+        )
+        
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5000,
+            help='Number of requests per run'
+        )
+    
+    def handle(self, *args, **options):
+        from apps.core.metering import usage_meter
+        from middlewares.tenant_middleware import TenantUsageTrackingMiddleware
+        
+        Tenant = get_tenant_model()
+        try:
+            tenant = Tenant.objects.get(slug=options['tenant'])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Tenant '{options['tenant']}' does not exist")
+        
+        middleware = TenantUsageTrackingMiddleware(lambda request: None)
+        factory = RequestFactory()
+        iterations = options['iterations']
+        
+        results = {}
+        for label, enabled in (('metering off', False), ('metering on', True)):
+            with override_settings(USAGE_METERING_ENABLED=enabled):
+                timings = []
+                for _ in range(iterations):
+                    request = factory.get('/api/inventory/products/')
+                    request.tenant = tenant
+                    start = time.perf_counter()
+                    middleware.process_request(request)
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[label] = timings
+        
+        start = time.perf_counter()
+        flushed = usage_meter.flush()
+        flush_ms = (time.perf_counter() - start) * 1000
+        
+        self.stdout.write(f"{'run':<14}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, timings in results.items():
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f"{label:<14}{statistics.mean(timings):>10.4f}"
+                f"{statistics.median(timings):>10.4f}{p99:>10.4f}"
+            )
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Flushed {flushed} API calls in {flush_ms:.2f} ms')
+        )
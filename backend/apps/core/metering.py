@@ -0,0 +1,255 @@
+# apps/core/metering.py
+"""
+Buffered API usage metering.
+
+Requests only increment a counter (Redis ``INCR`` when the default cache is
+django-redis, otherwise an in-process buffer). ``flush_api_usage`` folds the
+accumulated per-tenant, per-period deltas into ``TenantUsage`` with a single
+``UPDATE ... SET api_calls_count = api_calls_count + n`` per row.
+
+Crash safety (Redis backend): a counter is atomically RENAMEd to an
+"in-flight" key before it is applied, and the in-flight key is deleted only
+after the database transaction commits. In-flight keys left behind by a
+crashed flush are picked up again by the next flush, so increments are never
+lost; the only window for double counting is between COMMIT and DEL.
+
+Flushes are serialised by a Redis lock held from drain to acknowledge, so
+two overlapping beats can never both claim and apply the same in-flight keys.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'usage:api_calls'
+PENDING_SET = f'{KEY_PREFIX}:pending'
+INFLIGHT_SET = f'{KEY_PREFIX}:inflight'
+FLUSH_LOCK_KEY = f'{KEY_PREFIX}:flush-lock'
+
+# Counters live well past the flush interval so a stalled beat never drops them
+COUNTER_TTL = 7 * 24 * 3600
+
+
+def get_billing_period(now=None):
+    """Return (period_start, period_end) of the monthly billing period containing ``now``"""
+    now = now or timezone.now()
+    period_start = datetime(now.year, now.month, 1, tzinfo=now.tzinfo)
+
+    if now.month == 12:
+        period_end = datetime(now.year + 1, 1, 1, tzinfo=now.tzinfo)
+    else:
+        period_end = datetime(now.year, now.month + 1, 1, tzinfo=now.tzinfo)
+
+    return period_start, period_end
+
+
+def metering_enabled():
+    return getattr(settings, 'USAGE_METERING_ENABLED', True)
+
+
+class RedisUsageBuffer:
+    """Counters in Redis, shared by all workers"""
+
+    flushes_inline = False
+
+    def __init__(self, client):
+        self.client = client
+
+    def flush_lock(self, timeout):
+        return self.client.lock(FLUSH_LOCK_KEY, timeout=timeout, blocking=False)
+
+    def increment(self, tenant_id, period_key, amount=1):
+        key = f'{KEY_PREFIX}:{tenant_id}:{period_key}'
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incrby(key, amount)
+        pipe.expire(key, COUNTER_TTL)
+        pipe.sadd(PENDING_SET, key)
+        pipe.execute()
+
+    def drain(self):
+        """
+        Move every pending counter to an in-flight key and return
+        ``(deltas, inflight_keys)``. Left-over in-flight keys are included.
+        """
+        for key in self.client.smembers(PENDING_SET):
+            key = key.decode() if isinstance(key, bytes) else key
+            self.client.srem(PENDING_SET, key)
+            inflight_key = f'{key}:inflight:{uuid.uuid4().hex}'
+            try:
+                self.client.rename(key, inflight_key)
+            except Exception:
+                # Key vanished (expired or already drained by a concurrent flush)
+                continue
+            self.client.sadd(INFLIGHT_SET, inflight_key)
+
+        deltas = defaultdict(int)
+        inflight_keys = []
+        for inflight_key in self.client.smembers(INFLIGHT_SET):
+            inflight_key = inflight_key.decode() if isinstance(inflight_key, bytes) else inflight_key
+            value = self.client.get(inflight_key)
+            inflight_keys.append(inflight_key)
+            if value is None:
+                continue
+            _, _, tenant_id, period_key = inflight_key.split(':inflight:')[0].split(':')
+            deltas[(int(tenant_id), period_key)] += int(value)
+
+        return deltas, inflight_keys
+
+    def acknowledge(self, inflight_keys):
+        if not inflight_keys:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(*inflight_keys)
+        pipe.srem(INFLIGHT_SET, *inflight_keys)
+        pipe.execute()
+
+
+class LocalUsageBuffer:
+    """
+    Per-process fallback used when Redis is not configured (development).
+    Celery workers cannot see this buffer, so the request path flushes it
+    itself every ``flush_interval`` seconds. Counts are lost if the process
+    dies before a flush.
+    """
+
+    flushes_inline = True
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def flush_lock(self, timeout):
+        # ``drain`` swaps the whole buffer under ``_lock``, so flushes cannot overlap
+        return None
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def increment(self, tenant_id, period_key, amount=1):
+        with self._lock:
+            self._counts[(tenant_id, period_key)] += amount
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(int)
+            self._last_flush = time.monotonic()
+        return counts, None
+
+    def acknowledge(self, inflight_keys):
+        pass
+
+
+class UsageMeter:
+    """Entry point used by the middleware and by the flush task"""
+
+    def __init__(self):
+        self._buffer = None
+
+    @property
+    def buffer(self):
+        if self._buffer is None:
+            try:
+                from django_redis import get_redis_connection
+                self._buffer = RedisUsageBuffer(get_redis_connection('default'))
+            except Exception:
+                # django-redis not installed or default cache is not Redis
+                self._buffer = LocalUsageBuffer(
+                    getattr(settings, 'USAGE_METERING_LOCAL_FLUSH_INTERVAL', 60)
+                )
+        return self._buffer
+
+    def record_api_call(self, tenant, now=None):
+        period_start, _ = get_billing_period(now)
+        self.buffer.increment(tenant.id, period_start.strftime('%Y%m'))
+
+        if self.buffer.flushes_inline and self.buffer.flush_due():
+            self.flush()
+
+    def flush(self):
+        """
+        Apply buffered deltas to ``TenantUsage``.
+
+        Returns the number of API calls written, or 0 when another flush
+        currently holds the flush lock.
+        """
+        lock = self.buffer.flush_lock(
+            getattr(settings, 'USAGE_METERING_FLUSH_LOCK_TIMEOUT', 300)
+        )
+        if lock is not None and not lock.acquire(blocking=False):
+            logger.info("Skipping API usage flush, another flush is in progress")
+            return 0
+
+        try:
+            return self._flush()
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except Exception:
+                    # Lock expired mid-flush; nothing left to release
+                    logger.warning("API usage flush outlived its lock timeout")
+
+    def _flush(self):
+        from apps.core.models import TenantUsage
+
+        deltas, inflight_keys = self.buffer.drain()
+        if not deltas:
+            self.buffer.acknowledge(inflight_keys)
+            return 0
+
+        self._apply(TenantUsage, deltas)
+        self.buffer.acknowledge(inflight_keys)
+
+        self._check_limits(TenantUsage, {tenant_id for tenant_id, _ in deltas})
+        return sum(deltas.values())
+
+    def _apply(self, TenantUsage, deltas):
+        with transaction.atomic():
+            for (tenant_id, period_key), amount in deltas.items():
+                period_start, period_end = get_billing_period(
+                    datetime(int(period_key[:4]), int(period_key[4:]), 1, tzinfo=timezone.now().tzinfo)
+                )
+                updated = TenantUsage.objects.filter(
+                    tenant_id=tenant_id,
+                    billing_period_start=period_start,
+                ).update(api_calls_count=F('api_calls_count') + amount)
+
+                if not updated:
+                    usage, created = TenantUsage.objects.get_or_create(
+                        tenant_id=tenant_id,
+                        billing_period_start=period_start,
+                        defaults={
+                            'billing_period_end': period_end,
+                            'api_calls_count': amount,
+                        }
+                    )
+                    if not created:
+                        TenantUsage.objects.filter(pk=usage.pk).update(
+                            api_calls_count=F('api_calls_count') + amount
+                        )
+
+    def _check_limits(self, TenantUsage, tenant_ids):
+        period_start, _ = get_billing_period()
+        over_limit = TenantUsage.objects.filter(
+            tenant_id__in=tenant_ids,
+            billing_period_start=period_start,
+            api_calls_count__gt=F('tenant__max_api_calls_per_month'),
+        ).values_list('tenant__slug', flat=True)
+
+        for slug in over_limit:
+            logger.warning(f"Tenant {slug} exceeded API call limit")
+
+
+usage_meter = UsageMeter()
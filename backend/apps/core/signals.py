@@ -0,0 +1,49 @@
+# apps/core/signals.py
+"""
+Keep the tenant resolution cache in sync with Tenant, Domain and Membership rows.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django_tenants.utils import get_tenant_domain_model, get_tenant_model
+
+from apps.auth.models import Membership
+from apps.core.tenant_cache import tenant_resolution_cache
+
+Tenant = get_tenant_model()
+Domain = get_tenant_domain_model()
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Tenant)
+def invalidate_tenant_cache(sender, instance, **kwargs):
+    tenant_resolution_cache.invalidate_tenant(instance)
+
+
+@receiver(pre_save, sender=Domain)
+def remember_previous_domain(sender, instance, **kwargs):
+    """Capture the stored host so a rename also evicts the old cache key"""
+    instance._cached_previous = None
+    if instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(
+        'domain', 'tenant_id'
+    ).first()
+    if previous is not None and tuple(previous) != (instance.domain, instance.tenant_id):
+        instance._cached_previous = tuple(previous)
+
+
+@receiver([post_save, post_delete], sender=Domain)
+def invalidate_domain_cache(sender, instance, **kwargs):
+    tenant_resolution_cache.invalidate_domain(instance)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def invalidate_membership_cache(sender, instance, **kwargs):
+    tenant_resolution_cache.invalidate_membership(instance)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    tenant_resolution_cache.invalidate_user(instance)
@@ -78,4 +78,18 @@ def health_check():
         
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+@shared_task
+def flush_api_usage():
+    """Write buffered API call counts to TenantUsage."""
+    from apps.core.metering import usage_meter
+    
+    try:
+        flushed = usage_meter.flush()
+        if flushed:
+            logger.info(f"Flushed {flushed} buffered API calls")
+        return flushed
+    except Exception as e:
+        logger.error(f"Error flushing API usage: {str(e)}")
+        raise
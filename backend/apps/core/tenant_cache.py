@@ -0,0 +1,341 @@
+# apps/core/tenant_cache.py
+"""
+Tenant and membership resolution cache.
+
+Used by ``TenantContextMiddleware`` so that a warm request resolves its tenant
+and the user's membership without touching the database:
+
+- A short-TTL, per-process memory layer absorbs bursts on a single worker.
+- A longer-TTL layer in the shared Django cache is reused across workers.
+- Entries are invalidated by signals (see ``apps.core.signals``) whenever a
+  Tenant, Domain, Membership or User row changes.
+- ``QuerySet.update()`` and ``bulk_update()`` send no signals. Code that
+  changes these rows in bulk must call ``invalidate_queryset`` on the
+  affected rows, otherwise stale entries live until ``SHARED_TTL`` expires.
+- ``Membership.last_access`` writes are coalesced and flushed in the
+  background instead of being saved on every request.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Stored in place of a value to remember that a lookup found nothing.
+MISSING = '__missing__'
+
+DEFAULT_CONFIG = {
+    'LOCAL_TTL': 5,                      # seconds, per-process layer
+    'SHARED_TTL': 300,                   # seconds, shared cache layer
+    'LOCAL_MAX_ENTRIES': 10000,
+    'LAST_ACCESS_FLUSH_INTERVAL': 60,    # seconds between last_access flushes
+}
+
+
+def get_config():
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'TENANT_RESOLUTION_CACHE', {}))
+    return config
+
+
+class LocalTTLCache:
+    """Small thread-safe in-process cache with per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                self._evict()
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            del self._data[key]
+        if len(self._data) >= self.max_entries:
+            # Still full: drop the oldest half (dicts keep insertion order)
+            for key in list(self._data)[:len(self._data) // 2]:
+                del self._data[key]
+
+
+class LastAccessFlusher:
+    """
+    Collects ``Membership.last_access`` timestamps in memory and writes them in
+    one UPDATE per flush interval from a background thread.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, membership_id, when=None):
+        with self._lock:
+            self._pending[membership_id] = when or timezone.now()
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name='membership-last-access-flusher', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing membership last_access: {e}")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write all pending timestamps; returns the number of memberships updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        from apps.auth.models import Membership
+
+        Membership.objects.filter(id__in=list(pending)).update(
+            last_access=Case(
+                *[When(id=membership_id, then=Value(when)) for membership_id, when in pending.items()],
+                output_field=DateTimeField(),
+            )
+        )
+        return len(pending)
+
+
+class TenantResolutionCache:
+    """
+    Two-level cache for tenant lookups by id/slug/domain and for memberships.
+
+    Slug and domain keys map to a tenant id; the tenant itself is cached once
+    under its id so that invalidating a tenant is a single delete.
+    """
+
+    KEY_PREFIX = 'tenant_resolution'
+
+    def __init__(self):
+        config = get_config()
+        self.local_ttl = config['LOCAL_TTL']
+        self.shared_ttl = config['SHARED_TTL']
+        self.local = LocalTTLCache(config['LOCAL_MAX_ENTRIES'])
+        self.last_access = LastAccessFlusher(config['LAST_ACCESS_FLUSH_INTERVAL'])
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    def _key(self, *parts):
+        return ':'.join([self.KEY_PREFIX] + [str(part) for part in parts])
+
+    def tenant_key(self, tenant_id):
+        return self._key('tenant', tenant_id)
+
+    def slug_key(self, slug):
+        return self._key('slug', slug)
+
+    def domain_key(self, host):
+        return self._key('domain', host.lower())
+
+    def membership_key(self, user_id, tenant_id):
+        return self._key('membership', user_id, tenant_id)
+
+    def user_key(self, user_id):
+        return self._key('user_active', user_id)
+
+    # ------------------------------------------------------------------
+    # Generic two-level access
+    # ------------------------------------------------------------------
+
+    def _get(self, key, loader):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        value = cache.get(key)
+        if value is None:
+            value = loader()
+            if value is None:
+                value = MISSING
+            cache.set(key, value, self.shared_ttl)
+
+        self.local.set(key, value, self.local_ttl)
+        return value
+
+    def _delete(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        cache.delete_many(list(keys))
+
+    # ------------------------------------------------------------------
+    # Tenants
+    # ------------------------------------------------------------------
+
+    def get_tenant(self, tenant_id):
+        from django_tenants.utils import get_tenant_model
+        Tenant = get_tenant_model()
+
+        def load():
+            return Tenant.objects.filter(id=tenant_id).first()
+
+        tenant = self._get(self.tenant_key(tenant_id), load)
+        return None if tenant == MISSING else tenant
+
+    def get_tenant_by_slug(self, slug):
+        from django_tenants.utils import get_tenant_model
+        Tenant = get_tenant_model()
+
+        def load():
+            return Tenant.objects.filter(slug=slug).values_list('id', flat=True).first()
+
+        tenant_id = self._get(self.slug_key(slug), load)
+        if tenant_id == MISSING:
+            return None
+
+        tenant = self.get_tenant(tenant_id)
+        if tenant is None or tenant.slug != slug:
+            # Slug was renamed or tenant removed since the mapping was cached
+            self._delete(self.slug_key(slug))
+            return None
+        return tenant
+
+    def get_tenant_by_domain(self, host):
+        """Tenant for a primary domain, or ``None`` if no Domain row matches"""
+        from django_tenants.utils import get_tenant_domain_model
+        Domain = get_tenant_domain_model()
+
+        def load():
+            return Domain.objects.filter(
+                domain=host, is_primary=True
+            ).values_list('tenant_id', flat=True).first()
+
+        tenant_id = self._get(self.domain_key(host), load)
+        if tenant_id == MISSING:
+            return None
+        return self.get_tenant(tenant_id)
+
+    def invalidate_tenant(self, tenant):
+        self._delete(self.tenant_key(tenant.id), self.slug_key(tenant.slug))
+
+    def invalidate_domain(self, domain):
+        keys = [self.domain_key(domain.domain), self.tenant_key(domain.tenant_id)]
+
+        # A renamed or reassigned domain must stop resolving under its old host
+        previous = getattr(domain, '_cached_previous', None)
+        if previous is not None:
+            previous_host, previous_tenant_id = previous
+            keys.append(self.domain_key(previous_host))
+            keys.append(self.tenant_key(previous_tenant_id))
+
+        self._delete(*dict.fromkeys(keys))
+
+    # ------------------------------------------------------------------
+    # Memberships
+    # ------------------------------------------------------------------
+
+    def get_membership(self, user_id, tenant_id):
+        """Active membership of a user in a tenant, or ``None``"""
+        from apps.auth.models import Membership
+
+        def load():
+            return Membership.objects.filter(
+                user_id=user_id,
+                tenant_id=tenant_id,
+                is_active=True,
+                status='active'
+            ).first()
+
+        membership = self._get(self.membership_key(user_id, tenant_id), load)
+        return None if membership == MISSING else membership
+
+    def invalidate_membership(self, membership):
+        self._delete(self.membership_key(membership.user_id, membership.tenant_id))
+
+    # ------------------------------------------------------------------
+    # Users
+    # ------------------------------------------------------------------
+
+    def is_user_active(self, user_id):
+        """Whether the user still exists and is active"""
+        from django.contrib.auth import get_user_model
+        User = get_user_model()
+
+        def load():
+            return User.objects.filter(id=user_id, is_active=True).exists()
+
+        return self._get(self.user_key(user_id), load) is True
+
+    def invalidate_user(self, user):
+        self._delete(self.user_key(user.pk))
+
+    def invalidate_queryset(self, queryset):
+        """
+        Invalidate every row of ``queryset``; call it around bulk
+        ``update()``/``bulk_update()`` calls, which bypass the signals.
+        """
+        from django.contrib.auth import get_user_model
+        from django_tenants.utils import get_tenant_domain_model, get_tenant_model
+        from apps.auth.models import Membership
+
+        handlers = {
+            get_tenant_model(): self.invalidate_tenant,
+            get_tenant_domain_model(): self.invalidate_domain,
+            Membership: self.invalidate_membership,
+            get_user_model(): self.invalidate_user,
+        }
+        handler = handlers.get(queryset.model)
+        if handler is None:
+            raise ValueError(f"{queryset.model.__name__} rows are not cached")
+
+        for instance in queryset:
+            handler(instance)
+
+    def touch_membership(self, membership):
+        """Record an access; persisted by the background flusher"""
+        now = timezone.now()
+        membership.last_access = now
+        self.last_access.touch(membership.id, now)
+
+    def clear_local(self):
+        self.local.clear()
+
+
+tenant_resolution_cache = TenantResolutionCache()
@@ -1,3 +1,232 @@
-from django.test import TestCase
+from collections import Counter, defaultdict
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django_tenants.utils import get_tenant_domain_model, get_tenant_model
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.auth.models import Membership
+from apps.core.metering import RedisUsageBuffer, UsageMeter
+from apps.core.tenant_cache import tenant_resolution_cache
+from middlewares.tenant_middleware import TenantContextMiddleware
+
+
+class FakeRedis:
+    """The subset of redis-py used by RedisUsageBuffer, kept in memory"""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = defaultdict(set)
+        self.locks = set()
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def incrby(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def expire(self, key, ttl):
+        pass
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def rename(self, key, new_key):
+        if key not in self.values:
+            raise KeyError(key)
+        self.values[new_key] = self.values.pop(key)
+
+    def sadd(self, name, *members):
+        self.sets[name].update(members)
+
+    def srem(self, name, *members):
+        self.sets[name].difference_update(members)
+
+    def smembers(self, name):
+        return set(self.sets[name])
+
+    def lock(self, name, timeout=None, blocking=True):
+        return FakeLock(self, name)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: self.calls.append((method, args, kwargs))
+
+    def execute(self):
+        return [method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+
+class FakeLock:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def acquire(self, blocking=True):
+        if self.name in self.client.locks:
+            return False
+        self.client.locks.add(self.name)
+        return True
+
+    def release(self):
+        self.client.locks.discard(self.name)
+
+
+class UsageMeterFlushTests(SimpleTestCase):
+    """Overlapping flushes must apply every buffered counter exactly once"""
+
+    def setUp(self):
+        self.meter = UsageMeter()
+        self.meter._buffer = RedisUsageBuffer(FakeRedis())
+        self.applied = Counter()
+
+    def record(self, TenantUsage, deltas):
+        self.applied.update(deltas)
+
+    def test_overlapping_flushes_apply_each_counter_once(self):
+        buffer = self.meter.buffer
+        buffer.increment(1, '202610', 3)
+        buffer.increment(2, '202610', 5)
+
+        def apply_and_overlap(TenantUsage, deltas):
+            # A second beat fires while the first flush is still writing
+            buffer.increment(1, '202610', 2)
+            self.assertEqual(self.meter.flush(), 0)
+            self.record(TenantUsage, deltas)
+
+        with patch.object(self.meter, '_check_limits'):
+            with patch.object(self.meter, '_apply', side_effect=apply_and_overlap):
+                self.assertEqual(self.meter.flush(), 8)
+            with patch.object(self.meter, '_apply', side_effect=self.record):
+                self.assertEqual(self.meter.flush(), 2)
+                self.assertEqual(self.meter.flush(), 0)
+
+        self.assertEqual(self.applied, Counter({(1, '202610'): 5, (2, '202610'): 5}))
+
+    def test_failed_flush_is_retried_by_the_next_flush(self):
+        buffer = self.meter.buffer
+        buffer.increment(1, '202610', 4)
+
+        with patch.object(self.meter, '_check_limits'):
+            with patch.object(self.meter, '_apply', side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    self.meter.flush()
+            with patch.object(self.meter, '_apply', side_effect=self.record):
+                self.assertEqual(self.meter.flush(), 4)
+
+        self.assertEqual(self.applied, Counter({(1, '202610'): 4}))
+
+
+class TenantResolutionCacheTests(TestCase):
+    """Warm lookups skip the database and row changes evict stale entries"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        tenant_resolution_cache.clear_local()
+
+        Tenant = get_tenant_model()
+        Domain = get_tenant_domain_model()
+        self.tenant = Tenant.objects.create(
+            schema_name='acme', name='Acme', slug='acme', status='active'
+        )
+        self.domain = Domain.objects.create(
+            domain='acme.shop.example.com', tenant=self.tenant, is_primary=True
+        )
+        self.user = get_user_model().objects.create_user(
+            email='owner@acme.example.com', password='secret'
+        )
+        Membership.objects.create(
+            user=self.user, tenant_id=self.tenant.id, status='active', is_active=True
+        )
+        self.middleware = TenantContextMiddleware(lambda request: None)
+        self.factory = RequestFactory()
+
+    def test_hit_runs_no_queries(self):
+        tenant_resolution_cache.get_tenant_by_slug('acme')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(tenant_resolution_cache.get_tenant_by_slug('acme'), self.tenant)
+            self.assertEqual(
+                tenant_resolution_cache.get_tenant_by_domain('acme.shop.example.com'), self.tenant
+            )
+
+    def test_miss_is_cached(self):
+        self.assertIsNone(tenant_resolution_cache.get_tenant_by_slug('nobody'))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(tenant_resolution_cache.get_tenant_by_slug('nobody'))
+
+    def test_save_invalidates_tenant(self):
+        tenant_resolution_cache.get_tenant(self.tenant.id)
+
+        self.tenant.status = 'suspended'
+        self.tenant.save()
+
+        self.assertEqual(tenant_resolution_cache.get_tenant(self.tenant.id).status, 'suspended')
+
+    def test_domain_rename_evicts_old_host(self):
+        tenant_resolution_cache.get_tenant_by_domain('acme.shop.example.com')
+
+        self.domain.domain = 'acme.store.example.com'
+        self.domain.save()
+
+        self.assertIsNone(tenant_resolution_cache.get_tenant_by_domain('acme.shop.example.com'))
+        self.assertEqual(
+            tenant_resolution_cache.get_tenant_by_domain('acme.store.example.com'), self.tenant
+        )
+
+    def test_queryset_update_needs_explicit_invalidation(self):
+        tenant_resolution_cache.get_membership(self.user.id, self.tenant.id)
+        memberships = Membership.objects.filter(user=self.user)
+
+        memberships.update(is_active=False)
+        self.assertIsNotNone(tenant_resolution_cache.get_membership(self.user.id, self.tenant.id))
+
+        tenant_resolution_cache.invalidate_queryset(memberships)
+        self.assertIsNone(tenant_resolution_cache.get_membership(self.user.id, self.tenant.id))
+
+    def test_middleware_resolves_header_tenant(self):
+        request = self.factory.get('/api/products/', HTTP_X_TENANT_SLUG='acme')
+        request.user = self.user
+
+        self.assertIsNone(self.middleware.process_request(request))
+        self.assertEqual(request.tenant, self.tenant)
+        self.assertEqual(request.user.current_membership.tenant_id, self.tenant.id)
+
+    def test_middleware_rejects_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+
+        request = self.factory.get('/api/products/', HTTP_X_TENANT_SLUG='acme')
+        request.user = self.user
+
+        self.assertEqual(self.middleware.process_request(request).status_code, 403)
+
+    def test_jwt_of_deactivated_user_resolves_no_tenant(self):
+        token = AccessToken.for_user(self.user)
+        token['tenant_id'] = self.tenant.id
+
+        def jwt_request():
+            request = self.factory.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            request.user = AnonymousUser()
+            return request
+
+        self.assertEqual(self.middleware.get_tenant_from_jwt(jwt_request()), self.tenant)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(self.middleware.get_tenant_from_jwt(jwt_request()))
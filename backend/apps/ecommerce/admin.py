@@ -43,6 +43,7 @@ from .models import (
     # Analytics
     ProductAnalytics, AbandonedCart,
 )
+from .infrastructure.persistence.search.facets import reindex_facets
 
 
 # ============================================================================
@@ -205,13 +206,19 @@ class EcommerceProductAdmin(admin.ModelAdmin):
     
     def publish_products(self, request, queryset):
         """Bulk publish products"""
+        # The queryset may be filtered on the fields being changed
+        product_ids = list(queryset.values_list('pk', flat=True))
         count = queryset.update(is_published=True, status='PUBLISHED')
+        reindex_facets(EcommerceProduct.objects.filter(pk__in=product_ids))
         self.message_user(request, f'{count} products published successfully.')
     publish_products.short_description = "Publish selected products"
     
     def unpublish_products(self, request, queryset):
         """Bulk unpublish products"""
+        # The queryset may be filtered on the fields being changed
+        product_ids = list(queryset.values_list('pk', flat=True))
         count = queryset.update(is_published=False, status='DRAFT')
+        reindex_facets(EcommerceProduct.objects.filter(pk__in=product_ids))
         self.message_user(request, f'{count} products unpublished successfully.')
     unpublish_products.short_description = "Unpublish selected products"
     
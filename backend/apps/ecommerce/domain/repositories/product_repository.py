@@ -138,6 +138,26 @@ class ProductRepository(Repository):
         """
         pass
     
+    @abstractmethod
+    def search_page(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        sort_by: str = "relevance",
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Full-text search products with cursor pagination
+        Returns: {
+            'products': List[Product],
+            'next_cursor': Optional[str],
+            'total_count': int,
+            'total_is_exact': bool
+        }
+        """
+        pass
+    
     @abstractmethod
     def search_by_keywords(self, keywords: List[str], limit: Optional[int] = None) -> List[Product]:
         """Search products by AI keywords"""
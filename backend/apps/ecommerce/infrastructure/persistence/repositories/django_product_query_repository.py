@@ -9,6 +9,7 @@ from django.core.paginator import Paginator
 from ....domain.repositories.product_repository import ProductQueryRepository
 from ....models.products import EcommerceProduct
 from .mappers.product_mapper import ProductMapper
+from ..search.facets import FacetEngine, in_stock_q, price_bucket_range
 
 import logging
 
@@ -36,65 +37,58 @@ class DjangoProductQueryRepository(ProductQueryRepository):
         sort_options: Optional[List[Dict[str, str]]] = None,
         pagination: Optional[Dict[str, int]] = None
     ) -> Dict[str, Any]:
-        """Advanced search with faceted navigation"""
+        """
+        Advanced search with faceted navigation
+        
+        Filter-only browsing (no text query) is answered from the tenant's
+        precomputed facet index; text queries, price sliders and cold
+        tenants fall back to SQL.
+        """
         try:
-            base_queryset = EcommerceProduct.published.filter(tenant=self.tenant)
-            
-            # Apply search criteria
             query = search_criteria.get('query', '')
             filters = search_criteria.get('filters', {})
+            collection_id = search_criteria.get('collection_id')
             
-            if query:
-                base_queryset = base_queryset.filter(
-                    Q(title__icontains=query) |
-                    Q(description__icontains=query) |
-                    Q(brand__icontains=query) |
-                    Q(sku__icontains=query) |
-                    Q(ai_keywords__icontains=query)
-                )
-            
-            # Apply filters
-            if filters.get('category'):
-                base_queryset = base_queryset.filter(category__in=filters['category'])
-            
-            if filters.get('brand'):
-                base_queryset = base_queryset.filter(brand__in=filters['brand'])
-            
-            if filters.get('price_min'):
-                base_queryset = base_queryset.filter(price__gte=filters['price_min'])
-            
-            if filters.get('price_max'):
-                base_queryset = base_queryset.filter(price__lte=filters['price_max'])
-            
-            if filters.get('rating_min'):
-                base_queryset = base_queryset.filter(average_rating__gte=filters['rating_min'])
+            limit = pagination.get('limit', 20) if pagination else 100  # Limit to 100 for safety
+            offset = pagination.get('offset', 0) if pagination else 0
             
-            if filters.get('in_stock'):
-                base_queryset = base_queryset.filter(stock_quantity__gt=0)
-            
-            # Generate facets
-            facet_data = {}
-            if facets:
-                facet_data = self._generate_facets(base_queryset, facets)
+            result = None
+            if not query and FacetEngine.supports(filters):
+                result = FacetEngine(self.tenant.id).search(
+                    filters, collection_id=collection_id, facets=facets or [],
+                    offset=offset, limit=limit
+                )
             
-            # Apply sorting
-            if sort_options:
-                base_queryset = self._apply_sorting(base_queryset, sort_options)
+            if result is not None:
+                products = self._indexed_page(result, filters, collection_id, sort_options, offset, limit)
+                total_count = result['total_count']
+                facet_data = result['facets']
             else:
-                base_queryset = base_queryset.order_by('-sales_count', '-created_at')
-            
-            # Get total count
-            total_count = base_queryset.count()
-            
-            # Apply pagination
-            products = []
-            if pagination:
-                limit = pagination.get('limit', 20)
-                offset = pagination.get('offset', 0)
-                paginated_queryset = base_queryset[offset:offset + limit]
-                products = [self.mapper.django_model_to_entity(p) for p in paginated_queryset]
-            else:
-                products = [self.mapper.django_model_to_entity(p) for p in base_queryset[:100]]  # Limit to 100 for safety
+                base_queryset = self._apply_filters(
+                    EcommerceProduct.published.filter(tenant=self.tenant), filters, collection_id
+                )
+                
+                if query:
+                    base_queryset = base_queryset.filter(
+                        Q(title__icontains=query) |
+                        Q(description__icontains=query) |
+                        Q(brand__icontains=query) |
+                        Q(sku__icontains=query) |
+                        Q(ai_keywords__icontains=query)
+                    )
+                
+                # Generate facets
+                facet_data = {}
+                if facets:
+                    facet_data = self._generate_facets(base_queryset, facets)
+                
+                total_count = base_queryset.count()
+                
+                base_queryset = self._sorted(base_queryset, sort_options)
+                products = [
+                    self.mapper.django_model_to_entity(p)
+                    for p in base_queryset[offset:offset + limit]
+                ]
             
             return {
                 'products': products,
@@ -108,6 +102,64 @@ class DjangoProductQueryRepository(ProductQueryRepository):
             logger.error(f"Advanced search failed: {e}")
             raise
     
+    def _apply_filters(self, queryset, filters: Dict[str, Any], collection_id=None):
+        """SQL equivalent of the facet index filters, plus price sliders"""
+        if collection_id is not None:
+            queryset = queryset.filter(collections__id=collection_id)
+        
+        if filters.get('category'):
+            queryset = queryset.filter(product_type__in=filters['category'])
+        
+        if filters.get('brand'):
+            queryset = queryset.filter(brand__in=filters['brand'])
+        
+        if filters.get('price_range'):
+            price_condition = Q()
+            for label in filters['price_range']:
+                price_min, price_max = price_bucket_range(label)
+                bucket = Q(price__gte=price_min)
+                if price_max is not None:
+                    bucket &= Q(price__lt=price_max)
+                price_condition |= bucket
+            queryset = queryset.filter(price_condition)
+        
+        if filters.get('price_min'):
+            queryset = queryset.filter(price__gte=filters['price_min'])
+        
+        if filters.get('price_max'):
+            queryset = queryset.filter(price__lte=filters['price_max'])
+        
+        if filters.get('rating_min'):
+            queryset = queryset.filter(average_rating__gte=filters['rating_min'])
+        
+        if filters.get('in_stock'):
+            queryset = queryset.filter(in_stock_q())
+        
+        return queryset
+    
+    def _sorted(self, queryset, sort_options):
+        if sort_options:
+            return self._apply_sorting(queryset, sort_options)
+        return queryset.order_by('-sales_count', '-created_at')
+    
+    def _indexed_page(self, result, filters, collection_id, sort_options, offset, limit):
+        """The page of an index-answered search"""
+        # The index pages newest first (by primary key); other orders are
+        # read from SQL with the same filters
+        if sort_options and all(option.get('field') == 'newest' for option in sort_options):
+            products = EcommerceProduct.objects.in_bulk(result['product_ids'])
+            return [
+                self.mapper.django_model_to_entity(products[product_id])
+                for product_id in result['product_ids']
+                if product_id in products
+            ]
+        
+        queryset = self._sorted(
+            self._apply_filters(EcommerceProduct.published.filter(tenant=self.tenant), filters, collection_id),
+            sort_options
+        )
+        return [self.mapper.django_model_to_entity(p) for p in queryset[offset:offset + limit]]
+    
     def get_product_suggestions(
         self,
         partial_query: str,
@@ -422,7 +474,7 @@ class DjangoProductQueryRepository(ProductQueryRepository):
             for field in facet_fields:
                 if field == 'category':
                     facets['category'] = list(
-                        queryset.exclude(category='').values('category').annotate(
+                        queryset.values(category=F('product_type')).annotate(
                             count=Count('id')
                         ).order_by('-count')[:20]
                     )
@@ -462,6 +514,11 @@ class DjangoProductQueryRepository(ProductQueryRepository):
                                     'count': count
                                 })
                 
+                elif field == 'in_stock':
+                    facets['in_stock'] = [
+                        {'in_stock': True, 'count': queryset.filter(in_stock_q()).count()}
+                    ]
+                
                 elif field == 'rating':
                     facets['rating'] = [
                         {
@@ -3,7 +3,8 @@ from decimal import Decimal
 from datetime import datetime, timedelta
 from django.db import models, transaction
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q, F, Count, Avg, Sum, Max, Min
+from django.db.models import Q, F, Count, Avg, Sum, Max, Min, Case, When, Value, IntegerField, FloatField
+from django.contrib.postgres.search import SearchRank
 from django.utils import timezone
 
 from ....domain.entities.product import Product, AIFeatureState
@@ -12,7 +13,10 @@ from ....domain.value_objects.money import Money
 from ....domain.value_objects.price import Price
 from ....domain.repositories.product_repository import ProductRepository
 from ....models.products import EcommerceProduct  # Your existing Django model
+from ....models.collections import IntelligentCollection
 from .mappers.product_mapper import ProductMapper
+from ..search.product_search import ProductSearch, build_search_query
+from ..search.facets import reindex_facets
 
 import logging
 
@@ -327,63 +331,26 @@ class DjangoProductRepository(ProductRepository):
         limit: Optional[int] = None,
         offset: int = 0
     ) -> Tuple[List[Product], int]:
-        """Full-text search products"""
+        """
+        Full-text search products
+        
+        The total is exact up to EXACT_COUNT_LIMIT matches and the planner's
+        estimate above it; use search_page for deep pagination.
+        """
         try:
-            # Start with base published queryset
-            queryset = EcommerceProduct.published.filter(tenant=self.tenant)
-            
-            # Apply search query
-            if query.strip():
-                queryset = queryset.filter(
-                    Q(title__icontains=query) |
-                    Q(description__icontains=query) |
-                    Q(brand__icontains=query) |
-                    Q(sku__icontains=query) |
-                    Q(tags__icontains=query)
-                )
-            
-            # Apply filters
-            if filters:
-                if 'category' in filters:
-                    queryset = queryset.filter(category=filters['category'])
-                
-                if 'brand' in filters:
-                    queryset = queryset.filter(brand__in=filters['brand'])
-                
-                if 'price_min' in filters:
-                    queryset = queryset.filter(price__gte=filters['price_min'])
-                
-                if 'price_max' in filters:
-                    queryset = queryset.filter(price__lte=filters['price_max'])
-                
-                if 'in_stock' in filters and filters['in_stock']:
-                    queryset = queryset.filter(stock_quantity__gt=0)
-                
-                if 'featured' in filters and filters['featured']:
-                    queryset = queryset.filter(is_featured=True)
-            
-            # Apply sorting
-            sort_mapping = {
-                'relevance': ['-sales_count', '-view_count', '-created_at'],
-                'price_low': ['price'],
-                'price_high': ['-price'],
-                'newest': ['-created_at'],
-                'popularity': ['-sales_count', '-view_count'],
-                'rating': ['-average_rating', '-review_count'],
-                'name': ['title']
-            }
-            
-            sort_fields = sort_mapping.get(sort_by, ['-created_at'])
-            queryset = queryset.order_by(*sort_fields)
+            queryset = self._apply_search_filters(
+                EcommerceProduct.published.filter(tenant=self.tenant), filters
+            )
+            search = ProductSearch(queryset, query, sort_by)
             
-            # Get total count before pagination
-            total_count = queryset.count()
+            total_count, _ = search.estimated_count()
             
-            # Apply pagination
+            queryset = search.ordered()
             if limit:
                 queryset = queryset[offset:offset + limit]
+            elif offset:
+                queryset = queryset[offset:]
             
-            # Convert to entities
             products = [self.mapper.django_model_to_entity(p) for p in queryset]
             
             return products, total_count
@@ -392,50 +359,87 @@ class DjangoProductRepository(ProductRepository):
             logger.error(f"Failed to search products: {e}")
             raise
     
+    def search_page(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        sort_by: str = "relevance",
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Full-text search products with keyset (cursor) pagination"""
+        try:
+            queryset = self._apply_search_filters(
+                EcommerceProduct.published.filter(tenant=self.tenant), filters
+            )
+            page = ProductSearch(queryset, query, sort_by).page(limit, cursor)
+            
+            return {
+                'products': [self.mapper.django_model_to_entity(p) for p in page.results],
+                'next_cursor': page.next_cursor,
+                'total_count': page.total,
+                'total_is_exact': page.total_is_exact
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to search products: {e}")
+            raise
+    
+    def _apply_search_filters(self, queryset, filters: Optional[Dict[str, Any]]):
+        if not filters:
+            return queryset
+        
+        if 'category' in filters:
+            queryset = queryset.filter(category=filters['category'])
+        
+        if 'brand' in filters:
+            queryset = queryset.filter(brand__in=filters['brand'])
+        
+        if 'price_min' in filters:
+            queryset = queryset.filter(price__gte=filters['price_min'])
+        
+        if 'price_max' in filters:
+            queryset = queryset.filter(price__lte=filters['price_max'])
+        
+        if 'in_stock' in filters and filters['in_stock']:
+            queryset = queryset.filter(stock_quantity__gt=0)
+        
+        if 'featured' in filters and filters['featured']:
+            queryset = queryset.filter(is_featured=True)
+        
+        return queryset
+    
     def search_by_keywords(self, keywords: List[str], limit: Optional[int] = None) -> List[Product]:
         """Search products by AI keywords"""
         try:
+            keywords = [keyword for keyword in keywords if keyword and keyword.strip()]
             if not keywords:
                 return []
             
-            # Search in AI keywords field
-            queryset = EcommerceProduct.published.filter(tenant=self.tenant)
-            
-            # Build query for AI keywords
-            keyword_queries = Q()
-            for keyword in keywords:
-                keyword_queries |= Q(ai_keywords__icontains=keyword)
-            
-            queryset = queryset.filter(keyword_queries).distinct()
-            
-            # Also search in regular fields as fallback
-            fallback_queries = Q()
+            # Exact AI keyword matches come first, then the full-text matches
+            # (AI keywords are weighted into the vector above tags and description)
+            ai_match = Q()
             for keyword in keywords:
-                fallback_queries |= (
-                    Q(title__icontains=keyword) |
-                    Q(description__icontains=keyword) |
-                    Q(tags__icontains=keyword)
+                ai_match |= Q(ai_keywords__contains=[keyword])
+            
+            condition = ai_match
+            search_query = build_search_query(' '.join(keywords), match_all=False)
+            if search_query is not None:
+                condition |= Q(search_vector=search_query)
+            
+            queryset = EcommerceProduct.published.filter(tenant=self.tenant).filter(condition).annotate(
+                ai_match=Case(When(ai_match, then=Value(1)), default=Value(0), output_field=IntegerField()),
+                rank=(
+                    SearchRank(F('search_vector'), search_query)
+                    if search_query is not None
+                    else Value(0.0, output_field=FloatField())
                 )
-            
-            fallback_queryset = EcommerceProduct.published.filter(
-                tenant=self.tenant
-            ).filter(fallback_queries).distinct()
-            
-            # Combine results (AI keywords first, then fallback)
-            combined_ids = list(queryset.values_list('id', flat=True)) + \
-                          list(fallback_queryset.exclude(id__in=queryset).values_list('id', flat=True))
+            ).order_by('-ai_match', '-rank', '-pk')
             
             if limit:
-                combined_ids = combined_ids[:limit]
-            
-            # Get products in order
-            products_dict = {
-                str(p.id): p for p in EcommerceProduct.objects.filter(id__in=combined_ids)
-            }
-            
-            ordered_products = [products_dict[str(pid)] for pid in combined_ids if str(pid) in products_dict]
+                queryset = queryset[:limit]
             
-            return [self.mapper.django_model_to_entity(p) for p in ordered_products]
+            return [self.mapper.django_model_to_entity(p) for p in queryset]
             
         except Exception as e:
             logger.error(f"Failed to search by keywords: {e}")
@@ -739,6 +743,14 @@ class DjangoProductRepository(ProductRepository):
                     )
                     
                     updated_count += updated
+                
+                product_ids = [update['product_id'] for update in price_updates]
+                reindex_facets(EcommerceProduct.objects.filter(tenant=self.tenant, id__in=product_ids))
+                
+                # update() bypasses the post_save membership refresh; price rules may match differently
+                transaction.on_commit(lambda: IntelligentCollection.refresh_product_memberships(
+                    self.tenant.id, product_ids
+                ))
             
             return updated_count
             
@@ -749,14 +761,16 @@ class DjangoProductRepository(ProductRepository):
     def bulk_publish(self, product_ids: List[str]) -> int:
         """Bulk publish products"""
         try:
-            updated_count = EcommerceProduct.objects.filter(
+            products = EcommerceProduct.objects.filter(
                 tenant=self.tenant,
                 id__in=product_ids
-            ).update(
+            )
+            updated_count = products.update(
                 is_published=True,
                 is_active=True,
                 updated_at=timezone.now()
             )
+            reindex_facets(products)
             
             return updated_count
             
@@ -767,13 +781,15 @@ class DjangoProductRepository(ProductRepository):
     def bulk_unpublish(self, product_ids: List[str], reason: str = "") -> int:
         """Bulk unpublish products"""
         try:
-            updated_count = EcommerceProduct.objects.filter(
+            products = EcommerceProduct.objects.filter(
                 tenant=self.tenant,
                 id__in=product_ids
-            ).update(
+            )
+            updated_count = products.update(
                 is_published=False,
                 updated_at=timezone.now()
             )
+            reindex_facets(products)
             
             return updated_count
             
@@ -0,0 +1,726 @@
+"""
+Precomputed storefront facets
+
+Each tenant's published catalog is indexed as one bitmap per facet value
+(bit ``n`` set for the product with primary key ``n``), plus one bitmap per
+collection and one for all published products. A filter set is answered by
+OR-ing the selected values of each facet and AND-ing the facets together;
+a facet's counts are the popcounts of its value bitmaps AND-ed with the
+other facets' selections (disjunctive faceting, so selecting a brand still
+shows the counts of the other brands).
+
+Bitmaps live in Redis when the default cache is django-redis, where the
+set operations run server side, and otherwise in process memory (single
+process development setups only). Product saves, deletes and collection
+membership changes update the bits incrementally after commit. A tenant
+without an index ("cold") is answered from SQL by the caller while
+``rebuild_facet_index`` builds one.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'FACETS', 'FacetEngine', 'facet_values', 'price_bucket', 'price_bucket_range',
+    'rating_bucket', 'in_stock_q', 'get_facet_store', 'update_facets_on_commit',
+    'reindex_facets',
+]
+
+KEY_PREFIX = 'ecommerce:facets'
+
+FACETS = ['category', 'brand', 'price_range', 'rating', 'in_stock']
+
+# Rating facet entries, as in DjangoProductQueryRepository._generate_facets:
+# (rating, label, minimum average rating)
+RATING_THRESHOLDS = [
+    (5, '5 stars', Decimal('4.5')),
+    (4, '4+ stars', Decimal('4.0')),
+    (3, '3+ stars', Decimal('3.0')),
+]
+
+# Fields read to index a product
+SOURCE_FIELDS = [
+    'pk', 'product_type', 'brand', 'price', 'average_rating', 'track_quantity',
+    'stock_quantity', 'inventory_policy', 'is_active', 'is_published', 'status',
+]
+
+# Changes to these fields require the product to be re-indexed
+INDEXED_FIELDS = frozenset(SOURCE_FIELDS[1:])
+
+# Temporary result bitmaps expire quickly in case a request dies mid-query
+TEMP_TTL = 30
+
+# Rebuilds are scheduled at most once per interval per tenant
+REBUILD_LOCK_SECONDS = 600
+
+# Bit order conversion between Redis (most significant bit of a byte first)
+# and Python integers (least significant first)
+_REVERSE_BITS = bytes(int(f'{i:08b}'[::-1], 2) for i in range(256))
+_POPCOUNT = [bin(i).count('1') for i in range(256)]
+
+
+def _config():
+    return getattr(settings, 'ECOMMERCE_FACETS', {})
+
+
+def price_buckets():
+    return _config().get('PRICE_BUCKETS', [0, 25, 50, 100, 250, 500, 1000])
+
+
+def price_bucket(price):
+    """Label of the configured price bucket containing ``price``"""
+    bounds = price_buckets()
+    for lower, upper in zip(bounds, bounds[1:]):
+        if price < upper:
+            return f"{lower}-{upper}"
+    return f"{bounds[-1]}+"
+
+
+def price_bucket_range(label):
+    """``(min, max)`` of a price bucket label; max is None for the top bucket"""
+    if label.endswith('+'):
+        return Decimal(label[:-1]), None
+    lower, upper = label.split('-')
+    return Decimal(lower), Decimal(upper)
+
+
+def rating_bucket(average_rating):
+    """Half-star bucket of an average rating, e.g. 4.3 -> '4.0'"""
+    return f"{math.floor(float(average_rating or 0) * 2) / 2:.1f}"
+
+
+def rating_values_at_least(minimum):
+    """Rating bucket values covering an average rating of ``minimum`` and up"""
+    start = math.ceil(float(minimum) * 2)
+    return [f"{step / 2:.1f}" for step in range(start, 11)]
+
+
+def in_stock_q():
+    """Products that can be sold now (same rule as PublishedProductManager.in_stock)"""
+    return Q(track_quantity=False) | Q(stock_quantity__gt=0) | Q(inventory_policy='CONTINUE')
+
+
+def is_published(row):
+    return row['is_active'] and row['is_published'] and row['status'] == 'PUBLISHED'
+
+
+def facet_values(row):
+    """``{facet: value}`` for a product row with SOURCE_FIELDS"""
+    values = {
+        'category': row['product_type'],
+        'price_range': price_bucket(row['price']),
+        'rating': rating_bucket(row['average_rating']),
+        'in_stock': '1' if (
+            not row['track_quantity']
+            or row['stock_quantity'] > 0
+            or row['inventory_policy'] == 'CONTINUE'
+        ) else '0',
+    }
+    if row['brand']:
+        values['brand'] = row['brand']
+    return values
+
+
+def _int_to_bitmap(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little').translate(_REVERSE_BITS)
+
+
+def _bitmap_to_int(data):
+    return int.from_bytes((data or b'').translate(_REVERSE_BITS), 'little')
+
+
+def _positions_to_bitmap(positions):
+    """Redis-order bitmap with the given bit positions set"""
+    bitmap = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        bitmap[position >> 3] |= 0x80 >> (position & 7)
+    return bytes(bitmap)
+
+
+def _ids_descending(data, offset, limit):
+    """Primary keys set in a Redis-order bitmap, highest first, paginated"""
+    ids = []
+    skip = offset
+    for index in range(len(data) - 1, -1, -1):
+        byte = data[index]
+        if not byte:
+            continue
+        if skip >= _POPCOUNT[byte]:
+            skip -= _POPCOUNT[byte]
+            continue
+        for bit in range(7, -1, -1):
+            if byte & (0x80 >> bit):
+                if skip:
+                    skip -= 1
+                    continue
+                ids.append(index * 8 + bit)
+                if len(ids) == limit:
+                    return ids
+    return ids
+
+
+class RedisFacetStore:
+    """Bitmaps in Redis, shared by all workers; set operations run in Redis"""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+    
+    def set(self, key, value):
+        self.client.set(key, value)
+    
+    def incr(self, key):
+        return self.client.incr(key)
+    
+    def apply(self, bits, docs, members, removed_docs, doc_key):
+        """Set/clear bits and replace stored documents in one round trip"""
+        pipeline = self.client.pipeline(transaction=True)
+        for key, offset, value in bits:
+            pipeline.setbit(key, offset, value)
+        for key, values in members.items():
+            pipeline.sadd(key, *values)
+        if docs:
+            pipeline.hset(doc_key, mapping=docs)
+        if removed_docs:
+            pipeline.hdel(doc_key, *removed_docs)
+        pipeline.execute()
+    
+    def get_docs(self, doc_key, product_ids):
+        if not product_ids:
+            return {}
+        values = self.client.hmget(doc_key, [str(product_id) for product_id in product_ids])
+        return {
+            product_id: json.loads(value)
+            for product_id, value in zip(product_ids, values)
+            if value is not None
+        }
+    
+    def load(self, bitmaps, docs, members, doc_key):
+        """Write a freshly built index (``bitmaps`` in Redis bit order)"""
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in bitmaps.items():
+            pipeline.set(key, value)
+        for key, values in members.items():
+            pipeline.sadd(key, *values)
+        items = list(docs.items())
+        for start in range(0, len(items), 10000):
+            pipeline.hset(doc_key, mapping=dict(items[start:start + 10000]))
+        pipeline.execute()
+    
+    def members(self, key):
+        return sorted(
+            value.decode() if isinstance(value, bytes) else value
+            for value in self.client.smembers(key)
+        )
+    
+    def combine(self, dest, groups):
+        """Store in ``dest`` the AND over groups of the OR of each group's keys"""
+        pipeline = self.client.pipeline(transaction=False)
+        operands = []
+        for position, keys in enumerate(groups):
+            if len(keys) == 1:
+                operands.append(keys[0])
+            else:
+                union = f"{dest}:or:{position}"
+                pipeline.bitop('OR', union, *keys)
+                pipeline.expire(union, TEMP_TTL)
+                operands.append(union)
+        pipeline.bitop('AND', dest, *operands)
+        pipeline.expire(dest, TEMP_TTL)
+        pipeline.execute()
+    
+    def count_each(self, base, keys):
+        """Popcount of ``base AND key`` for each key"""
+        pipeline = self.client.pipeline(transaction=False)
+        scratch = f"{base}:count"
+        for key in keys:
+            pipeline.bitop('AND', scratch, base, key)
+            pipeline.bitcount(scratch)
+        pipeline.delete(scratch)
+        results = pipeline.execute()
+        return results[1:-1:2]
+    
+    def bitcount(self, key):
+        return self.client.bitcount(key)
+    
+    def bitmap(self, key):
+        return self.client.get(key) or b''
+    
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+    
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f"{prefix}*", count=1000))
+        for start in range(0, len(keys), 1000):
+            self.client.delete(*keys[start:start + 1000])
+
+
+class LocalFacetStore:
+    """
+    Bitmaps as Python integers in this process. Other processes do not see
+    updates, so this is only suitable for single process development setups.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._bitmaps = defaultdict(int)
+        self._sets = defaultdict(set)
+        self._hashes = defaultdict(dict)
+    
+    def get(self, key):
+        return self._values.get(key)
+    
+    def set(self, key, value):
+        self._values[key] = str(value)
+    
+    def incr(self, key):
+        with self._lock:
+            value = int(self._values.get(key, 0)) + 1
+            self._values[key] = str(value)
+        return value
+    
+    def apply(self, bits, docs, members, removed_docs, doc_key):
+        with self._lock:
+            for key, offset, value in bits:
+                if value:
+                    self._bitmaps[key] |= 1 << offset
+                else:
+                    self._bitmaps[key] &= ~(1 << offset)
+            for key, values in members.items():
+                self._sets[key].update(values)
+            self._hashes[doc_key].update(docs)
+            for product_id in removed_docs:
+                self._hashes[doc_key].pop(product_id, None)
+    
+    def get_docs(self, doc_key, product_ids):
+        stored = self._hashes.get(doc_key, {})
+        return {
+            product_id: json.loads(stored[str(product_id)])
+            for product_id in product_ids
+            if str(product_id) in stored
+        }
+    
+    def load(self, bitmaps, docs, members, doc_key):
+        with self._lock:
+            for key, value in bitmaps.items():
+                self._bitmaps[key] = _bitmap_to_int(value)
+            for key, values in members.items():
+                self._sets[key].update(values)
+            self._hashes[doc_key].update(docs)
+    
+    def members(self, key):
+        return sorted(self._sets.get(key, ()))
+    
+    def combine(self, dest, groups):
+        result = None
+        for keys in groups:
+            union = 0
+            for key in keys:
+                union |= self._bitmaps.get(key, 0)
+            result = union if result is None else result & union
+        self._bitmaps[dest] = result or 0
+    
+    def count_each(self, base, keys):
+        base_bitmap = self._bitmaps.get(base, 0)
+        return [(base_bitmap & self._bitmaps.get(key, 0)).bit_count() for key in keys]
+    
+    def bitcount(self, key):
+        return self._bitmaps.get(key, 0).bit_count()
+    
+    def bitmap(self, key):
+        return _int_to_bitmap(self._bitmaps.get(key, 0))
+    
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._bitmaps.pop(key, None)
+    
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for store in (self._values, self._bitmaps, self._sets, self._hashes):
+                for key in [key for key in store if key.startswith(prefix)]:
+                    del store[key]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_facet_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    from django_redis import get_redis_connection
+                    _store = RedisFacetStore(get_redis_connection('default'))
+                except Exception:
+                    # django-redis not installed or default cache is not Redis
+                    _store = LocalFacetStore()
+    return _store
+
+
+class FacetEngine:
+    """
+    Facet index of one tenant.
+    
+    ``search`` returns None while the tenant has no index; callers then
+    answer from SQL (a rebuild is scheduled on the way).
+    """
+    
+    def __init__(self, tenant_id, store=None):
+        self.tenant_id = tenant_id
+        self.store = store or get_facet_store()
+        self.prefix = f"{KEY_PREFIX}:{tenant_id}"
+    
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+    
+    def _generation(self):
+        return self.store.get(f"{self.prefix}:generation")
+    
+    def _keys(self, generation):
+        base = f"{self.prefix}:{generation}"
+        return {
+            'all': f"{base}:all",
+            'docs': f"{base}:docs",
+            'version': f"{base}:version",
+            'value': lambda facet, value: f"{base}:f:{facet}:{value}",
+            'values': lambda facet: f"{base}:v:{facet}",
+            'collection': lambda collection_id: f"{base}:c:{collection_id}",
+            'temp': lambda name: f"{base}:tmp:{name}",
+        }
+    
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def supports(filters):
+        """Whether ``filters`` can be answered from the index"""
+        filters = filters or {}
+        if set(filters) - {'category', 'brand', 'price_range', 'rating_min', 'in_stock'}:
+            return False
+        
+        # Ratings are indexed in half-star buckets
+        rating_min = filters.get('rating_min')
+        return not rating_min or float(rating_min) * 2 == int(float(rating_min) * 2)
+    
+    def search(self, filters=None, collection_id=None, facets=None, offset=0, limit=20):
+        """
+        ``{'product_ids', 'total_count', 'facets'}`` for published products
+        matching ``filters`` (optionally within a collection), with product
+        ids newest (highest primary key) first; None if the tenant is cold.
+        """
+        generation = self._generation()
+        if generation is None:
+            self.schedule_rebuild()
+            return None
+        
+        keys = self._keys(generation)
+        facets = FACETS if facets is None else facets
+        
+        version = self.store.get(keys['version']) or '0'
+        request = json.dumps(
+            [filters or {}, collection_id, facets, offset, limit], sort_keys=True, default=str
+        )
+        cache_key = (
+            f"{self.prefix}:result:{generation}:{version}:"
+            f"{hashlib.md5(request.encode()).hexdigest()}"
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        started = time.monotonic()
+        selections = self._selections(keys, filters or {})
+        scope = [[keys['all']]]
+        if collection_id is not None:
+            scope.append([keys['collection'](collection_id)])
+        
+        request_id = uuid.uuid4().hex[:12]
+        matched = keys['temp'](f"{request_id}:matched")
+        temp_keys = [matched]
+        self.store.combine(matched, scope + list(selections.values()))
+        
+        facet_counts = {}
+        for facet in facets:
+            values = self.store.members(keys['values'](facet))
+            if facet in selections:
+                # Disjunctive: this facet's counts ignore its own selection
+                base = keys['temp'](f"{request_id}:{facet}")
+                temp_keys.append(base)
+                self.store.combine(base, scope + [
+                    group for other, group in selections.items() if other != facet
+                ])
+            else:
+                base = matched
+            counts = self.store.count_each(base, [keys['value'](facet, value) for value in values])
+            facet_counts[facet] = self._format_facet(facet, dict(zip(values, counts)))
+        
+        result = {
+            'product_ids': _ids_descending(self.store.bitmap(matched), offset, limit),
+            'total_count': self.store.bitcount(matched),
+            'facets': facet_counts,
+        }
+        self.store.delete(*temp_keys)
+        
+        cache.set(cache_key, result, _config().get('RESULT_TTL', 60))
+        logger.debug(
+            f"Facet search for tenant {self.tenant_id}: {result['total_count']} products, "
+            f"{len(facets)} facets in {(time.monotonic() - started) * 1000:.1f}ms"
+        )
+        return result
+    
+    def _selections(self, keys, filters):
+        """``{facet: [value bitmap keys]}`` for the filters that are set"""
+        selections = {}
+        
+        for facet in ['category', 'brand', 'price_range']:
+            values = filters.get(facet)
+            if values:
+                if isinstance(values, str):
+                    values = [values]
+                selections[facet] = [keys['value'](facet, value) for value in values]
+        
+        if filters.get('rating_min'):
+            selections['rating'] = [
+                keys['value']('rating', value)
+                for value in rating_values_at_least(filters['rating_min'])
+            ]
+        
+        if filters.get('in_stock'):
+            selections['in_stock'] = [keys['value']('in_stock', '1')]
+        
+        return selections
+    
+    def _format_facet(self, facet, counts):
+        """Facet entries in the shape of DjangoProductQueryRepository._generate_facets"""
+        if facet == 'rating':
+            entries = []
+            for rating, label, minimum in RATING_THRESHOLDS:
+                covered = rating_values_at_least(minimum)
+                entries.append({
+                    'rating': rating,
+                    'label': label,
+                    'count': sum(counts.get(value, 0) for value in covered)
+                })
+            return entries
+        
+        if facet == 'price_range':
+            entries = []
+            for label, count in counts.items():
+                if not count:
+                    continue
+                lower, upper = price_bucket_range(label)
+                entries.append({
+                    'range': f"${lower:.0f} - ${upper:.0f}" if upper is not None else f"${lower:.0f}+",
+                    'value': label,
+                    'min': float(lower),
+                    'max': float(upper) if upper is not None else None,
+                    'count': count
+                })
+            return sorted(entries, key=lambda entry: entry['min'])
+        
+        if facet == 'in_stock':
+            return [{'in_stock': True, 'count': counts.get('1', 0)}]
+        
+        entries = [{facet: value, 'count': count} for value, count in counts.items() if count]
+        return sorted(entries, key=lambda entry: (-entry['count'], entry[facet]))
+    
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+    
+    def index_products(self, product_ids):
+        """Bring the index up to date with the current rows of ``product_ids``"""
+        from ....models.products import EcommerceProduct
+        
+        generation = self._generation()
+        if generation is None or not product_ids:
+            return
+        keys = self._keys(generation)
+        
+        rows = {
+            row['pk']: row
+            for row in EcommerceProduct.objects.filter(pk__in=product_ids).values(*SOURCE_FIELDS)
+        }
+        old_docs = self.store.get_docs(keys['docs'], list(product_ids))
+        
+        bits = []
+        docs = {}
+        members = defaultdict(set)
+        removed = []
+        
+        for product_id in product_ids:
+            row = rows.get(product_id)
+            new = facet_values(row) if row is not None and is_published(row) else None
+            old = old_docs.get(product_id)
+            if new == old:
+                continue
+            
+            for facet, value in (old or {}).items():
+                if (new or {}).get(facet) != value:
+                    bits.append((keys['value'](facet, value), product_id, 0))
+            for facet, value in (new or {}).items():
+                if (old or {}).get(facet) != value:
+                    bits.append((keys['value'](facet, value), product_id, 1))
+                    members[keys['values'](facet)].add(value)
+            
+            bits.append((keys['all'], product_id, 1 if new else 0))
+            if new:
+                docs[str(product_id)] = json.dumps(new)
+            else:
+                removed.append(str(product_id))
+        
+        if bits:
+            self.store.apply(bits, docs, members, removed, keys['docs'])
+            self.store.incr(keys['version'])
+    
+    def set_collection_membership(self, collection_id, product_id, member):
+        if member:
+            self.set_collection_members(collection_id, [product_id], [])
+        else:
+            self.set_collection_members(collection_id, [], [product_id])
+    
+    def set_collection_members(self, collection_id, added, removed):
+        """Add and remove collection members in one round trip"""
+        generation = self._generation()
+        if generation is None or not (added or removed):
+            return
+        keys = self._keys(generation)
+        
+        bits = [(keys['collection'](collection_id), product_id, 1) for product_id in added]
+        bits += [(keys['collection'](collection_id), product_id, 0) for product_id in removed]
+        self.store.apply(bits, {}, {}, [], keys['docs'])
+        self.store.incr(keys['version'])
+    
+    def invalidate(self):
+        """Drop the index; the tenant is cold until the next rebuild"""
+        self.store.delete_prefix(f"{self.prefix}:")
+    
+    # ------------------------------------------------------------------
+    # Rebuild
+    # ------------------------------------------------------------------
+    
+    def schedule_rebuild(self):
+        if not cache.add(f"{self.prefix}:rebuild_lock", 1, timeout=REBUILD_LOCK_SECONDS):
+            return
+        
+        try:
+            from ....tasks import rebuild_facet_index
+            rebuild_facet_index.delay(self.tenant_id)
+        except Exception as e:
+            cache.delete(f"{self.prefix}:rebuild_lock")
+            logger.error(f"Failed to schedule facet index rebuild for tenant {self.tenant_id}: {str(e)}")
+    
+    def rebuild(self, chunk_size=5000):
+        """
+        Build a new index generation from the database and switch to it.
+        
+        Queries keep using the previous generation until the switch; products
+        saved while the build ran are re-indexed into the new one afterwards.
+        """
+        from django.utils import timezone
+        from ....models.products import EcommerceProduct
+        from ....models.collections import CollectionProduct
+        
+        started_at = timezone.now()
+        started = time.monotonic()
+        previous = self._generation()
+        generation = str(int(time.time() * 1000))
+        keys = self._keys(generation)
+        
+        # Bit positions are collected first; setting bits one by one on
+        # Python integers would copy the whole bitmap per product
+        positions = defaultdict(list)
+        members = defaultdict(set)
+        docs = {}
+        
+        products = EcommerceProduct.published.filter(tenant_id=self.tenant_id).values(*SOURCE_FIELDS)
+        for row in products.iterator(chunk_size=chunk_size):
+            values = facet_values(row)
+            positions[keys['all']].append(row['pk'])
+            for facet, value in values.items():
+                positions[keys['value'](facet, value)].append(row['pk'])
+                members[keys['values'](facet)].add(value)
+            docs[str(row['pk'])] = json.dumps(values)
+        
+        memberships = CollectionProduct.objects.filter(tenant_id=self.tenant_id).values_list(
+            'collection_id', 'product_id'
+        )
+        for collection_id, product_id in memberships.iterator(chunk_size=chunk_size):
+            positions[keys['collection'](collection_id)].append(product_id)
+        
+        bitmaps = {key: _positions_to_bitmap(ids) for key, ids in positions.items()}
+        self.store.load(bitmaps, docs, members, keys['docs'])
+        self.store.set(keys['version'], 0)
+        self.store.set(f"{self.prefix}:generation", generation)
+        
+        if previous is not None:
+            self.store.delete_prefix(f"{self.prefix}:{previous}:")
+        
+        changed = list(
+            EcommerceProduct.objects.filter(
+                tenant_id=self.tenant_id, updated_at__gte=started_at
+            ).values_list('pk', flat=True)
+        )
+        self.index_products(changed)
+        
+        seconds = time.monotonic() - started
+        logger.info(
+            f"Facet index rebuilt for tenant {self.tenant_id}: {len(docs)} products, "
+            f"{len(bitmaps)} bitmaps in {seconds:.2f}s"
+        )
+        return {'products': len(docs), 'bitmaps': len(bitmaps), 'seconds': seconds}
+
+
+def update_facets_on_commit(tenant_id, update):
+    """
+    Run ``update(engine)`` for the tenant's facet index after the current
+    transaction commits. A failed update drops the index, so the tenant is
+    answered from SQL until it is rebuilt instead of serving wrong counts.
+    """
+    def apply():
+        engine = FacetEngine(tenant_id)
+        try:
+            update(engine)
+        except Exception as e:
+            logger.error(f"Facet index update failed for tenant {tenant_id}, dropping index: {str(e)}")
+            engine.invalidate()
+    
+    transaction.on_commit(apply)
+
+
+def reindex_facets(products):
+    """
+    Re-index a product queryset after commit. Code changing indexed fields
+    with ``update()`` or ``bulk_update()`` bypasses post_save and must call
+    this.
+    """
+    by_tenant = defaultdict(list)
+    for tenant_id, product_id in products.values_list('tenant_id', 'pk'):
+        by_tenant[tenant_id].append(product_id)
+    
+    for tenant_id, product_ids in by_tenant.items():
+        update_facets_on_commit(tenant_id, lambda engine, ids=product_ids: engine.index_products(ids))
@@ -0,0 +1,272 @@
+"""
+Full-text product search on PostgreSQL
+
+Products carry a weighted ``search_vector`` (title A; SKU, brand and AI
+keywords B; tags C; description D) backed by a GIN index, kept current by
+the post_save receiver in ``apps.ecommerce.signals``. Queries are matched
+with a prefix tsquery (every term must match, the last one as a prefix, so
+search-as-you-type works) or a SKU prefix served by the trigram index, and
+ranked with ``ts_rank``.
+
+Result pages use keyset pagination: the cursor carries the sort values of
+the last row, so page N costs the same as page 1 instead of scanning and
+discarding ``offset`` rows. Totals are exact up to ``EXACT_COUNT_LIMIT``
+and the planner's estimate above it.
+"""
+
+import base64
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, TextField, Value, When
+from django.db.models.functions import Cast
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'search_config', 'product_search_vector', 'refresh_search_vectors',
+    'build_search_query', 'SearchPage', 'ProductSearch', 'InvalidCursor',
+]
+
+# Up to this many matches the total is counted exactly
+EXACT_COUNT_LIMIT = 1000
+
+# Changes to these fields require the search vector to be rebuilt
+SEARCH_FIELDS = frozenset(['title', 'description', 'sku', 'brand', 'tags', 'ai_keywords'])
+
+# ts_rank weights in {D, C, B, A} order
+DEFAULT_RANK_WEIGHTS = [0.1, 0.2, 0.4, 1.0]
+
+# Added to the rank of an exact SKU match so it always comes first
+EXACT_SKU_BOOST = 10.0
+
+# Sort keys per sort option as (field, descending); the primary key is always
+# appended as a tie-break so the keyset is unique
+SORT_KEYS = {
+    'relevance': [('rank', True), ('sales_count', True)],
+    'price_low': [('price', False)],
+    'price_high': [('price', True)],
+    'newest': [('created_at', True)],
+    'popularity': [('sales_count', True), ('view_count', True)],
+    'rating': [('average_rating', True), ('review_count', True)],
+    'name': [('title', False)],
+}
+
+# Relevance without a query has nothing to rank on
+UNRANKED_RELEVANCE = [('sales_count', True), ('view_count', True), ('created_at', True)]
+
+DEFAULT_SORT = [('created_at', True)]
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class InvalidCursor(ValueError):
+    """Raised for a pagination cursor that cannot be decoded"""
+
+
+def search_config():
+    """PostgreSQL text search configuration used for vectors and queries"""
+    return getattr(settings, 'ECOMMERCE_SEARCH_CONFIG', 'english')
+
+
+def product_search_vector():
+    """Weighted tsvector expression over the searchable product fields"""
+    config = search_config()
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('sku', 'brand', weight='B', config=config)
+        + SearchVector(Cast('ai_keywords', TextField()), weight='B', config=config)
+        + SearchVector(Cast('tags', TextField()), weight='C', config=config)
+        + SearchVector('description', weight='D', config=config)
+    )
+
+
+def refresh_search_vectors(queryset):
+    """
+    Recompute ``search_vector`` for every product in ``queryset`` in one
+    UPDATE. Code that changes searchable fields with ``update()`` or
+    ``bulk_update()`` bypasses post_save and must call this.
+    """
+    return queryset.update(search_vector=product_search_vector())
+
+
+def _terms(text):
+    return _TERM_RE.findall(text.lower())
+
+
+def build_search_query(text, match_all=True):
+    """
+    Prefix tsquery for user input, or None when it has no searchable terms.
+    
+    With ``match_all`` every term must match (the last one as a prefix);
+    otherwise any term may match.
+    """
+    terms = _terms(text)
+    if not terms:
+        return None
+    
+    if match_all:
+        expression = ' & '.join(terms[:-1] + [f"{terms[-1]}:*"])
+    else:
+        expression = ' | '.join(terms)
+    
+    return SearchQuery(expression, search_type='raw', config=search_config())
+
+
+def _encode_cursor(values):
+    payload = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid search cursor: {e}")
+    
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Search cursor does not match the sort order")
+    
+    return values
+
+
+def _keyset_filter(keys, values):
+    """
+    Rows strictly after ``values`` in the order given by ``keys``
+    (mixed ascending/descending): for each key, the rows equal on all
+    previous keys and beyond the cursor on this one.
+    """
+    condition = Q()
+    for position, (field, descending) in enumerate(keys):
+        lookup = 'lt' if descending else 'gt'
+        branch = Q(**{f"{field}__{lookup}": values[position]})
+        for (previous_field, _), previous_value in zip(keys[:position], values):
+            branch &= Q(**{previous_field: previous_value})
+        condition |= branch
+    return condition
+
+
+def _planner_rows(queryset):
+    """The planner's row estimate for ``queryset`` from EXPLAIN (FORMAT JSON)"""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    
+    # psycopg decodes the json column; other drivers return the text
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+@dataclass
+class SearchPage:
+    """One page of search results"""
+    
+    results: List[Any]
+    next_cursor: Optional[str]
+    total: int
+    total_is_exact: bool
+
+
+class ProductSearch:
+    """
+    Builds ranked, keyset-paginated product search querysets.
+    
+    ``queryset`` is the scope to search (e.g. the tenant's published
+    products, already filtered); the search only narrows and orders it.
+    """
+    
+    def __init__(self, queryset, query: str = '', sort_by: str = 'relevance'):
+        self.query = (query or '').strip()
+        self.search_query = build_search_query(self.query) if self.query else None
+        self.sort_by = sort_by
+        self.queryset = self._match(queryset)
+        self.keys = self._sort_keys() + [('pk', True)]
+    
+    def _match(self, queryset):
+        if not self.query:
+            return queryset
+        
+        # SKU prefixes like "AB-12" tokenize poorly, so they are matched directly
+        condition = Q(sku__istartswith=self.query)
+        if self.search_query is not None:
+            condition |= Q(search_vector=self.search_query)
+        
+        queryset = queryset.filter(condition)
+        
+        if self.sort_by == 'relevance':
+            rank = (
+                SearchRank(F('search_vector'), self.search_query, weights=DEFAULT_RANK_WEIGHTS)
+                if self.search_query is not None
+                else Value(0.0, output_field=FloatField())
+            )
+            queryset = queryset.annotate(
+                rank=rank + Case(
+                    When(sku__iexact=self.query, then=Value(EXACT_SKU_BOOST)),
+                    default=Value(0.0),
+                    output_field=FloatField()
+                )
+            )
+        
+        return queryset
+    
+    def _sort_keys(self):
+        if self.sort_by == 'relevance' and not self.query:
+            return list(UNRANKED_RELEVANCE)
+        return list(SORT_KEYS.get(self.sort_by, DEFAULT_SORT))
+    
+    def ordered(self):
+        """The matching queryset in sort order"""
+        return self.queryset.order_by(
+            *[f"-{field}" if descending else field for field, descending in self.keys]
+        )
+    
+    def page(self, limit: int, cursor: Optional[str] = None) -> SearchPage:
+        """The ``limit`` results after ``cursor`` (the first page without one)"""
+        queryset = self.ordered()
+        if cursor:
+            values = _decode_cursor(cursor, len(self.keys))
+            queryset = queryset.filter(_keyset_filter(self.keys, values))
+        
+        # One extra row tells whether there is a next page
+        rows = list(queryset[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = _encode_cursor([
+                getattr(last, field) for field, _ in self.keys
+            ])
+        
+        total, exact = self.estimated_count()
+        return SearchPage(results=rows, next_cursor=next_cursor, total=total, total_is_exact=exact)
+    
+    def estimated_count(self):
+        """
+        ``(total, exact)``: an exact count when there are at most
+        ``EXACT_COUNT_LIMIT`` matches, the planner's row estimate otherwise.
+        """
+        queryset = self.queryset.order_by()
+        
+        # Counting a LIMITed subquery stops after EXACT_COUNT_LIMIT + 1 rows
+        bounded = queryset[:EXACT_COUNT_LIMIT + 1].count()
+        if bounded <= EXACT_COUNT_LIMIT:
+            return bounded, True
+        
+        try:
+            estimate = _planner_rows(queryset)
+        except Exception as e:
+            logger.warning(f"Could not estimate search result count: {e}")
+            return bounded, False
+        
+        return max(estimate, bounded), False
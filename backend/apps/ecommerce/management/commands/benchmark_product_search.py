@@ -0,0 +1,139 @@
+"""
+Benchmark Product Search Management Command
+"""
+
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django_tenants.utils import schema_context
+from ...models import EcommerceProduct
+from ...infrastructure.persistence.search.product_search import ProductSearch
+
+
+class Command(BaseCommand):
+    """
+    Time product search against a tenant's catalog: the first page, a deep
+    page reached through keyset cursors, and the previous icontains scan with
+    an exact COUNT(*) for comparison. Run it on a tenant with a realistic
+    catalog (e.g. 1M products) after rebuild_product_search_index.
+    
+    Usage:
+        python manage.py benchmark_product_search --tenant-id 1 --query "wireless headphones"
+    """
+    
+    help = 'Benchmark full-text product search against the icontains path'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant-id',
+            type=str,
+            help='Tenant ID to benchmark',
+        )
+        parser.add_argument(
+            '--query',
+            action='append',
+            dest='queries',
+            help='Search query (repeatable)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed runs per query',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=24,
+            help='Results per page',
+        )
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=20,
+            help='Pages to walk for the deep page timing',
+        )
+        parser.add_argument(
+            '--skip-legacy',
+            action='store_true',
+            help='Do not time the icontains path',
+        )
+    
+    def handle(self, *args, **options):
+        tenant_id = options.get('tenant_id')
+        if not tenant_id:
+            raise CommandError('Tenant ID is required')
+        
+        try:
+            from apps.core.models import Tenant
+            tenant = Tenant.objects.get(id=tenant_id)
+        except Tenant.DoesNotExist:
+            raise CommandError(f'Tenant {tenant_id} not found')
+        
+        queries = options['queries'] or ['shirt', 'wireless headphones', 'blue']
+        
+        with schema_context(tenant.schema_name):
+            scope = EcommerceProduct.published.filter(tenant=tenant)
+            self.stdout.write(f'Published products: {scope.count():,}')
+            
+            for query in queries:
+                self.stdout.write(f'\nQuery "{query}"')
+                self._report('First page', self._time(
+                    lambda: ProductSearch(scope, query).page(options['page_size']),
+                    options['iterations']
+                ))
+                
+                cursor = self._cursor_at(scope, query, options['page_size'], options['depth'])
+                if cursor:
+                    self._report(f'Page {options["depth"] + 1} (keyset)', self._time(
+                        lambda: ProductSearch(scope, query).page(options['page_size'], cursor),
+                        options['iterations']
+                    ))
+                
+                page = ProductSearch(scope, query).page(options['page_size'])
+                self.stdout.write(
+                    f'  Total: {page.total:,} ({"exact" if page.total_is_exact else "estimated"})'
+                )
+                
+                if not options['skip_legacy']:
+                    self._report('icontains + COUNT(*)', self._time(
+                        lambda: self._legacy_search(scope, query, options['page_size']),
+                        options['iterations']
+                    ))
+    
+    def _cursor_at(self, scope, query, page_size, depth):
+        cursor = None
+        for _ in range(depth):
+            page = ProductSearch(scope, query).page(page_size, cursor)
+            if not page.next_cursor:
+                return None
+            cursor = page.next_cursor
+        return cursor
+    
+    def _legacy_search(self, scope, query, page_size):
+        queryset = scope.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(brand__icontains=query) |
+            Q(sku__icontains=query) |
+            Q(tags__icontains=query)
+        ).order_by('-sales_count', '-view_count', '-created_at')
+        queryset.count()
+        return list(queryset[:page_size])
+    
+    def _time(self, func, iterations):
+        # One untimed run warms caches and the connection
+        func()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)
+    
+    def _report(self, label, timings):
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'  {label}: p50 {statistics.median(timings):.1f}ms, p99 {p99:.1f}ms'
+        )
@@ -0,0 +1,73 @@
+"""
+Rebuild Product Search Index Management Command
+"""
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django_tenants.utils import schema_context
+from ...models import EcommerceProduct
+from ...infrastructure.persistence.search.product_search import refresh_search_vectors
+
+
+class Command(BaseCommand):
+    """
+    Recompute product search vectors in primary key batches, e.g. after the
+    search_vector column is added or ECOMMERCE_SEARCH_CONFIG changes.
+    
+    Usage:
+        python manage.py rebuild_product_search_index --tenant-id 1
+        python manage.py rebuild_product_search_index --tenant-id 1 --missing-only
+    """
+    
+    help = 'Rebuild full-text search vectors for products'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant-id',
+            type=str,
+            help='Tenant ID to rebuild the index for',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Products updated per statement',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only products without a search vector',
+        )
+    
+    def handle(self, *args, **options):
+        tenant_id = options.get('tenant_id')
+        if not tenant_id:
+            raise CommandError('Tenant ID is required')
+        
+        try:
+            from apps.core.models import Tenant
+            tenant = Tenant.objects.get(id=tenant_id)
+        except Tenant.DoesNotExist:
+            raise CommandError(f'Tenant {tenant_id} not found')
+        
+        with schema_context(tenant.schema_name):
+            products = EcommerceProduct.objects.filter(tenant=tenant)
+            if options['missing_only']:
+                products = products.filter(search_vector__isnull=True)
+            
+            ids = list(products.order_by('pk').values_list('pk', flat=True))
+            batch_size = options['batch_size']
+            
+            started = time.monotonic()
+            updated = 0
+            for start in range(0, len(ids), batch_size):
+                updated += refresh_search_vectors(
+                    EcommerceProduct.objects.filter(pk__in=ids[start:start + batch_size])
+                )
+                self.stdout.write(f'  {updated}/{len(ids)} products')
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt search vectors for {updated} products in {time.monotonic() - started:.1f}s'
+            )
+        )
@@ -512,6 +512,11 @@ class IntelligentCartItem(EcommerceBaseModel, AIOptimizedPricingMixin):
         return self.product.featured_image
 
 
+# Services, views and serializers refer to the cart models by these names
+Cart = IntelligentCart
+CartItem = IntelligentCartItem
+
+
 class Wishlist(EcommerceBaseModel):
     """Customer wishlist for saving products"""
     
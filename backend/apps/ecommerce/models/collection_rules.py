@@ -0,0 +1,193 @@
+# apps/ecommerce/models/collection_rules.py
+
+"""
+Collection rule compiler
+
+Turns a collection rule set into one ORM ``Q`` expression over
+EcommerceProduct, so membership is decided by the database in a single
+query instead of rule by rule in Python.
+
+A rule set is a list of rules ``{'field', 'condition', 'value', 'operator'}``
+and nested groups ``{'operator', 'rules': [...]}``. A rule's (or group's)
+operator joins it to the rules before it, and AND binds tighter than OR:
+
+    [a, b (AND), c (OR), d (AND)]  ->  (a AND b) OR (c AND d)
+
+Rules with an unknown field or condition or an unusable value are skipped,
+as they always have been.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from operator import or_
+from typing import Any, Dict, List, Optional
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['RuleError', 'compile_rule', 'compile_rules', 'rule_set_key', 'RULE_SOURCE_FIELDS']
+
+# Rule field -> (product field, value type)
+RULE_FIELDS = {
+    'title': ('title', 'text'),
+    'description': ('description', 'text'),
+    'brand': ('brand', 'text'),
+    'product_type': ('product_type', 'text'),
+    'sku': ('sku', 'text'),
+    'barcode': ('barcode', 'text'),
+    'price': ('price', 'decimal'),
+    'compare_at_price': ('compare_at_price', 'decimal'),
+    'weight': ('weight', 'decimal'),
+    'inventory_quantity': ('stock_quantity', 'integer'),
+    'tags': ('tags', 'tags'),
+    'created_at': ('created_at', 'datetime'),
+    'updated_at': ('updated_at', 'datetime'),
+}
+
+# Product fields rules can read; changes to them may change membership
+RULE_SOURCE_FIELDS = frozenset(field for field, _ in RULE_FIELDS.values())
+
+TEXT_LOOKUPS = {
+    'equals': 'iexact',
+    'contains': 'icontains',
+    'starts_with': 'istartswith',
+    'ends_with': 'iendswith',
+}
+
+COMPARISON_LOOKUPS = {
+    'equals': 'exact',
+    'greater_than': 'gt',
+    'less_than': 'lt',
+    'greater_than_or_equal': 'gte',
+    'less_than_or_equal': 'lte',
+}
+
+NEGATIONS = {
+    'not_equals': 'equals',
+    'not_contains': 'contains',
+    'is_not_set': 'is_set',
+}
+
+
+class RuleError(ValueError):
+    """Raised for a rule that cannot be compiled"""
+
+
+def _parse_value(value_type, value):
+    try:
+        if value_type == 'decimal':
+            return Decimal(str(value))
+        if value_type == 'integer':
+            return int(Decimal(str(value)))
+    except (InvalidOperation, ValueError, TypeError):
+        raise RuleError(f"Invalid {value_type} value: {value!r}")
+    
+    if value_type == 'datetime':
+        if not isinstance(value, str):
+            return value
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                raise RuleError(f"Invalid date value: {value!r}")
+            parsed = datetime.combine(date, time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+    
+    return str(value)
+
+
+def compile_rule(field: str, condition: str, value: Any = None) -> Q:
+    """``Q`` for one rule; raises RuleError if it cannot be compiled"""
+    if field not in RULE_FIELDS:
+        raise RuleError(f"Unknown rule field: {field}")
+    
+    if condition in NEGATIONS:
+        return ~compile_rule(field, NEGATIONS[condition], value)
+    
+    product_field, value_type = RULE_FIELDS[field]
+    
+    if condition == 'is_set':
+        is_set = Q(**{f"{product_field}__isnull": False})
+        if value_type == 'text':
+            is_set &= ~Q(**{product_field: ''})
+        elif value_type == 'tags':
+            is_set &= ~Q(**{product_field: []})
+        return is_set
+    
+    if value is None:
+        raise RuleError(f"Rule {field} {condition} needs a value")
+    
+    if value_type == 'text':
+        lookup = TEXT_LOOKUPS.get(condition)
+    elif value_type == 'tags':
+        if condition == 'equals':
+            # Exactly one of the tags
+            return Q(**{f"{product_field}__contains": [str(value)]})
+        # Anywhere in the tag list, as before
+        lookup = 'icontains' if condition == 'contains' else None
+    else:
+        lookup = COMPARISON_LOOKUPS.get(condition)
+    
+    if lookup is None:
+        raise RuleError(f"Condition {condition} is not supported for {field}")
+    
+    return Q(**{f"{product_field}__{lookup}": _parse_value(value_type, value)})
+
+
+def _compile_entry(entry: Dict[str, Any]) -> Optional[Q]:
+    if 'rules' in entry:
+        return compile_rules(entry['rules'])
+    
+    if entry.get('is_active', True) is False:
+        return None
+    
+    field = entry.get('field')
+    if not field or (entry.get('value') is None and entry.get('condition') not in ('is_set', 'is_not_set')):
+        return None
+    
+    try:
+        return compile_rule(field, entry.get('condition', 'equals'), entry.get('value'))
+    except RuleError as e:
+        logger.debug(f"Skipping collection rule {entry}: {e}")
+        return None
+
+
+def compile_rules(rules: List[Dict[str, Any]]) -> Optional[Q]:
+    """
+    ``Q`` for a rule set, or None if no rule in it can be compiled (the
+    collection then matches nothing).
+    """
+    or_terms = []
+    current = None
+    
+    for entry in rules or []:
+        compiled = _compile_entry(entry)
+        if compiled is None:
+            continue
+        
+        if current is None:
+            current = compiled
+        elif str(entry.get('operator', 'AND')).upper() == 'OR':
+            or_terms.append(current)
+            current = compiled
+        else:
+            current &= compiled
+    
+    if current is not None:
+        or_terms.append(current)
+    
+    return reduce(or_, or_terms) if or_terms else None
+
+
+def rule_set_key(rules: List[Dict[str, Any]]) -> str:
+    """Stable digest of a rule set, for caching compiled expressions"""
+    return hashlib.md5(json.dumps(rules or [], sort_keys=True, default=str).encode()).hexdigest()
@@ -5,7 +5,7 @@ AI-Powered Intelligent Product Collections System
 Featuring machine learning curation, predictive analytics, and automated optimization
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
 from django.core.cache import cache
@@ -27,9 +27,13 @@ from .base import (
     AuditMixin,
     AIOptimizedPricingMixin
 )
+from .collection_rules import compile_rule, compile_rules, rule_set_key, RuleError
 
 logger = logging.getLogger(__name__)
 
+# Membership rows are written in batches of this size
+MEMBERSHIP_BATCH_SIZE = 5000
+
 
 class IntelligentCollection(EcommerceBaseModel, SEOMixin, VisibilityMixin, SortableMixin, AuditMixin, AIOptimizedPricingMixin):
     """
@@ -177,12 +181,12 @@ class IntelligentCollection(EcommerceBaseModel, SEOMixin, VisibilityMixin, Sorta
             
         # Ensure handle is unique
         if self.pk:  # Updating existing collection
-            existing = Collection.objects.filter(
+            existing = IntelligentCollection.objects.filter(
                 tenant=self.tenant, 
                 handle=self.handle
             ).exclude(pk=self.pk)
         else:  # Creating new collection
-            existing = Collection.objects.filter(
+            existing = IntelligentCollection.objects.filter(
                 tenant=self.tenant, 
                 handle=self.handle
             )
@@ -192,7 +196,7 @@ class IntelligentCollection(EcommerceBaseModel, SEOMixin, VisibilityMixin, Sorta
             counter = 1
             while existing.exists():
                 self.handle = f"{base_handle}-{counter}"
-                existing = Collection.objects.filter(
+                existing = IntelligentCollection.objects.filter(
                     tenant=self.tenant, 
                     handle=self.handle
                 )
@@ -208,8 +212,14 @@ class IntelligentCollection(EcommerceBaseModel, SEOMixin, VisibilityMixin, Sorta
         
         super().save(*args, **kwargs)
         
-        # Update products count after save
-        self.update_products_count()
+        # Re-materialise rule membership when the rules may have changed
+        update_fields = kwargs.get('update_fields')
+        if self.is_rule_based and (
+            update_fields is None or {'collection_rules', 'collection_type'} & set(update_fields)
+        ):
+            self.refresh_membership()
+        elif update_fields is None:
+            self.update_products_count()
     
     def clean(self):
         """Custom validation"""
@@ -249,32 +259,42 @@ class IntelligentCollection(EcommerceBaseModel, SEOMixin, VisibilityMixin, Sorta
             status='PUBLISHED'
         ).count()
     
+    @property
+    def is_rule_based(self):
+        """Whether membership is derived from ``collection_rules``"""
+        return self.collection_type == self.CollectionType.AUTOMATIC
+    
+    def compiled_rules(self):
+        """The rule set as one ``Q`` over products (None if it matches nothing)"""
+        key = rule_set_key(self.collection_rules)
+        if getattr(self, '_compiled_rules', (None, None))[0] != key:
+            self._compiled_rules = (key, compile_rules(self.collection_rules))
+        return self._compiled_rules[1]
+    
     def update_products_count(self):
         """Update cached products count"""
-        if self.collection_type == self.CollectionType.AUTOMATIC:
-            # For automatic collections, apply rules to get count
-            count = self.get_automatic_products().count()
-        else:
-            # For manual collections, count related products
-            count = self.collection_products.filter(
-                product__is_active=True,
-                product__is_published=True,
-                product__status='PUBLISHED'
-            ).count()
+        # Automatic collections are materialised in collection_products too
+        count = self.collection_products.filter(
+            product__is_active=True,
+            product__is_published=True,
+            product__status='PUBLISHED'
+        ).count()
         
+        # A queryset update, so saving the count does not re-enter save()
         self.products_count = count
-        self.save(update_fields=['products_count'])
+        IntelligentCollection.objects.filter(pk=self.pk).update(products_count=count)
     
     def get_products(self, limit=None):
         """Get products in this collection"""
-        if self.collection_type == self.CollectionType.AUTOMATIC:
-            queryset = self.get_automatic_products()
-        else:
-            queryset = self.products.filter(
-                is_active=True,
-                is_published=True,
-                status='PUBLISHED'
-            )
+        from .products import EcommerceProduct
+        
+        # Rule matches are materialised, so both kinds read the membership table
+        queryset = EcommerceProduct.objects.filter(
+            collection_memberships__collection=self,
+            is_active=True,
+            is_published=True,
+            status='PUBLISHED'
+        )
         
         # Apply sorting
         if self.default_sort_order == 'manual':
@@ -302,84 +322,136 @@ class IntelligentCollection(EcommerceBaseModel, SEOMixin, VisibilityMixin, Sorta
         return queryset
     
     def get_automatic_products(self):
-        """Get products based on automatic collection rules"""
+        """Evaluate the collection rules live (published products only)"""
         from .products import EcommerceProduct
         
-        if not self.collection_rules:
+        rules = self.compiled_rules()
+        if rules is None:
             return EcommerceProduct.objects.none()
         
-        queryset = EcommerceProduct.published.filter(tenant=self.tenant)
+        return EcommerceProduct.published.filter(tenant=self.tenant).filter(rules)
         
-        # Apply each rule
-        for rule in self.collection_rules:
-            condition = rule.get('condition', 'equals')
-            field = rule.get('field')
-            value = rule.get('value')
-            operator = rule.get('operator', 'AND')
+    @transaction.atomic
+    def refresh_membership(self):
+        """
+        Re-materialise the rule matches of this collection in
+        collection_products (all of the tenant's products, published or not).
             
-            if not field or value is None:
-                continue
+        Returns ``(added, removed)`` counts.
+        """
+        from .products import EcommerceProduct
+        from ..infrastructure.persistence.search.facets import update_facets_on_commit
             
-            # Build query based on rule
-            if field == 'title':
-                if condition == 'equals':
-                    filter_kwargs = {'title__iexact': value}
-                elif condition == 'contains':
-                    filter_kwargs = {'title__icontains': value}
-                elif condition == 'starts_with':
-                    filter_kwargs = {'title__istartswith': value}
-                elif condition == 'ends_with':
-                    filter_kwargs = {'title__iendswith': value}
-                else:
-                    continue
-            elif field == 'price':
-                if condition == 'equals':
-                    filter_kwargs = {'price': value}
-                elif condition == 'greater_than':
-                    filter_kwargs = {'price__gt': value}
-                elif condition == 'less_than':
-                    filter_kwargs = {'price__lt': value}
-                elif condition == 'greater_than_or_equal':
-                    filter_kwargs = {'price__gte': value}
-                elif condition == 'less_than_or_equal':
-                    filter_kwargs = {'price__lte': value}
-                else:
-                    continue
-            elif field == 'brand':
-                if condition == 'equals':
-                    filter_kwargs = {'brand__iexact': value}
-                elif condition == 'contains':
-                    filter_kwargs = {'brand__icontains': value}
-                else:
-                    continue
-            elif field == 'product_type':
-                filter_kwargs = {'product_type': value}
-            elif field == 'tags':
-                if condition == 'contains':
-                    filter_kwargs = {'tags__icontains': value}
-                else:
-                    continue
-            elif field == 'inventory_quantity':
-                if condition == 'greater_than':
-                    filter_kwargs = {'stock_quantity__gt': value}
-                elif condition == 'less_than':
-                    filter_kwargs = {'stock_quantity__lt': value}
-                elif condition == 'equals':
-                    filter_kwargs = {'stock_quantity': value}
-                else:
-                    continue
-            else:
-                continue
+        rules = self.compiled_rules() if self.is_rule_based else None
+        matching = EcommerceProduct.objects.filter(tenant=self.tenant)
+        if rules is not None:
+            matching = matching.filter(rules)
+        else:
+            matching = matching.none()
             
-            # Apply filter with operator
-            if operator == 'AND':
-                queryset = queryset.filter(**filter_kwargs)
-            elif operator == 'OR':
-                # For OR operations, we need to use Q objects
-                from django.db.models import Q
-                queryset = queryset.filter(Q(**filter_kwargs))
+        stale = self.collection_products.exclude(product_id__in=matching.values('pk'))
+        removed = list(stale.values_list('product_id', flat=True))
+        stale.delete()
+        
+        missing = matching.exclude(collection_memberships__collection=self).values_list('pk', flat=True)
+        added = []
+        batch = []
+        for product_id in missing.iterator(chunk_size=MEMBERSHIP_BATCH_SIZE):
+            batch.append(CollectionProduct(tenant_id=self.tenant_id, collection=self, product_id=product_id))
+            added.append(product_id)
+            if len(batch) >= MEMBERSHIP_BATCH_SIZE:
+                CollectionProduct.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            CollectionProduct.objects.bulk_create(batch, ignore_conflicts=True)
+        
+        # Deleted rows update the facet index through their post_delete signal
+        if added:
+            update_facets_on_commit(self.tenant_id, lambda engine: engine.set_collection_members(
+                self.pk, added, []
+            ))
+        self.update_products_count()
         
-        return queryset
+        logger.info(
+            f"Collection {self.handle} membership refreshed: {len(added)} added, {len(removed)} removed"
+        )
+        return len(added), len(removed)
+    
+    @classmethod
+    @transaction.atomic
+    def refresh_product_memberships(cls, tenant_id, product_ids):
+        """
+        Re-evaluate the rule-based collections of a tenant for the given
+        products, in one query over all collections, and apply the
+        membership differences.
+        """
+        from .products import EcommerceProduct
+        from ..infrastructure.persistence.search.facets import update_facets_on_commit
+        
+        product_ids = list(product_ids)
+        collections = {
+            collection.pk: collection
+            for collection in cls.objects.filter(
+                tenant_id=tenant_id, collection_type=cls.CollectionType.AUTOMATIC
+            )
+        }
+        if not product_ids or not collections:
+            return
+        
+        # One boolean column per collection
+        annotations = {}
+        for collection_id, collection in collections.items():
+            rules = collection.compiled_rules()
+            if rules is not None:
+                annotations[f"in_{collection_id}"] = models.ExpressionWrapper(
+                    rules, output_field=models.BooleanField()
+                )
+        
+        desired = set()
+        if annotations:
+            rows = EcommerceProduct.objects.filter(
+                tenant_id=tenant_id, pk__in=product_ids
+            ).annotate(**annotations).values('pk', *annotations)
+            for row in rows:
+                for collection_id in collections:
+                    if row.get(f"in_{collection_id}"):
+                        desired.add((collection_id, row['pk']))
+        
+        existing = set(
+            CollectionProduct.objects.filter(
+                collection_id__in=collections, product_id__in=product_ids
+            ).values_list('collection_id', 'product_id')
+        )
+        
+        added = desired - existing
+        removed = existing - desired
+        
+        CollectionProduct.objects.bulk_create([
+            CollectionProduct(tenant_id=tenant_id, collection_id=collection_id, product_id=product_id)
+            for collection_id, product_id in added
+        ], ignore_conflicts=True)
+        
+        removed_by_collection = {}
+        for collection_id, product_id in removed:
+            removed_by_collection.setdefault(collection_id, []).append(product_id)
+        for collection_id, removed_ids in removed_by_collection.items():
+            CollectionProduct.objects.filter(
+                collection_id=collection_id, product_id__in=removed_ids
+            ).delete()
+        
+        added_by_collection = {}
+        for collection_id, product_id in added:
+            added_by_collection.setdefault(collection_id, []).append(product_id)
+        
+        # Deleted rows update the facet index through their post_delete signal
+        for collection_id, added_ids in added_by_collection.items():
+            update_facets_on_commit(
+                tenant_id,
+                lambda engine, cid=collection_id, ids=added_ids: engine.set_collection_members(cid, ids, [])
+            )
+        
+        for collection_id in set(added_by_collection) | set(removed_by_collection):
+            collections[collection_id].update_products_count()
     
     def add_product(self, product, position=None, is_featured=False):
         """Add product to collection"""
@@ -612,6 +684,10 @@ class CollectionRule(EcommerceBaseModel):
     def __str__(self):
         return f"{self.collection.title} - {self.field} {self.condition} {self.value}"
     
+    def to_q(self):
+        """This rule as a ``Q`` over products (raises RuleError if unusable)"""
+        return compile_rule(self.field, self.condition, self.value)
+    
     def applies_to_product(self, product):
         """Check if this rule applies to a given product"""
         from .products import EcommerceProduct
@@ -619,62 +695,13 @@ class CollectionRule(EcommerceBaseModel):
         if not self.is_active:
             return False
         
-        # Get the field value from the product
-        field_value = getattr(product, self.field, None)
-        
-        if field_value is None and self.condition not in ['is_not_set']:
-            return self.condition == 'is_not_set'
-        
-        if self.condition == 'is_set':
-            return field_value is not None
-        elif self.condition == 'is_not_set':
-            return field_value is None
-        
-        # Convert values for comparison
-        rule_value = self.value
-        
-        # Handle different field types
-        if self.field in ['price', 'compare_at_price', 'weight']:
-            try:
-                field_value = float(field_value) if field_value else 0
-                rule_value = float(rule_value) if rule_value else 0
-            except (ValueError, TypeError):
-                return False
-        elif self.field == 'inventory_quantity':
-            field_value = int(field_value) if field_value else 0
-            rule_value = int(rule_value) if rule_value else 0
-        elif self.field in ['created_at', 'updated_at']:
-            from django.utils.dateparse import parse_datetime
-            if isinstance(rule_value, str):
-                rule_value = parse_datetime(rule_value)
-        else:
-            # String comparisons
-            field_value = str(field_value).lower() if field_value else ''
-            rule_value = str(rule_value).lower()
-        
-        # Apply condition
-        if self.condition == 'equals':
-            return field_value == rule_value
-        elif self.condition == 'not_equals':
-            return field_value != rule_value
-        elif self.condition == 'contains':
-            return rule_value in field_value
-        elif self.condition == 'not_contains':
-            return rule_value not in field_value
-        elif self.condition == 'starts_with':
-            return field_value.startswith(rule_value)
-        elif self.condition == 'ends_with':
-            return field_value.endswith(rule_value)
-        elif self.condition == 'greater_than':
-            return field_value > rule_value
-        elif self.condition == 'less_than':
-            return field_value < rule_value
-        elif self.condition == 'greater_than_or_equal':
-            return field_value >= rule_value
-        elif self.condition == 'less_than_or_equal':
-            return field_value <= rule_value
-        
-        return False
+        try:
+            rule = self.to_q()
+        except RuleError:
+            return False
+        
+        # Evaluated by the database, with the same semantics as collection membership
+        return EcommerceProduct.objects.filter(pk=product.pk).filter(rule).exists()
 
 
 class CollectionImage(EcommerceBaseModel):
@@ -0,0 +1,120 @@
+# apps/ecommerce/models/identifiers.py
+
+"""
+Identifier generation for products and orders
+
+URL handles and order numbers are reserved in one round trip and only
+retried when the database reports an actual unique-constraint violation,
+instead of probing candidates with one existence query each:
+
+- URL handles: one query over the handles sharing a slug returns the
+  highest numeric suffix in use, and the next one is free. Gaps left by
+  deleted products are not reused.
+- Order and tracking numbers come from PostgreSQL sequences in the tenant
+  schema, which never hand out a value twice and do not block concurrent
+  checkouts.
+"""
+
+import logging
+import re
+from contextlib import nullcontext
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import BigIntegerField, Case, Count, Max, Q, When
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'next_free_handle', 'next_sequence_value', 'next_order_number', 'next_tracking_number',
+    'is_unique_violation', 'save_with_unique_retry',
+]
+
+# SQLSTATE of unique_violation
+UNIQUE_VIOLATION = '23505'
+
+# Saves attempted with a freshly generated identifier before giving up
+MAX_ATTEMPTS = 5
+
+ORDER_NUMBER_SEQUENCE = 'ecommerce_order_number_seq'
+TRACKING_NUMBER_SEQUENCE = 'ecommerce_tracking_number_seq'
+
+# Sequences known to exist, per database alias and schema
+_known_sequences = set()
+
+
+def next_free_handle(queryset, base: str, field: str = 'url_handle') -> str:
+    """
+    ``base`` if no row in ``queryset`` uses it, otherwise ``base-N`` with N
+    one above the highest suffix in use. One query either way.
+    """
+    # At most 9 digits, so the suffix always fits a bigint
+    suffixed = {f"{field}__regex": rf"^{re.escape(base)}-[0-9]{{1,9}}$"}
+    
+    taken = queryset.filter(Q(**{field: base}) | Q(**suffixed)).aggregate(
+        base_taken=Count('pk', filter=Q(**{field: base})),
+        highest=Max(Case(When(then=Cast(Substr(field, len(base) + 2), BigIntegerField()), **suffixed))),
+    )
+    
+    if not taken['base_taken']:
+        return base
+    return f"{base}-{(taken['highest'] or 0) + 1}"
+
+
+def next_sequence_value(name: str, using: str = 'default') -> int:
+    """Next value of a sequence in the current schema, created on first use"""
+    connection = connections[using]
+    key = (using, getattr(connection, 'schema_name', None), name)
+    
+    with connection.cursor() as cursor:
+        if key not in _known_sequences:
+            try:
+                with transaction.atomic(using=using):
+                    cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {connection.ops.quote_name(name)}")
+            except IntegrityError:
+                # Created concurrently by another connection
+                pass
+            # The sequence only exists for others once the transaction commits
+            transaction.on_commit(lambda: _known_sequences.add(key), using=using)
+        
+        cursor.execute("SELECT nextval(%s)", [name])
+        return cursor.fetchone()[0]
+
+
+def next_order_number(tenant=None, using: str = 'default') -> str:
+    """Order number with tenant prefix, ``ORD-<TENANT>-<YYYYMMDD>-<sequence>``"""
+    prefix = f"ORD-{tenant.slug.upper() if tenant else 'DEF'}-{timezone.localdate():%Y%m%d}"
+    return f"{prefix}-{next_sequence_value(ORDER_NUMBER_SEQUENCE, using):06d}"
+
+
+def next_tracking_number(using: str = 'default') -> str:
+    """Tracking number, ``TRK`` and 12 digits"""
+    return f"TRK{next_sequence_value(TRACKING_NUMBER_SEQUENCE, using):012d}"
+
+
+def is_unique_violation(error: IntegrityError, field: str = None) -> bool:
+    """Whether ``error`` is a unique violation (on ``field``, if given)"""
+    cause = error.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    return code == UNIQUE_VIOLATION and (field is None or field in str(error))
+
+
+def save_with_unique_retry(instance, field: str, regenerate, save, using: str = None):
+    """
+    Call ``save()``; when it fails on a unique violation of ``field``, set
+    ``field`` to ``regenerate()`` and try again. Inside a transaction each
+    attempt runs in a savepoint, so a violation does not abort it.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        in_transaction = transaction.get_connection(using).in_atomic_block
+        try:
+            with transaction.atomic(using=using) if in_transaction else nullcontext():
+                return save()
+        except IntegrityError as e:
+            if attempt == MAX_ATTEMPTS - 1 or not is_unique_violation(e, field):
+                raise
+            
+            taken = getattr(instance, field)
+            setattr(instance, field, regenerate())
+            logger.debug(f"{type(instance).__name__}.{field} {taken!r} is taken, retrying with {getattr(instance, field)!r}")
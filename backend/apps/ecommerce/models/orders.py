@@ -18,6 +18,7 @@ from enum import TextChoices
 
 from .base import EcommerceBaseModel, CommonChoices, AuditMixin, SEOMixin
 from .managers import OrderManager, OrderQuerySet
+from .identifiers import next_order_number, save_with_unique_retry
 
 User = get_user_model()
 
@@ -275,7 +276,8 @@ class Order(EcommerceBaseModel, AuditMixin):
         return f"Order #{self.order_number} - {self.get_customer_display()} - ${self.total_amount}"
     
     def save(self, *args, **kwargs):
-        if not self.order_number:
+        generated = not self.order_number
+        if generated:
             self.order_number = self.generate_order_number()
         
         # Calculate totals before saving
@@ -284,30 +286,21 @@ class Order(EcommerceBaseModel, AuditMixin):
         # Set guest order flag
         self.is_guest_order = bool(self.guest_email and not self.user)
         
-        super().save(*args, **kwargs)
+        if not generated:
+            super().save(*args, **kwargs)
+            return
+        
+        # Numbers from before the sequence existed can still collide
+        save_with_unique_retry(
+            self,
+            'order_number',
+            self.generate_order_number,
+            lambda: super(Order, self).save(*args, **kwargs),
+        )
     
     def generate_order_number(self):
         """Generate unique order number with tenant prefix"""
-        from datetime import datetime
-        
-        today = datetime.now().strftime('%Y%m%d')
-        prefix = f"ORD-{self.tenant.slug.upper() if self.tenant else 'DEF'}-{today}"
-        
-        last_order = Order.objects.filter(
-            tenant=self.tenant,
-            order_number__startswith=prefix
-        ).order_by('-order_number').first()
-        
-        if last_order:
-            try:
-                last_seq = int(last_order.order_number.split('-')[-1])
-                next_seq = last_seq + 1
-            except (ValueError, IndexError):
-                next_seq = 1
-        else:
-            next_seq = 1
-        
-        return f"{prefix}-{next_seq:06d}"
+        return next_order_number(self.tenant)
     
     def get_customer_display(self):
         """Get customer display name"""
@@ -648,6 +641,11 @@ class OrderItem(EcommerceBaseModel):
         return f"{self.title} x{self.quantity} - Order #{self.order.order_number}"
     
     def save(self, *args, **kwargs):
+        self.populate_derived_fields()
+        super().save(*args, **kwargs)
+    
+    def populate_derived_fields(self):
+        """Set totals and the product snapshot; call before bulk_create, which skips save()"""
         # Calculate totals
         self.subtotal = self.price * self.quantity
         self.total_amount = self.subtotal + self.tax_amount - self.discount_amount
@@ -659,8 +657,6 @@ class OrderItem(EcommerceBaseModel):
             self.product_type = self.product.product_type
             self.requires_shipping = self.product.requires_shipping
             self.is_digital = self.product.is_digital_product
-        
-        super().save(*args, **kwargs)
     
     @property
     def quantity_pending(self):
@@ -5,14 +5,16 @@ AI-Powered Product and product variant models for e-commerce with intelligent fe
 """
 
 from django.db import models
-from django.contrib.postgres.search import SearchVector
+from django.db.models.functions import Coalesce, Greatest, NullIf, Round, Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils.text import slugify
 from django.urls import reverse
 from django.utils import timezone
 from django.core.cache import cache
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 from datetime import timedelta
 import uuid
 import json
@@ -28,9 +30,21 @@ from .base import (
     AuditMixin
 )
 from .managers import AIOptimizedProductManager
+from .identifiers import next_free_handle, save_with_unique_retry
 
 logger = logging.getLogger(__name__)
 
+# Products compared per chunk when reconciling rating aggregates
+RATING_RECONCILE_BATCH_SIZE = 2000
+
+RATING_FIELDS = ['rating_sum', 'review_count', 'average_rating']
+
+
+def _average_rating(rating_sum, review_count):
+    if not review_count:
+        return Decimal('0.00')
+    return (Decimal(rating_sum) / review_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
 
 class EcommerceProduct(EcommerceBaseModel, SEOMixin, AIOptimizedPricingMixin, InventoryMixin, 
                       VisibilityMixin, TagMixin, AuditMixin):
@@ -137,13 +151,18 @@ class EcommerceProduct(EcommerceBaseModel, SEOMixin, AIOptimizedPricingMixin, In
         default=Decimal('0.00'),
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
+    # Sum of approved review ratings, maintained with review_count so the
+    # average never needs an aggregate over the reviews
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     
     # Date Information
     available_date = models.DateTimeField(null=True, blank=True)
     discontinued_date = models.DateTimeField(null=True, blank=True)
     
     # Search and Performance
-    search_vector = SearchVector('title', 'description', 'sku', 'brand')
+    # Weighted tsvector of the searchable fields, kept current by the post_save
+    # receiver in apps/ecommerce/signals.py (see infrastructure/persistence/search)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     # ============================================================================
     # AI-POWERED FEATURES AND INTELLIGENT ANALYTICS
@@ -239,6 +258,10 @@ class EcommerceProduct(EcommerceBaseModel, SEOMixin, AIOptimizedPricingMixin, In
             models.Index(fields=['tenant', 'price']),
             models.Index(fields=['tenant', 'sales_count']),
             models.Index(fields=['url_handle']),
+            GinIndex(fields=['search_vector'], name='ecom_product_search_gin'),
+            # Trigram index (pg_trgm) for sku__istartswith / sku__icontains,
+            # which Django compiles to UPPER("sku") LIKE UPPER(...)
+            GinIndex(OpClass(Upper('sku'), name='gin_trgm_ops'), name='ecom_product_sku_trgm'),
         ]
         constraints = [
             models.UniqueConstraint(fields=['tenant', 'sku'], name='unique_product_sku_per_tenant'),
@@ -252,33 +275,21 @@ class EcommerceProduct(EcommerceBaseModel, SEOMixin, AIOptimizedPricingMixin, In
         # Generate URL handle if not provided
         if not self.url_handle:
             self.url_handle = slugify(self.title)
-            
-        # Ensure URL handle is unique
+        
+        base_handle = self.url_handle
+        handles = EcommerceProduct.objects.filter(tenant=self.tenant)
         if self.pk:  # Updating existing product
-            existing = EcommerceProduct.objects.filter(
-                tenant=self.tenant, 
-                url_handle=self.url_handle
-            ).exclude(pk=self.pk)
+            # Keep the handle unless the save hits the unique constraint
+            handles = handles.exclude(pk=self.pk)
         else:  # Creating new product
-            existing = EcommerceProduct.objects.filter(
-                tenant=self.tenant, 
-                url_handle=self.url_handle
-            )
-            
-        if existing.exists():
-            base_handle = self.url_handle
-            counter = 1
-            while existing.exists():
-                self.url_handle = f"{base_handle}-{counter}"
-                existing = EcommerceProduct.objects.filter(
-                    tenant=self.tenant, 
-                    url_handle=self.url_handle
-                )
-                if self.pk:
-                    existing = existing.exclude(pk=self.pk)
-                counter += 1
+            self.url_handle = next_free_handle(handles, base_handle)
         
-        super().save(*args, **kwargs)
+        save_with_unique_retry(
+            self,
+            'url_handle',
+            lambda: next_free_handle(handles, base_handle),
+            lambda: super(EcommerceProduct, self).save(*args, **kwargs),
+        )
     
     def clean(self):
         """Custom validation"""
@@ -363,31 +374,101 @@ class EcommerceProduct(EcommerceBaseModel, SEOMixin, AIOptimizedPricingMixin, In
         ).delete()
     
     def update_sales_count(self, quantity=1):
-        """Update sales count"""
-        self.sales_count += quantity
-        self.save(update_fields=['sales_count'])
+        """Update sales count atomically (negative quantity for returns)"""
+        EcommerceProduct.objects.filter(pk=self.pk).update(
+            sales_count=Greatest(models.F('sales_count') + quantity, models.Value(0))
+        )
+        self.refresh_from_db(fields=['sales_count'])
+    
+    def update_rating(self, added=None, removed=None):
+        """
+        Update rating aggregates. ``added`` and ``removed`` are the ratings of
+        a review that became or stopped being approved (both for an edited
+        rating) and are applied to the stored sum and count in one atomic
+        UPDATE. Without them the aggregates are recomputed from the reviews.
+        """
+        if added is None and removed is None:
+            EcommerceProduct.reconcile_ratings(self.tenant, product_ids=[self.pk])
+        else:
+            count_delta = (added is not None) - (removed is not None)
+            sum_delta = Decimal(str(added or 0)) - Decimal(str(removed or 0))
+            
+            # Right-hand sides see the row before the update
+            rating_sum = Greatest(models.F('rating_sum') + sum_delta, models.Value(Decimal('0.00')))
+            review_count = Greatest(models.F('review_count') + count_delta, models.Value(0))
+            average = Coalesce(
+                Round(
+                    models.ExpressionWrapper(
+                        rating_sum / NullIf(review_count, models.Value(0)),
+                        output_field=models.DecimalField()
+                    ),
+                    2
+                ),
+                models.Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2)
+            )
+            
+            EcommerceProduct.objects.filter(pk=self.pk).update(
+                rating_sum=rating_sum,
+                review_count=review_count,
+                average_rating=average,
+            )
+            
+            # update() bypasses the post_save facet receiver
+            from ..infrastructure.persistence.search.facets import reindex_facets
+            reindex_facets(EcommerceProduct.objects.filter(pk=self.pk))
+        
+        self.refresh_from_db(fields=RATING_FIELDS)
     
-    def update_rating(self):
-        """Update average rating from reviews"""
+    @classmethod
+    def reconcile_ratings(cls, tenant, product_ids=None, batch_size=RATING_RECONCILE_BATCH_SIZE):
+        """
+        Repair rating aggregates that drifted from the approved reviews.
+        
+        Actual sums and counts are computed by the database alongside the
+        stored ones in one streamed query; only products that differ are
+        rewritten. A review counted between the read and the write is
+        repaired by the next run. Returns the number of products repaired.
+        """
         from .reviews import ProductReview
         
-        reviews = ProductReview.objects.filter(
-            tenant=self.tenant,
-            product=self,
+        approved = ProductReview.objects.filter(
+            tenant=tenant,
+            product=models.OuterRef('pk'),
             status='APPROVED'
-        )
+        ).order_by().values('product')
         
-        if reviews.exists():
-            avg_rating = reviews.aggregate(
-                avg=models.Avg('rating')
-            )['avg'] or Decimal('0.00')
-            self.average_rating = round(avg_rating, 2)
-            self.review_count = reviews.count()
-        else:
-            self.average_rating = Decimal('0.00')
-            self.review_count = 0
+        products = cls.objects.filter(tenant=tenant)
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        
+        rows = products.annotate(
+            actual_sum=models.Subquery(approved.annotate(total=models.Sum('rating')).values('total')),
+            actual_count=models.Subquery(approved.annotate(total=models.Count('pk')).values('total')),
+        ).values_list('pk', 'rating_sum', 'review_count', 'average_rating', 'actual_sum', 'actual_count')
+        
+        repaired = []
+        for pk, rating_sum, review_count, average_rating, actual_sum, actual_count in rows.iterator(chunk_size=batch_size):
+            actual_sum = Decimal(actual_sum or 0)
+            actual_count = actual_count or 0
+            actual_average = _average_rating(actual_sum, actual_count)
+            
+            if (rating_sum, review_count, average_rating) != (actual_sum, actual_count, actual_average):
+                repaired.append(cls(
+                    pk=pk,
+                    rating_sum=actual_sum,
+                    review_count=actual_count,
+                    average_rating=actual_average,
+                ))
+        
+        if repaired:
+            from ..infrastructure.persistence.search.facets import reindex_facets
+            
+            cls.objects.bulk_update(repaired, RATING_FIELDS, batch_size=batch_size)
+            reindex_facets(cls.objects.filter(pk__in=[product.pk for product in repaired]))
+            logger.info(f"Repaired rating aggregates of {len(repaired)} products")
         
-        self.save(update_fields=['average_rating', 'review_count'])
+        return len(repaired)
     
     def get_variant_options(self):
         """Get available variant options"""
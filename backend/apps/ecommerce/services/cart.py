@@ -10,6 +10,7 @@ from typing import Optional, Dict, List, Union, Tuple
 import logging
 
 from .base import BaseEcommerceService, ServiceError, ValidationError as ServiceValidationError
+from .cart_pricing import CartPricingEngine
 from ..models import Cart, CartItem, EcommerceProduct, ProductVariant, Wishlist, WishlistItem
 
 
@@ -19,6 +20,7 @@ class CartService(BaseEcommerceService):
     def __init__(self, tenant=None):
         super().__init__(tenant)
         self.logger = logging.getLogger(__name__)
+        self.pricing = CartPricingEngine(tenant)
     
     def get_or_create_user_cart(self, user) -> Cart:
         """Get or create cart for authenticated user"""
@@ -84,12 +86,15 @@ class CartService(BaseEcommerceService):
                 # Validate quantity
                 self._validate_quantity(quantity, product, variant)
                 
-                # Check if item already exists
+                # Check if item already exists, under the cart lock so a
+                # concurrent change cannot move the quantity read here
+                self.pricing.lock(cart)
                 existing_item = self._get_existing_cart_item(cart, product, variant)
                 
                 if existing_item:
                     # Update existing item
-                    new_quantity = existing_item.quantity + quantity
+                    old_quantity = existing_item.quantity
+                    new_quantity = old_quantity + quantity
                     self._validate_quantity(new_quantity, product, variant)
                     
                     existing_item.quantity = new_quantity
@@ -98,6 +103,9 @@ class CartService(BaseEcommerceService):
                     existing_item.updated_at = timezone.now()
                     existing_item.save()
                     
+                    # Update cart totals
+                    self.pricing.apply_line_change(cart, existing_item.price, old_quantity, new_quantity)
+                    
                     self.log_info(f"Updated cart item quantity to {new_quantity}")
                     return existing_item
                 else:
@@ -114,7 +122,7 @@ class CartService(BaseEcommerceService):
                     )
                     
                     # Update cart totals
-                    self._update_cart_totals(cart)
+                    self.pricing.apply_line_change(cart, cart_item.price, new_quantity=quantity)
                     
                     self.log_info(f"Added {quantity}x {product.title} to cart")
                     return cart_item
@@ -128,12 +136,13 @@ class CartService(BaseEcommerceService):
         """Update cart item quantity and attributes"""
         try:
             with transaction.atomic():
-                cart_item = self._get_cart_item(cart_item_id)
+                cart_item = self._get_locked_cart_item(cart_item_id)
                 
                 # Validate quantity
                 self._validate_quantity(quantity, cart_item.product, cart_item.variant)
                 
                 # Update item
+                old_quantity = cart_item.quantity
                 cart_item.quantity = quantity
                 if custom_attributes is not None:
                     cart_item.custom_attributes = custom_attributes
@@ -141,7 +150,7 @@ class CartService(BaseEcommerceService):
                 cart_item.save()
                 
                 # Update cart totals
-                self._update_cart_totals(cart_item.cart)
+                self.pricing.apply_line_change(cart_item.cart, cart_item.price, old_quantity, quantity)
                 
                 self.log_info(f"Updated cart item {cart_item_id} quantity to {quantity}")
                 return cart_item
@@ -154,14 +163,14 @@ class CartService(BaseEcommerceService):
         """Remove item from cart"""
         try:
             with transaction.atomic():
-                cart_item = self._get_cart_item(cart_item_id)
+                cart_item = self._get_locked_cart_item(cart_item_id)
                 cart = cart_item.cart
                 
                 # Delete item
                 cart_item.delete()
                 
                 # Update cart totals
-                self._update_cart_totals(cart)
+                self.pricing.apply_line_change(cart, cart_item.price, old_quantity=cart_item.quantity)
                 
                 self.log_info(f"Removed cart item {cart_item_id}")
                 return True
@@ -178,12 +187,7 @@ class CartService(BaseEcommerceService):
                 cart.items.all().delete()
                 
                 # Reset cart totals
-                cart.subtotal = Decimal('0.00')
-                cart.tax_amount = Decimal('0.00')
-                cart.shipping_amount = Decimal('0.00')
-                cart.total_amount = Decimal('0.00')
-                cart.updated_at = timezone.now()
-                cart.save()
+                self.pricing.reset(cart)
                 
                 self.log_info(f"Cleared cart {cart.id}")
                 return True
@@ -267,12 +271,13 @@ class CartService(BaseEcommerceService):
         """Remove coupon from cart"""
         try:
             # TODO: Implement coupon removal logic
-            cart.coupon_code = None
-            cart.updated_at = timezone.now()
-            cart.save()
-            
-            # Recalculate totals
-            self._update_cart_totals(cart)
+            with transaction.atomic():
+                cart.coupon_code = None
+                cart.updated_at = timezone.now()
+                cart.save()
+                
+                # Discount inputs changed, recalculate totals
+                self.pricing.recompute(cart)
             
             self.log_info(f"Removed coupon from cart {cart.id}")
             return True
@@ -338,8 +343,8 @@ class CartService(BaseEcommerceService):
                         session_item.cart = user_cart
                         session_item.save()
                 
-                # Update user cart totals
-                self._update_cart_totals(user_cart)
+                # Lines were moved in bulk, recalculate user cart totals
+                self.pricing.recompute(user_cart)
                 
                 # Delete session cart
                 session_cart.delete()
@@ -421,34 +426,14 @@ class CartService(BaseEcommerceService):
         except CartItem.DoesNotExist:
             raise ServiceValidationError(f"Cart item {cart_item_id} not found")
     
-    def _update_cart_totals(self, cart: Cart):
-        """Update cart totals based on items"""
-        try:
-            items = cart.items.all()
-            
-            # Calculate subtotal
-            subtotal = sum(item.price * item.quantity for item in items)
-            
-            # TODO: Calculate tax based on tax settings
-            tax_amount = Decimal('0.00')
-            
-            # TODO: Calculate shipping based on shipping settings
-            shipping_amount = Decimal('0.00')
-            
-            # Calculate total
-            total_amount = subtotal + tax_amount + shipping_amount
-            
-            # Update cart
-            cart.subtotal = subtotal
-            cart.tax_amount = tax_amount
-            cart.shipping_amount = shipping_amount
-            cart.total_amount = total_amount
-            cart.updated_at = timezone.now()
-            cart.save()
-            
-        except Exception as e:
-            self.log_error(f"Error updating cart totals for cart {cart.id}", e)
-            raise ServiceError(f"Failed to update cart totals: {str(e)}")
+    def _get_locked_cart_item(self, cart_item_id: int) -> CartItem:
+        """
+        Cart item read after locking its cart, so its quantity holds until the
+        transaction ends. The cart is locked before any line, as the pricing
+        engine does, so concurrent line changes cannot deadlock.
+        """
+        self.pricing.lock(self._get_cart_item(cart_item_id).cart)
+        return self._get_cart_item(cart_item_id)
     
     def _get_or_create_default_wishlist(self, user) -> Wishlist:
         """Get or create default wishlist for user"""
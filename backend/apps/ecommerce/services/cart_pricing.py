@@ -0,0 +1,211 @@
+"""
+Cart pricing engine
+
+Cart totals are stored on the cart. A line change (add, remove, quantity
+change) is applied to them as a delta of units and line value, so pricing a
+click costs one locked read of the cart row and one UPDATE of the columns
+that changed, however many lines the cart has. Lines are only re-summed by
+``recompute``, which callers use when a discount, shipping or tax input
+changes or lines are moved in bulk.
+
+Tax, shipping and discounts depend only on the subtotal and those inputs, so
+they are re-derived from the new subtotal on every delta without reading the
+lines.
+"""
+
+import logging
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Optional
+
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['PricingInputs', 'CartPricingEngine']
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+# Stored cart totals maintained by the engine
+TOTAL_FIELDS = [
+    'item_count', 'subtotal', 'tax_amount', 'shipping_amount', 'discount_amount', 'total_amount',
+]
+
+
+def _money(amount):
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class PricingInputs:
+    """Tenant tax and shipping settings the cart totals depend on"""
+    
+    tax_rate: Decimal = ZERO
+    tax_included: bool = False
+    tax_on_shipping: bool = False
+    shipping_rate: Decimal = ZERO
+    free_shipping_threshold: Optional[Decimal] = None
+    
+    @classmethod
+    def for_tenant(cls, tenant):
+        """
+        Inputs from the tenant's EcommerceSettings. Only flat rates are
+        derived here; tax and shipping services are not integrated yet and
+        price as zero, as carts always have.
+        """
+        from ..models import EcommerceSettings
+        
+        settings = EcommerceSettings.objects.filter(tenant=tenant).first()
+        if settings is None:
+            return cls()
+        
+        tax_rate = ZERO
+        if settings.tax_calculation_method == EcommerceSettings.TaxCalculationMethod.FLAT_RATE:
+            # Stored as a percentage
+            tax_rate = settings.default_tax_rate / Decimal('100')
+        
+        shipping_rate = ZERO
+        if settings.shipping_calculation_method == EcommerceSettings.ShippingCalculationMethod.FLAT_RATE:
+            shipping_rate = settings.default_shipping_rate
+        
+        return cls(
+            tax_rate=tax_rate,
+            tax_included=settings.tax_included_in_prices,
+            tax_on_shipping=settings.charge_tax_on_shipping,
+            shipping_rate=shipping_rate,
+            free_shipping_threshold=settings.free_shipping_threshold,
+        )
+
+
+class CartPricingEngine:
+    """
+    Keeps stored cart totals current.
+    
+    Every method must run inside the caller's transaction: the cart row is
+    locked while its totals are read and rewritten, so concurrent changes to
+    one cart apply their deltas one after the other.
+    """
+    
+    def __init__(self, tenant=None, inputs: Optional[PricingInputs] = None):
+        self.tenant = tenant
+        self._inputs = inputs
+    
+    @property
+    def inputs(self) -> PricingInputs:
+        if self._inputs is None:
+            self._inputs = PricingInputs.for_tenant(self.tenant)
+        return self._inputs
+    
+    def invalidate_inputs(self):
+        """Forget the cached tax and shipping inputs (after the settings change)"""
+        self._inputs = None
+    
+    def price(self, cart, item_count: int, subtotal: Decimal) -> Dict[str, Decimal]:
+        """Totals for ``cart`` holding ``item_count`` units worth ``subtotal``"""
+        if item_count == 0:
+            totals = dict.fromkeys(TOTAL_FIELDS, ZERO)
+            totals['item_count'] = 0
+            return totals
+        
+        inputs = self.inputs
+        subtotal = _money(subtotal)
+        discount = min(_money(cart.calculate_discounts(subtotal)), subtotal)
+        
+        shipping = inputs.shipping_rate
+        if inputs.free_shipping_threshold is not None and subtotal >= inputs.free_shipping_threshold:
+            shipping = ZERO
+        shipping = _money(shipping)
+        
+        taxable = subtotal - discount
+        if inputs.tax_on_shipping:
+            taxable += shipping
+        
+        if inputs.tax_included:
+            # Prices already contain the tax; report the included share
+            tax = _money(taxable - taxable / (1 + inputs.tax_rate))
+            total = subtotal - discount + shipping
+        else:
+            tax = _money(taxable * inputs.tax_rate)
+            total = subtotal - discount + shipping + tax
+        
+        return {
+            'item_count': item_count,
+            'subtotal': subtotal,
+            'tax_amount': tax,
+            'shipping_amount': shipping,
+            'discount_amount': discount,
+            'total_amount': max(ZERO, total),
+        }
+    
+    def apply_line_delta(self, cart, quantity_delta: int, amount_delta: Decimal) -> Dict[str, Decimal]:
+        """
+        Apply one line change to the stored totals: ``quantity_delta`` units
+        worth ``amount_delta`` (both negative for removals).
+        """
+        current = self._lock(cart)
+        item_count = current['item_count'] + quantity_delta
+        subtotal = current['subtotal'] + amount_delta
+        
+        if item_count < 0 or subtotal < 0 or (item_count == 0 and subtotal != 0):
+            # Stored totals have drifted from the lines (e.g. written by an
+            # older code path); start again from the lines
+            logger.warning(f"Cart {cart.pk} totals out of step with its lines, recomputing")
+            return self._write(cart, current, self._sum_lines(cart))
+        
+        return self._write(cart, current, self.price(cart, item_count, subtotal))
+    
+    def apply_line_change(self, cart, price: Decimal, old_quantity: int = 0,
+                          new_quantity: int = 0) -> Dict[str, Decimal]:
+        """Apply a line going from ``old_quantity`` to ``new_quantity`` units at ``price``"""
+        quantity_delta = new_quantity - old_quantity
+        return self.apply_line_delta(cart, quantity_delta, price * quantity_delta)
+    
+    def recompute(self, cart) -> Dict[str, Decimal]:
+        """
+        Re-sum the cart's lines and re-derive every total. Needed when a
+        discount, shipping or tax input changes or lines are moved in bulk.
+        """
+        current = self._lock(cart)
+        return self._write(cart, current, self._sum_lines(cart))
+    
+    def reset(self, cart) -> Dict[str, Decimal]:
+        """Zero the totals of a cart whose lines were all removed"""
+        current = self._lock(cart)
+        return self._write(cart, current, self.price(cart, 0, ZERO))
+    
+    def lock(self, cart):
+        """
+        Lock the cart row until the transaction ends. Callers that read a
+        line's quantity to build a delta take this first, so the read and
+        the delta are made under the same lock.
+        """
+        self._lock(cart)
+    
+    def _sum_lines(self, cart):
+        lines = cart.items.aggregate(
+            item_count=Sum('quantity'),
+            subtotal=Sum(
+                F('price') * F('quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+        )
+        return self.price(cart, lines['item_count'] or 0, lines['subtotal'] or ZERO)
+    
+    def _lock(self, cart):
+        """The cart's stored totals, read under a row lock"""
+        return type(cart).objects.select_for_update().filter(pk=cart.pk).values(*TOTAL_FIELDS).get()
+    
+    def _write(self, cart, current, totals):
+        """Write the totals that differ from ``current`` in one UPDATE"""
+        changed = {field: value for field, value in totals.items() if current[field] != value}
+        now = timezone.now()
+        type(cart).objects.filter(pk=cart.pk).update(updated_at=now, last_activity=now, **changed)
+        
+        for field, value in totals.items():
+            setattr(cart, field, value)
+        cart.updated_at = now
+        cart.last_activity = now
+        
+        return totals
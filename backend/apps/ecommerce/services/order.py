@@ -3,8 +3,11 @@ E-Commerce Order Service
 Handles order creation, processing, fulfillment, and management
 """
 from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from collections import defaultdict
 from decimal import Decimal
 from typing import Optional, Dict, List, Union
 import uuid
@@ -16,6 +19,7 @@ from ..models import (
     ShippingAddress, BillingAddress, ShippingMethod, PaymentMethod,
     Discount, GiftCard, TaxRate, Refund, Return
 )
+from ..models.identifiers import next_order_number, next_tracking_number
 
 
 class OrderService(BaseEcommerceService):
@@ -25,8 +29,11 @@ class OrderService(BaseEcommerceService):
         """Create order from cart"""
         try:
             with transaction.atomic():
-                # Validate cart
-                validation_result = self.validate_cart_for_order(cart)
+                # Load the cart lines once for validation and item creation
+                cart_items = list(cart.items.select_related('product', 'variant'))
+                
+                # Validate cart, locking the stock it checks until commit
+                validation_result = self.validate_cart_for_order(cart, cart_items, lock=True)
                 if not validation_result['is_valid']:
                     raise ServiceValidationError(
                         "Cart validation failed",
@@ -37,7 +44,7 @@ class OrderService(BaseEcommerceService):
                 order = self.create_order_record(cart, order_data)
                 
                 # Create order items
-                self.create_order_items(order, cart)
+                order_items = self.create_order_items(order, cart, cart_items)
                 
                 # Create addresses
                 self.create_order_addresses(order, order_data)
@@ -47,7 +54,9 @@ class OrderService(BaseEcommerceService):
                 self.apply_gift_cards(order, order_data)
                 
                 # Calculate final totals
-                self.calculate_order_totals(order)
+                self.calculate_order_totals(order, sum(
+                    (item.total_amount for item in order_items), Decimal('0.00')
+                ))
                 
                 # Set initial status
                 self.create_status_history(
@@ -73,22 +82,30 @@ class OrderService(BaseEcommerceService):
             })
             raise
     
-    def validate_cart_for_order(self, cart: Cart) -> Dict:
-        """Validate cart can be converted to order"""
+    def validate_cart_for_order(self, cart: Cart, cart_items: Optional[List[CartItem]] = None,
+                                lock: bool = False) -> Dict:
+        """
+        Validate cart can be converted to order. ``cart_items`` are the
+        cart's lines with product and variant loaded, if the caller already
+        has them; ``lock`` keeps the checked stock locked (see
+        ``check_items_availability``).
+        """
         errors = []
         
+        if cart_items is None:
+            cart_items = list(cart.items.select_related('product', 'variant'))
+        
         # Check cart has items
-        if cart.items.count() == 0:
+        if not cart_items:
             errors.append("Cart is empty")
             return {'is_valid': False, 'errors': errors}
         
         # Check inventory availability
-        for item in cart.items.select_related('product', 'product_variant'):
-            if not self.check_item_availability(item):
-                errors.append(f"{item.product.name} is no longer available")
+        for item in self.check_items_availability(cart_items, lock=lock):
+            errors.append(f"{item.product.name} is no longer available")
         
         # Check product status
-        for item in cart.items.select_related('product'):
+        for item in cart_items:
             if not item.product.is_active or item.product.status != 'PUBLISHED':
                 errors.append(f"{item.product.name} has been discontinued")
         
@@ -104,9 +121,9 @@ class OrderService(BaseEcommerceService):
     
     def create_order_record(self, cart: Cart, order_data: Dict) -> Order:
         """Create the main order record"""
+        # Order.save() numbers the order and retries if the number is taken
         order = Order.objects.create(
             tenant=self.tenant,
-            order_number=self.generate_order_number(),
             customer=cart.customer,
             email=self.get_customer_email(cart, order_data),
             currency=cart.currency,
@@ -136,29 +153,33 @@ class OrderService(BaseEcommerceService):
         
         return order
     
-    def create_order_items(self, order: Order, cart: Cart):
-        """Create order items from cart items"""
-        for cart_item in cart.items.select_related('product', 'product_variant'):
-            OrderItem.objects.create(
+    def create_order_items(self, order: Order, cart: Cart,
+                           cart_items: Optional[List[CartItem]] = None) -> List[OrderItem]:
+        """Create order items from cart items in one insert"""
+        if cart_items is None:
+            cart_items = cart.items.select_related('product', 'variant')
+        
+        order_items = []
+        for cart_item in cart_items:
+            order_item = OrderItem(
                 tenant=self.tenant,
                 order=order,
                 product=cart_item.product,
-                product_variant=cart_item.product_variant,
-                product_name=cart_item.product.name,
-                product_sku=cart_item.product_variant.sku if cart_item.product_variant else cart_item.product.sku,
+                variant=cart_item.variant,
+                variant_title=cart_item.variant.title if cart_item.variant else '',
                 quantity=cart_item.quantity,
-                unit_price=cart_item.unit_price,
-                total_price=cart_item.total_price,
-                custom_attributes=cart_item.custom_attributes,
-                
-                # Snapshot product details for historical record
-                product_details={
-                    'name': cart_item.product.name,
-                    'description': cart_item.product.description,
-                    'weight': float(cart_item.product.weight) if cart_item.product.weight else None,
-                    'image_url': cart_item.product.featured_image.url if cart_item.product.featured_image else None
-                }
+                price=cart_item.unit_price,
+                custom_options=cart_item.custom_attributes,
             )
+            
+            # bulk_create skips OrderItem.save(), so derive totals and the snapshot here
+            order_item.populate_derived_fields()
+            if cart_item.variant and cart_item.variant.sku:
+                order_item.sku = cart_item.variant.sku
+            
+            order_items.append(order_item)
+        
+        return OrderItem.objects.bulk_create(order_items)
     
     def create_order_addresses(self, order: Order, order_data: Dict):
         """Create shipping and billing addresses for order"""
@@ -239,12 +260,16 @@ class OrderService(BaseEcommerceService):
             except GiftCard.DoesNotExist:
                 self.log_error(f"Gift card {gift_card_data['code']} not found for order {order.order_number}")
     
-    def calculate_order_totals(self, order: Order):
-        """Calculate and update order totals"""
+    def calculate_order_totals(self, order: Order, items_total: Optional[Decimal] = None):
+        """
+        Calculate and update order totals. ``items_total`` is the sum of the
+        item totals, if the caller already knows it.
+        """
         # Sum item totals
-        items_total = order.items.aggregate(
-            total=models.Sum('total_price')
-        )['total'] or Decimal('0.00')
+        if items_total is None:
+            items_total = order.items.aggregate(
+                total=Sum('total_amount')
+            )['total'] or Decimal('0.00')
         
         # Calculate tax
         tax_amount = self.calculate_order_tax(order, items_total)
@@ -400,33 +425,51 @@ class OrderService(BaseEcommerceService):
         # Send refund confirmation
         self.queue_background_task('send_refund_confirmation', order.id)
     
+    def get_order_inventory_quantities(self, order: Order) -> Dict[int, int]:
+        """Ordered quantity per inventory-tracked variant, from one query"""
+        quantities = defaultdict(int)
+        items = order.items.filter(
+            product__track_quantity=True,
+            variant__isnull=False
+        ).values_list('variant_id', 'quantity')
+        
+        for variant_id, quantity in items:
+            quantities[variant_id] += quantity
+        
+        return dict(quantities)
+    
     def reserve_order_inventory(self, order: Order):
-        """Reserve inventory for order items"""
-        for item in order.items.all():
-            if item.product.track_inventory and item.product_variant:
-                # Create inventory reservation
-                # This would integrate with inventory service
-                pass
+        """Reserve inventory for all order items in one batch"""
+        quantities = self.get_order_inventory_quantities(order)
+        if quantities:
+            # Create one inventory reservation covering every line
+            # This would integrate with inventory service
+            pass
     
     def process_order_inventory(self, order: Order):
         """Process inventory changes for order"""
-        for item in order.items.all():
-            if item.product.track_inventory and item.product_variant:
-                # Reduce inventory
-                variant = item.product_variant
-                variant.inventory_quantity = max(
-                    0, 
-                    variant.inventory_quantity - item.quantity
-                )
-                variant.save(update_fields=['inventory_quantity'])
+        quantities = self.get_order_inventory_quantities(order)
+        if not quantities:
+            return
+        
+        # Reduce inventory of every variant in one UPDATE
+        ProductVariant.objects.filter(id__in=quantities).update(
+            stock_quantity=Greatest(
+                F('stock_quantity') - Case(
+                    *[When(id=variant_id, then=Value(quantity)) for variant_id, quantity in quantities.items()],
+                    default=Value(0)
+                ),
+                Value(0)
+            )
+        )
     
     def release_order_inventory(self, order: Order):
-        """Release inventory reservations"""
-        for item in order.items.all():
-            if item.product.track_inventory and item.product_variant:
-                # Release inventory reservation
-                # This would integrate with inventory service
-                pass
+        """Release inventory reservations for all order items in one batch"""
+        quantities = self.get_order_inventory_quantities(order)
+        if quantities:
+            # Release the order's inventory reservation
+            # This would integrate with inventory service
+            pass
     
     def create_shipment_tracking(self, order: Order):
         """Create shipment tracking information"""
@@ -623,11 +666,11 @@ class OrderService(BaseEcommerceService):
     # Helper methods
     def generate_order_number(self) -> str:
         """Generate unique order number"""
-        return self.generate_unique_code('ORD', 8)
+        return next_order_number(self.tenant)
     
     def generate_tracking_number(self) -> str:
         """Generate tracking number"""
-        return self.generate_unique_code('TRK', 12)
+        return next_tracking_number()
     
     def get_customer_email(self, cart: Cart, order_data: Dict) -> str:
         """Get customer email from cart or order data"""
@@ -645,18 +688,51 @@ class OrderService(BaseEcommerceService):
     
     def check_item_availability(self, cart_item: CartItem) -> bool:
         """Check if cart item is still available"""
-        if not self.is_inventory_tracking_enabled():
-            return True
-        
-        if not cart_item.product.track_inventory:
-            return True
-        
-        if cart_item.product_variant:
-            available = cart_item.product_variant.inventory_quantity
-        else:
-            available = sum(
-                v.inventory_quantity 
-                for v in cart_item.product.variants.all()
-            )
-        
-        return available >= cart_item.quantity or self.are_backorders_allowed()
\ No newline at end of file
+        return not self.check_items_availability([cart_item])
+    
+    def check_items_availability(self, cart_items: List[CartItem], lock: bool = False) -> List[CartItem]:
+        """
+        Cart items that can no longer be fulfilled, checked for all lines
+        with one query. Quantities are summed per variant (per product for
+        lines without one) so split lines cannot oversell together. With
+        ``lock`` the variant rows stay locked until the transaction ends, so
+        concurrent checkouts of the same stock run one after the other.
+        """
+        if not self.is_inventory_tracking_enabled() or self.are_backorders_allowed():
+            return []
+        
+        tracked = [item for item in cart_items if item.product.track_quantity]
+        if not tracked:
+            return []
+        
+        variants = ProductVariant.objects.filter(
+            Q(id__in=[item.variant_id for item in tracked if item.variant_id])
+            | Q(ecommerce_product_id__in=[item.product_id for item in tracked if not item.variant_id])
+        ).order_by('id')
+        if lock:
+            variants = variants.select_for_update()
+        
+        # Products without a variant line have all their variants loaded
+        variant_stock = {}
+        product_stock = defaultdict(int)
+        for variant_id, product_id, quantity in variants.values_list('id', 'ecommerce_product_id', 'stock_quantity'):
+            variant_stock[variant_id] = quantity
+            product_stock[product_id] += quantity
+        
+        def stock_key(item):
+            if item.variant_id:
+                return 'variant', item.variant_id
+            return 'product', item.product_id
+        
+        required = defaultdict(int)
+        for item in tracked:
+            required[stock_key(item)] += item.quantity
+        
+        unavailable = []
+        for item in tracked:
+            kind, key_id = stock_key(item)
+            stock = variant_stock if kind == 'variant' else product_stock
+            if stock.get(key_id, 0) < required[(kind, key_id)]:
+                unavailable.append(item)
+        
+        return unavailable
\ No newline at end of file
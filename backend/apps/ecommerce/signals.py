@@ -0,0 +1,82 @@
+"""
+E-commerce signal receivers
+"""
+
+import logging
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import EcommerceProduct, CollectionProduct, IntelligentCollection
+from .models.collection_rules import RULE_SOURCE_FIELDS
+from .infrastructure.persistence.search.product_search import SEARCH_FIELDS, refresh_search_vectors
+from .infrastructure.persistence.search.facets import INDEXED_FIELDS, update_facets_on_commit
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=EcommerceProduct)
+def update_product_search_vector(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Rebuild the product's search vector when a searchable field may have changed"""
+    if raw:
+        return
+    
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    
+    # Computed in the database; update() does not re-send post_save
+    refresh_search_vectors(EcommerceProduct.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=EcommerceProduct)
+def update_product_facets(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Re-index the product's facet values (price, stock, rating, publish state, ...)"""
+    if raw:
+        return
+    
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    
+    update_facets_on_commit(instance.tenant_id, lambda engine: engine.index_products([instance.pk]))
+
+
+@receiver(post_save, sender=EcommerceProduct)
+def update_product_collection_memberships(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Re-evaluate rule-based collection membership for the product after commit"""
+    if raw:
+        return
+    
+    if update_fields is not None and not RULE_SOURCE_FIELDS.intersection(update_fields):
+        return
+    
+    tenant_id, product_id = instance.tenant_id, instance.pk
+    
+    def refresh():
+        try:
+            IntelligentCollection.refresh_product_memberships(tenant_id, [product_id])
+        except Exception as e:
+            logger.error(f"Failed to refresh collection memberships of product {product_id}: {str(e)}")
+    
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=EcommerceProduct)
+def remove_product_facets(sender, instance, **kwargs):
+    update_facets_on_commit(instance.tenant_id, lambda engine: engine.index_products([instance.pk]))
+
+
+@receiver(post_save, sender=CollectionProduct)
+def add_collection_facet_member(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    
+    update_facets_on_commit(instance.tenant_id, lambda engine: engine.set_collection_membership(
+        instance.collection_id, instance.product_id, True
+    ))
+
+
+@receiver(post_delete, sender=CollectionProduct)
+def remove_collection_facet_member(sender, instance, **kwargs):
+    update_facets_on_commit(instance.tenant_id, lambda engine: engine.set_collection_membership(
+        instance.collection_id, instance.product_id, False
+    ))
@@ -0,0 +1,113 @@
+"""
+E-commerce Celery Tasks
+"""
+
+import logging
+from celery import shared_task
+from django.core.cache import cache
+from django_tenants.utils import schema_context
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True)
+def rebuild_facet_index(self, tenant_id: int):
+    """Build the storefront facet index of a tenant from the database"""
+    from .infrastructure.persistence.search.facets import FacetEngine
+    
+    engine = FacetEngine(tenant_id)
+    try:
+        from apps.core.models import Tenant
+        
+        tenant = Tenant.objects.get(id=tenant_id)
+        
+        with schema_context(tenant.schema_name):
+            stats = engine.rebuild()
+        
+        return {
+            'success': True,
+            **stats
+        }
+    
+    except Exception as e:
+        logger.error(f"Error rebuilding facet index for tenant {tenant_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+    
+    finally:
+        cache.delete(f"{engine.prefix}:rebuild_lock")
+
+
+@shared_task(bind=True)
+def refresh_collection_memberships(self, tenant_id: int, collection_ids: list = None):
+    """Re-materialise the rule matches of a tenant's automatic collections"""
+    try:
+        from apps.core.models import Tenant
+        from .models import IntelligentCollection
+        
+        tenant = Tenant.objects.get(id=tenant_id)
+        
+        with schema_context(tenant.schema_name):
+            collections = IntelligentCollection.objects.filter(
+                tenant=tenant, collection_type=IntelligentCollection.CollectionType.AUTOMATIC
+            )
+            if collection_ids:
+                collections = collections.filter(id__in=collection_ids)
+            
+            added = removed = 0
+            for collection in collections:
+                collection_added, collection_removed = collection.refresh_membership()
+                added += collection_added
+                removed += collection_removed
+        
+        return {
+            'success': True,
+            'added': added,
+            'removed': removed
+        }
+    
+    except Exception as e:
+        logger.error(f"Error refreshing collection memberships for tenant {tenant_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+@shared_task(bind=True)
+def reconcile_product_ratings(self, tenant_id: int = None):
+    """
+    Repair product rating aggregates that drifted from the approved
+    reviews; without ``tenant_id``, queue one run per tenant.
+    """
+    try:
+        from apps.core.models import Tenant
+        from .models import EcommerceProduct
+        
+        if tenant_id is None:
+            tenant_ids = list(Tenant.objects.exclude(schema_name='public').values_list('id', flat=True))
+            for tenant_id in tenant_ids:
+                reconcile_product_ratings.delay(tenant_id)
+            return {
+                'success': True,
+                'tenants': len(tenant_ids)
+            }
+        
+        tenant = Tenant.objects.get(id=tenant_id)
+        
+        with schema_context(tenant.schema_name):
+            repaired = EcommerceProduct.reconcile_ratings(tenant)
+        
+        return {
+            'success': True,
+            'repaired': repaired
+        }
+    
+    except Exception as e:
+        logger.error(f"Error reconciling product ratings for tenant {tenant_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
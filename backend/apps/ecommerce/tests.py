@@ -0,0 +1,492 @@
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import SimpleTestCase, TestCase
+from django_tenants.utils import get_tenant_model
+
+from apps.ecommerce.infrastructure.persistence.repositories.django_product_query_repository import (
+    DjangoProductQueryRepository,
+)
+from apps.ecommerce.infrastructure.persistence.search import facets
+from apps.ecommerce.infrastructure.persistence.search.facets import FacetEngine, LocalFacetStore
+from apps.ecommerce.infrastructure.persistence.search.product_search import ProductSearch
+from apps.ecommerce.models import (
+    Cart, CartItem, CollectionProduct, EcommerceProduct, IntelligentCollection, ProductVariant,
+)
+from apps.ecommerce.models.collection_rules import compile_rules
+from apps.ecommerce.services.cart_pricing import CartPricingEngine, PricingInputs
+
+# Not every model the order service imports exists yet
+try:
+    from apps.ecommerce.models.orders import Order
+    from apps.ecommerce.services.order import OrderService
+except ImportError:
+    Order = OrderService = None
+
+PUBLISHED = {'is_active': True, 'is_published': True, 'status': 'PUBLISHED'}
+
+
+def make_tenant(slug='acme'):
+    return get_tenant_model().objects.create(
+        schema_name=slug, name=slug.title(), slug=slug, status='active'
+    )
+
+
+def make_product(tenant, sku, **fields):
+    fields.setdefault('title', f'Product {sku}')
+    fields.setdefault('description', '')
+    fields.setdefault('price', Decimal('10.00'))
+    return EcommerceProduct.objects.create(tenant=tenant, sku=sku, **fields)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL')
+class ProductSearchPaginationTests(TestCase):
+    """Keyset cursors walk every match exactly once, even across equal ranks"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        # Identical text and counters give every product the same rank, so
+        # only the primary key tie-break orders them
+        for number in range(7):
+            make_product(self.tenant, f'SHIRT-{number}', title='Blue cotton shirt')
+        make_product(self.tenant, 'SOCK-1', title='Red wool socks')
+        self.scope = EcommerceProduct.objects.filter(tenant=self.tenant)
+
+    def walk(self, search, limit):
+        seen, cursor = [], None
+        while True:
+            page = search.page(limit, cursor)
+            seen.extend(product.pk for product in page.results)
+            cursor = page.next_cursor
+            if cursor is None:
+                return seen, page
+
+    def test_cursor_is_continuous_across_equal_ranks(self):
+        search = ProductSearch(self.scope, 'shirt')
+        self.assertEqual(len({product.rank for product in search.ordered()}), 1)
+
+        seen, last_page = self.walk(search, limit=3)
+
+        self.assertEqual(seen, list(search.ordered().values_list('pk', flat=True)))
+        self.assertEqual(len(set(seen)), 7)
+        self.assertEqual((last_page.total, last_page.total_is_exact), (7, True))
+
+    def test_cursor_is_continuous_without_query(self):
+        search = ProductSearch(self.scope, '', sort_by='relevance')
+
+        seen, _ = self.walk(search, limit=3)
+
+        self.assertEqual(seen, list(search.ordered().values_list('pk', flat=True)))
+        self.assertEqual(len(set(seen)), 8)
+
+
+def facet_entries(entries, field):
+    return {(entry[field], entry['count']) for entry in entries}
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Product saves refresh a tsvector column')
+class FacetEngineTests(TestCase):
+    """Index-answered facet counts agree with SQL GROUP BY over the same products"""
+
+    def setUp(self):
+        cache.clear()
+        self.tenant = make_tenant()
+        catalog = [
+            ('PHYSICAL', 'Acme', '19.00', '4.6', 5),
+            ('PHYSICAL', 'Acme', '45.00', '3.2', 0),
+            ('PHYSICAL', 'Globex', '120.00', '4.1', 2),
+            ('DIGITAL', 'Acme', '9.00', '0', 0),
+            ('DIGITAL', 'Globex', '60.00', '4.9', 1),
+            ('SERVICE', '', '300.00', '2.0', 0),
+        ]
+        for number, (product_type, brand, price, rating, stock) in enumerate(catalog):
+            make_product(
+                self.tenant, f'SKU-{number}', product_type=product_type, brand=brand,
+                price=Decimal(price), average_rating=Decimal(rating), stock_quantity=stock,
+                track_quantity=True, inventory_policy='DENY', **PUBLISHED
+            )
+        # Unpublished products are neither indexed nor counted
+        make_product(self.tenant, 'DRAFT-1', brand='Acme', status='DRAFT')
+
+        self.published = EcommerceProduct.published.filter(tenant=self.tenant)
+        self.store = LocalFacetStore()
+        self.engine = FacetEngine(self.tenant.id, store=self.store)
+
+    def sql_counts(self, queryset, field):
+        rows = queryset.order_by().values(field).annotate(count=Count('id'))
+        return {(row[field], row['count']) for row in rows if row[field]}
+
+    def test_counts_match_sql_group_by(self):
+        self.engine.rebuild()
+
+        result = self.engine.search({'brand': ['Acme']}, facets=facets.FACETS, limit=100)
+
+        acme = self.published.filter(brand='Acme')
+        self.assertEqual(result['total_count'], acme.count())
+        self.assertEqual(
+            result['product_ids'], list(acme.order_by('-pk').values_list('pk', flat=True))
+        )
+        self.assertEqual(
+            facet_entries(result['facets']['category'], 'category'),
+            self.sql_counts(acme, 'product_type')
+        )
+        # Disjunctive: the brand facet ignores the brand selection
+        self.assertEqual(
+            facet_entries(result['facets']['brand'], 'brand'),
+            self.sql_counts(self.published, 'brand')
+        )
+        self.assertEqual(
+            result['facets']['in_stock'],
+            [{'in_stock': True, 'count': acme.filter(facets.in_stock_q()).count()}]
+        )
+        self.assertEqual(
+            [entry['count'] for entry in result['facets']['rating']],
+            [acme.filter(average_rating__gte=minimum).count()
+             for _, _, minimum in facets.RATING_THRESHOLDS]
+        )
+
+    def test_index_follows_product_changes(self):
+        self.engine.rebuild()
+        product = self.published.get(sku='SKU-3')
+
+        EcommerceProduct.objects.filter(pk=product.pk).update(brand='Globex')
+        self.engine.index_products([product.pk])
+
+        result = self.engine.search({}, facets=['brand'], limit=100)
+        self.assertEqual(
+            facet_entries(result['facets']['brand'], 'brand'),
+            self.sql_counts(self.published, 'brand')
+        )
+
+    def test_cold_tenant_is_answered_from_sql(self):
+        repository = DjangoProductQueryRepository(tenant=self.tenant)
+        criteria = {'filters': {'brand': ['Acme', 'Globex']}}
+
+        with patch.object(facets, 'get_facet_store', return_value=self.store), \
+                patch.object(FacetEngine, 'schedule_rebuild') as schedule_rebuild:
+            self.assertIsNone(self.engine.search(criteria['filters']))
+            cold = repository.advanced_search(criteria, facets=['category', 'brand'])
+
+            self.engine.rebuild()
+            warm = repository.advanced_search(criteria, facets=['category', 'brand'])
+
+        self.assertTrue(schedule_rebuild.called)
+
+        branded = self.published.filter(brand__in=['Acme', 'Globex'])
+        self.assertEqual(cold['total_count'], branded.count())
+        self.assertEqual(
+            facet_entries(cold['facets']['category'], 'category'),
+            self.sql_counts(branded, 'product_type')
+        )
+        self.assertEqual(warm['total_count'], cold['total_count'])
+        for facet in ['category', 'brand']:
+            self.assertEqual(
+                facet_entries(warm['facets'][facet], facet),
+                facet_entries(cold['facets'][facet], facet)
+            )
+
+
+def rule(field, condition, value, operator='AND'):
+    return {'field': field, 'condition': condition, 'value': value, 'operator': operator}
+
+
+class CompileRulesTests(SimpleTestCase):
+    """Rule sets compile to the Q trees the documented precedence implies"""
+
+    def setUp(self):
+        self.a = rule('title', 'contains', 'shirt')
+        self.b = rule('price', 'less_than', '50')
+        self.c = rule('brand', 'equals', 'Acme', operator='OR')
+        self.d = rule('inventory_quantity', 'greater_than', '0')
+        self.qa = Q(title__icontains='shirt')
+        self.qb = Q(price__lt=Decimal('50'))
+        self.qc = Q(brand__iexact='Acme')
+        self.qd = Q(stock_quantity__gt=0)
+
+    def test_and_binds_tighter_than_or(self):
+        self.assertEqual(
+            compile_rules([self.a, self.b, self.c, self.d]),
+            (self.qa & self.qb) | (self.qc & self.qd)
+        )
+
+    def test_nested_group_is_one_operand(self):
+        rules = [self.a, {'operator': 'AND', 'rules': [self.b, self.c]}, self.d]
+        self.assertEqual(
+            compile_rules(rules),
+            self.qa & (self.qb | self.qc) & self.qd
+        )
+
+    def test_nested_group_joined_with_or(self):
+        rules = [self.a, {'operator': 'OR', 'rules': [self.b, self.d]}]
+        self.assertEqual(compile_rules(rules), self.qa | (self.qb & self.qd))
+
+    def test_invalid_rules_are_skipped(self):
+        rules = [
+            rule('no_such_field', 'equals', 'x'),
+            self.a,
+            rule('price', 'contains', '50'),
+            rule('price', 'less_than', 'cheap'),
+            {**self.b, 'is_active': False},
+            {'field': 'title', 'condition': 'equals', 'operator': 'OR'},
+            self.c,
+        ]
+        self.assertEqual(compile_rules(rules), self.qa | self.qc)
+
+    def test_negated_condition(self):
+        self.assertEqual(
+            compile_rules([rule('brand', 'not_equals', 'Acme')]),
+            ~Q(brand__iexact='Acme')
+        )
+
+    def test_nothing_compilable_matches_nothing(self):
+        self.assertIsNone(compile_rules([rule('no_such_field', 'equals', 'x')]))
+        self.assertIsNone(compile_rules([]))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Product saves refresh a tsvector column')
+class CollectionMembershipRefreshTests(TestCase):
+    """refresh_product_memberships adds and removes exactly the membership differences"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        self.cheap = IntelligentCollection.objects.create(
+            tenant=self.tenant, title='Under 50',
+            collection_type=IntelligentCollection.CollectionType.AUTOMATIC,
+            collection_rules=[rule('price', 'less_than', '50')]
+        )
+        self.acme = IntelligentCollection.objects.create(
+            tenant=self.tenant, title='Acme',
+            collection_type=IntelligentCollection.CollectionType.AUTOMATIC,
+            collection_rules=[rule('brand', 'equals', 'acme')]
+        )
+        self.manual = IntelligentCollection.objects.create(
+            tenant=self.tenant, title='Staff picks',
+            collection_type=IntelligentCollection.CollectionType.MANUAL
+        )
+        self.shirt = make_product(self.tenant, 'SHIRT', brand='Acme', price=Decimal('19.00'))
+        self.lamp = make_product(self.tenant, 'LAMP', brand='Globex', price=Decimal('45.00'))
+        self.sofa = make_product(self.tenant, 'SOFA', brand='Acme', price=Decimal('900.00'))
+        self.product_ids = [self.shirt.pk, self.lamp.pk, self.sofa.pk]
+
+        # Stale automatic membership, and a manual one rules must not touch
+        CollectionProduct.objects.create(tenant=self.tenant, collection=self.cheap, product=self.sofa)
+        CollectionProduct.objects.create(tenant=self.tenant, collection=self.manual, product=self.lamp)
+
+    def memberships(self):
+        return set(CollectionProduct.objects.filter(
+            product_id__in=self.product_ids
+        ).values_list('collection_id', 'product_id'))
+
+    def refresh(self, product_ids):
+        IntelligentCollection.refresh_product_memberships(self.tenant.id, product_ids)
+
+    def test_adds_and_removes_differences(self):
+        self.refresh(self.product_ids)
+
+        self.assertEqual(self.memberships(), {
+            (self.cheap.pk, self.shirt.pk),
+            (self.cheap.pk, self.lamp.pk),
+            (self.acme.pk, self.shirt.pk),
+            (self.acme.pk, self.sofa.pk),
+            (self.manual.pk, self.lamp.pk),
+        })
+
+        # A second pass over unchanged products only reads: collections,
+        # rule matches and existing memberships
+        with self.assertNumQueries(3):
+            self.refresh(self.product_ids)
+
+    def test_refresh_after_queryset_update(self):
+        self.refresh(self.product_ids)
+
+        EcommerceProduct.objects.filter(pk=self.sofa.pk).update(price=Decimal('30.00'))
+        EcommerceProduct.objects.filter(pk=self.shirt.pk).update(brand='Globex')
+        self.refresh([self.sofa.pk, self.shirt.pk])
+
+        memberships = self.memberships()
+        self.assertIn((self.cheap.pk, self.sofa.pk), memberships)
+        self.assertNotIn((self.acme.pk, self.shirt.pk), memberships)
+        self.assertIn((self.acme.pk, self.sofa.pk), memberships)
+
+
+class StubCart:
+    """Just what CartPricingEngine.price reads from a cart"""
+
+    pk = 1
+
+    def __init__(self, discount=Decimal('0.00')):
+        self.discount = discount
+
+    def calculate_discounts(self, subtotal):
+        return self.discount
+
+
+class CartPricingTests(SimpleTestCase):
+    """Totals derived from the subtotal and the tenant's tax and shipping inputs"""
+
+    def price(self, subtotal, discount='0.00', item_count=1, **inputs):
+        engine = CartPricingEngine(inputs=PricingInputs(**inputs))
+        return engine.price(StubCart(Decimal(discount)), item_count, Decimal(subtotal))
+
+    def test_tax_added_to_prices(self):
+        totals = self.price('100.00', tax_rate=Decimal('0.10'), shipping_rate=Decimal('5.00'))
+
+        self.assertEqual(totals['tax_amount'], Decimal('10.00'))
+        self.assertEqual(totals['shipping_amount'], Decimal('5.00'))
+        self.assertEqual(totals['total_amount'], Decimal('115.00'))
+
+    def test_tax_included_in_prices(self):
+        totals = self.price(
+            '125.00', tax_rate=Decimal('0.25'), tax_included=True, shipping_rate=Decimal('5.00')
+        )
+
+        # The included share is reported but not added again
+        self.assertEqual(totals['tax_amount'], Decimal('25.00'))
+        self.assertEqual(totals['total_amount'], Decimal('130.00'))
+
+    def test_tax_on_shipping(self):
+        inputs = {'tax_rate': Decimal('0.10'), 'shipping_rate': Decimal('10.00')}
+
+        self.assertEqual(self.price('100.00', **inputs)['tax_amount'], Decimal('10.00'))
+        totals = self.price('100.00', tax_on_shipping=True, **inputs)
+        self.assertEqual(totals['tax_amount'], Decimal('11.00'))
+        self.assertEqual(totals['total_amount'], Decimal('121.00'))
+
+    def test_free_shipping_threshold(self):
+        inputs = {'shipping_rate': Decimal('7.50'), 'free_shipping_threshold': Decimal('50.00')}
+
+        self.assertEqual(self.price('49.99', **inputs)['shipping_amount'], Decimal('7.50'))
+        self.assertEqual(self.price('50.00', **inputs)['shipping_amount'], Decimal('0.00'))
+
+    def test_discount_is_clamped_to_subtotal(self):
+        totals = self.price(
+            '40.00', discount='55.00', tax_rate=Decimal('0.10'),
+            tax_on_shipping=True, shipping_rate=Decimal('5.00')
+        )
+
+        self.assertEqual(totals['discount_amount'], Decimal('40.00'))
+        self.assertEqual(totals['tax_amount'], Decimal('0.50'))
+        self.assertEqual(totals['total_amount'], Decimal('5.50'))
+
+    def test_empty_cart_prices_to_zero(self):
+        totals = self.price('0.00', item_count=0, shipping_rate=Decimal('5.00'))
+
+        self.assertEqual(totals['item_count'], 0)
+        self.assertEqual(totals['total_amount'], Decimal('0.00'))
+        self.assertEqual(totals['shipping_amount'], Decimal('0.00'))
+
+
+class CartLineDeltaTests(TestCase):
+    """Line deltas update stored totals; drifted totals are recomputed from the lines"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        self.engine = CartPricingEngine(self.tenant, inputs=PricingInputs(shipping_rate=Decimal('5.00')))
+
+    def stored(self, cart):
+        return Cart.objects.values('item_count', 'subtotal', 'total_amount').get(pk=cart.pk)
+
+    def test_delta_updates_stored_totals(self):
+        cart = Cart.objects.create(tenant=self.tenant, session_key='s1')
+
+        self.engine.apply_line_change(cart, Decimal('12.50'), new_quantity=2)
+        self.engine.apply_line_change(cart, Decimal('12.50'), old_quantity=2, new_quantity=1)
+
+        self.assertEqual(self.stored(cart), {
+            'item_count': 1, 'subtotal': Decimal('12.50'), 'total_amount': Decimal('17.50')
+        })
+
+    def test_drifted_totals_are_recomputed_from_lines(self):
+        # Totals left behind by a path that did not maintain them; the cart
+        # has no lines
+        cart = Cart.objects.create(
+            tenant=self.tenant, session_key='s2', item_count=1,
+            subtotal=Decimal('10.00'), total_amount=Decimal('15.00')
+        )
+
+        with self.assertLogs('apps.ecommerce.services.cart_pricing', 'WARNING'):
+            totals = self.engine.apply_line_delta(cart, -1, Decimal('-15.00'))
+
+        self.assertEqual(totals['item_count'], 0)
+        self.assertEqual(self.stored(cart), {
+            'item_count': 0, 'subtotal': Decimal('0.00'), 'total_amount': Decimal('0.00')
+        })
+        self.assertEqual(cart.total_amount, Decimal('0.00'))
+
+
+
+@skipUnless(
+    OrderService is not None and connection.vendor == 'postgresql',
+    'Checkout needs the order models and PostgreSQL'
+)
+class CheckoutInventoryTests(TestCase):
+    """Checkout checks and deducts stock on the variant rows the cart points at"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        self.product = make_product(self.tenant, 'TEE', track_quantity=True)
+        self.small = self.variant('TEE-S', stock_quantity=5)
+        self.large = self.variant('TEE-L', stock_quantity=1)
+        self.cart = Cart.objects.create(tenant=self.tenant, session_key='checkout')
+        self.service = OrderService(self.tenant)
+
+        # The service has no store settings lookups yet
+        settings = patch.multiple(
+            OrderService, create=True,
+            is_inventory_tracking_enabled=lambda service: True,
+            are_backorders_allowed=lambda service: False,
+        )
+        settings.start()
+        self.addCleanup(settings.stop)
+
+    def variant(self, sku, **fields):
+        return ProductVariant.objects.create(
+            tenant=self.tenant, ecommerce_product=self.product, title=sku, sku=sku,
+            price=Decimal('10.00'), **fields
+        )
+
+    def line(self, variant, quantity):
+        return CartItem.objects.create(
+            tenant=self.tenant, cart=self.cart, product=self.product, variant=variant,
+            quantity=quantity, price=Decimal('10.00'), unit_price=Decimal('10.00')
+        )
+
+    def lines(self):
+        return list(self.cart.items.select_related('product', 'variant'))
+
+    def test_lines_over_variant_stock_are_unavailable(self):
+        self.line(self.small, 5)
+        oversold = self.line(self.large, 2)
+
+        self.assertEqual(self.service.check_items_availability(self.lines(), lock=True), [oversold])
+
+    def test_line_without_variant_uses_all_product_stock(self):
+        line = self.line(None, 6)
+        self.assertEqual(self.service.check_items_availability(self.lines()), [])
+
+        line.quantity = 7
+        line.save()
+        self.assertEqual(self.service.check_items_availability(self.lines()), [line])
+
+    def test_order_deducts_variant_stock(self):
+        self.line(self.small, 3)
+        self.line(self.large, 1)
+        order = Order.objects.create(tenant=self.tenant, guest_email='guest@example.com')
+
+        self.service.create_order_items(order, self.cart, self.lines())
+        self.assertEqual(
+            self.service.get_order_inventory_quantities(order),
+            {self.small.id: 3, self.large.id: 1}
+        )
+
+        with self.assertNumQueries(2):
+            self.service.process_order_inventory(order)
+
+        stock = dict(
+            ProductVariant.objects.filter(ecommerce_product=self.product).values_list('sku', 'stock_quantity')
+        )
+        self.assertEqual(stock, {'TEE-S': 2, 'TEE-L': 0})
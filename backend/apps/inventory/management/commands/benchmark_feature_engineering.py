@@ -0,0 +1,107 @@
+# apps/inventory/management/commands/benchmark_feature_engineering.py
+from django.core.management.base import BaseCommand
+import time
+import tracemalloc
+
+
+class Command(BaseCommand):
+    """
+    Report wall time and peak traced memory of grouped feature engineering
+    on synthetic demand, optionally against the per-product loop.
+
+    The per-product loop is timed on a subset of products (--legacy-products)
+    and extrapolated, since on 10k products it takes far longer than the
+    grouped pass. Product attributes are skipped unless --tenant is given,
+    so the benchmark runs without a database.
+
+    Usage:
+        python manage.py benchmark_feature_engineering --products 10000 --days 730
+    """
+
+    help = 'Benchmark grouped lag/rolling feature engineering across all products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=10000,
+            help='Number of synthetic products'
+        )
+
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=730,
+            help='Days of history per product'
+        )
+
+        parser.add_argument(
+            '--legacy-products',
+            type=int,
+            default=0,
+            help='Also time the per-product loop on this many products'
+        )
+
+        parser.add_argument(
+            '--tenant',
+            type=int,
+            help='Tenant id whose product attributes are joined'
+        )
+
+    def handle(self, *args, **options):
+        import numpy as np
+        import pandas as pd
+        from apps.inventory.ml.feature_engineering import FeatureEngineer
+
+        products = options['products']
+        days = options['days']
+        include_product = options['tenant'] is not None
+
+        rng = np.random.default_rng(42)
+        dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days, freq='D')
+        data = pd.DataFrame({
+            'date': np.tile(dates.values, products),
+            'product_id': np.repeat(np.arange(1, products + 1), days),
+            'warehouse_id': 1,
+            'demand': rng.gamma(2.0, 10.0, products * days),
+        })
+        self.stdout.write(f"Rows: {len(data):,} ({products:,} products x {days} days)")
+
+        feature_engineer = FeatureEngineer(options['tenant'] or 0)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        engineered = feature_engineer.engineer_features_by_product(
+            data, include_product=include_product, k_best=30
+        )
+        grouped_seconds = time.perf_counter() - start
+        _, grouped_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f"Grouped pass: {grouped_seconds:.1f}s, peak {grouped_peak / 1024 ** 2:,.0f} MiB, "
+            f"{len(engineered):,} products"
+        )
+
+        legacy_products = min(options['legacy_products'], products)
+        if not legacy_products:
+            return
+
+        subset = data[data['product_id'] <= legacy_products]
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _, product_data in subset.groupby('product_id'):
+            feature_engineer.engineer_features(
+                product_data.sort_values('date'),
+                include_product=include_product,
+                k_best=30
+            ).dropna()
+        legacy_seconds = time.perf_counter() - start
+        _, legacy_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f"Per-product loop: {legacy_seconds:.1f}s for {legacy_products:,} products, "
+            f"~{legacy_seconds * products / legacy_products:.0f}s extrapolated to {products:,}, "
+            f"peak {legacy_peak / 1024 ** 2:,.0f} MiB"
+        )
@@ -0,0 +1,135 @@
+# apps/inventory/management/commands/benchmark_ml_serving.py
+from django.core.management.base import BaseCommand, CommandError
+from django_tenants.utils import get_tenant_model, schema_context
+import asyncio
+import time
+import statistics
+
+
+class Command(BaseCommand):
+    """
+    Measure ModelServingService batch inference latency for growing numbers
+    of products, optionally against one request per product.
+
+    The prediction cache is bypassed so every run hits the models. The tenant
+    needs active models in the registry.
+
+    Usage:
+        python manage.py benchmark_ml_serving --tenant acme --iterations 20 --sizes 1,100,1000
+    """
+
+    help = 'Benchmark ML serving latency (p50/p99) by number of products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            required=True,
+            help='Tenant slug'
+        )
+
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Number of requests per product count'
+        )
+
+        parser.add_argument(
+            '--sizes',
+            default='1,100,1000',
+            help='Comma separated product counts'
+        )
+
+        parser.add_argument(
+            '--horizon',
+            type=int,
+            default=30,
+            help='Forecast horizon in days'
+        )
+
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Also time one single-product request per product'
+        )
+
+    def handle(self, *args, **options):
+        from apps.inventory.ml.production_serving import ModelServingService, PredictionRequest
+        from apps.inventory.models import Product
+
+        Tenant = get_tenant_model()
+        tenant = Tenant.objects.filter(slug=options['tenant']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant '{options['tenant']}' not found")
+
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of integers')
+
+        with schema_context(tenant.schema_name):
+            product_ids = list(
+                Product.objects.order_by('id').values_list('id', flat=True)[:max(sizes)]
+            )
+        if not product_ids:
+            raise CommandError(f"Tenant '{options['tenant']}' has no products")
+
+        service = ModelServingService()
+        service.redis_client = None  # measure inference, not the prediction cache
+        feature_engineer = service._get_feature_engineer(tenant.id)
+
+        def make_request(products):
+            return PredictionRequest({
+                'tenant_id': tenant.id,
+                'products': products,
+                'forecast_horizon': options['horizon'],
+            })
+
+        async def run_batch(products):
+            return await service.predict_batch(make_request(products), products, feature_engineer)
+
+        async def run_per_product(products):
+            return [
+                await service.predict_batch(make_request([product_id]), [product_id], feature_engineer)
+                for product_id in products
+            ]
+
+        runs = [('batch', run_batch)]
+        if options['compare']:
+            runs.append(('per product', run_per_product))
+
+        self.stdout.write(
+            f"{'run':<14}{'products':>10}{'mean ms':>12}{'p50 ms':>12}{'p99 ms':>12}{'errors':>8}"
+        )
+        for size in sizes:
+            products = product_ids[:size]
+            if len(products) < size:
+                self.stdout.write(self.style.WARNING(
+                    f"Only {len(products)} products available for a run of {size}"
+                ))
+
+            for label, run in runs:
+                # Warm the model cache so loading is not counted
+                asyncio.run(run(products))
+
+                timings = []
+                errors = 0
+                for _ in range(options['iterations']):
+                    start = time.perf_counter()
+                    result = asyncio.run(run(products))
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                    batches = result if isinstance(result, list) else [result]
+                    errors += sum(
+                        1 for batch in batches for prediction in batch.values()
+                        if prediction.get('status') == 'error'
+                    )
+
+                timings.sort()
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                self.stdout.write(
+                    f"{label:<14}{len(products):>10}{statistics.mean(timings):>12.2f}"
+                    f"{statistics.median(timings):>12.2f}{p99:>12.2f}{errors:>8}"
+                )
+
+        service.executor.shutdown()
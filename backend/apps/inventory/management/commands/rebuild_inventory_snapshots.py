@@ -0,0 +1,48 @@
+# apps/inventory/management/commands/rebuild_inventory_snapshots.py
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_tenant_model, schema_context
+
+from apps.inventory.models import InventoryValueSnapshot
+
+
+class Command(BaseCommand):
+    """
+    Recompute InventoryValueSnapshot rows from open valuation layers and
+    report any drift from the incrementally maintained values. Runs nightly
+    through the rebuild_inventory_snapshots task.
+    
+    Usage:
+        python manage.py rebuild_inventory_snapshots [--tenant SLUG] [--dry-run]
+    """
+    
+    help = 'Rebuild per-warehouse/per-product inventory value snapshots'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            help='Only rebuild this tenant (slug)'
+        )
+        
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without writing'
+        )
+    
+    def handle(self, *args, **options):
+        Tenant = get_tenant_model()
+        tenants = Tenant.objects.exclude(schema_name='public')
+        
+        if options['tenant']:
+            tenants = tenants.filter(slug=options['tenant'])
+        
+        for tenant in tenants:
+            with schema_context(tenant.schema_name):
+                drifted, total = InventoryValueSnapshot.rebuild(tenant, dry_run=options['dry_run'])
+            
+            self.stdout.write(
+                f"{tenant.slug}: {total} snapshot rows, {drifted} corrected"
+                + (' (dry run)' if options['dry_run'] else '')
+            )
+        
+        self.stdout.write(self.style.SUCCESS('✅ Inventory snapshots rebuilt'))
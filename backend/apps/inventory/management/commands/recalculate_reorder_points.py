@@ -0,0 +1,74 @@
+# apps/inventory/management/commands/recalculate_reorder_points.py
+from django.core.management.base import BaseCommand, CommandError
+from django_tenants.utils import get_tenant_model, schema_context
+
+from apps.inventory.models.stock.reorder_service import ReorderService
+
+
+class Command(BaseCommand):
+    """
+    Recalculate reorder points and order quantities (EOQ) for a tenant.
+    
+    Usage:
+        python manage.py recalculate_reorder_points --tenant SLUG [--warehouse ID] [--per-warehouse] [--dry-run]
+    """
+    
+    help = 'Recalculate reorder points, safety stock and EOQ for stock items'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            required=True,
+            help='Tenant slug'
+        )
+        
+        parser.add_argument(
+            '--warehouse',
+            type=int,
+            help='Only recalculate this warehouse'
+        )
+        
+        parser.add_argument(
+            '--per-warehouse',
+            action='store_true',
+            help='Process and commit one warehouse at a time'
+        )
+        
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the changes without writing them'
+        )
+    
+    def handle(self, *args, **options):
+        Tenant = get_tenant_model()
+        tenant = Tenant.objects.filter(slug=options['tenant']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant '{options['tenant']}' not found")
+        
+        with schema_context(tenant.schema_name):
+            result = ReorderService(tenant=tenant).calculate_reorder_points(
+                warehouse_id=options['warehouse'],
+                per_warehouse=options['per_warehouse'],
+                dry_run=options['dry_run']
+            )
+        
+        if not result.is_success:
+            raise CommandError(result.message)
+        
+        if options['dry_run']:
+            for change in result.data:
+                self.stdout.write(
+                    f"item {change['stock_item_id']} (warehouse {change['warehouse_id']}): "
+                    f"reorder point {change['old_reorder_point']} -> {change['new_reorder_point']}, "
+                    f"order qty {change['old_reorder_quantity']} -> {change['new_reorder_quantity']}, "
+                    f"safety stock {change['safety_stock']}"
+                )
+        
+        for warehouse_id, count in sorted(result.meta['changes_by_warehouse'].items()):
+            self.stdout.write(f"warehouse {warehouse_id}: {count} items changed")
+        
+        self.stdout.write(
+            f"{result.meta['items_evaluated']} items evaluated"
+        )
+        self.stdout.write(self.style.SUCCESS(f"✅ {result.message}"))
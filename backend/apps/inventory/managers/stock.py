@@ -183,38 +183,143 @@ class StockItemManager(StockManager):
             )
         )
     
+    # Cumulative value share (%) up to which items are class A / B
+    ABC_THRESHOLDS = (80, 95)
+    
+    # Coefficient of variation of weekly demand up to which items are class X / Y
+    XYZ_THRESHOLDS = (0.5, 1.0)
+    
+    XYZ_DEMAND_MOVEMENT_TYPES = [
+        'SHIP', 'SALE', 'TRANSFER_OUT', 'MANUFACTURING_OUT', 'SAMPLE'
+    ]
+    
+    def _table_and_columns(self, model, *field_names):
+        from django.db import connection
+        
+        qn = connection.ops.quote_name
+        meta = model._meta
+        return qn(meta.db_table), [qn(meta.get_field(name).column) for name in field_names]
+    
     def calculate_abc_classification(self, tenant):
-        """Calculate ABC classification for stock items"""
-        from django.db import transaction
+        """
+        Calculate ABC classification for stock items.
+        
+        Items are ranked by value (quantity on hand x unit cost) and classified
+        by their cumulative share of the tenant's total value, all in one
+        UPDATE using window functions. Only rows whose class changes are
+        written. Returns the number of rows updated.
+        """
+        from django.db import connection
         
-        # Get items with their total value ordered by value
-        items_with_value = list(
-            self.for_tenant(tenant)
-            .with_valuation()
-            .filter(total_value__gt=0)
-            .order_by('-total_value')
-            .values('id', 'total_value')
+        tenant_id = getattr(tenant, 'id', tenant)
+        table, (id_col, tenant_col, qty_col, cost_col, abc_col) = self._table_and_columns(
+            self.model, 'id', 'tenant', 'quantity_on_hand', 'unit_cost', 'abc_classification'
         )
+        a_limit, b_limit = self.ABC_THRESHOLDS
         
-        if not items_with_value:
-            return
+        sql = f"""
+            WITH valued AS (
+                SELECT {id_col} AS id, {qty_col} * {cost_col} AS value
+                FROM {table}
+                WHERE {tenant_col} = %s AND {qty_col} * {cost_col} > 0
+            ),
+            ranked AS (
+                SELECT id,
+                       SUM(value) OVER (
+                           ORDER BY value DESC, id
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                       ) * 100 / SUM(value) OVER () AS cumulative_percentage
+                FROM valued
+            ),
+            classified AS (
+                SELECT id,
+                       CASE
+                           WHEN cumulative_percentage <= %s THEN 'A'
+                           WHEN cumulative_percentage <= %s THEN 'B'
+                           ELSE 'C'
+                       END AS classification
+                FROM ranked
+            )
+            UPDATE {table} AS si
+            SET {abc_col} = c.classification
+            FROM classified c
+            WHERE si.{id_col} = c.id
+              AND si.{abc_col} IS DISTINCT FROM c.classification
+        """
         
-        total_value = sum(item['total_value'] for item in items_with_value)
-        cumulative_value = 0
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [tenant_id, a_limit, b_limit])
+            return cursor.rowcount
+    
+    def calculate_xyz_classification(self, tenant, weeks=12):
+        """
+        Calculate XYZ classification for stock items.
         
-        with transaction.atomic():
-            for item in items_with_value:
-                cumulative_value += item['total_value']
-                cumulative_percentage = (cumulative_value / total_value) * 100
-                
-                if cumulative_percentage <= 80:
-                    classification = 'A'
-                elif cumulative_percentage <= 95:
-                    classification = 'B'
-                else:
-                    classification = 'C'
-                
-                self.filter(id=item['id']).update(abc_classification=classification)
+        Demand variability is the coefficient of variation of weekly outbound
+        quantity over the last ``weeks`` weeks (weeks without demand count as
+        zero). Items without demand are class Z. One UPDATE; returns the
+        number of rows updated.
+        """
+        from django.db import connection
+        from ..models.stock.movements import StockMovement
+        
+        tenant_id = getattr(tenant, 'id', tenant)
+        table, (id_col, tenant_col, xyz_col) = self._table_and_columns(
+            self.model, 'id', 'tenant', 'xyz_classification'
+        )
+        movement_table, (m_tenant_col, m_item_col, m_type_col, m_qty_col, m_date_col) = self._table_and_columns(
+            StockMovement, 'tenant', 'stock_item', 'movement_type', 'quantity', 'movement_date'
+        )
+        x_limit, y_limit = self.XYZ_THRESHOLDS
+        now = timezone.now()
+        week_start = (now - timezone.timedelta(days=now.weekday())).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        start_date = week_start - timezone.timedelta(weeks=weeks - 1)
+        
+        sql = f"""
+            WITH weekly AS (
+                SELECT {m_item_col} AS stock_item_id,
+                       date_trunc('week', {m_date_col}) AS week,
+                       SUM({m_qty_col}) AS quantity
+                FROM {movement_table}
+                WHERE {m_tenant_col} = %s
+                  AND {m_type_col} = ANY(%s)
+                  AND {m_date_col} >= %s
+                GROUP BY 1, 2
+            ),
+            stats AS (
+                SELECT stock_item_id,
+                       SUM(quantity) / %s AS mean,
+                       SUM(quantity * quantity) / %s AS mean_square
+                FROM weekly
+                GROUP BY stock_item_id
+            ),
+            classified AS (
+                SELECT si.{id_col} AS id,
+                       CASE
+                           WHEN s.mean IS NULL OR s.mean <= 0 THEN 'Z'
+                           WHEN SQRT(GREATEST(s.mean_square - s.mean * s.mean, 0)) / s.mean <= %s THEN 'X'
+                           WHEN SQRT(GREATEST(s.mean_square - s.mean * s.mean, 0)) / s.mean <= %s THEN 'Y'
+                           ELSE 'Z'
+                       END AS classification
+                FROM {table} si
+                LEFT JOIN stats s ON s.stock_item_id = si.{id_col}
+                WHERE si.{tenant_col} = %s
+            )
+            UPDATE {table} AS si
+            SET {xyz_col} = c.classification
+            FROM classified c
+            WHERE si.{id_col} = c.id
+              AND si.{xyz_col} IS DISTINCT FROM c.classification
+        """
+        
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [
+                tenant_id, self.XYZ_DEMAND_MOVEMENT_TYPES, start_date,
+                weeks, weeks, x_limit, y_limit, tenant_id
+            ])
+            return cursor.rowcount
 
 class StockMovementManager(TenantAwareManager):
     """
@@ -19,6 +19,18 @@ logger = logging.getLogger(__name__)
 class BaseForecaster(ABC):
     """Abstract base class for all forecasting models."""
     
+    # Rows are predicted independently, so inputs for several products can be
+    # stacked into one predict() call and the output split back per product
+    stackable_input = True
+    
+    # predict_with_confidence() bounds depend only on each row. When False the
+    # bounds come from the spread of the whole input (confidence_interval)
+    row_wise_confidence = False
+    
+    # The estimator can continue from a previously trained model of the same
+    # class instead of fitting from scratch (see warm_start_from)
+    supports_warm_start = False
+    
     def __init__(self, model_name: str, hyperparameters: Dict = None):
         self.model_name = model_name
         self.hyperparameters = hyperparameters or {}
@@ -49,7 +61,7 @@ class BaseForecaster(ABC):
                 self.model = self.build_model()
             
             # Train model
-            self.model.fit(X_prepared, y)
+            self.model.fit(X_prepared, y, **self._fit_kwargs())
             self.is_trained = True
             self.feature_names = list(X_prepared.columns)
             
@@ -64,6 +76,18 @@ class BaseForecaster(ABC):
             logger.error(f"Error training model {self.model_name}: {str(e)}")
             raise
     
+    def warm_start_from(self, previous: 'BaseForecaster') -> bool:
+        """
+        Set up the next fit() to continue from ``previous``, a trained model
+        of the same class and features. Returns False if this is not possible
+        and the model will be fitted from scratch.
+        """
+        return False
+    
+    def _fit_kwargs(self) -> Dict[str, Any]:
+        """Extra keyword arguments for the estimator's fit()."""
+        return {}
+    
     def predict(self, X: pd.DataFrame) -> np.ndarray:
         """Make predictions using the trained model."""
         if not self.is_trained:
@@ -75,7 +99,12 @@ class BaseForecaster(ABC):
     def predict_with_confidence(self, X: pd.DataFrame, confidence_level: float = 0.95) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """Make predictions with confidence intervals."""
         predictions = self.predict(X)
+        lower_bound, upper_bound = self.confidence_interval(predictions, confidence_level)
         
+        return predictions, lower_bound, upper_bound
+    
+    def confidence_interval(self, predictions: np.ndarray, confidence_level: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+        """Confidence bounds around ``predictions`` estimated from their spread."""
         # For models that don't natively support confidence intervals,
         # estimate using historical prediction errors
         prediction_std = np.std(predictions) if len(predictions) > 1 else predictions.std()
@@ -87,7 +116,7 @@ class BaseForecaster(ABC):
         lower_bound = predictions - margin_of_error
         upper_bound = predictions + margin_of_error
         
-        return predictions, lower_bound, upper_bound
+        return lower_bound, upper_bound
     
     def validate(self, X_val: pd.DataFrame, y_val: pd.Series) -> Dict[str, float]:
         """Validate model performance on validation set."""
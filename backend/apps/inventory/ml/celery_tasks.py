@@ -45,17 +45,28 @@ def cleanup_old_models_task():
 
 @shared_task
 def monitor_model_performance_task():
-    """Monitor model performance and trigger retraining if needed."""
+    """
+    Queue an incremental training run for every tenant with trained models.
+    Each run only retrains products whose data changed or whose error
+    drifted (see TrainingScheduler.plan_retraining).
+    """
     try:
-        from .training_pipeline import TrainingScheduler
+        from django_tenants.utils import get_tenant_model
         
-        scheduler = TrainingScheduler()
-        # This would check all tenants
-        # For now, placeholder implementation
+        registry = ModelRegistry()
+        Tenant = get_tenant_model()
+        
+        scheduled = []
+        for tenant in Tenant.objects.exclude(schema_name='public'):
+            if not registry.list_models(tenant_id=tenant.id, status='active'):
+                continue
+            
+            train_models_task.delay(tenant.id, {'incremental': True})
+            scheduled.append(tenant.id)
         
-        logger.info("Model performance monitoring completed")
-        return {'status': 'completed'}
+        logger.info(f"Model performance monitoring scheduled incremental training for {len(scheduled)} tenants")
+        return {'status': 'completed', 'scheduled_tenants': scheduled}
         
     except Exception as e:
         logger.error(f"Performance monitoring task failed: {str(e)}")
-        raise
\ No newline at end of file
+        raise
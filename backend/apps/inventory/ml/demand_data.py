@@ -0,0 +1,237 @@
+# apps/inventory/ml/demand_data.py
+
+import os
+import json
+import hashlib
+import logging
+from datetime import date
+from itertools import islice
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Avg, Sum
+from django.db.models.functions import TruncDate
+
+from ..models.stock.movements import StockMovement
+
+try:
+    import pyarrow  # noqa: F401 - parquet engine for pandas
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Outbound movements counted as demand
+DEMAND_MOVEMENT_TYPES = ['SALE', 'TRANSFER_OUT', 'ADJUSTMENT_OUT']
+
+DAILY_DEMAND_COLUMNS = ['product_id', 'warehouse_id', 'date', 'demand', 'unit_cost']
+DEMAND_MATRIX_COLUMNS = ['date', 'product_id', 'warehouse_id', 'demand', 'unit_cost']
+
+
+class DemandSnapshotStore:
+    """
+    Parquet snapshot of aggregated daily demand for one tenant and filter,
+    with a JSON sidecar holding the date range it covers.
+    
+    The parquet file is replaced before the sidecar, so a reader that sees
+    an older range only re-reads days the snapshot may already hold.
+    """
+    
+    def __init__(self, tenant_id: int, products: List[int] = None,
+                 warehouses: List[int] = None, path: str = None):
+        self.path = Path(path or getattr(
+            settings, 'ML_DEMAND_SNAPSHOT_PATH', os.path.join(settings.MEDIA_ROOT, 'ml_demand')
+        ))
+        
+        scope = json.dumps({
+            'products': sorted(products or []),
+            'warehouses': sorted(warehouses or []),
+        })
+        key = hashlib.md5(scope.encode()).hexdigest()[:12]
+        self.data_file = self.path / f"demand_{tenant_id}_{key}.parquet"
+        self.range_file = self.path / f"demand_{tenant_id}_{key}.json"
+    
+    @property
+    def enabled(self) -> bool:
+        return PARQUET_AVAILABLE
+    
+    def load(self) -> Optional[Tuple[pd.DataFrame, date, date]]:
+        """``(daily_demand, start_date, end_date)`` or None if there is no snapshot."""
+        if not self.enabled or not self.range_file.exists() or not self.data_file.exists():
+            return None
+        
+        try:
+            with open(self.range_file, 'r') as f:
+                covered = json.load(f)
+            daily_demand = pd.read_parquet(self.data_file)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable demand snapshot {self.data_file}: {str(e)}")
+            return None
+        
+        return (
+            daily_demand,
+            date.fromisoformat(covered['start_date']),
+            date.fromisoformat(covered['end_date'])
+        )
+    
+    def save(self, daily_demand: pd.DataFrame, start_date: date, end_date: date) -> None:
+        if not self.enabled:
+            return
+        
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            
+            temp_data_file = self.data_file.with_suffix('.parquet.tmp')
+            daily_demand.to_parquet(temp_data_file, index=False)
+            os.replace(temp_data_file, self.data_file)
+            
+            temp_range_file = self.range_file.with_suffix('.json.tmp')
+            with open(temp_range_file, 'w') as f:
+                json.dump({
+                    'start_date': start_date.isoformat(),
+                    'end_date': end_date.isoformat(),
+                    'rows': len(daily_demand)
+                }, f)
+            os.replace(temp_range_file, self.range_file)
+        except Exception as e:
+            logger.warning(f"Could not write demand snapshot {self.data_file}: {str(e)}")
+
+
+class DemandMatrixBuilder:
+    """
+    Dense product x warehouse x day demand matrix for ML training.
+    
+    Daily demand is aggregated in SQL and streamed with a server-side cursor.
+    The aggregate is cached in a DemandSnapshotStore, so a later run with the
+    same start date or a later one only queries days after the snapshot. The
+    dense matrix is one reindex over a MultiIndex of every observed
+    (product, warehouse) pair and every day in the range.
+    """
+    
+    CHUNK_SIZE = 20000
+    
+    def __init__(self, tenant_id: int, products: List[int] = None,
+                 warehouses: List[int] = None, snapshot_path: str = None,
+                 use_snapshot: bool = True):
+        self.tenant_id = tenant_id
+        self.products = products
+        self.warehouses = warehouses
+        self.use_snapshot = use_snapshot
+        self.store = DemandSnapshotStore(tenant_id, products, warehouses, snapshot_path)
+    
+    def build(self, start_date: date, end_date: date) -> pd.DataFrame:
+        """Dense daily demand for ``start_date``..``end_date`` inclusive."""
+        daily_demand = self.load_daily_demand(start_date, end_date)
+        return self.densify(daily_demand, start_date, end_date)
+    
+    def load_daily_demand(self, start_date: date, end_date: date) -> pd.DataFrame:
+        """Aggregated daily demand, reusing the snapshot where it covers the range."""
+        snapshot = self.store.load() if self.use_snapshot else None
+        
+        query_from = start_date
+        cached = None
+        if snapshot is not None:
+            snapshot_demand, snapshot_start, snapshot_end = snapshot
+            if snapshot_start <= start_date <= snapshot_end <= end_date:
+                # The snapshot's last day may have been partial, so it is re-read
+                query_from = snapshot_end
+                snapshot_dates = pd.to_datetime(snapshot_demand['date'])
+                cached = snapshot_demand[
+                    (snapshot_dates >= pd.Timestamp(start_date)) &
+                    (snapshot_dates < pd.Timestamp(query_from))
+                ]
+        
+        fresh = self.query_daily_demand(query_from, end_date)
+        
+        if cached is not None:
+            logger.info(
+                f"Demand snapshot reused for tenant {self.tenant_id}: "
+                f"{len(cached)} cached rows, {len(fresh)} rows from {query_from}"
+            )
+            daily_demand = pd.concat([cached, fresh], ignore_index=True)
+        else:
+            daily_demand = fresh
+        
+        if self.use_snapshot:
+            self.store.save(daily_demand, start_date, end_date)
+        
+        return daily_demand
+    
+    def query_daily_demand(self, start_date: date, end_date: date) -> pd.DataFrame:
+        """Daily demand per product and warehouse, summed in the database."""
+        movements = StockMovement.objects.filter(
+            tenant_id=self.tenant_id,
+            created_at__date__gte=start_date,
+            created_at__date__lte=end_date,
+            movement_type__in=DEMAND_MOVEMENT_TYPES
+        )
+        
+        if self.products:
+            movements = movements.filter(stock_item__product_id__in=self.products)
+        
+        if self.warehouses:
+            movements = movements.filter(stock_item__warehouse_id__in=self.warehouses)
+        
+        rows = movements.annotate(
+            day=TruncDate('created_at')
+        ).values(
+            'stock_item__product_id', 'stock_item__warehouse_id', 'day'
+        ).annotate(
+            demand=Sum('quantity'),
+            avg_unit_cost=Avg('unit_cost')
+        ).order_by().values_list(
+            'stock_item__product_id', 'stock_item__warehouse_id', 'day', 'demand', 'avg_unit_cost'
+        ).iterator(chunk_size=self.CHUNK_SIZE)
+        
+        chunks = []
+        while True:
+            chunk = list(islice(rows, self.CHUNK_SIZE))
+            if not chunk:
+                break
+            chunks.append(pd.DataFrame.from_records(chunk, columns=DAILY_DEMAND_COLUMNS))
+        
+        if not chunks:
+            return pd.DataFrame(columns=DAILY_DEMAND_COLUMNS)
+        
+        daily_demand = pd.concat(chunks, ignore_index=True)
+        daily_demand['date'] = pd.to_datetime(daily_demand['date'])
+        daily_demand['demand'] = daily_demand['demand'].astype(float)
+        daily_demand['unit_cost'] = daily_demand['unit_cost'].astype(float)
+        return daily_demand
+    
+    @staticmethod
+    def densify(daily_demand: pd.DataFrame, start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        One row per observed (product, warehouse) pair and day. Missing days
+        have zero demand; unit cost is carried forward, then back, per pair.
+        """
+        if daily_demand.empty:
+            return pd.DataFrame(columns=DEMAND_MATRIX_COLUMNS)
+        
+        daily_demand = daily_demand.assign(date=pd.to_datetime(daily_demand['date']))
+        observed = daily_demand.set_index(['product_id', 'warehouse_id', 'date'])
+        
+        dates = pd.date_range(start=start_date, end=end_date, freq='D')
+        pairs = observed.index.droplevel('date').unique().sort_values()
+        full_index = pd.MultiIndex.from_arrays(
+            [
+                np.repeat(pairs.get_level_values('product_id'), len(dates)),
+                np.repeat(pairs.get_level_values('warehouse_id'), len(dates)),
+                np.tile(dates.values, len(pairs)),
+            ],
+            names=['product_id', 'warehouse_id', 'date']
+        )
+        
+        dense = observed.reindex(full_index)
+        dense['demand'] = dense['demand'].fillna(0)
+        
+        pair_costs = dense['unit_cost'].groupby(level=['product_id', 'warehouse_id'], sort=False)
+        dense['unit_cost'] = pair_costs.ffill()
+        dense['unit_cost'] = dense['unit_cost'].groupby(
+            level=['product_id', 'warehouse_id'], sort=False
+        ).bfill()
+        
+        return dense.reset_index()[DEMAND_MATRIX_COLUMNS]
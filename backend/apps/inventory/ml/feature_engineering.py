@@ -3,23 +3,87 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timedelta
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.feature_selection import SelectKBest, f_regression
 import holidays
-from django.db.models import Sum, Avg, Count, Q
+from functools import lru_cache
+from django.conf import settings
+from django.db.models import Sum, Avg, Count, Q, F, OuterRef, Subquery
 from ..models.stock.movements import StockMovement
 from ..models.catalog.products import Product
+from ..models.suppliers.relationships import ProductSupplier
 from ..models.purchasing.orders import PurchaseOrder
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Distances to holidays are capped, as when the calendar was scanned day by day
+MAX_HOLIDAY_DISTANCE_DAYS = 365
+
+LAGS = [1, 2, 3, 7, 14, 30]
+ROLLING_WINDOWS = [7, 14, 30, 90]
+EWM_ALPHAS = [0.1, 0.3, 0.5]
+
+# Leading rows of a product whose lag or rolling-window features are incomplete
+WARMUP_ROWS = max(max(LAGS), max(ROLLING_WINDOWS) - 1)
+
+PRODUCT_ATTRIBUTES = [
+    'cost_price', 'selling_price', 'weight', 'abc_classification',
+    'lead_time_days', 'shelf_life_days', 'reorder_level', 'max_stock_level'
+]
+
+
+def get_holiday_country(tenant_id: int) -> str:
+    """Holiday calendar country for a tenant (ML_HOLIDAY_CALENDAR setting)."""
+    config = getattr(settings, 'ML_HOLIDAY_CALENDAR', {})
+    tenant_countries = config.get('TENANT_COUNTRIES', {})
+    return tenant_countries.get(
+        tenant_id, tenant_countries.get(str(tenant_id), config.get('DEFAULT_COUNTRY', 'US'))
+    )
+
+
+@lru_cache(maxsize=64)
+def holiday_calendar(country: str, first_year: int, last_year: int) -> np.ndarray:
+    """
+    Sorted holidays of ``country`` as days since the epoch (int64), covering
+    one year either side of the range so distances at its edges are exact.
+    """
+    try:
+        country_holidays = holidays.country_holidays(
+            country, years=range(first_year - 1, last_year + 2)
+        )
+    except NotImplementedError:
+        logger.warning(f"No holiday calendar for country {country}, holiday features will be empty")
+        return np.array([], dtype=np.int64)
+    
+    return np.array(sorted(country_holidays), dtype='datetime64[D]').astype(np.int64)
+
+
+def holiday_distances(day_numbers: np.ndarray, holiday_days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ``(is_holiday, days_to_next_holiday, days_from_last_holiday)`` for days
+    since the epoch, looked up in a sorted holiday calendar. Next and last
+    exclude the day itself.
+    """
+    far = np.int64(10 ** 9)
+    padded = np.concatenate(([-far], holiday_days, [far]))
+    first_on_or_after = np.searchsorted(holiday_days, day_numbers, side='left')
+    first_after = np.searchsorted(holiday_days, day_numbers, side='right')
+    
+    is_holiday = (first_after != first_on_or_after).astype(int)
+    days_to_next = np.minimum(padded[first_after + 1] - day_numbers, MAX_HOLIDAY_DISTANCE_DAYS)
+    days_from_last = np.minimum(day_numbers - padded[first_on_or_after], MAX_HOLIDAY_DISTANCE_DAYS)
+    
+    return is_holiday, days_to_next, days_from_last
+
+
 class FeatureEngineer:
     """Advanced feature engineering for demand forecasting."""
     
-    def __init__(self, tenant_id: int):
+    def __init__(self, tenant_id: int, holiday_country: str = None):
         self.tenant_id = tenant_id
+        self.holiday_country = holiday_country or get_holiday_country(tenant_id)
+        self._product_attributes = None
         self.scalers = {}
         self.encoders = {}
         self.feature_selectors = {}
@@ -53,19 +117,16 @@ class FeatureEngineer:
         df['is_quarter_start'] = df[date_column].dt.is_quarter_start.astype(int)
         df['is_quarter_end'] = df[date_column].dt.is_quarter_end.astype(int)
         
-        # Holiday features (US holidays by default)
-        us_holidays = holidays.US()
-        df['is_holiday'] = df[date_column].dt.date.apply(lambda x: x in us_holidays).astype(int)
-        
-        # Days to/from holidays
-        df['days_to_next_holiday'] = df[date_column].apply(self._days_to_next_holiday)
-        df['days_from_last_holiday'] = df[date_column].apply(self._days_from_last_holiday)
+        # Holiday features from the tenant's cached holiday calendar
+        df['is_holiday'], df['days_to_next_holiday'], df['days_from_last_holiday'] = (
+            self._holiday_features(df[date_column])
+        )
         
         logger.info(f"Created {len([col for col in df.columns if col not in [date_column]])} time features")
         return df
     
     def create_lag_features(self, df: pd.DataFrame, target_column: str, 
-                           lags: List[int] = [1, 2, 3, 7, 14, 30]) -> pd.DataFrame:
+                           lags: List[int] = LAGS) -> pd.DataFrame:
         """Create lag features for time series forecasting."""
         df = df.copy().sort_values('date')
         
@@ -73,7 +134,7 @@ class FeatureEngineer:
             df[f'{target_column}_lag_{lag}'] = df[target_column].shift(lag)
         
         # Rolling window statistics
-        windows = [7, 14, 30, 90]
+        windows = ROLLING_WINDOWS
         for window in windows:
             df[f'{target_column}_rolling_mean_{window}'] = df[target_column].rolling(window=window).mean()
             df[f'{target_column}_rolling_std_{window}'] = df[target_column].rolling(window=window).std()
@@ -82,44 +143,90 @@ class FeatureEngineer:
             df[f'{target_column}_rolling_median_{window}'] = df[target_column].rolling(window=window).median()
         
         # Exponentially weighted features
-        alphas = [0.1, 0.3, 0.5]
+        alphas = EWM_ALPHAS
         for alpha in alphas:
             df[f'{target_column}_ewm_{alpha}'] = df[target_column].ewm(alpha=alpha).mean()
         
         logger.info(f"Created lag features with {len(lags)} lags and {len(windows)} rolling windows")
         return df
     
+    def create_grouped_lag_features(self, df: pd.DataFrame, target_column: str,
+                                    group_column: str = 'product_id') -> pd.DataFrame:
+        """
+        Lag, rolling and EWM features for every group in one pass.
+        
+        ``df`` must be sorted by ``group_column`` then date. Shifts and rolling
+        windows run over the whole column and are masked where they would reach
+        into the previous group, giving the same values as create_lag_features
+        per group. Feature columns are float32.
+        """
+        target = df[target_column].astype(np.float64)
+        groups = df[group_column]
+        position = groups.groupby(groups, sort=False).cumcount().to_numpy()
+        
+        features = {}
+        for lag in LAGS:
+            features[f'{target_column}_lag_{lag}'] = target.shift(lag).where(position >= lag)
+        
+        for window in ROLLING_WINDOWS:
+            rolling = target.rolling(window=window)
+            complete = position >= window - 1
+            features[f'{target_column}_rolling_mean_{window}'] = rolling.mean().where(complete)
+            features[f'{target_column}_rolling_std_{window}'] = rolling.std().where(complete)
+            features[f'{target_column}_rolling_min_{window}'] = rolling.min().where(complete)
+            features[f'{target_column}_rolling_max_{window}'] = rolling.max().where(complete)
+            features[f'{target_column}_rolling_median_{window}'] = rolling.median().where(complete)
+        
+        # EWM is recursive, so it runs per group (still a single groupby call)
+        grouped_target = target.groupby(groups, sort=False)
+        for alpha in EWM_ALPHAS:
+            features[f'{target_column}_ewm_{alpha}'] = (
+                grouped_target.ewm(alpha=alpha).mean().droplevel(0)
+            )
+        
+        logger.info(f"Created grouped lag features for {groups.nunique()} groups")
+        return pd.concat(
+            [df, pd.DataFrame(features, index=df.index).astype(np.float32)], axis=1
+        )
+    
+    def get_product_attributes(self) -> pd.DataFrame:
+        """Product attributes indexed by product id, loaded with one query and cached."""
+        if self._product_attributes is None:
+            primary_supplier = ProductSupplier.objects.filter(
+                product=OuterRef('pk'),
+                is_primary=True
+            ).order_by('-id')
+            
+            rows = Product.objects.filter(tenant_id=self.tenant_id).values(
+                'id', 'cost_price', 'selling_price', 'weight', 'abc_classification',
+                'shelf_life_days', 'max_stock_level',
+                lead_time_days=Subquery(primary_supplier.values('lead_time_days')[:1]),
+                reorder_level=F('reorder_point')
+            )
+            
+            attributes = pd.DataFrame.from_records(
+                list(rows), columns=['id'] + PRODUCT_ATTRIBUTES
+            ).set_index('id')
+            
+            numeric_attributes = [name for name in PRODUCT_ATTRIBUTES if name != 'abc_classification']
+            attributes[numeric_attributes] = attributes[numeric_attributes].fillna(0).astype(float)
+            abc_classification = attributes['abc_classification']
+            attributes['abc_classification'] = abc_classification.where(
+                abc_classification.astype(bool), 'C'
+            )
+            self._product_attributes = attributes
+        
+        return self._product_attributes
+    
     def create_product_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Create product-specific features."""
         df = df.copy()
         
-        # Get product information
-        products = Product.objects.filter(tenant_id=self.tenant_id)
-        product_features = {}
-        
-        for product in products:
-            product_features[product.id] = {
-                'cost_price': float(product.cost_price or 0),
-                'selling_price': float(product.selling_price or 0),
-                'weight': float(product.weight or 0),
-                'abc_classification': product.abc_classification or 'C',
-                'lead_time_days': product.lead_time_days or 0,
-                'shelf_life_days': product.shelf_life_days or 0,
-                'reorder_level': float(product.reorder_level or 0),
-                'max_stock_level': float(product.max_stock_level or 0)
-            }
-        
         # Map features to dataframe
         if 'product_id' in df.columns:
-            for feature, values in zip(
-                ['cost_price', 'selling_price', 'weight', 'abc_classification', 
-                 'lead_time_days', 'shelf_life_days', 'reorder_level', 'max_stock_level'],
-                ['cost_price', 'selling_price', 'weight', 'abc_classification',
-                 'lead_time_days', 'shelf_life_days', 'reorder_level', 'max_stock_level']
-            ):
-                df[f'product_{feature}'] = df['product_id'].map(
-                    {pid: features[feature] for pid, features in product_features.items()}
-                )
+            attributes = self.get_product_attributes()
+            for feature in PRODUCT_ATTRIBUTES:
+                df[f'product_{feature}'] = df['product_id'].map(attributes[feature])
             
             # Derived product features
             df['profit_margin'] = (df['product_selling_price'] - df['product_cost_price']) / df['product_selling_price']
@@ -135,21 +242,23 @@ class FeatureEngineer:
         logger.info("Created product-specific features")
         return df
     
-    def create_seasonal_features(self, df: pd.DataFrame, target_column: str) -> pd.DataFrame:
-        """Create advanced seasonality features."""
+    def create_seasonal_features(self, df: pd.DataFrame, target_column: str,
+                                 group_column: str = None) -> pd.DataFrame:
+        """Create advanced seasonality features (per ``group_column`` if given)."""
         df = df.copy()
+        keys = [group_column] if group_column else []
         
         # Decompose seasonality using moving averages
         # Monthly seasonality
-        monthly_avg = df.groupby('month')[target_column].transform('mean')
+        monthly_avg = df.groupby(keys + ['month'])[target_column].transform('mean')
         df['monthly_seasonality'] = df[target_column] / (monthly_avg + 1e-8)
         
         # Weekly seasonality
-        weekly_avg = df.groupby('day_of_week')[target_column].transform('mean')
+        weekly_avg = df.groupby(keys + ['day_of_week'])[target_column].transform('mean')
         df['weekly_seasonality'] = df[target_column] / (weekly_avg + 1e-8)
         
         # Yearly trend
-        yearly_avg = df.groupby('year')[target_column].transform('mean')
+        yearly_avg = df.groupby(keys + ['year'])[target_column].transform('mean')
         df['yearly_trend'] = df[target_column] / (yearly_avg + 1e-8)
         
         # Fourier features for complex seasonality
@@ -307,28 +416,88 @@ class FeatureEngineer:
         logger.info(f"Feature engineering completed. Final shape: {df.shape}")
         return df
     
-    def _days_to_next_holiday(self, date: datetime) -> int:
-        """Calculate days to next holiday."""
-        us_holidays = holidays.US()
-        current_date = date.date() if hasattr(date, 'date') else date
-        
-        # Check next 365 days for holidays
-        for i in range(1, 366):
-            check_date = current_date + timedelta(days=i)
-            if check_date in us_holidays:
-                return i
-        
-        return 365  # Default if no holiday found
+    def engineer_features_by_product(self, df: pd.DataFrame, target_column: str = 'demand',
+                                     include_lags: bool = True, include_product: bool = True,
+                                     include_seasonal: bool = True, include_external: bool = True,
+                                     include_interactions: bool = True,
+                                     select_features: bool = True, k_best: int = 50,
+                                     drop_warmup: bool = False) -> Dict[int, pd.DataFrame]:
+        """
+        engineer_features for all products at once.
+        
+        The frame is sorted by product and date once and every stage runs over
+        all products together. Features are selected once across all products,
+        so every product shares the same columns. Returns ``{product_id: frame}``
+        where each frame is a row slice (a view) of the engineered frame.
+        
+        With ``drop_warmup`` (training) the first ``WARMUP_ROWS`` rows of each
+        product, whose lag and rolling features are incomplete, are dropped
+        instead of filled. Inference keeps them and fills the gaps.
+        """
+        logger.info("Starting grouped feature engineering pipeline")
+        if df.empty:
+            return {}
+        
+        df = df.sort_values(['product_id', 'date'], kind='stable').reset_index(drop=True)
+        df = self.create_time_features(df)
+        
+        if include_lags and target_column in df.columns:
+            df = self.create_grouped_lag_features(df, target_column)
+        
+        if include_product:
+            df = self.create_product_features(df)
+        
+        if include_seasonal and target_column in df.columns:
+            df = self.create_seasonal_features(df, target_column, group_column='product_id')
+        
+        if include_external:
+            df = self.create_external_features(df)
+            df = self.create_competitor_features(df)
+        
+        if include_interactions:
+            df = self.create_interaction_features(df)
+        
+        if drop_warmup and include_lags and target_column in df.columns:
+            position = df.groupby('product_id', sort=False).cumcount()
+            df = df[position >= WARMUP_ROWS].reset_index(drop=True)
+            if df.empty:
+                return {}
+        
+        # Handle missing values without filling across products
+        value_columns = [col for col in df.columns if col != 'product_id']
+        df[value_columns] = df.groupby('product_id', sort=False)[value_columns].ffill()
+        df[value_columns] = df.groupby('product_id', sort=False)[value_columns].bfill()
+        df = df.fillna(0)
+        
+        if select_features and target_column in df.columns:
+            key_columns = [col for col in ['date', 'product_id', target_column] if col in df.columns]
+            X = df.drop(columns=key_columns).select_dtypes(include=[np.number])
+            
+            selector = SelectKBest(score_func=f_regression, k=min(k_best, X.shape[1]))
+            selector.fit(X, df[target_column])
+            self.feature_selectors['k_best'] = selector
+            
+            df = df[key_columns + list(X.columns[selector.get_support()])]
+        
+        product_ids = df['product_id'].to_numpy()
+        boundaries = np.flatnonzero(product_ids[1:] != product_ids[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(df)]))
+        
+        logger.info(f"Grouped feature engineering completed. Final shape: {df.shape}")
+        return {
+            product_ids[start].item(): df.iloc[start:end]
+            for start, end in zip(starts, ends)
+        }
     
-    def _days_from_last_holiday(self, date: datetime) -> int:
-        """Calculate days from last holiday."""
-        us_holidays = holidays.US()
-        current_date = date.date() if hasattr(date, 'date') else date
-        
-        # Check previous 365 days for holidays
-        for i in range(1, 366):
-            check_date = current_date - timedelta(days=i)
-            if check_date in us_holidays:
-                return i
-        
-        return 365  # Default if no holiday found
\ No newline at end of file
+    def _holiday_features(self, dates: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorised holiday flags and distances for a datetime column."""
+        if dates.empty:
+            empty = np.array([], dtype=int)
+            return empty, empty, empty
+        
+        day_numbers = dates.values.astype('datetime64[D]').astype(np.int64)
+        calendar = holiday_calendar(
+            self.holiday_country, int(dates.dt.year.min()), int(dates.dt.year.max())
+        )
+        return holiday_distances(day_numbers, calendar)
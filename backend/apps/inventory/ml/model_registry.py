@@ -1,10 +1,14 @@
 # apps/inventory/ml/model_registry.py
 
 import os
+import re
 import json
 import pickle
 import joblib
 import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
@@ -50,6 +54,240 @@ class Model model registry entries."""
         data['training_timestamp'] = datetime.fromisoformat(data['training_timestamp'])
         return cls(**data)
 
+class RegistryIndex:
+    """
+    SQLite index over registry metadata, keyed by tenant, product, algorithm
+    and status so lookups do not scan the metadata directory.
+    
+    The JSON metadata files stay the source of truth; the index is updated
+    on every registry write and can be rebuilt from them at any time.
+    """
+    
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS model_index (
+            model_id TEXT PRIMARY KEY,
+            tenant_id INTEGER,
+            product_id INTEGER,
+            is_global INTEGER NOT NULL DEFAULT 0,
+            algorithm TEXT NOT NULL,
+            status TEXT NOT NULL,
+            mae REAL,
+            training_timestamp TEXT NOT NULL,
+            metadata TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS model_index_tenant_product "
+        "ON model_index (tenant_id, status, product_id)",
+        "CREATE INDEX IF NOT EXISTS model_index_tenant_global "
+        "ON model_index (tenant_id, status, is_global)",
+        "CREATE INDEX IF NOT EXISTS model_index_algorithm "
+        "ON model_index (algorithm, status)",
+    ]
+    
+    TENANT_PATTERN = re.compile(r'training_pipeline_(\d+)$')
+    PRODUCT_PATTERN = re.compile(r'^product_(\d+)$')
+    
+    def __init__(self, index_file: Path):
+        self.index_file = index_file
+        self._local = threading.local()
+        
+        with self._connect() as connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+    
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(str(self.index_file), timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+    
+    @classmethod
+    def parse_scope(cls, metadata: 'ModelMetadata') -> Tuple[Optional[int], Optional[int], bool]:
+        """(tenant_id, product_id, is_global) from created_by and tags"""
+        tenant_match = cls.TENANT_PATTERN.search(metadata.created_by or '')
+        tenant_id = int(tenant_match.group(1)) if tenant_match else None
+        
+        product_id = None
+        for tag in metadata.tags or []:
+            product_match = cls.PRODUCT_PATTERN.match(tag)
+            if product_match:
+                product_id = int(product_match.group(1))
+                break
+        
+        return tenant_id, product_id, 'global_model' in (metadata.tags or [])
+    
+    def upsert(self, metadata: 'ModelMetadata') -> None:
+        tenant_id, product_id, is_global = self.parse_scope(metadata)
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO model_index "
+                "(model_id, tenant_id, product_id, is_global, algorithm, status, mae, "
+                "training_timestamp, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    metadata.model_id, tenant_id, product_id, int(is_global),
+                    metadata.algorithm, metadata.status,
+                    metadata.performance_metrics.get('mae'),
+                    metadata.training_timestamp.isoformat(),
+                    json.dumps(metadata.to_dict())
+                )
+            )
+    
+    def delete(self, model_id: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM model_index WHERE model_id = ?", (model_id,))
+    
+    def get(self, model_id: str) -> Optional['ModelMetadata']:
+        row = self._connect().execute(
+            "SELECT metadata FROM model_index WHERE model_id = ?", (model_id,)
+        ).fetchone()
+        return ModelMetadata.from_dict(json.loads(row[0])) if row else None
+    
+    # Stays below SQLite's default limit on bound variables per statement
+    MAX_IN_CLAUSE = 500
+    
+    def query(self, tenant_id: int = None, product_id: int = None, is_global: bool = None,
+              algorithm: str = None, status: str = None,
+              product_ids: List[int] = None) -> List['ModelMetadata']:
+        """Matching metadata, newest first"""
+        clauses = []
+        params = []
+        for column, value in (
+            ('tenant_id', tenant_id),
+            ('product_id', product_id),
+            ('is_global', None if is_global is None else int(is_global)),
+            ('algorithm', algorithm),
+            ('status', status),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        
+        if product_ids is None:
+            return self._select(clauses, params)
+        
+        product_ids = sorted(set(product_ids))
+        models = []
+        for start in range(0, len(product_ids), self.MAX_IN_CLAUSE):
+            chunk = product_ids[start:start + self.MAX_IN_CLAUSE]
+            models.extend(self._select(
+                clauses + [f"product_id IN ({', '.join('?' * len(chunk))})"],
+                params + chunk
+            ))
+        
+        models.sort(key=lambda metadata: metadata.training_timestamp, reverse=True)
+        return models
+    
+    def _select(self, clauses: List[str], params: List[Any]) -> List['ModelMetadata']:
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connect().execute(
+            f"SELECT metadata FROM model_index {where} ORDER BY training_timestamp DESC",
+            params
+        ).fetchall()
+        return [ModelMetadata.from_dict(json.loads(row[0])) for row in rows]
+    
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM model_index").fetchone()[0]
+    
+    def rebuild(self, metadata_path: Path) -> int:
+        """Replace the index with the contents of the metadata files"""
+        entries = []
+        for metadata_file in metadata_path.glob("*.json"):
+            try:
+                with open(metadata_file, 'r') as f:
+                    entries.append(ModelMetadata.from_dict(json.load(f)))
+            except Exception as e:
+                logger.warning(f"Error loading metadata from {metadata_file}: {str(e)}")
+        
+        with self._connect() as connection:
+            connection.execute("DELETE FROM model_index")
+        for metadata in entries:
+            self.upsert(metadata)
+        
+        return len(entries)
+
+
+class ModelCache:
+    """
+    Process-wide LRU of loaded models, bounded by entry count and by the
+    models' on-disk size as an estimate of their memory footprint.
+    """
+    
+    def __init__(self, max_models: int, max_bytes: int):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (model, size_bytes)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, model, size_bytes: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            
+            self._entries[key] = (model, size_bytes)
+            self.total_bytes += size_bytes
+            
+            # Always keep the entry just added, even if it alone exceeds the budget
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_models or self.total_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+    
+    def invalidate(self, key) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'loaded_models': len(self._entries),
+                'loaded_mb': round(self.total_bytes / (1024 * 1024), 2),
+                'max_models': self.max_models,
+                'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _build_model_cache() -> ModelCache:
+    config = getattr(settings, 'ML_MODEL_CACHE', {})
+    return ModelCache(
+        max_models=config.get('MAX_MODELS', 256),
+        max_bytes=config.get('MAX_BYTES', 1024 * 1024 * 1024),
+    )
+
+
+model_cache = _build_model_cache()
+
 class ModelRegistry:
     """Production-ready model registry for ML model management."""
     
@@ -64,6 +302,12 @@ class ModelRegistry:
         
         self.cache_prefix = 'ml_registry'
         self.cache_timeout = 3600  # 1 hour
+        
+        self.index = RegistryIndex(self.registry_path / 'index.sqlite3')
+        if self.index.count() == 0 and any(self.metadata_path.glob("*.json")):
+            self.rebuild_index()
+        
+        self.model_cache = model_cache
     
     def register_model(self, model:_file: Optional[str] = None) -> str:
         """Register a new model in the registry."""
@@ -104,26 +348,32 @@ class ModelRegistry:
             logger.error(f"Error registering model: {str(e)}")
             raise
     
+    def get_metadata(self, model_id: str) -> ModelMetadata:
+        """Metadata for a model, from the index (falls back to its file)."""
+        metadata = self.index.get(model_id)
+        if metadata is not None:
+            return metadata
+        
+        metadata_file = self.metadata_path / f"{model_id}.json"
+        if not metadata_file.exists():
+            raise ValueError(f"Model {model_id} not found in registry")
+        
+        with open(metadata_file, 'r') as f:
+            metadata = ModelMetadata.from_dict(json.load(f))
+        
+        # Written by something that bypassed the registry; index it now
+        self.index.upsert(metadata)
+        return metadata
+    
     def get_model(self, model_id: str) -> Tuple[Any, ModelMetadata]:
-        """Load model and metadata by ID."""
+        """Load model and metadata by ID. Loaded models are kept in the LRU cache."""
         try:
-            # Check cache first
-            cached_metadata = cache.get(f"{self.cache_prefix}_{model_id}")
-            metadata = ModelMetadata.from_dict(cached_metadata)
-            else:
-                # Load from disk
-                metadata_file = self.metadata_path / f"{model_id}.json"
-                if not metadata_file.exists():
-                    raise ValueError(f"Model {model_id} not found in registry")
-                
-                with open(metadata_file, 'r') as f:
-                    metadata_dict = json.load(f)
-                
-                metadata = ModelMetadata.from_dict(metadata_dict)
-                
-                # Cache metadata
-                cache.set(f"{self.cache_prefix}_{model_id}", 
-                         metadata.to_dict(), self.cache_timeout)
+            metadata = self.get_metadata(model_id)
+            
+            cache_key = self._model_cache_key(model_id)
+            model = self.model_cache.get(cache_key)
+            if model is not None:
+                return model, metadata
             
             # Load model
             model_file = f"{model_id}.pkl"
@@ -140,45 +390,53 @@ class ModelRegistry:
                 from .base import BaseForecaster
                 model = BaseForecaster.load_model(str(model_path))
             
+            self.model_cache.put(cache_key, model, metadata.model_size_bytes or model_path.stat().st_size)
+            
             return model, metadata
             
         except Exception as e:
             logger.error(f"Error loading model {model_id}: {str(e)}")
             raise
     
-    def list_models(self, algorithm: str = None, status: str = None, 
-                   tags: List[str] = None) -> List[ModelMetadata]:
-        """List models with optional filtering."""
-        models = []
-        
-        for metadata_file in self.metadata_path.glob("*.json"):
+    def warm_cache(self, model_ids: List[str]) -> int:
+        """Load models into the cache ahead of use; returns how many loaded."""
+        loaded = 0
+        for model_id in model_ids:
             try:
-                with open(metadata_file, 'r') as f:
-                    metadata_dict = json.load(f)
-                
-                metadata = ModelMetadata.from_dict(metadata_dict)
-                
-                # Apply filters
-                if algorithm and metadata.algorithm != algorithm:
-                    continue
-                
-                if status and metadata.status != status:
-                    continue
-                
-                if tags:
-                    if not any(tag in metadata.tags for tag in tags):
-                        continue
-                
-                models.append(metadata)
-                
+                self.get_model(model_id)
+                loaded += 1
             except Exception as e:
-                logger.warning(f"Error loading metadata from {metadata_file}: {str(e)}")
-                continue
+                logger.warning(f"Error warming model {model_id}: {str(e)}")
+        return loaded
+    
+    def list_models(self, algorithm: str = None, status: str = None, 
+                   tags: List[str] = None, tenant_id: int = None,
+                   product_id: int = None, is_global: bool = None,
+                   product_ids: List[int] = None) -> List[ModelMetadata]:
+        """List models with optional filtering (newest first)."""
+        models = self.index.query(
+            tenant_id=tenant_id,
+            product_id=product_id,
+            is_global=is_global,
+            algorithm=algorithm,
+            status=status,
+            product_ids=product_ids
+        )
+        
+        if tags:
+            models = [
+                metadata for metadata in models
+                if any(tag in metadata.tags for tag in tags)
+            ]
         
-        # Sort by training timestamp (newest first)
-        models.sort(key=lambda x: x.training_timestamp, reverse=True)
         return models
     
+    def rebuild_index(self) -> int:
+        """Rebuild the metadata index from the metadata files."""
+        count = self.index.rebuild(self.metadata_path)
+        logger.info(f"Model registry index rebuilt with {count} models")
+        return count
+    
     def get_latest_model(self, algorithm: str = None, status: str = 'active') -> Tuple[str, ModelMetadata]:
         """Get the latest model for given algorithm."""
         models = self.list_models(algorithm=algorithm, status=status)
@@ -193,7 +451,7 @@ class ModelRegistry:
                      to_status: str = 'active') -> None:
         """Promote model to different status (e.g., training -> active)."""
         try:
-            _, metadata = self.get_model(model_id)
+            metadata = self.get_metadata(model_id)
             
             if metadata.status != from_status:
                 raise ValueError(f"Model status is {metadata.status}, expected {from_status}")
@@ -222,7 +480,7 @@ class ModelRegistry:
     def archive_model(self, model_id: str) -> None:
         """Archive a model (keep metadata, remove model file)."""
         try:
-            _, metadata = self.get_model(model_id)
+            metadata = self.get_metadata(model_id)
             
             # Update status
             metadata.status = 'archived'
@@ -236,6 +494,7 @@ class ModelRegistry:
             model_file = self.models_path / f"{model_id}.pkl"
             if model_file.exists():
                 model_file.unlink()
+            self.model_cache.invalidate(self._model_cache_key(model_id))
             
             # Update cache
             self._update_cache(model_id, metadata)
@@ -259,8 +518,10 @@ class ModelRegistry:
             if metadata_file.exists():
                 metadata_file.unlink()
             
-            # Remove from cache
+            # Remove from cache and index
             cache.delete(f"{self.cache_prefix}_{model_id}")
+            self.model_cache.invalidate(self._model_cache_key(model_id))
+            self.index.delete(model_id)
             
             logger.info(f"Model {model_id} deleted")
             
@@ -275,7 +536,7 @@ class ModelRegistry:
         
         for model_id in model_ids:
             try:
-                _, metadata = self.get_model(model_id)
+                metadata = self.get_metadata(model_id)
                 if metric in metadata.performance_metrics:
                     comparison[model_id] = metadata.performance_metrics[metric]
             except Exception as e:
@@ -287,7 +548,7 @@ class ModelRegistry:
     def get_model_lineage(self, model_id: str) -> Dict[str, Any]:
         """Get model lineage and versioning information."""
         try:
-            _, metadata = self.get_model(model_id)
+            metadata = self.get_metadata(model_id)
             
             # Find related models (same algorithm, similar parameters)
             related_models = []
@@ -402,9 +663,12 @@ class ModelRegistry:
         return f"{metadata.algorithm.lower()}_{metadata.version}_{model_hash}"
     
     def _update_cache(self, model_id: str, metadata: ModelMetadata) -> None:
-        """Update cache with model metadata."""
-        cache.set(f"{self.cache_prefix}_{model_id}", 
-                 metadata.to_dict(), self.cache_timeout)
+        """Update the metadata index (read by get_metadata and list_models)."""
+        self.index.upsert(metadata)
+    
+    def _model_cache_key(self, model_id: str) -> str:
+        # Registries rooted at different paths share the process-wide cache
+        return f"{self.registry_path}:{model_id}"
     
     def _demote_active_models(self, algorithm: str) -> None:
         """Demote current active models for given algorithm."""
@@ -14,6 +14,9 @@ from .prophet_model import ProphetForecaster
 class EnsembleForecaster(BaseForecaster):
     """Ensemble forecaster combining multiple models."""
     
+    # Bounds come from the per-row spread of the base model predictions
+    row_wise_confidence = True
+    
     def __init__(self, models: List[str] = None, ensemble_method: str = 'weighted_average'):
         self.models = models or ['RandomForest', 'XGBoost', 'Prophet']
         self.ensemble_method = ensemble_method
@@ -23,6 +26,13 @@ class EnsembleForecaster(BaseForecaster):
         
         super().__init__(f'Ensemble_{ensemble_method}', {})
         
+    @property
+    def stackable_input(self) -> bool:
+        return all(
+            getattr(model, 'stackable_input', True)
+            for model in self.base_models.values()
+        )
+    
     def build_model(self):
         """Build ensemble of base models."""
         model_classes = {
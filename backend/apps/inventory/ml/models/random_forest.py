@@ -1,5 +1,6 @@
 # apps/inventory/ml/models/random_forest.py
 
+import copy
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import RandomizedSearchCV
 import pandas as pd
@@ -7,9 +8,16 @@ import numpy as np
 from typing import Dict
 from ..base import BaseForecaster
 
+# Trees added to a warm-started forest on each retrain, and the forest size
+# past which the next retrain starts from scratch instead
+WARM_START_TREES = 20
+MAX_WARM_START_TREES = 500
+
 class RandomForestForecaster(BaseForecaster):
     """Random Forest-based demand forecaster."""
     
+    supports_warm_start = True
+    
     def __init__(self, hyperparameters: Dict = None):
         default_params = {
             'n_estimators': 100,
@@ -29,6 +37,26 @@ class RandomForestForecaster(BaseForecaster):
         """Build Random Forest model."""
         return RandomForestRegressor(**self.hyperparameters)
     
+    def warm_start_from(self, previous: 'RandomForestForecaster') -> bool:
+        """Keep the previous trees and grow WARM_START_TREES more on the new data."""
+        if not isinstance(previous, RandomForestForecaster) or not previous.is_trained:
+            return False
+        
+        if previous.model.n_estimators + WARM_START_TREES > MAX_WARM_START_TREES:
+            return False
+        
+        self.hyperparameters = dict(previous.hyperparameters)
+        self.hyperparameters['n_estimators'] = previous.model.n_estimators + WARM_START_TREES
+        self.hyperparameters['warm_start'] = True
+        
+        # Copy so the registry's cached instance keeps serving the old forest
+        self.model = copy.deepcopy(previous.model)
+        self.model.set_params(
+            warm_start=True,
+            n_estimators=self.hyperparameters['n_estimators']
+        )
+        return True
+    
     def prepare_features(self, data: pd.DataFrame) -> pd.DataFrame:
         """Prepare features for Random Forest."""
         # Random Forest can handle missing values and doesn't require scaling
@@ -74,9 +102,16 @@ import numpy as np
 from typing import Dict
 from ..base import BaseForecaster
 
+# Boosting rounds added on top of a warm-started booster on each retrain, and
+# the booster size past which the next retrain starts from scratch instead
+WARM_START_ROUNDS = 20
+MAX_WARM_START_ROUNDS = 1000
+
 class XGBoostForecaster(BaseForecaster):
     """XGBoost-based demand forecaster."""
     
+    supports_warm_start = True
+    
     def __init__(self, hyperparameters: Dict = None):
         default_params = {
             'n_estimators': 100,
@@ -97,6 +132,32 @@ class XGBoostForecaster(BaseForecaster):
         """Build XGBoost model."""
         return xgb.XGBRegressor(**self.hyperparameters)
     
+    def warm_start_from(self, previous: 'XGBoostForecaster') -> bool:
+        """Continue boosting from the previous booster for WARM_START_ROUNDS rounds."""
+        if not isinstance(previous, XGBoostForecaster) or not previous.is_trained:
+            return False
+        
+        booster = previous.model.get_booster()
+        if booster.num_boosted_rounds() + WARM_START_ROUNDS > MAX_WARM_START_ROUNDS:
+            return False
+        
+        self.hyperparameters = dict(previous.hyperparameters)
+        self.hyperparameters['n_estimators'] = WARM_START_ROUNDS
+        self.model = None
+        self._warm_start_booster = booster
+        return True
+    
+    def _fit_kwargs(self) -> Dict:
+        booster = getattr(self, '_warm_start_booster', None)
+        return {'xgb_model': booster} if booster is not None else {}
+    
+    def fit(self, X: pd.DataFrame, y: pd.Series) -> 'XGBoostForecaster':
+        try:
+            return super().fit(X, y)
+        finally:
+            # The fitted model contains the previous trees; don't keep a second copy
+            self._warm_start_booster = None
+    
     def prepare_features"""Prepare features for XGBoost."""
         # XGBoost can handle missing values
         return data.fillna(-999)
@@ -145,6 +206,9 @@ from ..base import BaseForecaster
 class LSTMForecaster(BaseForecaster):
     """LSTM Neural Network for time series forecasting."""
     
+    # Predictions are made from the trailing sequence of the input
+    stackable_input = False
+    
     def __init__(self, hyperparameters: Dict = None):
         default_params = {
             'sequence_length': 30,
@@ -293,6 +357,8 @@ from ..base import BaseForecaster
 class ProphetForecaster(BaseForecaster):
     """Facebook Prophet forecaster for time series with seasonality."""
     
+    row_wise_confidence = True
+    
     def __init__(self, hyperparameters: Dict = None):
         if not PROPHET_AVAILABLE:
             raise ImportError("Prophet not available. Install with: pip install prophet")
@@ -2,7 +2,7 @@
 
 import asyncio
 import aiohttp
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -19,7 +19,7 @@ from django.utils.decorators import method_decorator
 from django.views import View
 import time
 
-from .model_registry import ModelRegistry
+from .model_registry import ModelRegistry, RegistryIndex
 from .feature_engineering import FeatureEngineer
 
 logger = logging.getLogger(__name__)
@@ -62,7 +62,6 @@ class ModelServingService:
     def __init__(self):
         self.model_registry = ModelRegistry()
         self.feature_engineers = {}  # Cached per tenant
-        self.loaded_models = {}  # Model cache
         self.redis_client = redis.Redis.from_url(settings.REDIS_URL) if hasattr(settings, 'REDIS_URL') else None
         self.executor = ThreadPoolExecutor(max_workers=4)
         
@@ -82,21 +81,10 @@ class ModelServingService:
             # Get feature engineer
             feature_engineer = self._get_feature_engineer(request.tenant_id)
             
-            # Generate predictions for each product
-            predictions = {}
-            
-            # Process in batches for efficiency
-            batch_size = 10
-            product_batches = [
-                request.products[i:i + batch_size] 
-                for i in range(0, len(request.products), batch_size)
-            ]
-            
-            for batch in product_batches:
-                batch_predictions = await self._predict_batch(
-                    request, batch, feature_engineer
-                )
-                predictions.update(batch_predictions)
+            # Generate predictions for all products in one batch
+            predictions = await self.predict_batch(
+                request, request.products, feature_engineer
+            )
             
             # Calculate latency
             latency_ms = (time.time() - start_time) * 1000
@@ -125,35 +113,175 @@ class ModelServingService:
                 'timestamp': datetime.now().isoformat()
             }
     
-    async def _predict_batch(self, request: PredictionRequest, 
-                           product_ids: List[int], 
-                           feature_engineer: FeatureEngineer) -> Dict[int, Dict]:
-        """Process a batch of products."""
-        batch_predictions = {}
-        
-        # Create async tasks for each product
-        tasks = [
-            self._predict_single_product(
-                request, product_id, feature_engineer
-            )
+    async def predict_batch(self, request: PredictionRequest, 
+                          product_ids: List[int], 
+                          feature_engineer: FeatureEngineer) -> Dict[int, Dict]:
+        """
+        Predict for many products at once.
+        
+        Products served by the same model (global models especially) share one
+        stacked feature matrix and a single predict() call. Each model group
+        runs on the executor, so product-specific models are predicted in
+        parallel rather than one after another on the event loop.
+        """
+        cache_keys = {
+            product_id: self._generate_cache_key(request, product_id)
             for product_id in product_ids
-        ]
+        }
+        predictions = self._get_many_from_cache(cache_keys)
         
-        # Execute tasks concurrently
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        pending = [product_id for product_id in cache_keys if product_id not in predictions]
+        if not pending:
+            return predictions
         
-        # Process results
-        for product_id, result in zip(product_ids, results):
+        groups, unmodelled = self._group_products_by_model(
+            request.tenant_id, pending, request.model_preference
+        )
+        
+        for product_id in unmodelled:
+            predictions[product_id] = {
+                'status': 'error',
+                'error': f"No trained models found for tenant {request.tenant_id}"
+            }
+        
+        loop = asyncio.get_running_loop()
+        group_list = list(groups.values())
+        results = await asyncio.gather(*[
+            loop.run_in_executor(
+                self.executor, self._predict_group,
+                request, model_metadata, group_product_ids, feature_engineer
+            )
+            for model_metadata, group_product_ids in group_list
+        ], return_exceptions=True)
+        
+        fresh_predictions = {}
+        for (model_metadata, group_product_ids), result in zip(group_list, results):
             if isinstance(result, Exception):
-                logger.error(f"Error predicting for product {product_id}: {str(result)}")
-                batch_predictions[product_id] = {
-                    'status': 'error',
-                    'error': str(result)
-                }
+                logger.error(f"Error predicting with model {model_metadata.model_id}: {str(result)}")
+                for product_id in group_product_ids:
+                    predictions[product_id] = {
+                        'status': 'error',
+                        'error': f"Prediction failed for product {product_id}: {str(result)}"
+                    }
+            else:
+                fresh_predictions.update(result)
+        
+        self._cache_many(
+            {cache_keys[product_id]: result for product_id, result in fresh_predictions.items()},
+            ttl=3600  # 1 hour
+        )
+        predictions.update(fresh_predictions)
+        
+        return {product_id: predictions[product_id] for product_id in cache_keys}
+    
+    def _group_products_by_model(self, tenant_id: int, product_ids: List[int], 
+                                 preference: str) -> Tuple[Dict[str, Tuple[Any, List[int]]], List[int]]:
+        """
+        Map each model to the products it serves, as ``{model_id: (metadata,
+        product_ids)}``, plus the products no model covers. Product-specific
+        models come from one indexed lookup; the rest share the best global model.
+        """
+        models_by_product = {}
+        for metadata in self.model_registry.list_models(
+            status='active', tenant_id=tenant_id, product_ids=product_ids
+        ):
+            _, product_id, _ = RegistryIndex.parse_scope(metadata)
+            models_by_product.setdefault(product_id, []).append(metadata)
+        
+        groups = {}
+        without_model = []
+        for product_id in product_ids:
+            if product_id in models_by_product:
+                metadata = self._select_best_model(models_by_product[product_id], preference)
+                groups.setdefault(metadata.model_id, (metadata, []))[1].append(product_id)
             else:
-                batch_predictions[product_id] = result
+                without_model.append(product_id)
+        
+        if not without_model:
+            return groups, []
+        
+        global_models = self.model_registry.list_models(
+            status='active', tenant_id=tenant_id, is_global=True
+        )
+        if not global_models:
+            return groups, without_model
+        
+        metadata = self._select_best_model(global_models, 'best')
+        groups.setdefault(metadata.model_id, (metadata, []))[1].extend(without_model)
+        
+        return groups, []
+    
+    def _predict_group(self, request: PredictionRequest, model_metadata: Any,
+                       product_ids: List[int], 
+                       feature_engineer: FeatureEngineer) -> Dict[int, Dict]:
+        """Predict every product served by one model (runs on the executor)."""
+        model, _ = self.model_registry.get_model(model_metadata.model_id)
+        
+        if getattr(model, 'stackable_input', True):
+            return self._predict_stacked(
+                model, model_metadata, request, product_ids, feature_engineer
+            )
         
-        return batch_predictions
+        # Sequence models read the trailing rows of their input, so each
+        # product needs its own call
+        results = {}
+        for product_id in product_ids:
+            results.update(self._predict_stacked(
+                model, model_metadata, request, [product_id], feature_engineer
+            ))
+        return results
+    
+    def _predict_stacked(self, model: Any, model_metadata: Any, 
+                         request: PredictionRequest, product_ids: List[int],
+                         feature_engineer: FeatureEngineer) -> Dict[int, Dict]:
+        """One predict() call over the stacked inputs of ``product_ids``."""
+        horizon = request.forecast_horizon
+        input_data = self._prepare_batch_input_data(request, product_ids, feature_engineer)
+        windows = [
+            slice(position * horizon, (position + 1) * horizon)
+            for position in range(len(product_ids))
+        ]
+        
+        lower_bound = upper_bound = None
+        if not hasattr(model, 'predict_with_confidence'):
+            predictions = np.asarray(model.predict(input_data))
+        elif len(product_ids) == 1 or getattr(model, 'row_wise_confidence', False):
+            predictions, lower_bound, upper_bound = model.predict_with_confidence(
+                input_data, request.confidence_level
+            )
+        elif hasattr(model, 'confidence_interval'):
+            # Spread-based bounds are taken per product so they match what a
+            # single-product request returns
+            predictions = np.asarray(model.predict(input_data), dtype=float)
+            lower_bound = np.empty_like(predictions)
+            upper_bound = np.empty_like(predictions)
+            for window in windows:
+                lower_bound[window], upper_bound[window] = model.confidence_interval(
+                    predictions[window], request.confidence_level
+                )
+        else:
+            parts = [
+                model.predict_with_confidence(input_data.iloc[window], request.confidence_level)
+                for window in windows
+            ]
+            predictions, lower_bound, upper_bound = (
+                np.concatenate([np.asarray(part[i]) for part in parts]) for i in range(3)
+            )
+        
+        predictions = np.asarray(predictions)
+        if lower_bound is not None:
+            lower_bound = np.asarray(lower_bound)
+            upper_bound = np.asarray(upper_bound)
+        
+        return {
+            product_id: self._format_prediction_result(
+                predictions[window],
+                lower_bound[window] if lower_bound is not None else None,
+                upper_bound[window] if upper_bound is not None else None,
+                model_metadata, horizon
+            )
+            for product_id, window in zip(product_ids, windows)
+        }
     
     async def _predict_single_product(self, request: PredictionRequest, 
                                     product_id: int, 
@@ -204,62 +332,58 @@ class ModelServingService:
     async def _get_best_model(self, tenant_id: int, product_id: int, 
                             preference: str) -> Tuple[Any, Any]:
         """Get the best model for prediction."""
-        # Look for product-specific model first
-        models = self.model_registry.list_models(status='active')
-        
-        # Filter models for this tenant
-        tenant_models = [
-            m for m in models 
-            if f"training_pipeline_{tenant_id}" in m.created_by
-        ]
-        
-        # Look for product-specific model
-        product_models = [
-            m for m in tenant_models 
-            if f"product_{product_id}" in m.tags
-        ]
+        # Look for product-specific model first (indexed lookup)
+        product_models = self.model_registry.list_models(
+            status='active', tenant_id=tenant_id, product_id=product_id
+        )
         
         if product_models:
             # Get best product-specific model
-            if preference == 'ensemble':
-                best_model_meta = next(
-                    (m for m in product_models if m.algorithm == 'Ensemble'), 
-                    product_models[0]
-                )
-            else:
-                # Get model with best performance
-                best_model_meta = min(
-                    product_models, 
-                    key=lambda m: m.performance_metrics.get('mae', float('inf'))
-                )
+            best_model_meta = self._select_best_model(product_models, preference)
         else:
             # Fall back to global model
-            global_models = [
-                m for m in tenant_models 
-                if 'global_model' in m.tags
-            ]
+            global_models = self.model_registry.list_models(
+                status='active', tenant_id=tenant_id, is_global=True
+            )
             
             if not global_models:
                 raise ModelServingError(f"No trained models found for tenant {tenant_id}")
             
-            best_model_meta = min(
-                global_models,
-                key=lambda m: m.performance_metrics.get('mae', float('inf'))
-            )
+            best_model_meta = self._select_best_model(global_models, 'best')
         
-        # Load model (with caching)
-        model_id = best_model_meta.model_id
+        # Load model (served from the registry's LRU cache when warm)
+        model, _ = self.model_registry.get_model(best_model_meta.model_id)
         
-        if model_id not in self.loaded_models:
-            model, _ = self.model_registry.get_model(model_id)
-            self.loaded_models[model_id] = model
+        return model, best_model_meta
+    
+    def _select_best_model(self, models: List[Any], preference: str) -> Any:
+        """Pick the model to serve from candidate metadata (newest first)."""
+        if preference == 'ensemble':
+            return next(
+                (m for m in models if m.algorithm == 'Ensemble'), 
+                models[0]
+            )
         
-        return self.loaded_models[model_id], best_model_meta
+        # Get model with best performance
+        return min(
+            models, 
+            key=lambda m: m.performance_metrics.get('mae', float('inf'))
+        )
     
     async def _prepare_input_data(self, request: PredictionRequest, 
                                 product_id: int, 
                                 feature_engineer: FeatureEngineer) -> pd.DataFrame:
         """Prepare input data for prediction."""
+        return self._prepare_batch_input_data(request, [product_id], feature_engineer)
+    
+    def _prepare_batch_input_data(self, request: PredictionRequest, 
+                                  product_ids: List[int], 
+                                  feature_engineer: FeatureEngineer) -> pd.DataFrame:
+        """
+        Input rows for ``product_ids``, stacked product by product with
+        ``forecast_horizon`` days each. Time features depend only on the date,
+        so they are engineered once and repeated for every product.
+        """
         # Get historical data for feature engineering
         # This would typically fetch recent data from database
         
@@ -272,7 +396,7 @@ class ModelServingService:
         
         input_data = pd.DataFrame({
             'date': future_dates,
-            'product_id': product_id
+            'product_id': product_ids[0]
         })
         
         # Add any additional context data
@@ -289,6 +413,14 @@ class ModelServingService:
             else:
                 featured_data[col] = featured_data[col].fillna('')
         
+        if len(product_ids) == 1:
+            return featured_data
+        
+        featured_data = featured_data.iloc[
+            np.tile(np.arange(request.forecast_horizon), len(product_ids))
+        ].reset_index(drop=True)
+        featured_data['product_id'] = np.repeat(product_ids, request.forecast_horizon)
+        
         return featured_data
     
     def _format_prediction_result(self, predictions: np.ndarray, 
@@ -372,6 +504,36 @@ class ModelServingService:
         
         return None
     
+    def _get_many_from_cache(self, cache_keys: Dict[int, str]) -> Dict[int, Dict]:
+        """Cached results for ``{product_id: cache_key}`` in one round trip."""
+        if not self.redis_client or not cache_keys:
+            return {}
+        
+        try:
+            cached_values = self.redis_client.mget(list(cache_keys.values()))
+        except Exception as e:
+            logger.warning(f"Cache get error: {str(e)}")
+            return {}
+        
+        return {
+            product_id: pickle.loads(cached_data)
+            for product_id, cached_data in zip(cache_keys, cached_values)
+            if cached_data
+        }
+    
+    def _cache_many(self, results: Dict[str, Dict], ttl: int = 3600):
+        """Cache ``{cache_key: result}`` in one pipelined round trip."""
+        if not self.redis_client or not results:
+            return
+        
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for cache_key, result in results.items():
+                pipeline.setex(cache_key, ttl, pickle.dumps(result))
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Cache set error: {str(e)}")
+    
     async def _cache_result(self, cache_key: str, result: Dict, ttl: int = 3600):
         """Cache prediction result."""
         if self.redis_client:
@@ -416,7 +578,8 @@ class ModelServingService:
             'status': health_status,
             'metrics': self.prediction_metrics,
             'error_rate_percent': round(error_rate, 2),
-            'loaded_models_count': len(self.loaded_models),
+            'loaded_models_count': self.model_registry.model_cache.stats()['loaded_models'],
+            'model_cache': self.model_registry.model_cache.stats(),
             'timestamp': datetime.now().isoformat()
         }
 
@@ -0,0 +1,94 @@
+# apps/inventory/ml/shared_features.py
+
+import os
+import logging
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Columns kept out of the shared matrix; models never train on them
+EXCLUDED_COLUMNS = ['date', 'product_id', 'warehouse_id']
+
+
+class SharedFeatureMatrix:
+    """
+    Engineered feature frames for many products packed into one
+    memory-mapped ``.npy`` file.
+    
+    Worker processes receive this small handle (path, columns and row
+    offsets) once, when the pool starts, and map the file read-only, so the
+    operating system shares the pages between them instead of each task
+    pickling its product's DataFrame.
+    """
+    
+    def __init__(self, path: str, columns: List[str], offsets: Dict[Any, Tuple[int, int]]):
+        self.path = path
+        self.columns = columns
+        self.offsets = offsets
+        self._matrix = None
+    
+    @classmethod
+    def create(cls, processed_data: Dict[Any, pd.DataFrame], directory: str) -> 'SharedFeatureMatrix':
+        """Write the numeric columns of ``processed_data`` to ``directory``."""
+        columns = []
+        for data in processed_data.values():
+            for column in data.select_dtypes(include='number').columns:
+                if column not in EXCLUDED_COLUMNS and column not in columns:
+                    columns.append(column)
+        
+        path = os.path.join(directory, 'features.npy')
+        total_rows = sum(len(data) for data in processed_data.values())
+        matrix = np.lib.format.open_memmap(
+            path, mode='w+', dtype=np.float64, shape=(total_rows, len(columns))
+        )
+        
+        offsets = {}
+        position = 0
+        for product_id, data in processed_data.items():
+            end = position + len(data)
+            matrix[position:end] = data.reindex(columns=columns).to_numpy(dtype=np.float64)
+            offsets[product_id] = (position, end)
+            position = end
+        
+        matrix.flush()
+        del matrix
+        
+        logger.info(
+            f"Shared feature matrix written: {total_rows} rows x {len(columns)} columns, "
+            f"{len(offsets)} products"
+        )
+        return cls(path, columns, offsets)
+    
+    def frame(self, product_id: Any) -> pd.DataFrame:
+        """The product's rows as a DataFrame over the mapped file (no copy)."""
+        if self._matrix is None:
+            self._matrix = np.load(self.path, mmap_mode='r')
+        
+        start, end = self.offsets[product_id]
+        return pd.DataFrame(self._matrix[start:end], columns=self.columns, copy=False)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_matrix'] = None
+        return state
+
+
+# Per-process state of training pool workers, set by init_training_worker
+_worker_state = {}
+
+
+def init_training_worker(config, shared_matrix: SharedFeatureMatrix) -> None:
+    """ProcessPoolExecutor initializer: one pipeline and matrix handle per worker."""
+    from .training_pipeline import TrainingPipeline
+    
+    _worker_state['pipeline'] = TrainingPipeline(config)
+    _worker_state['matrix'] = shared_matrix
+
+
+def train_shared_product(product_id: Any, warm_start_models: Dict[str, str] = None) -> Dict[str, Any]:
+    """Train one product's models from the shared matrix in a pool worker."""
+    pipeline = _worker_state['pipeline']
+    data = _worker_state['matrix'].frame(product_id)
+    return pipeline._train_single_product_models(product_id, data, warm_start_models)
@@ -2,6 +2,9 @@
 
 import pandas as pd
 import numpy as np
+import hashlib
+import tempfile
+import time
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass
@@ -12,8 +15,10 @@ from django.db.models import Sum, Avg, Count, Q
 from django.utils import timezone
 from django.core.cache import cache
 
+from .demand_data import DemandMatrixBuilder
 from .feature_engineering import FeatureEngineer
-from .model_registry import ModelRegistry, ModelMetadata
+from .model_registry import ModelRegistry, ModelMetadata, RegistryIndex
+from .shared_features import SharedFeatureMatrix, init_training_worker, train_shared_product
 from .models.random_forest import RandomForestForecaster
 from .models.xgboost_model import XGBoostForecaster
 from .models.lstm_model import LSTMForecaster
@@ -26,6 +31,25 @@ from ..services.analytics.data_quality import DataQualityChecker
 
 logger = logging.getLogger(__name__)
 
+# Days of demand history, up to the training date, fingerprinted per product
+FINGERPRINT_DAYS = 90
+
+# Days after training needed before a model's error drift is measured
+MIN_DRIFT_DAYS = 7
+
+
+def demand_fingerprint(data: pd.DataFrame, until) -> str:
+    """Hash of the product's daily demand for the FINGERPRINT_DAYS ending ``until``."""
+    dates = pd.to_datetime(data['date'])
+    until = pd.Timestamp(until)
+    window = data.loc[
+        (dates > until - pd.Timedelta(days=FINGERPRINT_DAYS)) & (dates <= until),
+        ['date', 'demand']
+    ]
+    hashed = pd.util.hash_pandas_object(window, index=False)
+    return hashlib.md5(hashed.to_numpy().tobytes()).hexdigest()
+
+
 @dataclass
 class TrainingConfig:
     """Configuration for training pipeline."""
@@ -42,6 +66,9 @@ class TrainingConfig:
     max_workers: Optional[int] = None
     retrain_threshold_days: int = 30
     performance_threshold: float = 0.8  # R² score threshold
+    incremental: bool = False  # Only retrain products whose data changed or error drifted
+    drift_threshold: float = 0.25  # Relative MAE increase that triggers a retrain
+    warm_start: bool = True  # Continue from the previous model where supported
     
     def __post_init__(self):
         if self.algorithms is None:
@@ -93,8 +120,20 @@ class TrainingPipeline:
             processed_data = self._engineer_features(training_data)
             
             # Step 4: Train models
+            retrain_plan = None
+            if self.config.incremental:
+                logger.info("Step 4: Incremental retrain planning")
+                retrain_plan = TrainingScheduler(self.model_registry).plan_retraining(
+                    self.config, processed_data
+                )
+            
             logger.info("Step 4: Model training")
-            training_results = self._train_models(processed_data)
+            training_results = self._train_models(processed_data, retrain_plan)
+            
+            if retrain_plan is not None:
+                training_results['incremental'] = self._summarize_incremental_training(
+                    retrain_plan, training_results
+                )
             
             # Step 5: Model evaluation and selection
             logger.info("Step 5: Model evaluation")
@@ -123,62 +162,16 @@ class TrainingPipeline:
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=self.config.training_period_months * 30)
         
-        # Base query for stock movements
-        movements_query = StockMovement.objects.filter(
-            tenant_id=self.config.tenant_id,
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date,
-            movement_type__in=['SALE', 'TRANSFER_OUT', 'ADJUSTMENT_OUT']  # Outbound movements
-        )
-        
-        # Apply product filter
-        if self.config.products:
-            movements_query = movements_query.filter(product_id__in=self.config.products)
-        
-        # Apply warehouse filter
-        if self.config.warehouses:
-            movements_query = movements_query.filter(warehouse_id__in=self.config.warehouses)
+        final_df = DemandMatrixBuilder(
+            self.config.tenant_id,
+            products=self.config.products,
+            warehouses=self.config.warehouses
+        ).build(start_date, end_date)
         
-        # Extract data
-        movements = movements_query.select_related('product', 'warehouse').values(
-            'product_id', 'warehouse_id', 'created_at__date', 'quantity', 'unit_cost'
-        )
-        
-        if not movements:
+        if final_df.empty:
             return pd.DataFrame()
         
-        # Convert to DataFrame
-        df = pd.DataFrame(movements)
-        df.rename(columns={'created_at__date': 'date'}, inplace=True)
-        
-        # Aggregate daily demand by product and warehouse
-        demand_data = df.groupby(['product_id', 'warehouse_id', 'date']).agg({
-            'quantity': 'sum',
-            'unit_cost': 'mean'
-        }).reset_index()
-        
-        demand_data.rename(columns={'quantity': 'demand'}, inplace=True)
-        
-        # Create complete date range for each product-warehouse combination
-        complete_data = []
-        
-        for (product_id, warehouse_id), group in demand_data.groupby(['product_id', 'warehouse_id']):
-            # Create complete date range
-            date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-            complete_df = pd.DataFrame({'date': date_range})
-            complete_df['product_id'] = product_id
-            complete_df['warehouse_id'] = warehouse_id
-            
-            # Merge with actual demand data
-            merged = complete_df.merge(group, on=['product_id', 'warehouse_id', 'date'], how='left')
-            merged['demand'] = merged['demand'].fillna(0)  # Fill missing days with 0 demand
-            merged['unit_cost'] = merged['unit_cost'].fillna(method='ffill').fillna(method='bfill')
-            
-            complete_data.append(merged)
-        
-        iffinal_df = pd.concat(complete_data, ignore_index=True)
-        
-        logger.info(f"Extracted training, "
+        logger.info(f"Extracted training data: {len(final_df)} records, "
                    f"{final_df['product_id'].nunique()} products, "
                    f"{final_df['warehouse_id'].nunique()} warehouses")
         
@@ -188,95 +181,124 @@ class TrainingPipeline:
         """Assess data quality and generate report."""
         return self.data_quality_checker.assess_data_quality(data)
     
-    def _engineer_features( -> Dict[int, pd.DataFrame]:
-        """Engineer features for each product."""
+    def _engineer_features(self, data: pd.DataFrame) -> Dict[int, pd.DataFrame]:
+        """Engineer features for all products in one grouped pass."""
         processed_data = {}
         
-        # Process each product separately
-        for product_id, product_data in data.groupby('product_id'):
-            try:
-                # Sort by date
-                product_data = product_data.sort_values('date')
-                
-                # Engineer features
-                engineered_data = self.feature_engineer.engineer_features(
-                    product_data, 
-                    target_column='demand',
-                    include_lags=True,
-                    include_product=True,
-                    include_seasonal=True,
-                    include_external=True,
-                    k_best=30  # Limit features for efficiency
-                )
-                
-                # Remove rows with insufficient data (due to lags)
-                engineered_data = engineered_data.dropna()
-                
-                if len(engineered_data) > 30:  # Minimum data points required
-                    processed_data[product_id] = engineered_data
-                else:
-                    logger.warning(f"Insufficient data for product {product_id}: {len(engineered_data)} records")
-                    
-            except Exception as e:
-                logger.warning(f"Error processing product {product_id}: {str(e)}")
-                continue
+        engineered = self.feature_engineer.engineer_features_by_product(
+            data,
+            target_column='demand',
+            include_lags=True,
+            include_product=True,
+            include_seasonal=True,
+            include_external=True,
+            k_best=30,  # Limit features for efficiency
+            drop_warmup=True  # Do not train on zero-filled lag/rolling rows
+        )
+        
+        for product_id, engineered_data in engineered.items():
+            if len(engineered_data) > 30:  # Minimum data points required
+                processed_data[product_id] = engineered_data
+            else:
+                logger.warning(f"Insufficient data for product {product_id}: {len(engineered_data)} records")
         
         logger.info(f"Feature engineering completed for {len(processed_data)} products")
         return processed_data
     
-    def _train_models(self, processed_DataFrame]) -> Dict[str, Any]:
-        """Train models for all products."""
+    def _train_models(self, processed_data: Dict[int, pd.DataFrame],
+                      retrain_plan: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Train models for all products, or only for the retrain set of
+        ``retrain_plan`` when the pipeline runs incrementally.
+        """
         training_results = {
             'product_models': {},
             'global_models': {},
             'training_summary': {}
         }
         
+        if retrain_plan is not None:
+            product_data = {
+                product_id: processed_data[product_id] for product_id in retrain_plan['retrain']
+            }
+            warm_start = retrain_plan['warm_start'] if self.config.warm_start else {}
+        else:
+            product_data = processed_data
+            warm_start = {}
+        
+        started = time.monotonic()
+        
         # Train individual product models
-        if self.config.parallel_training:
-            training_results['product_models'] = self._train_product_models_parallel(processed_data)
+        if self.config.parallel_training and len(product_data) > 1:
+            training_results['product_models'] = self._train_product_models_parallel(product_data, warm_start)
         else:
-            training_results['product_models'] = self._train_product_models_sequential(processed_data)
+            training_results['product_models'] = self._train_product_models_sequential(product_data, warm_start)
         
-        # Train global models (if we have enough data)
-        if len(processed_data) >= 5:  # Minimum products for global model
+        # Fingerprint the history up to the last complete day, which is what
+        # the next incremental run compares against (see TrainingScheduler)
+        fingerprint_until = datetime.now().date() - timedelta(days=1)
+        for product_id, product_result in training_results['product_models'].items():
+            if {'date', 'demand'} <= set(product_data[product_id].columns):
+                product_result['data_fingerprint'] = demand_fingerprint(
+                    product_data[product_id], fingerprint_until
+                )
+        
+        # Train global models (if we have enough data). An incremental run
+        # with nothing to retrain keeps the current global models too
+        if len(processed_data) >= 5 and product_data:  # Minimum products for global model
             training_results['global_models'] = self._train_global_models(processed_data)
         
+        training_results['training_seconds'] = round(time.monotonic() - started, 1)
+        
         # Generate training summary
         training_results['training_summary'] = self._summarize_training_results(training_results)
         
         return training_results
     
-    def _train_product_models_parallel[int, pd.DataFrame]) -> Dict[int, Dict]:
-        """Train product models in parallel."""
+    def _train_product_models_parallel(self, processed_data: Dict[int, pd.DataFrame],
+                                       warm_start: Dict[int, Dict[str, str]] = None) -> Dict[int, Dict]:
+        """
+        Train product models in parallel. Workers read features from a
+        memory-mapped SharedFeatureMatrix instead of a pickled frame per task.
+        """
+        warm_start = warm_start or {}
         product_models = {}
         
-        with ProcessPoolExecutor(max_workers=self.config.max_workers) as executor:
-            # Submit training jobs
-            future_to_product = {
-                executor.submit(self._train_single_product_models, product_id, data): product_id
-                for product_id, data in processed_data.items()
-            }
+        with tempfile.TemporaryDirectory(prefix='ml_training_') as directory:
+            shared_matrix = SharedFeatureMatrix.create(processed_data, directory)
             
-            # Collect results
-            for future in future_to_product:
-                product_id = future_to_product[future]
-                try:
-                    result = future.result(timeout=300)  # 5 minute timeout per product
-                    product_models[product_id] = result
-                except Exception as e:
-                    logger.error(f"Error training models for product {product_id}: {str(e)}")
-                    continue
+            with ProcessPoolExecutor(
+                max_workers=self.config.max_workers,
+                initializer=init_training_worker,
+                initargs=(self.config, shared_matrix)
+            ) as executor:
+                # Submit training jobs
+                future_to_product = {
+                    executor.submit(train_shared_product, product_id, warm_start.get(product_id)): product_id
+                    for product_id in processed_data
+                }
+                
+                # Collect results
+                for future in future_to_product:
+                    product_id = future_to_product[future]
+                    try:
+                        result = future.result(timeout=300)  # 5 minute timeout per product
+                        product_models[product_id] = result
+                    except Exception as e:
+                        logger.error(f"Error training models for product {product_id}: {str(e)}")
+                        continue
         
         return product_models
     
-    def _train_product_models_sequential(self, pd.DataFrame]) -> Dict[int, Dict]:
+    def _train_product_models_sequential(self, processed_data: Dict[int, pd.DataFrame],
+                                         warm_start: Dict[int, Dict[str, str]] = None) -> Dict[int, Dict]:
         """Train product models sequentially."""
+        warm_start = warm_start or {}
         product_models = {}
         
         for product_id, data in processed_data.items():
             try:
-                result = self._train_single_product_models(product_id, data)
+                result = self._train_single_product_models(product_id, data, warm_start.get(product_id))
                 product_models[product_id] = result
             except Exception as e:
                 logger.error(f"Error training models for product {product_id}: {str(e)}")
@@ -284,9 +306,16 @@ class TrainingPipeline:
         
         return product_models
     
-    def _train_singled.DataFrame) -> Dict[str, Any]:
-        """Train all specified algorithms for a single product."""
+    def _train_single_product_models(self, product_id, data: pd.DataFrame,
+                                     warm_start_models: Dict[str, str] = None) -> Dict[str, Any]:
+        """
+        Train all specified algorithms for a single product.
+        
+        ``warm_start_models`` maps algorithm to the model_id of the product's
+        current model; algorithms that support it continue from that model.
+        """
         models = {}
+        warm_start_models = warm_start_models or {}
         
         # Prepare data splits
         n_samples = len(data)
@@ -295,7 +324,7 @@ class TrainingPipeline:
         train_size = n_samples - test_size - val_size
         
         if train_size < 20:  # Minimum training samples
-            raise ValueError(
+            raise ValueError(f"Insufficient training samples for product {product_id}: {train_size}")
         
         # Split data
         train_data = data.iloc[:train_size]
@@ -322,9 +351,13 @@ class TrainingPipeline:
                 
                 # Initialize model
                 model = model_class()
+                warm_started = self._warm_start_model(
+                    model, warm_start_models.get(algorithm), feature_columns
+                )
                 
-                # Hyperparameter optimization
-                if self.config.hyperparameter_optimization:
+                # Hyperparameter optimization (a warm-started model keeps the
+                # hyperparameters of the model it continues from)
+                if self.config.hyperparameter_optimization and not warm_started:
                     try:
                         best_params = model.optimize_hyperparameters(X_train, y_train)
                         logger.info(f"Optimized hyperparameters for {algorithm}: {best_params}")
@@ -345,11 +378,13 @@ class TrainingPipeline:
                     'model': model,
                     'validation_metrics': val_metrics,
                     'test_metrics': test_metrics,
-                    'feature_importance': model.get_feature_importance() if hasattr(model, 'get_feature_importance') else None
+                    'feature_importance': model.get_feature_importance() if hasattr(model, 'get_feature_importance') else None,
+                    'warm_started': warm_started
                 }
                 
                 logger.info(f"Trained {algorithm} for product {product_id}: "
-                           f"Test MAE = {test_metrics['mae']:.4f}")
+                           f"Test MAE = {test_metrics['mae']:.4f}"
+                           f"{' (warm start)' if warm_started else ''}")
                 
             except Exception as e:
                 logger.error(f"Error training {algorithm} for product {product_id}: {str(e)}")
@@ -394,7 +429,24 @@ class TrainingPipeline:
             }
         }
     
-    def _train_global_models(self, processe, Any]:
+    def _warm_start_model(self, model, previous_model_id: Optional[str],
+                          feature_columns: List[str]) -> bool:
+        """Continue ``model`` from a registered model trained on the same features."""
+        if not previous_model_id or not model.supports_warm_start:
+            return False
+        
+        try:
+            previous_model, _ = self.model_registry.get_model(previous_model_id)
+        except Exception as e:
+            logger.warning(f"Could not load model {previous_model_id} for warm start: {str(e)}")
+            return False
+        
+        if list(previous_model.feature_names) != list(feature_columns):
+            return False
+        
+        return model.warm_start_from(previous_model)
+    
+    def _train_global_models(self, processed_data: Dict[int, pd.DataFrame]) -> Dict[str, Any]:
         """Train global models using data from all products."""
         logger.info("Training global models")
         
@@ -489,7 +541,7 @@ class TrainingPipeline:
                         version='1.0.0',
                         algorithm=algorithm,
                         parameters=model_info['model'].hyperparameters if hasattr(model_info['model'], 'hyperparameters') else {},
-                        training_data_hash=self._calculate_data_hash(product_result['data_info']),
+                        training_data_hash=product_result.get('data_fingerprint') or self._calculate_data_hash(product_result['data_info']),
                         feature_names=model_info['model'].feature_names if hasattr(model_info['model'], 'feature_names') else [],
                         performance_metrics=model_info['test_metrics'],
                         training_timestamp=datetime.now(),
@@ -597,6 +649,29 @@ class TrainingPipeline:
         
         return summary
     
+    def _summarize_incremental_training(self, retrain_plan: Dict[str, Any],
+                                        training_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Retrain set and compute saved by an incremental run."""
+        warm_started_models = sum(
+            1
+            for product_result in training_results['product_models'].values()
+            for model_info in product_result['models'].values()
+            if model_info.get('warm_started')
+        )
+        
+        return {
+            'retrain_set': retrain_plan['retrain'],
+            'products_total': retrain_plan['products_total'],
+            'products_retrained': retrain_plan['products_retrained'],
+            'products_skipped': retrain_plan['products_skipped'],
+            'rows_total': retrain_plan['rows_total'],
+            'rows_retrained': retrain_plan['rows_retrained'],
+            'compute_saved_percent': retrain_plan['compute_saved_percent'],
+            'warm_started_models': warm_started_models,
+            'global_models_retrained': bool(training_results.get('global_models')),
+            'training_seconds': training_results.get('training_seconds')
+        }
+    
     def _generate_training_report(self, quality_report: Dict, training_results: Dict,
                                  evaluation_results: Dict, registration_results: Dict) -> Dict[str, Any]:
         """Generate comprehensive training report."""
@@ -608,7 +683,8 @@ class TrainingPipeline:
                     'algorithms': self.config.algorithms,
                     'training_period_months': self.config.training_period_months,
                     'parallel_training': self.config.parallel_training,
-                    'ensemble_enabled': self.config.ensemble_enabled
+                    'ensemble_enabled': self.config.ensemble_enabled,
+                    'incremental': self.config.incremental
                 }
             },
             'data_quality': quality_report,
@@ -618,6 +694,9 @@ class TrainingPipeline:
             'recommendations': []
         }
         
+        if 'incremental' in training_results:
+            report['incremental'] = training_results['incremental']
+        
         # Generate recommendations
         if evaluation_results.get('overall_best_algorithm'):
             report['recommendations'].append(
@@ -676,16 +755,15 @@ class TrainingPipeline:
 class TrainingScheduler:
     """Automated training scheduler for ML models."""
     
-    def __init__(self):
-        self.model_registry = ModelRegistry()
+    def __init__(self, model_registry: ModelRegistry = None):
+        self.model_registry = model_registry or ModelRegistry()
     
     def check_retrain_requirements(self, tenant_id: int) -> List[Dict[str, Any]]:
         """Check which models need retraining."""
         retrain_candidates = []
         
         # Get all active models for tenant
-        models = self.model_registry.list_models(status='active')
-        tenant_models = [m for m in models if f"training_pipeline_{tenant_id}" in m.created_by]
+        tenant_models = self.model_registry.list_models(status='active', tenant_id=tenant_id)
         
         for model_metadata in tenant_models:
             # Check age
@@ -716,6 +794,118 @@ class TrainingScheduler:
         
         return retrain_candidates
     
+    def plan_retraining(self, config: TrainingConfig,
+                        processed_data: Dict[int, pd.DataFrame]) -> Dict[str, Any]:
+        """
+        Decide which products an incremental training run retrains.
+        
+        A product is retrained when it has no model, its model is older than
+        ``retrain_threshold_days`` or was trained on features that are no
+        longer produced, the demand history it was trained on has changed
+        since, or its error on the days after training exceeds the test MAE
+        by more than ``drift_threshold``. Only the last two cases warm start
+        from the current models; the others are fitted from scratch.
+        """
+        latest_models = self._latest_product_models(config.tenant_id, list(processed_data))
+        today = datetime.now().date()
+        
+        retrain = {}
+        warm_start = {}
+        skipped = []
+        
+        for product_id, data in processed_data.items():
+            models = latest_models.get(product_id)
+            if not models:
+                retrain[product_id] = ["No trained model"]
+                continue
+            
+            reference = min(
+                models.values(),
+                key=lambda metadata: metadata.performance_metrics.get('mae', float('inf'))
+            )
+            trained_on = reference.training_timestamp.date()
+            reasons = []
+            
+            model_age = (today - trained_on).days
+            if model_age > config.retrain_threshold_days:
+                reasons.append(f"Model is {model_age} days old")
+            
+            if not set(reference.feature_names) <= set(data.columns):
+                reasons.append("Feature set changed")
+            
+            if reasons:
+                retrain[product_id] = reasons
+                continue
+            
+            if reference.training_data_hash != demand_fingerprint(data, trained_on - timedelta(days=1)):
+                reasons.append("Training data changed")
+            
+            drift = self._error_drift(reference, data, trained_on)
+            if drift is not None and drift > config.drift_threshold:
+                reasons.append(f"Error drifted {drift:.0%} above test MAE")
+            
+            if reasons:
+                retrain[product_id] = reasons
+                warm_start[product_id] = {
+                    algorithm: metadata.model_id for algorithm, metadata in models.items()
+                }
+            else:
+                skipped.append(product_id)
+        
+        rows_total = sum(len(data) for data in processed_data.values())
+        rows_retrained = sum(len(processed_data[product_id]) for product_id in retrain)
+        
+        logger.info(f"Incremental training for tenant {config.tenant_id}: "
+                   f"retraining {len(retrain)} of {len(processed_data)} products "
+                   f"({len(warm_start)} warm started)")
+        
+        return {
+            'retrain': retrain,
+            'warm_start': warm_start,
+            'skipped': skipped,
+            'products_total': len(processed_data),
+            'products_retrained': len(retrain),
+            'products_skipped': len(skipped),
+            'rows_total': rows_total,
+            'rows_retrained': rows_retrained,
+            'compute_saved_percent': round(100 * (1 - rows_retrained / max(1, rows_total)), 1)
+        }
+    
+    def _latest_product_models(self, tenant_id: int,
+                               product_ids: List[int]) -> Dict[int, Dict[str, ModelMetadata]]:
+        """Newest active or training model per product and algorithm."""
+        latest = {}
+        
+        # list_models returns the newest first
+        for metadata in self.model_registry.list_models(tenant_id=tenant_id, product_ids=product_ids):
+            if metadata.status not in ('active', 'training'):
+                continue
+            
+            _, product_id, _ = RegistryIndex.parse_scope(metadata)
+            latest.setdefault(product_id, {}).setdefault(metadata.algorithm, metadata)
+        
+        return latest
+    
+    def _error_drift(self, metadata: ModelMetadata, data: pd.DataFrame, trained_on) -> Optional[float]:
+        """Relative MAE increase on the days after ``trained_on`` over the test MAE."""
+        baseline_mae = metadata.performance_metrics.get('mae')
+        if not baseline_mae:
+            return None
+        
+        recent = data[pd.to_datetime(data['date']) > pd.Timestamp(trained_on)]
+        if recent['date'].nunique() < MIN_DRIFT_DAYS:
+            return None
+        
+        try:
+            model, _ = self.model_registry.get_model(metadata.model_id)
+            predictions = model.predict(recent[metadata.feature_names])
+        except Exception as e:
+            logger.warning(f"Could not measure drift of model {metadata.model_id}: {str(e)}")
+            return None
+        
+        recent_mae = float(np.mean(np.abs(recent['demand'].to_numpy() - predictions)))
+        return recent_mae / baseline_mae - 1
+    
     def _check_model_performance(self, model_id: str) -> Optional[float]:
         """Check current model performance (placeholder for production monitoring)."""
         # In production, this would check actual prediction accuracy
@@ -21,7 +21,7 @@ from .catalog.variations import ProductVariation
 from .stock.items import StockItem
 from .stock.movements import StockMovement
 from .stock.batches import Batch, SerialNumber
-from .stock.valuations import StockValuationLayer, CostAllocation, CostAdjustment
+from .stock.valuations import StockValuationLayer, CostAllocation, CostAdjustment, InventoryValueSnapshot
 
 # Purchasing models
 from .purchasing.orders import PurchaseOrder, PurchaseOrderItem, PurchaseOrderApproval
@@ -71,7 +71,7 @@ __all__ = [
     'StockItem',
     'StockMovement', 'StockMovementItem',
     'Batch', 'SerialNumber',
-    'StockValuationLayer', 'CostAllocation', 'CostAdjustment',
+    'StockValuationLayer', 'CostAllocation', 'CostAdjustment', 'InventoryValueSnapshot',
     
     # Purchasing models
     'PurchaseOrder', 'PurchaseOrderItem', 'PurchaseOrderApproval',
@@ -1,7 +1,8 @@
 """
 Stock adjustment and write-off management
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from decimal import Decimal
@@ -259,15 +260,7 @@ class StockAdjustment(TenantBaseModel, AuditableMixin):
         if self.status != 'APPROVED':
             return False, f"Cannot post adjustment with status {self.status}"
         
-        posting_errors = []
-        
-        for item in self.items.all():
-            success, message = item.apply_adjustment(user)
-            if not success:
-                posting_errors.append(f"Line {item.line_number}: {message}")
-        
-        if posting_errors:
-            return False, f"Posting failed: {'; '.join(posting_errors)}"
+        self._apply_items(user)
         
         self.status = 'POSTED'
         self.posted_by = user
@@ -335,6 +328,93 @@ class StockAdjustment(TenantBaseModel, AuditableMixin):
         
         return True, f"Adjustment reversed with number {reversal.adjustment_number}"
     
+    @transaction.atomic
+    def _apply_items(self, user):
+        """
+        Apply all unapplied lines with one locked fetch of their stock items
+        and bulk writes, with the same effect as StockAdjustmentItem.apply_adjustment
+        on each line in order: stock quantities and values, one ADJUST_IN or
+        ADJUST_OUT movement per quantity change, and the lines' applied flags.
+        """
+        from ..stock.items import StockItem
+        from ..stock.movements import StockMovement
+        
+        items = list(self.items.filter(is_applied=False).order_by('line_number'))
+        if not items:
+            return
+        
+        # Lock in primary key order so concurrent adjustments cannot deadlock
+        stock_items = StockItem.objects.select_for_update().order_by('pk').in_bulk(
+            {item.stock_item_id for item in items}
+        )
+        
+        now = timezone.now()
+        movements = []
+        
+        for item in items:
+            stock_item = stock_items[item.stock_item_id]
+            
+            # Apply quantity adjustment
+            if item.quantity_adjustment != 0:
+                adjustment = item.quantity_after - stock_item.quantity_on_hand
+                if adjustment != 0:
+                    movement_type = 'ADJUST_IN' if adjustment > 0 else 'ADJUST_OUT'
+                    
+                    stock_item.quantity_on_hand = item.quantity_after
+                    reserved_allocated = stock_item.quantity_reserved + stock_item.quantity_allocated
+                    stock_item.quantity_available = max(Decimal('0'), item.quantity_after - reserved_allocated)
+                    stock_item.last_movement_date = now
+                    stock_item.last_movement_type = movement_type
+                    
+                    movements.append(StockMovement(
+                        tenant_id=self.tenant_id,
+                        stock_item=stock_item,
+                        movement_type=movement_type,
+                        quantity=abs(adjustment),
+                        unit_cost=stock_item.average_cost,
+                        total_cost=abs(adjustment) * stock_item.average_cost,
+                        reason=item.reason,
+                        performed_by=user,
+                        stock_before=stock_item.quantity_on_hand,
+                        stock_after=stock_item.quantity_on_hand,
+                        reference_id=str(self.id),
+                        notes=item.reason,
+                        movement_date=now,
+                        actual_date=now
+                    ))
+            
+            # Apply cost adjustment
+            if item.unit_cost_after != item.unit_cost_before and self.adjustment_type == 'REVALUATION':
+                stock_item.average_cost = item.unit_cost_after
+            
+            stock_item.total_value = stock_item.quantity_on_hand * stock_item.average_cost
+            
+            item.is_applied = True
+            item.applied_by = user
+            item.applied_at = now
+        
+        changed_fields = [
+            'quantity_on_hand', 'quantity_available', 'total_value', 'average_cost',
+            'last_movement_date', 'last_movement_type'
+        ]
+        StockItem.objects.bulk_update(stock_items.values(), changed_fields, batch_size=1000)
+        
+        StockMovement.assign_movement_numbers(movements)
+        StockMovement.objects.bulk_create(movements, batch_size=1000)
+        
+        StockAdjustmentItem.objects.bulk_update(
+            items, ['is_applied', 'applied_by', 'applied_at'], batch_size=1000
+        )
+        
+        # Stock sync and alert receivers run once per stock item and movement
+        for stock_item in stock_items.values():
+            post_save.send(sender=StockItem, instance=stock_item, created=False, raw=False,
+                           using=stock_item._state.db, update_fields=frozenset(changed_fields))
+        
+        for movement in movements:
+            post_save.send(sender=StockMovement, instance=movement, created=True, raw=False,
+                           using=movement._state.db, update_fields=None)
+    
     def calculate_totals(self):
         """Calculate summary totals from line items"""
         totals = self.items.aggregate(
@@ -1,11 +1,14 @@
 """
 Cycle counting and physical inventory management
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Round
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from decimal import Decimal
 from datetime import date, timedelta
+from itertools import islice
 
 from apps.core.models import TenantBaseModel
 from ..abstract.auditable import AuditableMixin
@@ -19,6 +22,9 @@ class CycleCount(TenantBaseModel, AuditableMixin):
     Cycle counting management with comprehensive planning and execution
     """
     
+    # Stock items read and count items inserted per round trip
+    COUNT_ITEM_BATCH_SIZE = 5000
+    
     COUNT_STATUS = [
         ('PLANNED', 'Planned'),
         ('SCHEDULED', 'Scheduled'),
@@ -220,6 +226,7 @@ class CycleCount(TenantBaseModel, AuditableMixin):
                 last_num = 0
             self.count_number = f"CNT{last_num + 1:06d}"
     
+    @transaction.atomic
     def generate_count_items(self):
         """Generate count items based on scope criteria"""
         if self.status not in ['PLANNED', 'SCHEDULED']:
@@ -255,26 +262,44 @@ class CycleCount(TenantBaseModel, AuditableMixin):
         if self.xyz_class:
             queryset = queryset.filter(xyz_classification=self.xyz_class)
         
-        # Create count items
-        count_items_created = 0
-        for stock_item in queryset:
-            count_item, created = CycleCountItem.objects.get_or_create(
-                tenant_id=self.tenant_id,
-                cycle_count=self,
-                stock_item=stock_item,
-                defaults={
-                    'location': stock_item.location,
-                    'batch': stock_item.batch,
-                    'system_quantity': stock_item.quantity_on_hand,
-                    'unit_cost': stock_item.average_cost,
-                }
+        # Stock items already in this count keep their existing count item
+        queryset = queryset.exclude(
+            id__in=self.items.values('stock_item_id')
+        ).distinct()
+        
+        existing_items = self.items.count()
+        
+        # Stream the scope and insert count items in chunks
+        rows = queryset.values_list(
+            'id', 'location_id', 'batch_id', 'quantity_on_hand', 'average_cost'
+        ).iterator(chunk_size=self.COUNT_ITEM_BATCH_SIZE)
+        
+        while True:
+            chunk = list(islice(rows, self.COUNT_ITEM_BATCH_SIZE))
+            if not chunk:
+                break
+            
+            CycleCountItem.objects.bulk_create(
+                [
+                    CycleCountItem(
+                        tenant_id=self.tenant_id,
+                        cycle_count=self,
+                        stock_item_id=stock_item_id,
+                        location_id=location_id,
+                        batch_id=batch_id,
+                        system_quantity=quantity_on_hand,
+                        unit_cost=average_cost,
+                    )
+                    for stock_item_id, location_id, batch_id, quantity_on_hand, average_cost in chunk
+                ],
+                batch_size=self.COUNT_ITEM_BATCH_SIZE,
+                ignore_conflicts=True
             )
-            if created:
-                count_items_created += 1
         
-        self.total_items_to_count = count_items_created
+        self.total_items_to_count = self.items.count()
         self.save(update_fields=['total_items_to_count'])
         
+        count_items_created = self.total_items_to_count - existing_items
         return True, f"Generated {count_items_created} count items"
     
     def start_count(self, user):
@@ -344,20 +369,21 @@ class CycleCount(TenantBaseModel, AuditableMixin):
     
     def calculate_summary_stats(self):
         """Calculate summary statistics from count items"""
-        items = self.items.all()
+        stats = self.items.aggregate(
+            items_counted=Count('id', filter=Q(counted_quantity__isnull=False)),
+            items_with_variance=Count('id', filter=~Q(variance_quantity=0)),
+            items_requiring_recount=Count('id', filter=Q(recount_required=True)),
+            positive_variance=Sum('variance_value', filter=Q(variance_value__gt=0)),
+            negative_variance=Sum('variance_value', filter=Q(variance_value__lt=0)),
+        )
         
-        self.items_counted = items.filter(counted_quantity__isnull=False).count()
-        self.items_with_variance = items.filter(variance_quantity__ne=0).count()
-        self.items_requiring_recount = items.filter(recount_required=True).count()
+        self.items_counted = stats['items_counted']
+        self.items_with_variance = stats['items_with_variance']
+        self.items_requiring_recount = stats['items_requiring_recount']
         
         # Calculate variance values
-        positive_variance = items.filter(variance_value__gt=0).aggregate(
-            total=models.Sum('variance_value')
-        )['total'] or Decimal('0')
-        
-        negative_variance = items.filter(variance_value__lt=0).aggregate(
-            total=models.Sum('variance_value')
-        )['total'] or Decimal('0')
+        positive_variance = stats['positive_variance'] or Decimal('0')
+        negative_variance = stats['negative_variance'] or Decimal('0')
         
         self.positive_variance_value = positive_variance
         self.negative_variance_value = abs(negative_variance)
@@ -367,9 +393,105 @@ class CycleCount(TenantBaseModel, AuditableMixin):
         if self.items_counted > 0:
             accurate_items = self.items_counted - self.items_with_variance
             self.count_accuracy_percentage = (
-                accurate_items / self.items_counted * 100
+                Decimal(accurate_items) / self.items_counted * 100
             ).quantize(Decimal('0.01'))
     
+    @transaction.atomic
+    def record_counts(self, counts, user, count_method='MANUAL'):
+        """
+        Record physical counts for many items at once.
+        
+        ``counts`` maps count item ids to counted quantities. Counts are
+        written with one bulk update and variances are then calculated
+        set-based, with the same results as CycleCountItem.record_count.
+        """
+        items = self.items.filter(id__in=list(counts))
+        if not self.allow_multiple_counts:
+            items = items.filter(counted_quantity__isnull=True)
+        items = list(items)
+        
+        now = timezone.now()
+        for item in items:
+            item.counted_quantity = Decimal(str(counts[item.id]))
+            item.counted_by = user
+            item.counted_at = now
+            item.count_method = count_method
+        
+        CycleCountItem.objects.bulk_update(
+            items,
+            ['counted_quantity', 'counted_by', 'counted_at', 'count_method'],
+            batch_size=self.COUNT_ITEM_BATCH_SIZE
+        )
+        
+        item_ids = [item.id for item in items]
+        self.calculate_variances(item_ids)
+        
+        return True, f"Recorded {len(item_ids)} counts"
+    
+    def calculate_variances(self, item_ids=None):
+        """
+        Set-based equivalent of CycleCountItem.calculate_variance for the
+        counted items of this count (or only ``item_ids``).
+        """
+        items = self.items.filter(counted_quantity__isnull=False)
+        if item_ids is not None:
+            items = items.filter(id__in=item_ids)
+        
+        variance = F('counted_quantity') - F('system_quantity')
+        items.update(
+            variance_quantity=variance,
+            variance_percentage=Case(
+                When(system_quantity=0, counted_quantity__gt=0, then=Value(Decimal('100'))),
+                When(system_quantity=0, then=Value(Decimal('0'))),
+                default=Round(variance * 100 / F('system_quantity'), 3),
+                output_field=models.DecimalField(max_digits=8, decimal_places=3)
+            ),
+            variance_value=variance * F('unit_cost')
+        )
+        
+        # Status from the stored variances, as calculate_variance does
+        tolerance_pct = self.variance_tolerance_percentage
+        tolerance_amt = self.variance_tolerance_amount
+        items.update(
+            variance_status=Case(
+                When(variance_quantity=0, then=Value('NO_VARIANCE')),
+                When(
+                    variance_percentage__range=(-tolerance_pct, tolerance_pct),
+                    variance_value__range=(-tolerance_amt, tolerance_amt),
+                    then=Value('MINOR_VARIANCE')
+                ),
+                When(
+                    variance_percentage__range=(-tolerance_pct * 2, tolerance_pct * 2),
+                    variance_value__range=(-tolerance_amt * 2, tolerance_amt * 2),
+                    then=Value('MAJOR_VARIANCE')
+                ),
+                default=Value('CRITICAL_VARIANCE'),
+                output_field=models.CharField()
+            )
+        )
+        
+        # Recount flags are only ever raised here, never cleared
+        recount = Q(variance_status__in=['MAJOR_VARIANCE', 'CRITICAL_VARIANCE'])
+        if self.require_recount:
+            recount |= ~Q(variance_status='NO_VARIANCE')
+        items.filter(recount).update(recount_required=True)
+    
+    def approve_variances(self, user, reason='', corrective_action='', item_ids=None):
+        """Approve all variances of this count (or only ``item_ids``) for adjustment"""
+        items = self.items.exclude(variance_status='NO_VARIANCE')
+        if item_ids is not None:
+            items = items.filter(id__in=item_ids)
+        
+        approved = items.update(
+            adjustment_approved=True,
+            approved_by=user,
+            approved_at=timezone.now(),
+            variance_reason=reason,
+            corrective_action=corrective_action
+        )
+        
+        return True, f"{approved} variances approved for adjustment"
+    
     def generate_preliminary_report(self):
         """Generate preliminary count report"""
         if self.preliminary_report_generated:
@@ -399,15 +521,17 @@ class CycleCount(TenantBaseModel, AuditableMixin):
         
         return True, "Cycle count results approved"
     
+    @transaction.atomic
     def generate_adjustments(self, user):
         """Generate stock adjustments for variances"""
         from .adjustments import StockAdjustment, StockAdjustmentItem
         
         # Get items with variances that need adjustment
         variance_items = self.items.filter(
-            variance_quantity__ne=0,
             adjustment_approved=True
-        )
+        ).exclude(
+            variance_quantity=0
+        ).select_related('stock_item__product').order_by('id')
         
         if not variance_items.exists():
             return False, "No variance items found for adjustment"
@@ -422,20 +546,31 @@ class CycleCount(TenantBaseModel, AuditableMixin):
             created_by=user
         )
         
-        # Create adjustment items
-        for count_item in variance_items:
-            StockAdjustmentItem.objects.create(
-                tenant_id=self.tenant_id,
-                adjustment=adjustment,
-                stock_item=count_item.stock_item,
-                location=count_item.location,
-                batch=count_item.batch,
-                quantity_before=count_item.system_quantity,
-                quantity_adjustment=count_item.variance_quantity,
-                unit_cost_before=count_item.unit_cost,
-                unit_cost_after=count_item.unit_cost,
-                reason=f"Cycle count variance - {count_item.variance_reason or 'No reason specified'}"
-            )
+        # Create adjustment items; bulk_create skips save(), so the values
+        # it derives (line number, quantity after, value impact) are set here
+        StockAdjustmentItem.objects.bulk_create(
+            [
+                StockAdjustmentItem(
+                    tenant_id=self.tenant_id,
+                    adjustment=adjustment,
+                    line_number=line_number,
+                    stock_item=count_item.stock_item,
+                    location_id=count_item.location_id,
+                    batch_id=count_item.batch_id,
+                    quantity_before=count_item.system_quantity,
+                    quantity_adjustment=count_item.variance_quantity,
+                    quantity_after=count_item.system_quantity + count_item.variance_quantity,
+                    unit_cost_before=count_item.unit_cost,
+                    unit_cost_after=count_item.unit_cost,
+                    value_impact=count_item.variance_quantity * count_item.unit_cost,
+                    unit_id=count_item.stock_item.product.unit_id,
+                    reason=f"Cycle count variance - {count_item.variance_reason or 'No reason specified'}"
+                )
+                for line_number, count_item in enumerate(variance_items, start=1)
+            ],
+            batch_size=self.COUNT_ITEM_BATCH_SIZE
+        )
+        adjustment.calculate_totals()
         
         # Auto-approve and post if within tolerance
         if self._all_variances_within_tolerance(variance_items):
@@ -445,10 +580,12 @@ class CycleCount(TenantBaseModel, AuditableMixin):
     
     def _all_variances_within_tolerance(self, variance_items):
         """Check if all variances are within tolerance"""
-        for item in variance_items:
-            if not item.is_within_tolerance(self.variance_tolerance_percentage, self.variance_tolerance_amount):
-                return False
-        return True
+        tolerance_pct = self.variance_tolerance_percentage
+        tolerance_amt = self.variance_tolerance_amount
+        return not variance_items.exclude(
+            variance_percentage__range=(-tolerance_pct, tolerance_pct),
+            variance_value__range=(-tolerance_amt, tolerance_amt)
+        ).exists()
     
     @property
     def completion_percentage(self):
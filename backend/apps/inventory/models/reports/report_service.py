@@ -4,8 +4,12 @@ import json
 import hashlib
 from decimal import Decimal
 from datetime import datetime, timedelta
+from itertools import chain
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
-from django.db.models import Q, F, Sum, Count, Avg, Max, Min
+from django.db.models import Q, F, Sum, Count, Avg, Max, Min, Case, When, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.template.loader import render_to_string
 from django.http import HttpResponse
@@ -30,11 +34,73 @@ except ImportError:
 
 try:
     from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, PatternFill
     OPENPYXL_AVAILABLE = True
 except ImportError:
     OPENPYXL_AVAILABLE = False
 
+# Rows fetched per database round trip, and between progress updates
+REPORT_CHUNK_SIZE = 2000
+
+# Rows per PDF table flowable; reportlab lays out small tables much faster
+PDF_TABLE_ROWS = 500
+
+PROGRESS_TTL = 24 * 3600
+
+
+def _progress_key(report_id):
+    return f"inventory:report_progress:{report_id}"
+
+
+class ReportRows:
+    """
+    Rows of a report, produced lazily by a data source and counted as the
+    writer consumes them.
+    
+    ``total`` is the expected number of rows (None if unknown). Once bound to
+    a report, the count is published every REPORT_CHUNK_SIZE rows for
+    ``ReportService._calculate_progress``.
+    """
+    
+    def __init__(self, rows, total=None):
+        self._rows = iter(rows)
+        self._peeked = []
+        self.total = total
+        self.count = 0
+        self._report_id = None
+    
+    def bind(self, report):
+        self._report_id = report.id
+        self._publish_progress()
+    
+    def columns(self) -> List[str]:
+        """Column names, from the first row (which is kept for iteration)"""
+        if not self._peeked:
+            first = next(self._rows, None)
+            if first is None:
+                return []
+            self._peeked.append(first)
+        return list(self._peeked[0].keys())
+    
+    def __iter__(self):
+        for row in chain(self._peeked, self._rows):
+            self.count += 1
+            if self.count % REPORT_CHUNK_SIZE == 0:
+                self._publish_progress()
+            yield row
+        self._peeked = []
+        self._publish_progress()
+    
+    def _publish_progress(self):
+        if self._report_id is not None:
+            cache.set(
+                _progress_key(self._report_id),
+                {'rows': self.count, 'total': self.total},
+                PROGRESS_TTL
+            )
+
+
 class ReportService(BaseService):
     """
     Service for generating inventory reports
@@ -67,10 +133,15 @@ class ReportService(BaseService):
                     report.mark_failed(data_result.message)
                     return data_result
                 
+                # Rows are streamed from the database into the file writer
+                rows = data_result.data['data']
+                rows.bind(report)
+                
                 # Generate file based on output format
                 file_result = self._generate_report_file(
                     report, data_result.data, output_format
                 )
+                cache.delete(_progress_key(report.id))
                 
                 if file_result.is_success:
                     # Mark report as completed
@@ -78,7 +149,7 @@ class ReportService(BaseService):
                     report.mark_completed(
                         file_path=file_info['file_path'],
                         file_size=file_info['file_size'],
-                        total_records=len(data_result.data.get('data', [])),
+                        total_records=rows.count,
                         file_hash=file_info.get('file_hash')
                     )
                     
@@ -139,7 +210,7 @@ class ReportService(BaseService):
                 return ServiceResult.error(f"Unsupported report type: {template.report_type}")
                 
         except Exception as e:
-            (e)}")
+            return ServiceResult.error(f"Failed to get report data: {str(e)}")
     
     def _get_stock_summary_data(self, filters: Dict[str, Any]) -> ServiceResult:
         """Get stock summary report data"""
@@ -178,7 +249,10 @@ class ReportService(BaseService):
             )
             
             return ServiceResult.success(data={
-                'data': list(stock_data),
+                'data': ReportRows(
+                    stock_data.order_by('id').iterator(chunk_size=REPORT_CHUNK_SIZE),
+                    totals['total_items']
+                ),
                 'totals': totals,
                 'filters_applied': filters
             })
@@ -230,13 +304,17 @@ class ReportService(BaseService):
             )
             
             return ServiceResult.success(data={
-                'data': list(valuation_data),
+                'data': ReportRows(
+                    valuation_data.order_by('id').iterator(chunk_size=REPORT_CHUNK_SIZE),
+                    overall_totals['total_items']
+                ),
                 'category_totals': list(category_totals),
                 'overall_totals': overall_totals,
                 'filters_applied': filters
             })
             
-        except Exception as e: {str(e)}")
+        except Exception as e:
+            return ServiceResult.error(f"Failed to get stock valuation data: {str(e)}")
     
     def _get_movement_history_data(self, filters: Dict[str, Any]) -> ServiceResult:
         """Get stock movement history data"""
@@ -257,36 +335,40 @@ class ReportService(BaseService):
                 queryset = queryset.filter(movement_type__in=filters['movement_types'])
             
             # Get movement data
-            movement_data = queryset.select_related(
-                'warehouse', 'created_by'
-            ).prefetch_related(
-                'items__stock_item__product'
-            ).values(
+            movement_data = queryset.values(
                 'id', 'movement_type', 'reference_number', 'warehouse__name',
                 'created_at', 'created_by__username', 'notes', 'status'
-            )
+            ).order_by('id')
             
-            # Get detailed items for each movement
-            detailed_data = []
-            for movement in queryset:
-                for item in movement.items.all():
-                    detailed_data.append({
-                        'movement_date': movement.created_at,
-                        'movement_type': movement.get_movement_type_display(),
-                        'reference_number': movement.reference_number,
-                        'product_name': item.stock_item.product.name,
-                        'product_sku': item.stock_item.product.sku,
-                        'warehouse': movement.warehouse.name,
-                        'quantity': item.quantity,
-                        'unit_cost': item.unit_cost,
-                        'total_value': item.quantity * item.unit_cost,
-                        'created_by': movement.created_by.username if movement.created_by else '',
-                        'notes': item.notes or movement.notes
-                    })
+            # Items are prefetched per chunk of movements
+            movements = queryset.select_related(
+                'warehouse', 'created_by'
+            ).prefetch_related(
+                'items__stock_item__product'
+            ).order_by('id')
+            
+            def detailed_data():
+                for movement in movements.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                    for item in movement.items.all():
+                        yield {
+                            'movement_date': movement.created_at,
+                            'movement_type': movement.get_movement_type_display(),
+                            'reference_number': movement.reference_number,
+                            'product_name': item.stock_item.product.name,
+                            'product_sku': item.stock_item.product.sku,
+                            'warehouse': movement.warehouse.name,
+                            'quantity': item.quantity,
+                            'unit_cost': item.unit_cost,
+                            'total_value': item.quantity * item.unit_cost,
+                            'created_by': movement.created_by.username if movement.created_by else '',
+                            'notes': item.notes or movement.notes
+                        }
+            
+            total_items = queryset.aggregate(total=Count('items'))['total']
             
             return ServiceResult.success(data={
-                'data': detailed_data,
-                'summary': list(movement_data),
+                'data': ReportRows(detailed_data(), total_items),
+                'summary': movement_data.iterator(chunk_size=REPORT_CHUNK_SIZE),
                 'filters_applied': filters
             })
             
@@ -321,7 +403,10 @@ class ReportService(BaseService):
             ).order_by('abc_classification')
             
             return ServiceResult.success(data={
-                'data': list(abc_data),
+                'data': ReportRows(
+                    abc_data.iterator(chunk_size=REPORT_CHUNK_SIZE),
+                    sum(group['item_count'] for group in abc_totals)
+                ),
                 'abc_totals': list(abc_totals),
                 'filters_applied': filters
             })
@@ -344,7 +429,7 @@ class ReportService(BaseService):
             )
             
             return ServiceResult.success(data={
-                'data': list(aging_data),
+                'data': ReportRows(aging_data),
                 'filters_applied': filters
             })
             
@@ -375,29 +460,35 @@ class ReportService(BaseService):
                 suggested_quantity=F('maximum_stock_level') - F('quantity_on_hand')
             )
             
-            detailed_data = []
-            for stock
-                primary_supplier = stock_item.product.productsupplier_set.filter(
-                    is_primary=True
-                ).first()
-                
-                detailed_data.append({
-                    'product_name': stock_item.product.name,
-                    'product_sku': stock_item.product.sku,
-                    'warehouse': stock_item.warehouse.name,
-                    'current_stock': stock_item.quantity_on_hand,
-                    'reorder_level': stock_item.reorder_level,
-                    'maximum_level': stock_item.maximum_stock_level,
-                    'suggested_quantity': max(0, stock_item.maximum_stock_level - stock_item.quantity_on_hand),
-                    'primary_supplier': primary_supplier.supplier.name if primary_supplier else 'N/A',
-                    'supplier_cost': primary_supplier.supplier_cost if primary_supplier else 0,
-                    'estimated_cost': (stock_item.maximum_stock_level - stock_item.quantity_on_hand) * 
-                                    (primary_supplier.supplier_cost if primary_supplier else 0),
-                    'lead_time_days': primary_supplier.lead_time_days if primary_supplier else 0
-                })
+            def detailed_data():
+                for stock_item in reorder_data.order_by('id').iterator(chunk_size=REPORT_CHUNK_SIZE):
+                    # Pick the primary supplier from the prefetched rows
+                    primary_supplier = next(
+                        (
+                            product_supplier
+                            for product_supplier in stock_item.product.productsupplier_set.all()
+                            if product_supplier.is_primary
+                        ),
+                        None
+                    )
+                    
+                    yield {
+                        'product_name': stock_item.product.name,
+                        'product_sku': stock_item.product.sku,
+                        'warehouse': stock_item.warehouse.name,
+                        'current_stock': stock_item.quantity_on_hand,
+                        'reorder_level': stock_item.reorder_level,
+                        'maximum_level': stock_item.maximum_stock_level,
+                        'suggested_quantity': max(0, stock_item.maximum_stock_level - stock_item.quantity_on_hand),
+                        'primary_supplier': primary_supplier.supplier.name if primary_supplier else 'N/A',
+                        'supplier_cost': primary_supplier.supplier_cost if primary_supplier else 0,
+                        'estimated_cost': (stock_item.maximum_stock_level - stock_item.quantity_on_hand) * 
+                                        (primary_supplier.supplier_cost if primary_supplier else 0),
+                        'lead_time_days': primary_supplier.lead_time_days if primary_supplier else 0
+                    }
             
             return ServiceResult.success(data={
-                'data': detailed_data,
+                'data': ReportRows(detailed_data(), queryset.count()),
                 'filters_applied': filters
             })
             
@@ -438,7 +529,10 @@ class ReportService(BaseService):
             ).order_by('-stock_value')
             
             return ServiceResult.success(data={
-                'data': list(dead_stock_data),
+                'data': ReportRows(
+                    dead_stock_data.iterator(chunk_size=REPORT_CHUNK_SIZE),
+                    queryset.count()
+                ),
                 'filters_applied': filters
             })
             
@@ -485,7 +579,10 @@ class ReportService(BaseService):
             ).order_by('-velocity_ratio')
             
             return ServiceResult.success(data={
-                'data': list(movement_data),
+                'data': ReportRows(
+                    movement_data.iterator(chunk_size=REPORT_CHUNK_SIZE),
+                    queryset.count()
+                ),
                 'filters_applied': filters
             })
             
@@ -507,7 +604,7 @@ class ReportService(BaseService):
             )
             
             return ServiceResult.success(data={
-                'data': list(supplier_data),
+                'data': ReportRows(supplier_data),
                 'filters_applied': filters
             })
             
@@ -552,7 +649,10 @@ class ReportService(BaseService):
             ).order_by('month')
             
             return ServiceResult.success(data={
-                'data': list(purchase_data),
+                'data': ReportRows(
+                    purchase_data.order_by('id').iterator(chunk_size=REPORT_CHUNK_SIZE),
+                    queryset.count()
+                ),
                 'supplier_summary': list(supplier_summary),
                 'monthly_trends': list(monthly_trends),
                 'filters_applied': filters
@@ -581,7 +681,7 @@ class ReportService(BaseService):
         except Exception as e:
             return ServiceResult.error(f"Failed to generate {output_format} file: {str(e)}")
     
-    def _generate_pdf_report(self, report: str, Any]) -> ServiceResult:
+    def _generate_pdf_report(self, report: InventoryReport, data: Dict[str, Any]) -> ServiceResult:
         """Generate PDF report"""
         if not REPORTLAB_AVAILABLE:
             return ServiceResult.error("PDF generation not available - install reportlab")
@@ -611,20 +711,11 @@ class ReportService(BaseService):
             story.append(info)
             story.append(Paragraph("<br/><br/>", styles['Normal']))
             
-            # Data table
-            if data.get('data'):
-                table_data = []
-                # Headers
-                headers = list(data['data'][0].keys()) if data['data'] else []
-                table_data.append(headers)
-                
-                # Data rows
-                for row in data['data'][:100]:  # Limit to 100 rows for PDF
-                    table_data.append([str(row.get(h, '')) for h in headers])
-                
-                # Create table
-                table = Table(table_data)
-                table.setStyle(TableStyle([
+            # Data table, split into tables of PDF_TABLE_ROWS rows each
+            rows = data['data']
+            headers = rows.columns()
+            if headers:
+                table_style = TableStyle([
                     ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
                     ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                     ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -633,8 +724,17 @@ class ReportService(BaseService):
                     ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
                     ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
                     ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(table)
+                ])
+                
+                table_rows = []
+                for row in rows:
+                    table_rows.append([str(row.get(h, '')) for h in headers])
+                    if len(table_rows) == PDF_TABLE_ROWS:
+                        story.append(self._pdf_table(headers, table_rows, table_style))
+                        table_rows = []
+                
+                if table_rows:
+                    story.append(self._pdf_table(headers, table_rows, table_style))
             
             # Build PDF
             doc.build(story)
@@ -652,7 +752,13 @@ class ReportService(BaseService):
         except Exception as e:
             return ServiceResult.error(f"Failed to generate PDF: {str(e)}")
     
-    def _generate_[str, Any]) -> ServiceResult:
+    def _pdf_table(self, headers: List[str], table_rows: List[List[str]], table_style) -> 'Table':
+        """One table flowable of report rows, headed by the column names"""
+        table = Table([headers] + table_rows, repeatRows=1)
+        table.setStyle(table_style)
+        return table
+    
+    def _generate_excel_report(self, report: InventoryReport, data: Dict[str, Any]) -> ServiceResult:
         """Generate Excel report"""
         if not OPENPYXL_AVAILABLE:
             return ServiceResult.error("Excel generation not available - install openpyxl")
@@ -666,28 +772,29 @@ class ReportService(BaseService):
             import os
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
             
-            # Create workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Report Data"
+            # Write-only workbook: rows are streamed to disk as they are appended
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Report Data")
             
             # Add headers
-            if data.get('data'):
-                headers = list(data['data'][0].keys()) if data['data'] else []
-                
+            rows = data['data']
+            headers = rows.columns()
+            if headers:
                 # Style headers
                 header_font = Font(bold=True)
                 header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
                 
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col, value=header)
+                header_cells = []
+                for header in headers:
+                    cell = WriteOnlyCell(ws, value=header)
                     cell.font = header_font
                     cell.fill = header_fill
+                    header_cells.append(cell)
+                ws.append(header_cells)
                 
                 # Add data
-                for row_idx, row_data in enumerate(data['data'], 2):
-                    for col_idx, header in enumerate(headers, 1):
-                        ws.cell(row=row_idx, column=col_idx, value=row_data.get(header))
+                for row_data in rows:
+                    ws.append([row_data.get(header) for header in headers])
             
             # Save workbook
             wb.save(full_path)
@@ -705,7 +812,8 @@ class ReportService(BaseService):
         except Exception as e:
             return ServiceResult.error(f"Failed to generate Excel: {str(e)}")
     
-    def _generate_csv_report(self, report: InventoryReport, CSV report"""
+    def _generate_csv_report(self, report: InventoryReport, data: Dict[str, Any]) -> ServiceResult:
+        """Generate CSV report"""
         try:
             # Create file path
             file_path = f"reports/{report.id}_{report.template.name.lower().replace(' ', '_')}.csv"
@@ -715,14 +823,15 @@ class ReportService(BaseService):
             import os
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
             
-            # Write CSV
+            # Write CSV row by row
             with open(full_path, 'w', newline='', encoding='utf-8') as csvfile:
-                if data.get('data'):
-                    fieldnames = list(data['data'][0].keys()) if data['data'] else []
+                rows = data['data']
+                fieldnames = rows.columns()
+                if fieldnames:
                     writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                     
                     writer.writeheader()
-                    for row in data['data']:
+                    for row in rows:
                         writer.writerow(row)
             
             # Get file info
@@ -749,22 +858,28 @@ class ReportService(BaseService):
             import os
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
             
-            # Prepare JSON data
-            json_data = {
-                'report_info': {
-                    'name': report.template.name,
-                    'generated_at': timezone.now().isoformat(),
-                    'generated_by': report.created_by.username if report.created_by else 'System',
-                    'filters_applied': report.filters_applied
-                },
-                'data': data['data'],
-                'totals': data.get('totals', {}),
-                'summary': data.get('summary', {})
+            report_info = {
+                'name': report.template.name,
+                'generated_at': timezone.now().isoformat(),
+                'generated_by': report.created_by.username if report.created_by else 'System',
+                'filters_applied': report.filters_applied
             }
             
-            # Write JSON
+            # Write JSON incrementally; rows are written one per line as produced
             with open(full_path, 'w', encoding='utf-8') as jsonfile:
-                json.dump(json_data, jsonfile, indent=2, default=str)
+                jsonfile.write('{\n  "report_info": ')
+                jsonfile.write(json.dumps(report_info, default=str))
+                jsonfile.write(',\n  "data": ')
+                self._write_json_rows(jsonfile, data['data'])
+                jsonfile.write(',\n  "totals": ')
+                jsonfile.write(json.dumps(data.get('totals', {}), default=str))
+                jsonfile.write(',\n  "summary": ')
+                summary = data.get('summary', {})
+                if isinstance(summary, dict):
+                    jsonfile.write(json.dumps(summary, default=str))
+                else:
+                    self._write_json_rows(jsonfile, summary)
+                jsonfile.write('\n}\n')
             
             # Get file info
             file_size = os.path.getsize(full_path)
@@ -779,6 +894,16 @@ class ReportService(BaseService):
         except Exception as e:
             return ServiceResult.error(f"Failed to generate JSON: {str(e)}")
     
+    def _write_json_rows(self, jsonfile, rows):
+        """Write an iterable of rows as a JSON array without materialising it"""
+        jsonfile.write('[')
+        separator = '\n    '
+        for row in rows:
+            jsonfile.write(separator)
+            jsonfile.write(json.dumps(row, default=str))
+            separator = ',\n    '
+        jsonfile.write('\n  ]' if separator != '\n    ' else ']')
+    
     def _calculate_file_hash(self, file_path: str) -> str:
         """Calculate SHA256 hash of file"""
         hash_sha256 = hashlib.sha256()
@@ -811,6 +936,11 @@ class ReportService(BaseService):
         if report.status == 'PENDING':
             return 0
         elif report.status == 'GENERATING':
+            # Rows written so far against the expected row count
+            progress = cache.get(_progress_key(report.id))
+            if progress and progress.get('total'):
+                return max(10, min(99, int(progress['rows'] / progress['total'] * 100)))
+            
             # Estimate based on time elapsed
             if report.generation_started_at:
                 elapsed = (timezone.now() - report.generation_started_at).total_seconds()
@@ -0,0 +1,260 @@
+"""
+Batch allocation of stock reservation lines
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+
+class BatchReservationAllocator:
+    """
+    Allocates many reservation lines against one locked availability snapshot.
+    
+    All stock items that can serve the lines are loaded in a single
+    SELECT ... FOR UPDATE (in primary key order, so concurrent batches lock
+    in the same order). Lines are then allocated in memory, in the order
+    given, with the same candidate filters and fulfillment strategy ordering
+    as ``StockReservationItem.allocate_stock``; stock consumed by a line is
+    no longer available to the lines after it. The result is the same as
+    allocating the lines one by one, but allocations, RESERVE movements,
+    stock quantities and line quantities are written in bulk.
+    """
+    
+    def __init__(self, tenant_id, user=None):
+        self.tenant_id = tenant_id
+        self.user = user
+    
+    @transaction.atomic
+    def allocate(self, items):
+        """
+        Allocate ``items`` (StockReservationItem instances or a queryset).
+        
+        Returns ``{item_id: (success, message)}`` in allocation order, with
+        the same messages as ``StockReservationItem.allocate_stock``.
+        """
+        items = list(items)
+        if not items:
+            return {}
+        
+        snapshot = self._load_snapshot(items)
+        available = {
+            stock_item.id: stock_item.quantity_available
+            for stock_items in snapshot.values()
+            for stock_item in stock_items
+        }
+        today = timezone.now().date()
+        
+        results = {}
+        allocations = []
+        reserved = defaultdict(Decimal)
+        
+        for item in items:
+            if item.status not in ['REQUESTED', 'BACKORDERED']:
+                results[item.id] = (False, f"Cannot allocate stock for item with status {item.status}")
+                continue
+            
+            candidates = [
+                stock_item
+                for stock_item in snapshot.get((item.product_id, item.variation_id), [])
+                if available[stock_item.id] > 0 and self._matches(item, stock_item, today)
+            ]
+            
+            if not candidates:
+                item.status = 'BACKORDERED'
+                item.quantity_backordered = item.quantity_requested - item.quantity_allocated
+                results[item.id] = (False, "No available stock found")
+                continue
+            
+            allocated_quantity = Decimal('0')
+            remaining_quantity = item.quantity_requested - item.quantity_allocated
+            
+            for stock_item in self._order_candidates(candidates, item.reservation.fulfillment_strategy):
+                if remaining_quantity <= 0:
+                    break
+                
+                qty_to_allocate = min(remaining_quantity, available[stock_item.id])
+                available[stock_item.id] -= qty_to_allocate
+                reserved[stock_item.id] += qty_to_allocate
+                
+                allocations.append((item, stock_item, qty_to_allocate))
+                allocated_quantity += qty_to_allocate
+                remaining_quantity -= qty_to_allocate
+            
+            item.quantity_allocated += allocated_quantity
+            item.reserved_value = item.quantity_allocated * item.estimated_unit_cost
+            
+            if item.quantity_allocated >= item.quantity_requested:
+                item.status = 'ALLOCATED'
+                item.allocated_at = timezone.now()
+            elif item.quantity_allocated > 0:
+                item.status = 'RESERVED'
+                item.quantity_backordered = item.quantity_requested - item.quantity_allocated
+            else:
+                item.status = 'BACKORDERED'
+                item.quantity_backordered = item.quantity_requested
+            
+            results[item.id] = (True, f"Allocated {allocated_quantity} units")
+        
+        stock_items = {
+            stock_item.id: stock_item
+            for stock_items in snapshot.values()
+            for stock_item in stock_items
+        }
+        self._persist(items, allocations, reserved, stock_items)
+        
+        return results
+    
+    def _load_snapshot(self, items):
+        """Lock the stock items the lines may draw from, grouped by (product, variation)."""
+        from ..stock.items import StockItem
+        
+        warehouses_by_product = defaultdict(set)
+        for item in items:
+            warehouse_id = item.preferred_warehouse_id or item.reservation.warehouse_id
+            warehouses_by_product[item.product_id].add(warehouse_id)
+        
+        scope = Q()
+        for product_id, warehouse_ids in warehouses_by_product.items():
+            if None in warehouse_ids:
+                scope |= Q(product_id=product_id)
+            else:
+                scope |= Q(product_id=product_id, warehouse_id__in=warehouse_ids)
+        
+        stock_items = StockItem.objects.select_for_update(of=('self',)).filter(
+            scope,
+            tenant_id=self.tenant_id,
+            is_active=True,
+            quantity_available__gt=0
+        ).select_related('batch').order_by('pk')
+        
+        snapshot = defaultdict(list)
+        for stock_item in stock_items:
+            snapshot[(stock_item.product_id, stock_item.variation_id)].append(stock_item)
+        
+        return snapshot
+    
+    def _matches(self, item, stock_item, today):
+        """In-memory equivalent of the filters in StockReservationItem._find_available_stock"""
+        if item.preferred_warehouse_id:
+            if stock_item.warehouse_id != item.preferred_warehouse_id:
+                return False
+        elif item.reservation.warehouse_id:
+            if stock_item.warehouse_id != item.reservation.warehouse_id:
+                return False
+        
+        if item.preferred_location_id and stock_item.location_id != item.preferred_location_id:
+            return False
+        
+        if item.preferred_batch_id and stock_item.batch_id != item.preferred_batch_id:
+            return False
+        
+        batch = stock_item.batch
+        
+        if item.quality_grade_required:
+            if batch is None or batch.quality_grade != item.quality_grade_required:
+                return False
+        
+        if item.min_expiry_days:
+            min_expiry_date = today + timedelta(days=item.min_expiry_days)
+            if batch is not None and batch.expiry_date is not None and batch.expiry_date < min_expiry_date:
+                return False
+        
+        return True
+    
+    def _order_candidates(self, candidates, strategy):
+        """
+        Order candidates like the database does for the strategy's ORDER BY
+        (ties by primary key; NULLs last ascending and first descending).
+        """
+        # Candidates arrive in primary key order and sorting is stable
+        if strategy == 'FIFO':
+            return sorted(candidates, key=lambda stock_item: stock_item.created_at)
+        elif strategy == 'LIFO':
+            return sorted(candidates, key=lambda stock_item: stock_item.created_at, reverse=True)
+        elif strategy == 'FEFO':
+            def expiry(stock_item):
+                expiry_date = stock_item.batch.expiry_date if stock_item.batch else None
+                return (expiry_date is None, expiry_date or date.min)
+            return sorted(candidates, key=expiry)
+        elif strategy == 'CHEAPEST':
+            return sorted(candidates, key=lambda stock_item: stock_item.average_cost)
+        elif strategy == 'HIGHEST_QUALITY':
+            def grade(stock_item):
+                quality_grade = stock_item.batch.quality_grade if stock_item.batch else None
+                return (quality_grade is None, quality_grade or '')
+            return sorted(candidates, key=grade, reverse=True)
+        
+        return candidates
+    
+    def _persist(self, items, allocations, reserved, stock_items):
+        """Write allocations, RESERVE movements, stock and line quantities in bulk"""
+        from ..stock.items import StockItem
+        from ..stock.movements import StockMovement
+        from .reservations import StockReservationItem, ReservationAllocation
+        
+        now = timezone.now()
+        
+        ReservationAllocation.objects.bulk_create([
+            ReservationAllocation(
+                tenant_id=self.tenant_id,
+                reservation_item=item,
+                stock_item=stock_item,
+                quantity_allocated=quantity,
+                quantity_remaining=quantity,
+                unit_cost=stock_item.average_cost,
+                total_cost=quantity * stock_item.average_cost,
+                allocated_by=self.user,
+                allocated_at=now
+            )
+            for item, stock_item, quantity in allocations
+        ])
+        
+        movements = []
+        for item, stock_item, quantity in allocations:
+            reason = f"Reservation: {item.reservation.reservation_number}"
+            movements.append(StockMovement(
+                tenant_id=self.tenant_id,
+                stock_item=stock_item,
+                movement_type='RESERVE',
+                quantity=quantity,
+                unit_cost=stock_item.average_cost,
+                total_cost=quantity * stock_item.average_cost,
+                reason=reason,
+                stock_before=stock_item.quantity_on_hand,
+                stock_after=stock_item.quantity_on_hand,
+                reference_id=str(item.reservation_id),
+                notes=reason,
+                movement_date=now,
+                actual_date=now
+            ))
+        StockMovement.assign_movement_numbers(movements)
+        StockMovement.objects.bulk_create(movements)
+        
+        # The rows are locked, so the new quantities can be written directly
+        touched = []
+        for stock_item_id, quantity in reserved.items():
+            stock_item = stock_items[stock_item_id]
+            stock_item.quantity_reserved += quantity
+            stock_item.quantity_available -= quantity
+            touched.append(stock_item)
+        StockItem.objects.bulk_update(touched, ['quantity_reserved', 'quantity_available'])
+        
+        StockReservationItem.objects.bulk_update(items, [
+            'quantity_allocated', 'reserved_value', 'status',
+            'allocated_at', 'quantity_backordered'
+        ])
+        
+        # Stock sync and alert receivers run once per stock item and movement
+        for stock_item in touched:
+            post_save.send(sender=StockItem, instance=stock_item, created=False, raw=False,
+                           using=stock_item._state.db,
+                           update_fields=frozenset(['quantity_reserved', 'quantity_available']))
+        
+        for movement in movements:
+            post_save.send(sender=StockMovement, instance=movement, created=True, raw=False,
+                           using=movement._state.db, update_fields=None)
@@ -217,8 +217,14 @@ class StockReservation(TenantBaseModel, AuditableMixin):
         
         allocation_results = []
         
-        for item in self.items.all():
-            success, message = item.allocate_stock(user)
+        items = list(self.items.all())
+        for item in items:
+            item.reservation = self
+        
+        results = StockReservationItem.allocate_batch(items, user)
+        
+        for item in items:
+            success, message = results[item.id]
             if success:
                 allocation_results.append(f"Line {item.line_number}: {message}")
             else:
@@ -545,6 +551,23 @@ class StockReservationItem(TenantBaseModel):
     def __str__(self):
         return f"{self.reservation.reservation_number} Line {self.line_number}: {self.product.name}"
     
+    @classmethod
+    def allocate_batch(cls, items, user=None):
+        """
+        Allocate many reservation lines, possibly from different reservations,
+        against one locked stock snapshot. Lines are allocated in the order
+        given, with the same result as calling allocate_stock on each in turn.
+        
+        Returns ``{item_id: (success, message)}``.
+        """
+        from .allocation import BatchReservationAllocator
+        
+        items = list(items)
+        if not items:
+            return {}
+        
+        return BatchReservationAllocator(items[0].tenant_id, user).allocate(items)
+    
     def allocate_stock(self, user=None):
         """Allocate stock for this reservation item"""
         if self.status not in ['REQUESTED', 'BACKORDERED']:
@@ -722,20 +745,21 @@ class StockReservationItem(TenantBaseModel):
                 models.Q(batch__expiry_date__gte=min_expiry_date)
             )
         
-        # Apply fulfillment strategy ordering
+        # Apply fulfillment strategy ordering (ties broken by primary key so
+        # the order is deterministic and matches BatchReservationAllocator)
         if self.reservation.fulfillment_strategy == 'FIFO':
-            queryset = queryset.order_by('created_at')
+            queryset = queryset.order_by('created_at', 'pk')
         elif self.reservation.fulfillment_strategy == 'LIFO':
-            queryset = queryset.order_by('-created_at')
+            queryset = queryset.order_by('-created_at', 'pk')
         elif self.reservation.fulfillment_strategy == 'FEFO':
-            queryset = queryset.order_by('batch__expiry_date')
+            queryset = queryset.order_by('batch__expiry_date', 'pk')
         elif self.reservation.fulfillment_strategy == 'CHEAPEST':
-            queryset = queryset.order_by('average_cost')
+            queryset = queryset.order_by('average_cost', 'pk')
         elif self.reservation.fulfillment_strategy == 'HIGHEST_QUALITY':
-            queryset = queryset.order_by('-batch__quality_grade')
-        elif self.reservation.fulfillment_strategy == 'NEAREST':
-            # Would need location-based sorting logic
-            pass
+            queryset = queryset.order_by('-batch__quality_grade', 'pk')
+        else:
+            # NEAREST would need location-based sorting logic
+            queryset = queryset.order_by('pk')
         
         # Return list of (stock_item, available_quantity) tuples
         return [(item, item.quantity_available) for item in queryset]
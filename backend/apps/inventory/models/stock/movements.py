@@ -342,6 +342,18 @@ class StockMovement(TenantBaseModel):
         
         return f"MOV-{today}-{next_seq:06d}"
     
+    @classmethod
+    def assign_movement_numbers(cls, movements):
+        """Number unsaved movements of one tenant consecutively (for bulk_create)"""
+        if not movements:
+            return
+        
+        first_number = movements[0].generate_movement_number()
+        prefix, first_sequence = first_number.rsplit('-', 1)
+        
+        for sequence, movement in enumerate(movements, start=int(first_sequence)):
+            movement.movement_number = f"{prefix}-{sequence:06d}"
+    
     def can_be_reversed(self):
         """Check if movement can be reversed"""
         # Business rules for reversal eligibility
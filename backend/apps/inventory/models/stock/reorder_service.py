@@ -1,4 +1,6 @@
 from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from decimal import Decimal
 from typing import List, Dict, Any, Optional
@@ -7,14 +9,148 @@ from ...models import (
     StockItem, Product, ProductSupplier, PurchaseOrder,
     InventoryAlert, AlertRule
 )
+from ...utils.calculations import (
+    SERVICE_LEVEL_Z_FACTORS, calculate_eoq, calculate_reorder_point, calculate_safety_stock
+)
+from ...utils.constants import BUSINESS_RULES, DEFAULT_VALUES
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+CONSUMPTION_MOVEMENT_TYPES = ['ISSUE', 'TRANSFER_OUT', 'PRODUCTION_CONSUMPTION']
+
+# Demand multipliers by calendar month (this could be data-driven)
+SEASONAL_MULTIPLIERS = {
+    1: 0.8,   # January - lower demand
+    2: 0.8,   # February
+    3: 0.9,   # March
+    4: 1.0,   # April
+    5: 1.1,   # May
+    6: 1.2,   # June - higher demand
+    7: 1.3,   # July - peak season
+    8: 1.3,   # August
+    9: 1.2,   # September
+    10: 1.1,  # October
+    11: 1.4,  # November - holiday season
+    12: 1.5,  # December - peak holiday
+}
+
+DEFAULT_REORDER_POINT = Decimal('10')
+ORDERING_COST = Decimal('50')        # Cost per order
+HOLDING_COST_RATE = Decimal('0.25')  # 25% of unit cost per year
+
+
+def _round_half_up(values):
+    # Same rounding as Decimal.quantize(Decimal('1'), ROUND_HALF_UP) for values >= 0
+    return np.floor(values + 0.5)
+
+
+def compute_reorder_parameters(consumed_30, consumed_90, consumed_365, lead_time_days, unit_cost,
+                               seasonal_multiplier=1.0, service_level=0.95,
+                               ordering_cost=ORDERING_COST, holding_cost_rate=HOLDING_COST_RATE):
+    """
+    Vectorised reorder parameters for arrays of stock items.
+
+    Uses the formulas of ``utils.calculations`` (``calculate_safety_stock``,
+    ``calculate_reorder_point``, ``calculate_eoq``) on whole columns:
+
+    - daily usage is the higher of the 30 and 90 day rates, seasonally adjusted
+    - annual demand is the last 365 days, or the 90 day rate extrapolated if
+      that is higher (items with less than a year of history)
+
+    Returns a dict of float arrays: daily_usage, annual_demand, safety_stock,
+    reorder_point and eoq. An EOQ of 0 means it could not be computed.
+    """
+    consumed_30 = np.asarray(consumed_30, dtype=float)
+    consumed_90 = np.asarray(consumed_90, dtype=float)
+    consumed_365 = np.asarray(consumed_365, dtype=float)
+    lead_time = np.asarray(lead_time_days, dtype=float)
+    unit_cost = np.asarray(unit_cost, dtype=float)
+
+    daily_usage = np.maximum(consumed_30 / 30, consumed_90 / 90) * float(seasonal_multiplier)
+    annual_demand = np.maximum(consumed_365, consumed_90 / 90 * 365)
+    has_usage = (daily_usage > 0) & (lead_time > 0)
+
+    # Safety stock = Z * σ * sqrt(L), σ estimated as 20% of average usage
+    z_factor = SERVICE_LEVEL_Z_FACTORS.get(service_level, 1.65)
+    safety_stock = np.where(
+        has_usage,
+        _round_half_up(z_factor * (daily_usage * 0.20) * np.sqrt(np.maximum(lead_time, 0))),
+        0.0
+    )
+
+    # Reorder point = (daily usage x lead time) + safety stock
+    reorder_point = np.where(
+        has_usage,
+        np.maximum(_round_half_up(daily_usage * lead_time + safety_stock), BUSINESS_RULES['MIN_REORDER_LEVEL']),
+        float(DEFAULT_REORDER_POINT)
+    )
+
+    # EOQ = sqrt((2 * D * S) / H)
+    holding_cost = unit_cost * float(holding_cost_rate)
+    can_order = (annual_demand > 0) & (holding_cost > 0) & (float(ordering_cost) > 0)
+    eoq = np.where(
+        can_order,
+        _round_half_up(np.sqrt(2 * annual_demand * float(ordering_cost) / np.where(can_order, holding_cost, 1.0))),
+        0.0
+    )
+
+    return {
+        'daily_usage': daily_usage,
+        'annual_demand': annual_demand,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'eoq': eoq,
+    }
+
+
+def compute_reorder_parameters_scalar(consumed_30, consumed_90, consumed_365, lead_time_days, unit_cost,
+                                      seasonal_multiplier=1.0, service_level=0.95,
+                                      ordering_cost=ORDERING_COST, holding_cost_rate=HOLDING_COST_RATE):
+    """Row-by-row equivalent of ``compute_reorder_parameters`` (used without NumPy)"""
+    results = {key: [] for key in ('daily_usage', 'annual_demand', 'safety_stock', 'reorder_point', 'eoq')}
+
+    for c30, c90, c365, lead_time, cost in zip(consumed_30, consumed_90, consumed_365, lead_time_days, unit_cost):
+        daily_usage = max(float(c30) / 30, float(c90) / 90) * float(seasonal_multiplier)
+        annual_demand = max(float(c365), float(c90) / 90 * 365)
+
+        safety_stock = calculate_safety_stock(daily_usage, lead_time, service_level)
+        reorder_point = calculate_reorder_point(daily_usage, lead_time, safety_stock)
+        if reorder_point <= 0:
+            reorder_point = DEFAULT_REORDER_POINT
+        eoq = calculate_eoq(annual_demand, ordering_cost, Decimal(str(cost)) * holding_cost_rate)
+
+        results['daily_usage'].append(daily_usage)
+        results['annual_demand'].append(annual_demand)
+        results['safety_stock'].append(float(safety_stock))
+        results['reorder_point'].append(float(max(reorder_point, Decimal(BUSINESS_RULES['MIN_REORDER_LEVEL']))))
+        results['eoq'].append(float(eoq))
+
+    return results
+
 
 class ReorderService(BaseService):
     """
     Service for managing reorder points and automatic reordering
     """
     
-    def calculate_reorder_points(self, warehouse_id: Optional[int] = None) -> ServiceResult:
-        """Calculate optimal reorder points based on usage patterns"""
+    def calculate_reorder_points(self, warehouse_id: Optional[int] = None,
+                                 per_warehouse: bool = False, dry_run: bool = False) -> ServiceResult:
+        """
+        Calculate optimal reorder points and order quantities based on usage patterns.
+        
+        Consumption for all items is loaded with one grouped query, safety stock,
+        reorder point and EOQ are computed column-wise, and only changed rows
+        are written with ``bulk_update``.
+        
+        ``per_warehouse`` runs (and commits) the pipeline one warehouse at a
+        time, bounding memory and lock time on large tenants. ``dry_run``
+        returns the diff without writing anything.
+        """
         try:
             self.validate_tenant()
             
@@ -22,157 +158,159 @@ class ReorderService(BaseService):
             if warehouse_id:
                 queryset = queryset.filter(warehouse_id=warehouse_id)
             
-            updated_items = []
+            if per_warehouse:
+                warehouse_ids = list(
+                    queryset.order_by().values_list('warehouse_id', flat=True).distinct()
+                )
+                batches = [queryset.filter(warehouse_id=wh_id) for wh_id in warehouse_ids]
+            else:
+                batches = [queryset]
             
-            for stock_item in queryset.select_related('product'):
-                # Calculate based on different methods
-                usage_based = self._calculate_usage_based_reorder_point(stock_item)
-                lead_time_based = self._calculate_lead_time_based_reorder_point(stock_item)
-                seasonal_adjusted = self._apply_seasonal_adjustments(stock_item, usage_based)
-                
-                # Use the most appropriate method
-                new_reorder_point = max(usage_based, lead_time_based, seasonal_adjusted)
-                
-                if new_reorder_point != stock_item.reorder_level:
-                    old_level = stock_item.reorder_level
-                    stock_item.reorder_level = new_reorder_point
-                    stock_item.reorder_point_updated_at = timezone.now()
-                    stock_item.save(update_fields=['reorder_level', 'reorder_point_updated_at'])
-                    
-                    updated_items.append({
-                        'stock_item': stock_item,
-                        'old_reorder_point': old_level,
-                        'new_reorder_point': new_reorder_point,
-                        'calculation_method': 'usage_based'
-                    })
+            changes = []
+            items_evaluated = 0
+            by_warehouse = {}
+            
+            for batch in batches:
+                batch_changes, evaluated = self._recalculate_reorder_batch(batch, dry_run)
+                changes.extend(batch_changes)
+                items_evaluated += evaluated
+                for change in batch_changes:
+                    by_warehouse[change['warehouse_id']] = by_warehouse.get(change['warehouse_id'], 0) + 1
             
             self.log_operation('calculate_reorder_points', {
                 'warehouse_id': warehouse_id,
-                'items_updated': len(updated_items)
+                'per_warehouse': per_warehouse,
+                'dry_run': dry_run,
+                'items_evaluated': items_evaluated,
+                'items_updated': 0 if dry_run else len(changes)
             })
             
+            verb = 'Would update' if dry_run else 'Updated'
             return ServiceResult.success(
-                data=updated_items,
-                message=f"Updated reorder points for {len(updated_items)} items"
+                data=changes,
+                message=f"{verb} reorder points for {len(changes)} items",
+                meta={
+                    'dry_run': dry_run,
+                    'items_evaluated': items_evaluated,
+                    'changes_by_warehouse': by_warehouse
+                }
             )
             
         except Exception as e:
             return ServiceResult.error(f"Failed to calculate reorder points: {str(e)}")
     
-    def _calculate_usage_based_reorder_point(self, stock_item: StockItem) -> Decimal:
-        """Calculate reorder point based on historical usage"""
-        try:
-            # Get usage data for last 3 months
-            from datetime import timedelta
-            cutoff_date = timezone.now() - timedelta(days=90)
-            
-            # Get total issued quantity in period
-            total_issued = stock_item.stockmovementitem_set.filter(
-                movement__movement_type__in=['ISSUE', 'TRANSFER_OUT'],
-                movement__created_at__gte=cutoff_date
-            ).aggregate(
-                total=models.Sum('quantity')
-            )['total'] or 0
-            
-            if total_issued > 0:
-                # Calculate daily usage
-                daily_usage = total_issued / 90
-                
-                # Get lead time from primary supplier
-                primary_supplier = ProductSupplier.objects.filter(
-                    product=stock_item.product,
-                    is_primary=True
-                ).first()
-                
-                lead_time_days = primary_supplier.lead_time_days if primary_supplier else 14
-                safety_stock_days = 7  # Safety buffer
-                
-                # Reorder point = (Daily usage × Lead time) + Safety stock
-                reorder_point = daily_usage * (lead_time_days + safety_stock_days)
-                
-                return max(Decimal('1'), Decimal(str(reorder_point)).quantize(Decimal('1')))
-            
-            return Decimal('10')  # Default minimum
-            
-        except Exception as e:
-            self.logger.error(f"Error calculating usage-based reorder point: {str(e)}")
-            return Decimal('10')
-    
-    def _calculate_lead_time_based_reorder_point(self, stock_item: StockItem) -> Decimal:
-        """Calculate reorder point based on lead time analysis"""
-        try:
-            # Get primary supplier lead time
-            primary_supplier = ProductSupplier.objects.filter(
-                product=stock_item.product,
+    def _load_reorder_frame(self, queryset) -> Dict[str, list]:
+        """
+        Columns for every stock item of ``queryset``: current settings,
+        30/90/365-day consumption (one grouped query) and primary supplier
+        lead time and cost (one query).
+        """
+        from datetime import timedelta
+        now = timezone.now()
+        
+        def consumed_since(days):
+            return Coalesce(
+                Sum(
+                    'stockmovementitem__quantity',
+                    filter=Q(
+                        stockmovementitem__movement__movement_type__in=CONSUMPTION_MOVEMENT_TYPES,
+                        stockmovementitem__movement__created_at__gte=now - timedelta(days=days)
+                    )
+                ),
+                Value(Decimal('0')),
+                output_field=DecimalField()
+            )
+        
+        rows = list(
+            queryset.order_by().annotate(
+                consumed_30=consumed_since(30),
+                consumed_90=consumed_since(90),
+                consumed_365=consumed_since(365),
+            ).values(
+                'id', 'product_id', 'warehouse_id', 'unit_cost', 'reorder_level', 'reorder_quantity',
+                'consumed_30', 'consumed_90', 'consumed_365'
+            )
+        )
+        
+        # Ascending ids with last-wins assignment keep the newest primary supplier
+        suppliers = {
+            product_id: (lead_time_days, supplier_cost)
+            for product_id, lead_time_days, supplier_cost in ProductSupplier.objects.filter(
+                product_id__in=queryset.values('product_id'),
                 is_primary=True
-            ).first()
-            
-            if not primary_supplier:
-                return Decimal('10')
-            
-            lead_time_days = primary_supplier.lead_time_days
-            
-            # Calculate average daily consumption
-            avg_daily_consumption = self._get_average_daily_consumption(stock_item)
-            
-            # Add safety margin (25% of lead time consumption)
-            safety_margin = (avg_daily_consumption * lead_time_days) * Decimal('0.25')
-            
-            reorder_point = (avg_daily_consumption * lead_time_days) + safety_margin
-            
-            return max(Decimal('1'), reorder_point.quantize(Decimal('1')))
-            
-        except Exception as e:
-            self.logger.error(f"Error calculating lead time based reorder point: {str(e)}")
-            return Decimal('10')
+            ).order_by('product_id', 'id').values_list('product_id', 'lead_time_days', 'supplier_cost')
+        }
+        
+        default_lead_time = DEFAULT_VALUES['DEFAULT_LEAD_TIME_DAYS']
+        frame = {key: [] for key in rows[0]} if rows else {}
+        frame['lead_time_days'] = []
+        frame['cost'] = []
+        
+        for row in rows:
+            for key, value in row.items():
+                frame[key].append(value)
+            lead_time_days, supplier_cost = suppliers.get(row['product_id'], (None, None))
+            frame['lead_time_days'].append(lead_time_days or default_lead_time)
+            frame['cost'].append(supplier_cost if supplier_cost is not None else row['unit_cost'])
+        
+        return frame
     
-    def _apply_seasonal_adjustments(self, stock_item: StockItem, base_reorder_point: Decimal) -> Decimal:
-        """Apply seasonal adjustments to reorder point"""
-        try:
-            current_month = timezone.now().month
-            
-            # Define seasonal multipliers (this could be data-driven)
-            seasonal_multipliers = {
-                1: 0.8,   # January - lower demand
-                2: 0.8,   # February
-                3: 0.9,   # March
-                4: 1.0,   # April
-                5: 1.1,   # May
-                6: 1.2,   # June - higher demand
-                7: 1.3,   # July - peak season
-                8: 1.3,   # August
-                9: 1.2,   # September
-                10: 1.1,  # October
-                11: 1.4,  # November - holiday season
-                12: 1.5,  # December - peak holiday
-            }
-            
-            multiplier = seasonal_multipliers.get(current_month, 1.0)
-            adjusted_point = base_reorder_point * Decimal(str(multiplier))
-            
-            return adjusted_point.quantize(Decimal('1'))
-            
-        except Exception as e:
-            self.logger.error(f"Error applying seasonal adjustments: {str(e)}")
-            return base_reorder_point
-    
-    def _get_average_daily_consumption(self, stock_item: StockItem) -> Decimal:
-        """Get average daily consumption for a stock item"""
-        try:
-            from datetime import timedelta
-            cutoff_date = timezone.now() - timedelta(days=30)
-            
-            total_consumed = stock_item.stockmovementitem_set.filter(
-                movement__movement_type__in=['ISSUE', 'TRANSFER_OUT', 'PRODUCTION_CONSUMPTION'],
-                movement__created_at__gte=cutoff_date
-            ).aggregate(
-                total=models.Sum('quantity')
-            )['total'] or 0
-            
-            return Decimal(str(total_consumed / 30)) if total_consumed > 0 else Decimal('0.1')
-            
-        except Exception as e:
-            return Decimal('0.1')
+    def _recalculate_reorder_batch(self, queryset, dry_run: bool):
+        """Run the pipeline for one queryset; returns (changes, items_evaluated)"""
+        frame = self._load_reorder_frame(queryset)
+        if not frame.get('id'):
+            return [], 0
+        
+        compute = compute_reorder_parameters if NUMPY_AVAILABLE else compute_reorder_parameters_scalar
+        params = compute(
+            frame['consumed_30'], frame['consumed_90'], frame['consumed_365'],
+            frame['lead_time_days'], frame['cost'],
+            seasonal_multiplier=SEASONAL_MULTIPLIERS.get(timezone.now().month, 1.0)
+        )
+        
+        now = timezone.now()
+        changes = []
+        updates = []
+        
+        for index, stock_item_id in enumerate(frame['id']):
+            old_reorder_point = frame['reorder_level'][index]
+            old_reorder_quantity = frame['reorder_quantity'][index]
+            new_reorder_point = Decimal(int(params['reorder_point'][index]))
+            eoq = Decimal(int(params['eoq'][index]))
+            # Keep the configured order quantity when EOQ cannot be computed
+            new_reorder_quantity = eoq if eoq > 0 else old_reorder_quantity
+            
+            if new_reorder_point == old_reorder_point and new_reorder_quantity == old_reorder_quantity:
+                continue
+            
+            changes.append({
+                'stock_item_id': stock_item_id,
+                'product_id': frame['product_id'][index],
+                'warehouse_id': frame['warehouse_id'][index],
+                'old_reorder_point': old_reorder_point,
+                'new_reorder_point': new_reorder_point,
+                'old_reorder_quantity': old_reorder_quantity,
+                'new_reorder_quantity': new_reorder_quantity,
+                'safety_stock': Decimal(int(params['safety_stock'][index])),
+                'average_daily_usage': Decimal(str(round(float(params['daily_usage'][index]), 4))),
+                'calculation_method': 'usage_based'
+            })
+            updates.append(StockItem(
+                id=stock_item_id,
+                reorder_level=new_reorder_point,
+                reorder_quantity=new_reorder_quantity,
+                reorder_point_updated_at=now
+            ))
+        
+        if updates and not dry_run:
+            with transaction.atomic():
+                StockItem.objects.bulk_update(
+                    updates,
+                    ['reorder_level', 'reorder_quantity', 'reorder_point_updated_at'],
+                    batch_size=1000
+                )
+        
+        return changes, len(frame['id'])
     
     def generate_reorder_suggestions(self, warehouse_id: Optional[int] = None) -> ServiceResult:
         """Generate reorder suggestions based on current stock levels"""
@@ -182,7 +320,7 @@ class ReorderService(BaseService):
             # Get items below reorder level
             queryset = StockItem.objects.filter(
                 tenant=self.tenant,
-                quantity_on_hand__lte=models.F('reorder_level'),
+                quantity_on_hand__lte=F('reorder_level'),
                 product__is_active=True,
                 product__is_purchasable=True
             ).select_related('product', 'warehouse')
@@ -284,7 +422,7 @@ class ReorderService(BaseService):
                 movement__movement_type__in=['ISSUE', 'TRANSFER_OUT'],
                 movement__created_at__gte=cutoff_date
             ).aggregate(
-                total=models.Sum('quantity')
+                total=Sum('quantity')
             )['total'] or 0
             
             # Extrapolate to annual (90 days to 365 days)
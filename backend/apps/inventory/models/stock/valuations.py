@@ -1,9 +1,9 @@
 """
 Stock valuation layers for FIFO/LIFO cost tracking
 """
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 
 from apps.core.models import TenantBaseModel
 from ..abstract.base import ActivatableMixin
@@ -430,4 +430,161 @@ class CostAdjustment(TenantBaseModel):
                     stock_item.standard_cost = self.new_unit_cost
                     stock_item.save(update_fields=['standard_cost'])
         
-        return True, "Cost adjustment applied successfully"
\ No newline at end of file
+        return True, "Cost adjustment applied successfully"
+
+class InventoryValueSnapshot(TenantBaseModel):
+    """
+    Materialised layer-based inventory value per warehouse and product.
+    
+    Kept current by the valuation services, which apply a quantity/value delta
+    for every layer they create, consume or re-cost. ``rebuild`` recomputes it
+    from open layers: nightly through the ``rebuild_inventory_snapshots`` task
+    to correct drift, and once per tenant on the first valuation read to
+    backfill stock that existed before the snapshot did.
+    """
+    
+    warehouse = models.ForeignKey(
+        'warehouse.Warehouse',
+        on_delete=models.CASCADE,
+        related_name='value_snapshots'
+    )
+    product = models.ForeignKey(
+        'catalog.Product',
+        on_delete=models.CASCADE,
+        related_name='value_snapshots'
+    )
+    
+    quantity = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    
+    last_rebuilt_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = InventoryManager()
+    
+    class Meta:
+        db_table = 'inventory_value_snapshots'
+        unique_together = [['tenant', 'warehouse', 'product']]
+        indexes = [
+            models.Index(fields=['tenant_id', 'warehouse']),
+            models.Index(fields=['tenant_id', 'product']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} @ {self.warehouse}: {self.quantity} = {self.value}"
+    
+    @classmethod
+    def apply_deltas(cls, tenant_id, deltas):
+        """
+        Add ``{(warehouse_id, product_id): (quantity_delta, value_delta)}`` to
+        the snapshot rows. Missing rows are inserted first (ignoring rows a
+        concurrent writer created), then each row gets an atomic increment.
+        """
+        from django.db.models import F
+        
+        deltas = {
+            key: (quantity_delta, value_delta)
+            for key, (quantity_delta, value_delta) in deltas.items()
+            if quantity_delta or value_delta
+        }
+        if not deltas:
+            return
+        
+        cls.objects.bulk_create(
+            [
+                cls(tenant_id=tenant_id, warehouse_id=warehouse_id, product_id=product_id)
+                for warehouse_id, product_id in deltas
+            ],
+            ignore_conflicts=True
+        )
+        
+        now = timezone.now()
+        for (warehouse_id, product_id), (quantity_delta, value_delta) in deltas.items():
+            cls.objects.filter(
+                tenant_id=tenant_id,
+                warehouse_id=warehouse_id,
+                product_id=product_id
+            ).update(
+                quantity=F('quantity') + quantity_delta,
+                value=F('value') + value_delta,
+                updated_at=now
+            )
+    
+    @classmethod
+    def has_been_rebuilt(cls, tenant_id):
+        """Whether a rebuild has ever covered this tenant's snapshot"""
+        return cls.objects.filter(tenant_id=tenant_id, last_rebuilt_at__isnull=False).exists()
+    
+    @classmethod
+    def _quantize(cls, field_name, amount):
+        """Round a recomputed sum to the precision the snapshot column stores"""
+        decimal_places = cls._meta.get_field(field_name).decimal_places
+        return (amount or Decimal('0')).quantize(Decimal(1).scaleb(-decimal_places), rounding=ROUND_HALF_UP)
+    
+    @classmethod
+    def rebuild(cls, tenant, dry_run=False):
+        """
+        Recompute the tenant's rows from open valuation layers.
+        
+        Returns (rows corrected, rows with open layers). Unless ``dry_run``,
+        every row of the tenant is stamped with ``last_rebuilt_at``.
+        """
+        from django.db.models import F, Sum
+        
+        now = timezone.now()
+        
+        with transaction.atomic():
+            existing = {
+                (snapshot.warehouse_id, snapshot.product_id): snapshot
+                for snapshot in cls.objects.select_for_update().filter(tenant=tenant)
+            }
+            
+            # Read layers only after locking the snapshots so concurrent
+            # deltas land either before or after this rebuild
+            actual = {
+                (row['stock_item__warehouse_id'], row['stock_item__product_id']): (
+                    cls._quantize('quantity', row['quantity']),
+                    cls._quantize('value', row['value'])
+                )
+                for row in StockValuationLayer.objects.filter(
+                    tenant=tenant,
+                    quantity_remaining__gt=0
+                ).values(
+                    'stock_item__warehouse_id', 'stock_item__product_id'
+                ).annotate(
+                    quantity=Sum('quantity_remaining'),
+                    value=Sum(F('quantity_remaining') * F('unit_cost'))
+                )
+            }
+            
+            to_create = []
+            to_update = []
+            
+            for key, (quantity, value) in actual.items():
+                snapshot = existing.pop(key, None)
+                if snapshot is None:
+                    to_create.append(cls(
+                        tenant=tenant,
+                        warehouse_id=key[0],
+                        product_id=key[1],
+                        quantity=quantity,
+                        value=value,
+                        last_rebuilt_at=now
+                    ))
+                elif snapshot.quantity != quantity or snapshot.value != value:
+                    snapshot.quantity = quantity
+                    snapshot.value = value
+                    to_update.append(snapshot)
+            
+            # Rows with no open layers left
+            for snapshot in existing.values():
+                if snapshot.quantity or snapshot.value:
+                    snapshot.quantity = Decimal('0')
+                    snapshot.value = Decimal('0')
+                    to_update.append(snapshot)
+            
+            if not dry_run:
+                cls.objects.bulk_create(to_create, batch_size=1000)
+                cls.objects.bulk_update(to_update, ['quantity', 'value'], batch_size=1000)
+                cls.objects.filter(tenant=tenant).update(last_rebuilt_at=now)
+        
+        return len(to_create) + len(to_update), len(actual)
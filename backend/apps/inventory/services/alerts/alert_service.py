@@ -1,4 +1,5 @@
 from django.db import transaction
+from django.db.models import BooleanField, Count, Exists, ExpressionWrapper, F, OuterRef, Q
 from django.utils import timezone
 from decimal import Decimal
 from typing import List, Dict, Any, Optional
@@ -24,9 +25,14 @@ class AlertService(BaseService):
         'REORDER_POINT': 'HIGH'
     }
     
+    OPEN_ALERT_STATUSES = ['OPEN', 'ACKNOWLEDGED']
+    
     def process_alert_rules(self) -> ServiceResult:
         """
         Process all active alert rules and generate alerts
+        
+        Rules with the same scope (products, categories, warehouses) are
+        evaluated together in a single query.
         """
         try:
             self.validate_tenant()
@@ -35,29 +41,36 @@ class AlertService(BaseService):
             rules = AlertRule.objects.filter(
                 tenant=self.tenant,
                 is_active=True
-            )
+            ).prefetch_related('product_categories', 'specific_products', 'warehouses')
+            
+            due_rules = [rule for rule in rules if rule.should_check()]
             
             alerts_generated = 0
-            rules_processed = 0
+            alerts_resolved = 0
+            
+            for scope_rules in self._group_rules_by_scope(due_rules):
+                result = self._evaluate_rule_group(scope_rules)
+                alerts_generated += result['alerts_created']
+                alerts_resolved += result['alerts_resolved']
             
-            for rule in rules:
-                if rule.should_check():
-                    rule_result = self._process_single_rule(rule)
-                    if rule_result.is_success:
-                        alerts_generated += rule_result.data.get('alerts_created', 0)
-                    
-                    rule.mark_checked()
-                    rules_processed += 1
+            if due_rules:
+                AlertRule.objects.filter(
+                    id__in=[rule.id for rule in due_rules]
+                ).update(last_checked_at=timezone.now())
+            
+            rules_processed = len(due_rules)
             
             self.log_operation('process_alert_rules', {
                 'rules_processed': rules_processed,
-                'alerts_generated': alerts_generated
+                'alerts_generated': alerts_generated,
+                'alerts_resolved': alerts_resolved
             })
             
             return ServiceResult.success(
                 data={
                     'rules_processed': rules_processed,
-                    'alerts_generated': alerts_generated
+                    'alerts_generated': alerts_generated,
+                    'alerts_resolved': alerts_resolved
                 },
                 message=f"Processed {rules_processed} rules and generated {alerts_generated} alerts"
             )
@@ -68,259 +81,319 @@ class AlertService(BaseService):
     def _process_single_rule(self, rule: AlertRule) -> ServiceResult:
         """Process a single alert rule"""
         try:
-            alerts_created = 0
-            
-            if rule.alert_type == 'LOW_STOCK':
-                alerts_created = self._check_low_stock_rule(rule)
-            elif rule.alert_type == 'OUT_OF_STOCK':
-                alerts_created = self._check_out_of_stock_rule(rule)
-            elif rule.alert_type == 'OVERSTOCK':
-                alerts_created = self._check_overstock_rule(rule)
-            elif rule.alert_type == 'EXPIRY':
-                alerts_created = self._check_expiry_rule(rule)
-            elif rule.alert_type == 'SLOW_MOVING':
-                alerts_created = self._check_slow_moving_rule(rule)
-            elif rule.alert_type == 'DEAD_STOCK':
-                alerts_created = self._check_dead_stock_rule(rule)
-            elif rule.alert_type == 'NEGATIVE_STOCK':
-                alerts_created = self._check_negative_stock_rule(rule)
-            elif rule.alert_type == 'REORDER_POINT':
-                alerts_created = self._check_reorder_point_rule(rule)
-            
-            if alerts_created > 0:
-                rule.mark_triggered()
-            
-            return ServiceResult.success(data={'alerts_created': alerts_created})
+            return ServiceResult.success(data=self._evaluate_rule_group([rule]))
             
         except Exception as e:
             return ServiceResult.error(f"Failed to process rule {rule.name}: {str(e)}")
     
-    def _check_low_stock_rule(self, rule: AlertRule) -> int:
-        """Check low stock rule and create alerts"""
-        queryset = self._get_stock_queryset(rule)
-        
-        # Apply low stock condition
-        low_stock_items = queryset.filter(
-            quantity_on_hand__lte=models.F('reorder_level'),
-            quantity_on_hand__gt=0,
-            reorder_level__gt=0
-        )
-        
-        alerts_created = 0
-        for stock_item in low_stock_items:
-            # Check if alert already exists and not resolved
-            existing_alert = InventoryAlert.objects.filter(
-                tenant=self.tenant,
-                alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
-            
-            if not existing_alert and rule.can_trigger_again():
-                self._create_low_stock_alert(rule, stock_item)
-                alerts_created += 1
-        
-        return alerts_created
+    def _group_rules_by_scope(self, rules: List[AlertRule]) -> List[List[AlertRule]]:
+        """Group rules whose stock item querysets are identical"""
+        groups = {}
+        for rule in rules:
+            groups.setdefault(self._rule_scope_key(rule), []).append(rule)
+        return list(groups.values())
     
-    def _check_out_of_stock_rule(self, rule: AlertRule) -> int:
-        """Check out of stock rule and create alerts"""
-        queryset = self._get_stock_queryset(rule)
-        
-        out_of_stock_items = queryset.filter(quantity_on_hand=0)
-        
-        alerts_created = 0
-        for stock_item in out_of_stock_items:
-            existing_alert = InventoryAlert.objects.filter(
-                tenant=self.tenant,
+    def _rule_scope_key(self, rule: AlertRule):
+        if rule.apply_to_all_products:
+            categories, products = (), ()
+        else:
+            categories = tuple(sorted(category.id for category in rule.product_categories.all()))
+            products = tuple(sorted(product.id for product in rule.specific_products.all()))
+        warehouses = tuple(sorted(warehouse.id for warehouse in rule.warehouses.all()))
+        return categories, products, warehouses
+    
+    def _rule_days_threshold(self, rule: AlertRule, default: int) -> int:
+        return int(rule.condition_value or default)
+    
+    def _rule_condition(self, rule: AlertRule):
+        """
+        ``(condition, annotations)`` selecting the stock items that violate
+        the rule, or ``None`` for alert types that are not stock item based.
+        Annotation names are suffixed with the rule id so several rules can
+        share one queryset.
+        """
+        alert_type = rule.alert_type
+        
+        if alert_type == 'LOW_STOCK':
+            return Q(
+                quantity_on_hand__lte=F('reorder_level'),
+                quantity_on_hand__gt=0,
+                reorder_level__gt=0
+            ), {}
+        
+        if alert_type == 'OUT_OF_STOCK':
+            return Q(quantity_on_hand=0), {}
+        
+        if alert_type == 'OVERSTOCK':
+            return Q(
+                quantity_on_hand__gte=F('maximum_stock_level'),
+                maximum_stock_level__gt=0
+            ), {}
+        
+        if alert_type == 'EXPIRY':
+            days_threshold = self._rule_days_threshold(rule, 30)
+            cutoff_date = timezone.now().date() + timezone.timedelta(days=days_threshold)
+            return Q(
+                batch__expiry_date__lte=cutoff_date,
+                batch__expiry_date__isnull=False,
+                quantity_on_hand__gt=0
+            ), {}
+        
+        if alert_type == 'SLOW_MOVING':
+            days_threshold = self._rule_days_threshold(rule, 90)
+            cutoff_date = timezone.now() - timezone.timedelta(days=days_threshold)
+            movement_count = f'movement_count_{rule.id}'
+            return Q(
+                **{f'{movement_count}__lte': 2},  # Configurable threshold
+                quantity_on_hand__gt=0
+            ), {
+                movement_count: Count(
+                    'stockmovementitem',
+                    filter=Q(stockmovementitem__movement__created_at__gte=cutoff_date)
+                )
+            }
+        
+        if alert_type == 'DEAD_STOCK':
+            days_threshold = self._rule_days_threshold(rule, 180)
+            cutoff_date = timezone.now() - timezone.timedelta(days=days_threshold)
+            return Q(
+                Q(last_movement_date__lt=cutoff_date) | Q(last_movement_date__isnull=True),
+                quantity_on_hand__gt=0
+            ), {}
+        
+        if alert_type == 'NEGATIVE_STOCK':
+            return Q(quantity_on_hand__lt=0), {}
+        
+        if alert_type == 'REORDER_POINT':
+            return Q(
+                quantity_on_hand__lte=F('reorder_level'),
+                reorder_level__gt=0
+            ), {}
+        
+        return None
+    
+    def _open_alert_exists(self, rule: AlertRule) -> Exists:
+        return Exists(
+            InventoryAlert.objects.filter(
                 alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
+                stock_item=OuterRef('pk'),
+                status__in=self.OPEN_ALERT_STATUSES
+            )
+        )
+    
+    def _evaluate_rule_group(self, rules: List[AlertRule]) -> Dict[str, int]:
+        """
+        Evaluate rules sharing one scope: a single query selects new violators
+        of every rule (anti-joined against their open alerts), alerts are
+        created in bulk, and open alerts whose condition cleared are resolved
+        in one update.
+        """
+        conditions = {}
+        annotations = {}
+        for rule in rules:
+            rule_condition = self._rule_condition(rule)
+            if rule_condition is not None:
+                conditions[rule], rule_annotations = rule_condition
+                annotations.update(rule_annotations)
+        
+        if not conditions:
+            return {'alerts_created': 0, 'alerts_resolved': 0}
+        
+        queryset = self._get_stock_queryset(rules[0])
+        
+        # Negative stock always alerts; other rules respect their cooldown
+        triggerable = [
+            rule for rule in conditions
+            if rule.alert_type == 'NEGATIVE_STOCK' or rule.can_trigger_again()
+        ]
+        
+        alerts = []
+        if triggerable:
+            violations = {
+                f'violates_{rule.id}': ExpressionWrapper(
+                    conditions[rule] & ~self._open_alert_exists(rule),
+                    output_field=BooleanField()
+                )
+                for rule in triggerable
+            }
+            any_violation = Q()
+            for rule in triggerable:
+                any_violation |= conditions[rule] & ~self._open_alert_exists(rule)
             
-            if not existing_alert and rule.can_trigger_again():
-                self._create_out_of_stock_alert(rule, stock_item)
-                alerts_created += 1
+            violators = queryset.annotate(**annotations).annotate(**violations).filter(any_violation)
+            
+            for stock_item in violators:
+                for rule in triggerable:
+                    if getattr(stock_item, f'violates_{rule.id}'):
+                        alerts.append(self._build_alert(rule, stock_item))
         
-        return alerts_created
-    
-    def _check_overstock_rule(self, rule: AlertRule) -> int:
-        """Check overstock rule and create alerts"""
-        queryset = self._get_stock_queryset(rule)
+        with transaction.atomic():
+            created = self._bulk_create_alerts(alerts)
+            resolved = self._resolve_cleared_alerts(queryset, annotations, conditions)
         
-        overstock_items = queryset.filter(
-            quantity_on_hand__gte=models.F('maximum_stock_level'),
-            maximum_stock_level__gt=0
-        )
+        return {'alerts_created': len(created), 'alerts_resolved': resolved}
+    
+    def _get_stock_queryset(self, rule: AlertRule):
+        """Get stock item queryset based on rule filters"""
+        queryset = StockItem.objects.filter(tenant=self.tenant)
         
-        alerts_created = 0
-        for stock_item in overstock_items:
-            existing_alert = InventoryAlert.objects.filter(
-                tenant=self.tenant,
-                alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
+        # Apply scope filters
+        if not rule.apply_to_all_products:
+            if rule.product_categories.exists():
+                queryset = queryset.filter(product__category__in=rule.product_categories.all())
             
-            if not existing_alert and rule.can_trigger_again():
-                self._create_overstock_alert(rule, stock_item)
-                alerts_created += 1
+            if rule.specific_products.exists():
+                queryset = queryset.filter(product__in=rule.specific_products.all())
         
-        return alerts_created
+        if rule.warehouses.exists():
+            queryset = queryset.filter(warehouse__in=rule.warehouses.all())
+        
+        return queryset.select_related('product', 'warehouse', 'batch')
     
-    def _check_expiry_rule(self, rule: AlertRule) -> int:
-        """Check expiry rule and create alerts"""
-        from django.db.models import Q
+    def _bulk_create_alerts(self, alerts: List[InventoryAlert]) -> List[InventoryAlert]:
+        """
+        Insert alerts in bulk and apply what the alert post_save handler does
+        for single creates (reference number, auto-resolve date, CREATED
+        history, rule trigger count, notifications).
+        """
+        if not alerts:
+            return []
         
-        days_threshold = int(rule.condition_value or 30)
-        cutoff_date = timezone.now().date() + timezone.timedelta(days=days_threshold)
+        from ...signals.alert_signals import _get_auto_resolve_hours, _update_alert_dashboard_metrics
         
-        queryset = self._get_stock_queryset(rule)
+        now = timezone.now()
+        self._assign_reference_numbers(alerts)
+        for alert in alerts:
+            auto_resolve_hours = _get_auto_resolve_hours(alert.alert_rule.alert_type)
+            if alert.is_auto_resolvable and auto_resolve_hours:
+                alert.auto_resolve_at = now + timezone.timedelta(hours=auto_resolve_hours)
         
-        expiring_items = queryset.filter(
-            batch__expiry_date__lte=cutoff_date,
-            batch__expiry_date__isnull=False,
-            quantity_on_hand__gt=0
-        ).distinct()
+        created = InventoryAlert.objects.bulk_create(alerts)
         
-        alerts_created = 0
-        for stock_item in expiring_items:
-            existing_alert = InventoryAlert.objects.filter(
+        AlertHistory.objects.bulk_create([
+            AlertHistory(
                 tenant=self.tenant,
-                alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
-            
-            if not existing_alert and rule.can_trigger_again():
-                self._create_expiry_alert(rule, stock_item, cutoff_date)
-                alerts_created += 1
-        
-        return alerts_created
-    
-    def _check_slow_moving_rule(self, rule: AlertRule) -> int:
-        """Check slow moving rule and create alerts"""
-        days_threshold = int(rule.condition_value or 90)
-        cutoff_date = timezone.now() - timezone.timedelta(days=days_threshold)
-        
-        queryset = self._get_stock_queryset(rule)
-        
-        slow_moving_items = queryset.annotate(
-            movement_count=Count(
-                'stockmovementitem',
-                filter=Q(stockmovementitem__movement__created_at__gte=cutoff_date)
+                alert=alert,
+                action='CREATED',
+                old_status='',
+                new_status=alert.status,
+                notes='Alert created by system'
             )
-        ).filter(
-            movement_count__lte=2,  # Configurable threshold
-            quantity_on_hand__gt=0
+            for alert in created
+        ])
+        
+        triggered_rule_ids = {alert.alert_rule_id for alert in created}
+        AlertRule.objects.filter(id__in=triggered_rule_ids).update(
+            last_triggered_at=now,
+            trigger_count=F('trigger_count') + 1
         )
         
-        alerts_created = 0
-        for stock_item in slow_moving_items:
-            existing_alert = InventoryAlert.objects.filter(
-                tenant=self.tenant,
-                alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
+        transaction.on_commit(lambda: self._notify_created_alerts(created, _update_alert_dashboard_metrics))
+        return created
+    
+    def _notify_created_alerts(self, alerts: List[InventoryAlert], update_dashboard_metrics):
+        for alert in alerts:
+            self._send_alert_notifications(alert)
+        update_dashboard_metrics.delay(self.tenant.id)
+    
+    def _assign_reference_numbers(self, alerts: List[InventoryAlert]):
+        """Give each alert a reference number not used by the batch or the database"""
+        pending = [alert for alert in alerts if not alert.reference_number]
+        taken = set()
+        
+        for _ in range(10):
+            if not pending:
+                return
+            
+            candidates = {}
+            for alert in pending:
+                reference_number = alert.generate_reference_number()
+                if reference_number not in taken and reference_number not in candidates:
+                    candidates[reference_number] = alert
+            
+            existing = set(
+                InventoryAlert.objects.filter(
+                    reference_number__in=list(candidates)
+                ).values_list('reference_number', flat=True)
+            )
+            
+            for reference_number, alert in candidates.items():
+                if reference_number not in existing:
+                    alert.reference_number = reference_number
+                    taken.add(reference_number)
             
-            if not existing_alert and rule.can_trigger_again():
-                self._create_slow_moving_alert(rule, stock_item, days_threshold)
-                alerts_created += 1
+            pending = [alert for alert in pending if not alert.reference_number]
         
-        return alerts_created
+        if pending:
+            raise ValueError(f"Could not generate unique reference numbers for {len(pending)} alerts")
     
-    def _check_dead_stock_rule(self, rule: AlertRule) -> int:
-        """Check dead stock rule and create alerts"""
-        days_threshold = int(rule.condition_value or 180)
-        cutoff_date = timezone.now() - timezone.timedelta(days=days_threshold)
-        
-        queryset = self._get_stock_queryset(rule)
-        
-        dead_stock_items = queryset.filter(
-            Q(last_movement_date__lt=cutoff_date) | Q(last_movement_date__isnull=True),
-            quantity_on_hand__gt=0
+    def _resolve_cleared_alerts(self, queryset, annotations: Dict[str, Any],
+                                conditions: Dict[AlertRule, Q]) -> int:
+        """Auto-resolve open alerts of these rules whose stock item no longer violates them"""
+        cleared = Q()
+        for rule, condition in conditions.items():
+            still_violating = queryset.annotate(**annotations).filter(condition).values('pk')
+            cleared |= Q(alert_rule=rule) & ~Q(stock_item__in=still_violating)
+        
+        alerts = InventoryAlert.objects.filter(
+            cleared,
+            tenant=self.tenant,
+            stock_item__isnull=False
         )
-        
-        alerts_created = 0
-        for stock_item in dead_stock_items:
-            existing_alert = InventoryAlert.objects.filter(
-                tenant=self.tenant,
-                alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
-            
-            if not existing_alert and rule.can_trigger_again():
-                self._create_dead_stock_alert(rule, stock_item, days_threshold)
-                alerts_created += 1
-        
-        return alerts_created
+        return self._auto_resolve(alerts, 'Condition cleared')
     
-    def _check_negative_stock_rule(self, rule: AlertRule) -> int:
-        """Check negative stock rule and create alerts"""
-        queryset = self._get_stock_queryset(rule)
+    def _auto_resolve(self, alerts, notes: str) -> int:
+        """Auto-resolve ``alerts`` with one UPDATE and record their history in bulk"""
+        alerts = alerts.filter(
+            is_auto_resolvable=True,
+            status__in=self.OPEN_ALERT_STATUSES
+        )
+        previous_statuses = dict(alerts.values_list('id', 'status'))
+        if not previous_statuses:
+            return 0
         
-        negative_stock_items = queryset.filter(quantity_on_hand__lt=0)
+        InventoryAlert.objects.filter(
+            id__in=list(previous_statuses),
+            status__in=self.OPEN_ALERT_STATUSES
+        ).update(status='AUTO_RESOLVED', resolved_at=timezone.now())
         
-        alerts_created = 0
-        for stock_item in negative_stock_items:
-            existing_alert = InventoryAlert.objects.filter(
+        AlertHistory.objects.bulk_create([
+            AlertHistory(
                 tenant=self.tenant,
-                alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
-            
-            if not existing_alert:  # Always create for negative stock
-                self._create_negative_stock_alert(rule, stock_item)
-                alerts_created += 1
+                alert_id=alert_id,
+                action='AUTO_RESOLVED',
+                old_status=old_status,
+                new_status='AUTO_RESOLVED',
+                notes=notes
+            )
+            for alert_id, old_status in previous_statuses.items()
+        ])
         
-        return alerts_created
+        return len(previous_statuses)
     
-    def _check_reorder_point_rule(self, rule: AlertRule) -> int:
-        """Check reorder point rule and create alerts"""
-        queryset = self._get_stock_queryset(rule)
-        
-        reorder_items = queryset.filter(
-            quantity_on_hand__lte=models.F('reorder_level'),
-            reorder_level__gt=0
-        )
-        
-        alerts_created = 0
-        for stock_item in reorder_items:
-            existing_alert = InventoryAlert.objects.filter(
-                tenant=self.tenant,
-                alert_rule=rule,
-                stock_item=stock_item,
-                status__in=['OPEN', 'ACKNOWLEDGED']
-            ).first()
-            
-            if not existing_alert and rule.can_trigger_again():
-                self._create_reorder_point_alert(rule, stock_item)
-                alerts_created += 1
-        
-        return alerts_created
+    def _build_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Unsaved alert for a stock item violating ``rule``"""
+        builders = {
+            'LOW_STOCK': self._build_low_stock_alert,
+            'OUT_OF_STOCK': self._build_out_of_stock_alert,
+            'OVERSTOCK': self._build_overstock_alert,
+            'EXPIRY': self._build_expiry_alert,
+            'SLOW_MOVING': self._build_slow_moving_alert,
+            'DEAD_STOCK': self._build_dead_stock_alert,
+            'NEGATIVE_STOCK': self._build_negative_stock_alert,
+            'REORDER_POINT': self._build_reorder_point_alert,
+        }
+        return builders[rule.alert_type](rule, stock_item)
     
-    def _get_stock_queryset(self, rule: AlertRule):
-        """Get stock item queryset based on rule filters"""
-        queryset = StockItem.objects.filter(tenant=self.tenant)
-        
-        # Apply scope filters
-        if not rule.apply_to_all_products:
-            if rule.product_categories.exists():
-                queryset = queryset.filter(product__category__in=rule.product_categories.all())
-            
-            if rule.specific_products.exists():
-                queryset = queryset.filter(product__in=rule.specific_products.all())
-        
-        if rule.warehouses.exists():
-            queryset = queryset.filter(warehouse__in=rule.warehouses.all())
-        
-        return queryset.select_related('product', 'warehouse')
+    def _create_alert(self, alert: InventoryAlert) -> InventoryAlert:
+        """Save a single alert and send its notifications"""
+        alert.save()
+        self._send_alert_notifications(alert)
+        return alert
     
-    def _create_low_stock_alert(self, rule: AlertRule, stock_item: StockItem):
-        """Create low stock alert"""
-        alert = InventoryAlert.objects.create(
+    def _build_low_stock_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build low stock alert"""
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"Low Stock Alert: {stock_item.product.name}",
@@ -332,13 +405,10 @@ class AlertService(BaseService):
             current_value=stock_item.quantity_on_hand,
             threshold_value=stock_item.reorder_level
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
-    def _create_out_of_stock_alert(self, rule: AlertRule, stock_item: StockItem):
-        """Create out of stock alert"""
-        alert = InventoryAlert.objects.create(
+    def _build_out_of_stock_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build out of stock alert"""
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"Out of Stock: {stock_item.product.name}",
@@ -350,13 +420,10 @@ class AlertService(BaseService):
             current_value=Decimal('0'),
             threshold_value=Decimal('1')
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
-    def _create_overstock_alert(self, rule: AlertRule, stock_item: StockItem):
-        """Create overstock alert"""
-        alert = InventoryAlert.objects.create(
+    def _build_overstock_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build overstock alert"""
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"Overstock Alert: {stock_item.product.name}",
@@ -368,22 +435,14 @@ class AlertService(BaseService):
             current_value=stock_item.quantity_on_hand,
             threshold_value=stock_item.maximum_stock_level
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
-    def _create_expiry_alert(self, rule: AlertRule, stock_item: StockItem, cutoff_date):
-        """Create expiry alert"""
-        # Get earliest expiry date for this stock item
-        earliest_expiry = stock_item.batch_set.filter(
-            expiry_date__isnull=False
-        ).aggregate(
-            earliest=Min('expiry_date')
-        )['earliest']
+    def _build_expiry_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build expiry alert"""
+        earliest_expiry = stock_item.batch.expiry_date if stock_item.batch_id else None
         
         days_to_expiry = (earliest_expiry - timezone.now().date()).days if earliest_expiry else 0
         
-        alert = InventoryAlert.objects.create(
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"Expiry Warning: {stock_item.product.name}",
@@ -395,13 +454,12 @@ class AlertService(BaseService):
             current_value=Decimal(str(days_to_expiry)),
             additional_data={'expiry_date': earliest_expiry.isoformat() if earliest_expiry else None}
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
-    def _create_slow_moving_alert(self, rule: AlertRule, stock_item: StockItem, days_threshold: int):
-        """Create slow moving alert"""
-        alert = InventoryAlert.objects.create(
+    def _build_slow_moving_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build slow moving alert"""
+        days_threshold = self._rule_days_threshold(rule, 90)
+        
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"Slow Moving Stock: {stock_item.product.name}",
@@ -413,15 +471,13 @@ class AlertService(BaseService):
             current_value=Decimal(str(days_threshold)),
             additional_data={'analysis_period_days': days_threshold}
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
-    def _create_dead_stock_alert(self, rule: AlertRule, stock_item: StockItem, days_threshold: int):
-        """Create dead stock alert"""
-        days_since_movement = (timezone.now().date() - stock_item.last_movement_date).days if stock_item.last_movement_date else 999
+    def _build_dead_stock_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build dead stock alert"""
+        days_threshold = self._rule_days_threshold(rule, 180)
+        days_since_movement = (timezone.now() - stock_item.last_movement_date).days if stock_item.last_movement_date else 999
         
-        alert = InventoryAlert.objects.create(
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"Dead Stock Alert: {stock_item.product.name}",
@@ -433,13 +489,10 @@ class AlertService(BaseService):
             current_value=Decimal(str(days_since_movement)),
             threshold_value=Decimal(str(days_threshold))
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
-    def _create_negative_stock_alert(self, rule: AlertRule, stock_item: StockItem):
-        """Create negative stock alert"""
-        alert = InventoryAlert.objects.create(
+    def _build_negative_stock_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build negative stock alert"""
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"CRITICAL: Negative Stock - {stock_item.product.name}",
@@ -451,13 +504,10 @@ class AlertService(BaseService):
             current_value=stock_item.quantity_on_hand,
             threshold_value=Decimal('0')
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
-    def _create_reorder_point_alert(self, rule: AlertRule, stock_item: StockItem):
-        """Create reorder point alert"""
-        alert = InventoryAlert.objects.create(
+    def _build_reorder_point_alert(self, rule: AlertRule, stock_item: StockItem) -> InventoryAlert:
+        """Build reorder point alert"""
+        return InventoryAlert(
             tenant=self.tenant,
             alert_rule=rule,
             title=f"Reorder Required: {stock_item.product.name}",
@@ -469,9 +519,6 @@ class AlertService(BaseService):
             current_value=stock_item.quantity_on_hand,
             threshold_value=stock_item.reorder_level
         )
-        
-        self._send_alert_notifications(alert)
-        return alert
     
     def _send_alert_notifications(self, alert: InventoryAlert):
         """Send notifications for alert"""
@@ -613,31 +660,16 @@ class AlertService(BaseService):
     def auto_resolve_alerts(self) -> ServiceResult:
         """Auto-resolve alerts that meet resolution criteria"""
         try:
-            # Get alerts that should be auto-resolved
-            auto_resolvable_alerts = InventoryAlert.objects.filter(
-                tenant=self.tenant,
-                is_auto_resolvable=True,
-                status__in=['OPEN', 'ACKNOWLEDGED']
+            # Alerts past their auto-resolve date (see InventoryAlert.should_auto_resolve)
+            resolved_count = self._auto_resolve(
+                InventoryAlert.objects.filter(
+                    tenant=self.tenant,
+                    auto_resolve_at__isnull=False,
+                    auto_resolve_at__lte=timezone.now()
+                ),
+                'Automatically resolved by system'
             )
             
-            resolved_count = 0
-            
-            for alert in auto_resolvable_alerts:
-                if alert.should_auto_resolve():
-                    alert.auto_resolve()
-                    
-                    # Create history entry
-                    AlertHistory.objects.create(
-                        tenant=self.tenant,
-                        alert=alert,
-                        action='AUTO_RESOLVED',
-                        old_status=alert.status,
-                        new_status='AUTO_RESOLVED',
-                        notes='Automatically resolved by system'
-                    )
-                    
-                    resolved_count += 1
-            
             self.log_operation('auto_resolve_alerts', {
                 'resolved_count': resolved_count
             })
@@ -660,7 +692,18 @@ class AlertService(BaseService):
         ).first()
         
         if rule:
-            return self._create_low_stock_alert(rule, stock_item)
+            return self._create_alert(self._build_low_stock_alert(rule, stock_item))
+    
+    def create_overstock_alert(self, stock_item: StockItem) -> InventoryAlert:
+        """Create overstock alert for a specific stock item"""
+        rule = AlertRule.objects.filter(
+            tenant=self.tenant,
+            alert_type='OVERSTOCK',
+            is_active=True
+        ).first()
+        
+        if rule:
+            return self._create_alert(self._build_overstock_alert(rule, stock_item))
     
     def create_negative_stock_alert(self, stock_item: StockItem) -> InventoryAlert:
         """Create negative stock alert for a specific stock item"""
@@ -671,7 +714,7 @@ class AlertService(BaseService):
         ).first()
         
         if rule:
-            return self._create_negative_stock_alert(rule, stock_item)
+            return self._create_alert(self._build_negative_stock_alert(rule, stock_item))
     
     def create_qc_required_alert(self, receipt: StockReceipt) -> InventoryAlert:
         """Create quality control required alert"""
@@ -219,7 +219,7 @@ class FinanceIntegrationService(BaseService):
             from ..stock.valuation_service import StockValuationService
             
             valuation_service = StockValuationService(tenant=self.tenant, user=self.user)
-            valuation_result = valuation_service.calculate_inventory_value()
+            valuation_result = valuation_service.calculate_inventory_value(as_of=as_of_date)
             
             if valuation_result.is_success:
                 valuation_data = valuation_result.data
@@ -235,7 +235,7 @@ class FinanceIntegrationService(BaseService):
                 
                 for item in valuation_data['item_values']:
                     finance_report['line_items'].append({
-                        'product_id': item['stock_item_id'],
+                        'product_id': item['product_id'],
                         'product_name': item['product_name'],
                         'quantity': item['quantity'],
                         'unit_value': item['value'] / item['quantity'] if item['quantity'] > 0 else 0,
@@ -1,4 +1,5 @@
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models.signals import post_save
 from django.utils import timezone
 from decimal import Decimal
 from typing import List, Dict, Any, Optional
@@ -369,4 +370,292 @@ class StockMovementService(BaseService):
             return ServiceResult.error(
                 message="Bulk movement creation failed",
                 errors=errors
-            )
\ No newline at end of file
+            )
+    
+    INBOUND_MOVEMENT_TYPES = [
+        'RECEIPT', 'TRANSFER_IN', 'ADJUSTMENT_POSITIVE',
+        'PRODUCTION_OUTPUT', 'RETURN_FROM_CUSTOMER', 'FOUND'
+    ]
+    
+    OUTBOUND_MOVEMENT_TYPES = [
+        'ISSUE', 'TRANSFER_OUT', 'ADJUSTMENT_NEGATIVE',
+        'PRODUCTION_CONSUMPTION', 'RETURN_TO_SUPPLIER',
+        'DAMAGED', 'EXPIRED', 'LOST'
+    ]
+    
+    @transaction.atomic
+    def post_movements_bulk(self, movements_data: List[Dict[str, Any]]) -> ServiceResult:
+        """
+        Post many movements (e.g. a large ASN or a POS day-end batch) with a
+        constant number of queries.
+        
+        Each entry of ``movements_data`` is a movement dict with an ``items``
+        list, as accepted by ``create_movement``. All lines are validated
+        against one locked fetch of the referenced stock items, movements and
+        items are inserted with ``bulk_create``, stock quantities are changed
+        with one set-based UPDATE, valuation runs once per stock item, and
+        post_save signals and alerts fire once per movement.
+        """
+        try:
+            self.validate_tenant()
+            
+            movements_data = [dict(movement_data) for movement_data in movements_data]
+            items_by_movement = [movement_data.pop('items', []) for movement_data in movements_data]
+            
+            stock_item_ids = {
+                item_data.get('stock_item_id')
+                for items_data in items_by_movement
+                for item_data in items_data
+            }
+            stock_items = StockItem.objects.select_for_update().filter(
+                tenant=self.tenant
+            ).in_bulk(stock_item_ids)
+            warehouses = Warehouse.objects.filter(tenant=self.tenant).in_bulk(
+                {movement_data.get('warehouse_id') for movement_data in movements_data}
+            )
+            
+            errors = self._validate_movements_bulk(
+                movements_data, items_by_movement, stock_items, warehouses
+            )
+            if errors:
+                return ServiceResult.error("Validation failed", errors=errors)
+            
+            # Movements
+            movements = []
+            for movement_data, items_data in zip(movements_data, items_by_movement):
+                total_quantity = sum((item_data['quantity'] for item_data in items_data), Decimal('0'))
+                total_value = sum(
+                    (item_data['quantity'] * item_data['unit_cost'] for item_data in items_data),
+                    Decimal('0')
+                )
+                movement = StockMovement(
+                    tenant=self.tenant,
+                    created_by=self.user,
+                    **movement_data
+                )
+                # bulk_create skips StockMovement.save(), so derive its totals from the lines
+                movement.quantity = total_quantity
+                movement.total_cost = total_value
+                movement.total_quantity = total_quantity
+                movement.total_value = total_value
+                movements.append(movement)
+            
+            now = timezone.now()
+            for movement in movements:
+                if not movement.actual_date:
+                    movement.actual_date = movement.movement_date
+                if movement.status == 'CONFIRMED' and not movement.confirmed_at:
+                    movement.confirmed_at = now
+            StockMovement.assign_movement_numbers(
+                [movement for movement in movements if not movement.movement_number]
+            )
+            StockMovement.objects.bulk_create(movements)
+            
+            # Movement items
+            movement_items = []
+            for movement, items_data in zip(movements, items_by_movement):
+                for item_data in items_data:
+                    movement_item = StockMovementItem(movement=movement, **item_data)
+                    movement_item.stock_item = stock_items[item_data['stock_item_id']]
+                    movement_items.append(movement_item)
+            StockMovementItem.objects.bulk_create(movement_items)
+            
+            # Stock levels
+            deltas = self._calculate_stock_deltas(movement_items, stock_items)
+            self._apply_stock_deltas(deltas)
+            
+            # Valuation, one pass per stock item
+            from ...services.stock.valuation_service import StockValuationService
+            
+            valuation_service = StockValuationService(tenant=self.tenant, user=self.user)
+            valuation_result = valuation_service.update_valuation_layers_bulk(movement_items)
+            if not valuation_result.is_success:
+                raise Exception(valuation_result.message)
+            
+            # Signals and alerts, once per movement
+            refreshed_items = StockItem.objects.in_bulk(deltas.keys())
+            alerted = set()
+            for movement, items_data in zip(movements, items_by_movement):
+                post_save.send(sender=StockMovement, instance=movement, created=True, raw=False,
+                               using=movement._state.db, update_fields=None)
+                
+                movement_stock_items = [
+                    refreshed_items[stock_item_id]
+                    for stock_item_id in dict.fromkeys(item_data['stock_item_id'] for item_data in items_data)
+                    if stock_item_id in refreshed_items and stock_item_id not in alerted
+                ]
+                self._check_and_generate_alerts_for_items(movement_stock_items)
+                alerted.update(stock_item.id for stock_item in movement_stock_items)
+            
+            self.log_operation('post_movements_bulk', {
+                'movements': len(movements),
+                'items': len(movement_items),
+                'stock_items': len(deltas)
+            })
+            
+            return ServiceResult.success(
+                data=movements,
+                message=f"Posted {len(movements)} movements with {len(movement_items)} items"
+            )
+            
+        except Exception as e:
+            transaction.set_rollback(True)
+            return ServiceResult.error(
+                message=f"Failed to post movements: {str(e)}",
+                errors={'movements': [str(e)]}
+            )
+    
+    def _validate_movements_bulk(self, movements_data, items_by_movement, stock_items, warehouses):
+        """Validate all lines in memory against pre-fetched stock items and warehouses"""
+        errors = {}
+        # Outbound demand already claimed by earlier lines in the batch
+        claimed = {}
+        
+        for m, (movement_data, items_data) in enumerate(zip(movements_data, items_by_movement)):
+            movement_errors = {}
+            movement_type = movement_data.get('movement_type')
+            
+            if movement_type not in self.MOVEMENT_TYPES:
+                movement_errors['movement_type'] = ['Invalid movement type']
+            
+            if movement_data.get('warehouse_id') not in warehouses:
+                movement_errors['warehouse'] = ['Invalid warehouse']
+            
+            if not items_data:
+                movement_errors['items'] = ['At least one item is required']
+            
+            for i, item_data in enumerate(items_data):
+                item_errors = []
+                quantity = item_data.get('quantity')
+                stock_item = stock_items.get(item_data.get('stock_item_id'))
+                
+                if stock_item is None:
+                    item_errors.append('Invalid stock item')
+                elif movement_type in ['ISSUE', 'TRANSFER_OUT', 'ADJUSTMENT_NEGATIVE'] and quantity:
+                    available = (
+                        stock_item.quantity_on_hand - stock_item.quantity_reserved
+                        - claimed.get(stock_item.id, Decimal('0'))
+                    )
+                    if quantity > available:
+                        item_errors.append(f'Insufficient stock. Available: {available}')
+                    else:
+                        claimed[stock_item.id] = claimed.get(stock_item.id, Decimal('0')) + quantity
+                
+                if not quantity or quantity <= 0:
+                    item_errors.append('Quantity must be greater than zero')
+                
+                if item_data.get('unit_cost') is None or item_data.get('unit_cost') < 0:
+                    item_errors.append('Unit cost must be non-negative')
+                
+                if item_errors:
+                    movement_errors[f'item_{i}'] = item_errors
+            
+            if movement_errors:
+                errors[f'movement_{m}'] = movement_errors
+        
+        return errors
+    
+    def _calculate_stock_deltas(self, movement_items, stock_items):
+        """
+        Fold all lines into one delta per stock item, applying them in order
+        so receipt average costs match line-by-line posting.
+        """
+        deltas = {}
+        
+        for movement_item in movement_items:
+            stock_item = stock_items[movement_item.stock_item_id]
+            movement_type = movement_item.movement.movement_type
+            quantity = movement_item.quantity
+            
+            delta = deltas.setdefault(stock_item.id, {
+                'on_hand': Decimal('0'),
+                'received': Decimal('0'),
+                'issued': Decimal('0'),
+                'reserved': Decimal('0'),
+                'movements': 0,
+                'unit_cost': None,
+                # Running values used for the weighted average cost
+                'quantity_on_hand': stock_item.quantity_on_hand,
+                'current_unit_cost': stock_item.unit_cost,
+            })
+            
+            if movement_type in self.INBOUND_MOVEMENT_TYPES:
+                delta['on_hand'] += quantity
+                delta['received'] += quantity
+                delta['quantity_on_hand'] += quantity
+                
+                if movement_type == 'RECEIPT':
+                    total_value = (delta['quantity_on_hand'] - quantity) * delta['current_unit_cost']
+                    total_value += quantity * movement_item.unit_cost
+                    if delta['quantity_on_hand'] > 0:
+                        delta['current_unit_cost'] = total_value / delta['quantity_on_hand']
+                        delta['unit_cost'] = delta['current_unit_cost']
+            
+            elif movement_type in self.OUTBOUND_MOVEMENT_TYPES:
+                delta['on_hand'] -= quantity
+                delta['issued'] += quantity
+                delta['quantity_on_hand'] -= quantity
+            
+            elif movement_type == 'RESERVATION':
+                delta['reserved'] += quantity
+            
+            elif movement_type == 'UNRESERVATION':
+                delta['reserved'] -= quantity
+            
+            if movement_type in self.INBOUND_MOVEMENT_TYPES + self.OUTBOUND_MOVEMENT_TYPES:
+                delta['movements'] += 1
+        
+        return deltas
+    
+    def _apply_stock_deltas(self, deltas):
+        """Apply per-stock-item deltas with one UPDATE ... FROM (VALUES ...)"""
+        if not deltas:
+            return
+        
+        meta = StockItem._meta
+        qn = connection.ops.quote_name
+        
+        def column(field_name):
+            return qn(meta.get_field(field_name).column)
+        
+        values_sql = []
+        params = []
+        for stock_item_id, delta in deltas.items():
+            values_sql.append('(%s, %s::numeric, %s::numeric, %s::numeric, %s::numeric, %s::integer, %s::numeric)')
+            params.extend([
+                stock_item_id, delta['on_hand'], delta['received'], delta['issued'],
+                delta['reserved'], delta['movements'], delta['unit_cost'],
+            ])
+        
+        sql = f"""
+            UPDATE {qn(meta.db_table)} AS si SET
+                {column('quantity_on_hand')} = si.{column('quantity_on_hand')} + v.on_hand,
+                {column('total_quantity_received')} = si.{column('total_quantity_received')} + v.received,
+                {column('total_quantity_issued')} = si.{column('total_quantity_issued')} + v.issued,
+                {column('quantity_reserved')} = si.{column('quantity_reserved')} + v.reserved,
+                {column('movement_count')} = si.{column('movement_count')} + v.movements,
+                {column('unit_cost')} = COALESCE(v.unit_cost, si.{column('unit_cost')}),
+                {column('last_movement_date')} = %s
+            FROM (VALUES {', '.join(values_sql)})
+                AS v(id, on_hand, received, issued, reserved, movements, unit_cost)
+            WHERE si.{column('id')} = v.id
+        """
+        
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [timezone.now()] + params)
+    
+    def _check_and_generate_alerts_for_items(self, stock_items):
+        """Low/negative stock alerts for already-refreshed stock items"""
+        if not stock_items:
+            return
+        
+        from ...services.alerts.alert_service import AlertService
+        
+        alert_service = AlertService(tenant=self.tenant, user=self.user)
+        
+        for stock_item in stock_items:
+            if stock_item.quantity_on_hand <= stock_item.reorder_level:
+                alert_service.create_low_stock_alert(stock_item)
+            
+            if stock_item.quantity_on_hand < 0:
+                alert_service.create_negative_stock_alert(stock_item)
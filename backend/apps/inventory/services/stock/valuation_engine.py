@@ -0,0 +1,232 @@
+from django.db.models import F, Sum, Value, Window
+from django.db.models.expressions import RowRange
+from django.utils import timezone
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+from ...models import InventoryValueSnapshot, StockItem, StockValuationLayer
+
+
+@dataclass
+class LayerSlice:
+    """Quantity taken from one valuation layer"""
+    layer_id: int
+    quantity: Decimal
+    unit_cost: Decimal
+
+    @property
+    def cost(self) -> Decimal:
+        return self.quantity * self.unit_cost
+
+
+def plan_consumption(layers: Iterable[Tuple[int, Decimal, Decimal]],
+                     quantity: Decimal) -> Tuple[List[LayerSlice], Decimal]:
+    """
+    Split ``quantity`` over ``layers`` given as ``(layer_id, quantity_remaining,
+    unit_cost)`` in consumption order. Returns the slices and their total cost.
+
+    If the layers hold less than ``quantity`` everything available is consumed,
+    matching the layer-by-layer walk this replaces.
+    """
+    remaining_to_consume = quantity
+    total_cost = Decimal('0')
+    slices = []
+
+    for layer_id, quantity_remaining, unit_cost in layers:
+        if remaining_to_consume <= 0:
+            break
+
+        consume_quantity = min(remaining_to_consume, quantity_remaining)
+        layer_slice = LayerSlice(layer_id, consume_quantity, unit_cost)
+        slices.append(layer_slice)
+
+        total_cost += layer_slice.cost
+        remaining_to_consume -= consume_quantity
+
+    return slices, total_cost
+
+
+def plan_consumption_lines(layers: Iterable[Tuple[int, Decimal, Decimal]],
+                           quantities: Iterable[Decimal]) -> List[Tuple[List[LayerSlice], Decimal]]:
+    """
+    Plan several issues against the same layers, one after another, exactly
+    as if each had been consumed separately in order.
+    """
+    open_layers = [list(layer) for layer in layers]
+    plans = []
+
+    for quantity in quantities:
+        slices, total_cost = plan_consumption(
+            (layer for layer in open_layers if layer[1] > 0), quantity
+        )
+        consumed = {layer_slice.layer_id: layer_slice.quantity for layer_slice in slices}
+        for layer in open_layers:
+            layer[1] -= consumed.get(layer[0], Decimal('0'))
+        plans.append((slices, total_cost))
+
+    return plans
+
+
+class LayerConsumptionEngine:
+    """
+    Set-based consumption of valuation layers for outbound movements.
+
+    Only the prefix of open layers needed to cover the issue is fetched (a
+    running-sum window over the costing order), the split is computed in
+    memory, and all writes are batched. The stock item's average cost is
+    derived from the open-layer totals returned by the same window query, so
+    no second pass over the layers is needed. The number of queries is
+    constant regardless of how many layers are consumed.
+    """
+
+    def __init__(self, tenant, costing_method='FIFO'):
+        self.tenant = tenant
+        self.costing_method = costing_method
+
+    def get_ordering(self) -> List[str]:
+        if self.costing_method == 'LIFO':
+            return ['-layer_date', '-id']
+        # FIFO, WEIGHTED_AVERAGE, STANDARD and anything else consume oldest first
+        return ['layer_date', 'id']
+
+    def _window_order(self):
+        return [
+            F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+            for field in self.get_ordering()
+        ]
+
+    def fetch_needed_layers(self, stock_item: StockItem, quantity: Decimal) -> List[dict]:
+        """
+        Open layers, in consumption order, whose preceding running total is
+        below ``quantity``. Each row also carries the totals over *all* open
+        layers (``open_quantity``/``open_value``).
+        """
+        return list(
+            StockValuationLayer.objects.filter(
+                stock_item=stock_item,
+                quantity_remaining__gt=0
+            ).annotate(
+                cumulative_quantity=Window(
+                    expression=Sum('quantity_remaining'),
+                    order_by=self._window_order(),
+                    frame=RowRange(start=None, end=0),
+                ),
+                open_quantity=Window(expression=Sum('quantity_remaining')),
+                open_value=Window(expression=Sum(F('quantity_remaining') * F('unit_cost'))),
+            ).filter(
+                cumulative_quantity__lt=Value(quantity) + F('quantity_remaining')
+            ).order_by(
+                *self.get_ordering()
+            ).values(
+                'id', 'quantity_remaining', 'unit_cost', 'open_quantity', 'open_value'
+            )
+        )
+
+    def consume(self, stock_item: StockItem, quantity: Decimal, movement_item) -> dict:
+        """
+        Consume ``quantity`` from the stock item's layers. Must run inside a
+        transaction; the stock item and the consumed layers are row-locked.
+        """
+        return self.consume_lines(stock_item, [(movement_item, quantity)])[0]
+
+    def consume_lines(self, stock_item: StockItem, lines: List[Tuple[object, Decimal]]) -> List[dict]:
+        """
+        Consume several ``(movement_item, quantity)`` issues of one stock item
+        in order, with a single layer fetch and one batch of writes. Returns
+        one result dict per line.
+        """
+        # Serialise consumers of this stock item before reading running totals
+        list(StockItem.objects.select_for_update().filter(pk=stock_item.pk).values_list('pk', flat=True))
+
+        total_quantity = sum((quantity for _, quantity in lines), Decimal('0'))
+        rows = self.fetch_needed_layers(stock_item, total_quantity)
+        plans = plan_consumption_lines(
+            [(row['id'], row['quantity_remaining'], row['unit_cost']) for row in rows],
+            [quantity for _, quantity in lines]
+        )
+
+        layers = StockValuationLayer.objects.select_for_update().in_bulk(
+            {layer_slice.layer_id for slices, _ in plans for layer_slice in slices}
+        )
+
+        now = timezone.now()
+        consumptions = []
+        results = []
+        consumed_quantity = Decimal('0')
+        consumed_cost = Decimal('0')
+
+        for (movement_item, _), (slices, total_cost) in zip(lines, plans):
+            for layer_slice in slices:
+                layer = layers[layer_slice.layer_id]
+                layer.quantity_out += layer_slice.quantity
+                layer.quantity_remaining -= layer_slice.quantity
+                consumed_quantity += layer_slice.quantity
+
+                consumptions.append(StockValuationLayer(
+                    tenant=self.tenant,
+                    stock_item=stock_item,
+                    movement_item=movement_item,
+                    source_layer=layer,
+                    quantity_out=layer_slice.quantity,
+                    unit_cost=layer_slice.unit_cost,
+                    total_cost=layer_slice.cost,
+                    layer_date=now,
+                    costing_method=self.costing_method
+                ))
+
+            consumed_cost += total_cost
+            results.append({
+                'layers_consumed': [
+                    {
+                        'layer_id': layer_slice.layer_id,
+                        'quantity': layer_slice.quantity,
+                        'cost': layer_slice.cost
+                    }
+                    for layer_slice in slices
+                ],
+                'total_cost': total_cost,
+            })
+
+        if layers:
+            StockValuationLayer.objects.bulk_update(
+                list(layers.values()), ['quantity_out', 'quantity_remaining']
+            )
+            StockValuationLayer.objects.bulk_create(consumptions)
+
+        if rows:
+            self.apply_average_cost(
+                stock_item,
+                rows[0]['open_quantity'] - consumed_quantity,
+                rows[0]['open_value'] - consumed_cost
+            )
+
+        self.record_value_change(stock_item, -consumed_quantity, -consumed_cost)
+
+        return results
+
+    def record_value_change(self, stock_item: StockItem, quantity: Decimal, value: Decimal):
+        """Apply a layer quantity/value change to the inventory value snapshot"""
+        InventoryValueSnapshot.apply_deltas(
+            stock_item.tenant_id,
+            {(stock_item.warehouse_id, stock_item.product_id): (quantity, value)}
+        )
+
+    def open_layer_totals(self, stock_item: StockItem) -> Tuple[Decimal, Decimal]:
+        """(quantity, value) over all open layers, summed in the database"""
+        totals = StockValuationLayer.objects.filter(
+            stock_item=stock_item,
+            quantity_remaining__gt=0
+        ).aggregate(
+            quantity=Sum('quantity_remaining'),
+            value=Sum(F('quantity_remaining') * F('unit_cost'))
+        )
+        return totals['quantity'] or Decimal('0'), totals['value'] or Decimal('0')
+
+    def apply_average_cost(self, stock_item: StockItem, open_quantity: Decimal,
+                           open_value: Decimal) -> Optional[Decimal]:
+        """Store open_value / open_quantity as the average cost (unchanged if empty)"""
+        if open_quantity > 0:
+            stock_item.average_unit_cost = open_value / open_quantity
+            stock_item.save(update_fields=['average_unit_cost'])
+            return stock_item.average_unit_cost
+        return None
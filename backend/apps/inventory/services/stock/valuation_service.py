@@ -1,11 +1,14 @@
 from django.db import transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP
 from typing import List, Dict, Any, Optional
 from ..base import BaseService, ServiceResult
+from .valuation_engine import LayerConsumptionEngine
 from ...models import (
     StockItem, StockMovementItem, StockValuationLayer,
-    LandedCost, LandedCostAllocation
+    InventoryValueSnapshot, LandedCost, LandedCostAllocation
 )
 
 class StockValuationService(BaseService):
@@ -24,6 +27,7 @@ class StockValuationService(BaseService):
     def __init__(self, tenant=None, user=None, costing_method='FIFO'):
         super().__init__(tenant, user)
         self.costing_method = costing_method
+        self.engine = LayerConsumptionEngine(tenant, costing_method)
     
     @transaction.atomic
     def update_valuation_layers(self, movement_item: StockMovementItem) -> ServiceResult:
@@ -46,6 +50,99 @@ class StockValuationService(BaseService):
         except Exception as e:
             return ServiceResult.error(f"Failed to update valuation layers: {str(e)}")
     
+    @transaction.atomic
+    def update_valuation_layers_bulk(self, movement_items: List[StockMovementItem]) -> ServiceResult:
+        """
+        Update valuation layers for many movement items in one pass per stock item.
+        
+        Lines of a stock item are handled in order as runs of inbound or
+        outbound movements: an inbound run becomes one bulk insert of layers,
+        an outbound run one engine call that consumes all of its lines.
+        """
+        try:
+            inbound_types = self._get_inbound_movement_types()
+            outbound_types = self._get_outbound_movement_types()
+            
+            lines_by_stock_item = {}
+            for movement_item in movement_items:
+                lines_by_stock_item.setdefault(movement_item.stock_item_id, []).append(movement_item)
+            
+            costed_items = []
+            layers_created = 0
+            
+            for lines in lines_by_stock_item.values():
+                stock_item = lines[0].stock_item
+                needs_average_refresh = False
+                run_direction = None
+                run = []
+                
+                def flush_run():
+                    nonlocal layers_created, needs_average_refresh
+                    if run_direction == 'in':
+                        now = timezone.now()
+                        StockValuationLayer.objects.bulk_create([
+                            StockValuationLayer(
+                                tenant=self.tenant,
+                                stock_item=stock_item,
+                                movement_item=item,
+                                quantity_in=item.quantity,
+                                quantity_remaining=item.quantity,
+                                unit_cost=item.unit_cost,
+                                total_cost=item.quantity * item.unit_cost,
+                                layer_date=now,
+                                costing_method=self.costing_method
+                            )
+                            for item in run
+                        ])
+                        layers_created += len(run)
+                        needs_average_refresh = True
+                        self.engine.record_value_change(
+                            stock_item,
+                            sum((item.quantity for item in run), Decimal('0')),
+                            sum((item.quantity * item.unit_cost for item in run), Decimal('0'))
+                        )
+                    elif run_direction == 'out':
+                        results = self.engine.consume_lines(
+                            stock_item, [(item, item.quantity) for item in run]
+                        )
+                        for item, result in zip(run, results):
+                            item.actual_unit_cost = (
+                                result['total_cost'] / item.quantity if item.quantity > 0 else Decimal('0')
+                            )
+                            costed_items.append(item)
+                        needs_average_refresh = False
+                
+                for movement_item in lines:
+                    movement_type = movement_item.movement.movement_type
+                    if movement_type in inbound_types:
+                        direction = 'in'
+                    elif movement_type in outbound_types:
+                        direction = 'out'
+                    else:
+                        continue
+                    
+                    if direction != run_direction:
+                        flush_run()
+                        run_direction, run = direction, []
+                    run.append(movement_item)
+                
+                flush_run()
+                
+                if needs_average_refresh:
+                    self._update_average_cost(stock_item)
+            
+            if costed_items:
+                StockMovementItem.objects.bulk_update(costed_items, ['actual_unit_cost'])
+            
+            return ServiceResult.success(data={
+                'layers_created': layers_created,
+                'items_costed': len(costed_items)
+            })
+            
+        except Exception as e:
+            transaction.set_rollback(True)
+            return ServiceResult.error(f"Failed to update valuation layers: {str(e)}")
+    
     def _get_inbound_movement_types(self):
         return [
             'RECEIPT', 'TRANSFER_IN', 'ADJUSTMENT_POSITIVE',
@@ -78,6 +175,7 @@ class StockValuationService(BaseService):
             
             # Update stock item average cost
             self._update_average_cost(stock_item)
+            self.engine.record_value_change(stock_item, quantity, quantity * unit_cost)
             
             return ServiceResult.success(data=valuation_layer)
             
@@ -88,57 +186,15 @@ class StockValuationService(BaseService):
                                  movement_item: StockMovementItem) -> ServiceResult:
         """Process outbound movement and consume from valuation layers"""
         try:
-            remaining_to_consume = quantity
-            total_cost = Decimal('0')
-            layers_consumed = []
-            
-            # Get available valuation layers based on costing method
-            available_layers = self._get_available_layers(stock_item)
-            
-            for layer in available_layers:
-                if remaining_to_consume <= 0:
-                    break
-                
-                # Calculate quantity to consume from this layer
-                consume_quantity = min(remaining_to_consume, layer.quantity_remaining)
-                consume_cost = consume_quantity * layer.unit_cost
-                
-                # Update layer
-                layer.quantity_out += consume_quantity
-                layer.quantity_remaining -= consume_quantity
-                layer.save()
-                
-                # Create consumption record
-                consumption = StockValuationLayer.objects.create(
-                    tenant=self.tenant,
-                    stock_item=stock_item,
-                    movement_item=movement_item,
-                    source_layer=layer,
-                    quantity_out=consume_quantity,
-                    unit_cost=layer.unit_cost,
-                    total_cost=consume_cost,
-                    layer_date=timezone.now(),
-                    costing_method=self.costing_method
-                )
-                
-                layers_consumed.append({
-                    'layer_id': layer.id,
-                    'quantity': consume_quantity,
-                    'cost': consume_cost
-                })
-                
-                total_cost += consume_cost
-                remaining_to_consume -= consume_quantity
+            consumption = self.engine.consume(stock_item, quantity, movement_item)
+            total_cost = consumption['total_cost']
             
             # Update movement item with actual cost
             movement_item.actual_unit_cost = total_cost / quantity if quantity > 0 else Decimal('0')
             movement_item.save()
             
-            # Update stock item average cost
-            self._update_average_cost(stock_item)
-            
             return ServiceResult.success(data={
-                'layers_consumed': layers_consumed,
+                'layers_consumed': consumption['layers_consumed'],
                 'total_cost': total_cost,
                 'actual_unit_cost': movement_item.actual_unit_cost
             })
@@ -148,62 +204,61 @@ class StockValuationService(BaseService):
     
     def _get_available_layers(self, stock_item: StockItem):
         """Get available valuation layers based on costing method"""
-        base_query = StockValuationLayer.objects.filter(
+        return StockValuationLayer.objects.filter(
             stock_item=stock_item,
             quantity_remaining__gt=0
-        )
-        
-        if self.costing_method == 'FIFO':
-            return base_query.order_by('layer_date', 'id')
-        elif self.costing_method == 'LIFO':
-            return base_query.order_by('-layer_date', '-id')
-        elif self.costing_method in ['WEIGHTED_AVERAGE', 'STANDARD']:
-            return base_query.order_by('layer_date', 'id')
-        else:
-            return base_query.order_by('layer_date', 'id')
+        ).order_by(*self.engine.get_ordering())
     
     def _update_average_cost(self, stock_item: StockItem):
         """Update stock item average cost based on valuation layers"""
-        layers = StockValuationLayer.objects.filter(
-            stock_item=stock_item,
-            quantity_remaining__gt=0
-        )
-        
-        total_quantity = sum(layer.quantity_remaining for layer in layers)
-        total_cost = sum(layer.quantity_remaining * layer.unit_cost for layer in layers)
-        
-        if total_quantity > 0:
-            stock_item.average_unit_cost = total_cost / total_quantity
-            stock_item.save(update_fields=['average_unit_cost'])
+        total_quantity, total_cost = self.engine.open_layer_totals(stock_item)
+        self.engine.apply_average_cost(stock_item, total_quantity, total_cost)
     
     def calculate_inventory_value(self, warehouse_id: Optional[int] = None, 
-                                product_ids: Optional[List[int]] = None) -> ServiceResult:
-        """Calculate total inventory value"""
+                                product_ids: Optional[List[int]] = None,
+                                as_of: Optional[timezone.datetime] = None) -> ServiceResult:
+        """
+        Calculate total inventory value.
+        
+        FIFO/LIFO values come from the per-warehouse/per-product snapshot; with
+        ``as_of`` the layer changes recorded after that moment are backed out
+        of it. A tenant whose snapshot has never been rebuilt is backfilled
+        from its open layers first. Weighted average and standard cost are
+        valued from stock items.
+        """
         try:
-            queryset = StockItem.objects.filter(tenant=self.tenant)
+            if self.costing_method in ['WEIGHTED_AVERAGE', 'STANDARD']:
+                return self._calculate_stock_item_value(warehouse_id, product_ids)
+            
+            if not InventoryValueSnapshot.has_been_rebuilt(self.tenant.id):
+                InventoryValueSnapshot.rebuild(self.tenant)
+            
+            snapshots = InventoryValueSnapshot.objects.filter(tenant=self.tenant)
             
             if warehouse_id:
-                queryset = queryset.filter(warehouse_id=warehouse_id)
+                snapshots = snapshots.filter(warehouse_id=warehouse_id)
             
             if product_ids:
-                queryset = queryset.filter(product_id__in=product_ids)
+                snapshots = snapshots.filter(product_id__in=product_ids)
+            
+            changes = self._get_layer_changes_since(as_of, warehouse_id, product_ids) if as_of else {}
             
             total_value = Decimal('0')
             item_values = []
             
-            for stock_item in queryset:
-                # Calculate value based on costing method
-                if self.costing_method == 'WEIGHTED_AVERAGE':
-                    value = stock_item.quantity_on_hand * stock_item.average_unit_cost
-                elif self.costing_method == 'STANDARD':
-                    value = stock_item.quantity_on_hand * stock_item.standard_cost
-                else:  # FIFO/LIFO
-                    value = self._calculate_fifo_lifo_value(stock_item)
+            for snapshot in snapshots.select_related('product'):
+                quantity_in, value_in, quantity_out, value_out = changes.get(
+                    (snapshot.warehouse_id, snapshot.product_id),
+                    (Decimal('0'), Decimal('0'), Decimal('0'), Decimal('0'))
+                )
+                quantity = snapshot.quantity - quantity_in + quantity_out
+                value = snapshot.value - value_in + value_out
                 
                 item_values.append({
-                    'stock_item_id': stock_item.id,
-                    'product_name': stock_item.product.name,
-                    'quantity': stock_item.quantity_on_hand,
+                    'warehouse_id': snapshot.warehouse_id,
+                    'product_id': snapshot.product_id,
+                    'product_name': snapshot.product.name,
+                    'quantity': quantity,
                     'value': value
                 })
                 
@@ -212,12 +267,105 @@ class StockValuationService(BaseService):
             return ServiceResult.success(data={
                 'total_value': total_value,
                 'item_values': item_values,
-                'costing_method': self.costing_method
+                'costing_method': self.costing_method,
+                'as_of': as_of
             })
             
         except Exception as e:
             return ServiceResult.error(f"Failed to calculate inventory value: {str(e)}")
     
+    def _get_layer_changes_since(self, as_of, warehouse_id=None, product_ids=None) -> Dict:
+        """
+        Layer receipts, consumptions and landed-cost re-costs after ``as_of``
+        per (warehouse, product) as (quantity_in, value_in, quantity_out,
+        value_out), in one grouped query each for layers and allocations.
+        
+        Receipts are valued at their cost before landed cost, since landed
+        cost reaches the snapshot as a separate value-only delta that is
+        backed out by its allocation date.
+        """
+        layers = StockValuationLayer.objects.filter(tenant=self.tenant, layer_date__gt=as_of)
+        allocations = LandedCostAllocation.objects.filter(tenant=self.tenant, created_at__gt=as_of)
+        
+        if warehouse_id:
+            layers = layers.filter(stock_item__warehouse_id=warehouse_id)
+            allocations = allocations.filter(stock_item__warehouse_id=warehouse_id)
+        
+        if product_ids:
+            layers = layers.filter(stock_item__product_id__in=product_ids)
+            allocations = allocations.filter(stock_item__product_id__in=product_ids)
+        
+        inbound = Q(source_layer__isnull=True)
+        consumption = Q(source_layer__isnull=False)
+        zero = Value(Decimal('0'))
+        
+        rows = layers.values(
+            'stock_item__warehouse_id', 'stock_item__product_id'
+        ).annotate(
+            quantity_in=Coalesce(Sum('quantity_in', filter=inbound), zero),
+            value_in=Coalesce(
+                Sum(F('quantity_in') * F('unit_cost') - F('landed_cost_allocated'), filter=inbound), zero
+            ),
+            quantity_out=Coalesce(Sum('quantity_out', filter=consumption), zero),
+            value_out=Coalesce(Sum('total_cost', filter=consumption), zero),
+        )
+        
+        changes = {
+            (row['stock_item__warehouse_id'], row['stock_item__product_id']): [
+                row['quantity_in'], row['value_in'], row['quantity_out'], row['value_out']
+            ]
+            for row in rows
+        }
+        
+        landed_rows = allocations.values(
+            'stock_item__warehouse_id', 'stock_item__product_id'
+        ).annotate(
+            value=Coalesce(Sum('capitalized_cost'), zero)
+        )
+        
+        for row in landed_rows:
+            key = (row['stock_item__warehouse_id'], row['stock_item__product_id'])
+            changes.setdefault(key, [Decimal('0')] * 4)[1] += row['value']
+        
+        return {key: tuple(change) for key, change in changes.items()}
+    
+    def _calculate_stock_item_value(self, warehouse_id: Optional[int] = None,
+                                    product_ids: Optional[List[int]] = None) -> ServiceResult:
+        """Value stock items at their average or standard cost"""
+        queryset = StockItem.objects.filter(tenant=self.tenant).select_related('product')
+        
+        if warehouse_id:
+            queryset = queryset.filter(warehouse_id=warehouse_id)
+        
+        if product_ids:
+            queryset = queryset.filter(product_id__in=product_ids)
+        
+        total_value = Decimal('0')
+        item_values = []
+        
+        for stock_item in queryset:
+            if self.costing_method == 'WEIGHTED_AVERAGE':
+                value = stock_item.quantity_on_hand * stock_item.average_unit_cost
+            else:
+                value = stock_item.quantity_on_hand * stock_item.standard_cost
+            
+            item_values.append({
+                'stock_item_id': stock_item.id,
+                'warehouse_id': stock_item.warehouse_id,
+                'product_id': stock_item.product_id,
+                'product_name': stock_item.product.name,
+                'quantity': stock_item.quantity_on_hand,
+                'value': value
+            })
+            
+            total_value += value
+        
+        return ServiceResult.success(data={
+            'total_value': total_value,
+            'item_values': item_values,
+            'costing_method': self.costing_method
+        })
+    
     def _calculate_fifo_lifo_value(self, stock_item: StockItem) -> Decimal:
         """Calculate FIFO/LIFO inventory value"""
         layers = self._get_available_layers(stock_item)
@@ -268,6 +416,9 @@ class StockValuationService(BaseService):
                     allocation_percentage = item_base_cost / total_base_cost
                     allocated_cost = landed_cost.total_cost * allocation_percentage
                     
+                    # Update valuation layers with landed cost
+                    capitalized_cost = self._apply_landed_cost_to_layers(movement_item, allocated_cost)
+                    
                     # Create allocation record
                     allocation = LandedCostAllocation.objects.create(
                         tenant=self.tenant,
@@ -276,12 +427,10 @@ class StockValuationService(BaseService):
                         movement_item=movement_item,
                         base_cost=item_base_cost,
                         allocated_cost=allocated_cost,
+                        capitalized_cost=capitalized_cost,
                         allocation_percentage=allocation_percentage * 100
                     )
                     allocations.append(allocation)
-                    
-                    # Update valuation layers with landed cost
-                    self._apply_landed_cost_to_layers(movement_item, allocated_cost)
             
             # Mark landed cost as applied
             landed_cost.status = 'APPLIED'
@@ -300,8 +449,11 @@ class StockValuationService(BaseService):
         except Exception as e:
             return ServiceResult.error(f"Failed to apply landed costs: {str(e)}")
     
-    def _apply_landed_cost_to_layers(self, movement_item: StockMovementItem, allocated_cost: Decimal):
-        """Apply allocated landed cost to valuation layers"""
+    def _apply_landed_cost_to_layers(self, movement_item: StockMovementItem, allocated_cost: Decimal) -> Decimal:
+        """
+        Apply allocated landed cost to valuation layers and return the part
+        of it added to inventory value (the share of units still on hand).
+        """
         # Find the valuation layer created for this movement item
         layer = StockValuationLayer.objects.filter(
             movement_item=movement_item,
@@ -320,6 +472,11 @@ class StockValuationService(BaseService):
             
             # Update stock item average cost
             self._update_average_cost(layer.stock_item)
+            capitalized_cost = layer.quantity_remaining * additional_cost_per_unit
+            self.engine.record_value_change(layer.stock_item, Decimal('0'), capitalized_cost)
+            return capitalized_cost
+        
+        return Decimal('0')
     
     def get_cost_analysis(self, stock_item_id: int) -> ServiceResult:
         """Get detailed cost analysis for a stock item"""
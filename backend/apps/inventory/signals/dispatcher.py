@@ -0,0 +1,266 @@
+"""
+Coalescing dispatcher for inventory signal side effects
+
+Receivers mark objects dirty for a side effect (stock alerts, valuation
+layers, integration syncs, ...) instead of queueing one task per save.
+Marks are collected per transaction - or per request, when the request runs
+inside ``coalesce_side_effects`` - de-duplicated, and emitted on commit as
+one ``process_side_effect_batch`` task per side effect and tenant carrying
+the full id set.
+
+Batches of one side effect and tenant are rate limited to a number per
+minute; batches over the limit are deferred to the next minute with free
+capacity rather than dropped. A batch may include ids marked inside a
+savepoint that was later rolled back; side effect handlers recompute from
+current data, so this only costs a redundant recomputation.
+"""
+
+import logging
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'register_side_effect', 'get_side_effect_handler', 'each_object',
+    'mark_dirty', 'coalesce_side_effects', 'side_effect_metrics',
+]
+
+KEY_PREFIX = 'inventory:side_effects'
+
+# Batches per side effect and tenant per minute, unless configured
+DEFAULT_RATE_LIMIT = 60
+
+# Batches over the rate limit are deferred at most this far
+MAX_DEFER_MINUTES = 10
+
+# Coalescing counters are kept for a day
+METRICS_TTL = 24 * 3600
+
+METRIC_FIELDS = ['requested', 'coalesced', 'batches', 'deferred']
+
+_handlers = {}
+_local = threading.local()
+
+
+def register_side_effect(side_effect, handler, rate_limit=None):
+    """
+    Register ``handler(tenant_id, object_ids)`` for a side effect.
+    
+    ``rate_limit`` is the default number of batches per tenant per minute;
+    ``INVENTORY_SIDE_EFFECT_RATE_LIMITS`` overrides it per side effect.
+    """
+    _handlers[side_effect] = {
+        'handler': handler,
+        'rate_limit': rate_limit or DEFAULT_RATE_LIMIT,
+    }
+
+
+def get_side_effect_handler(side_effect):
+    entry = _handlers.get(side_effect)
+    return entry['handler'] if entry else None
+
+
+def each_object(func):
+    """Batch handler calling a per-object task function for every id"""
+    def handler(tenant_id, object_ids):
+        for object_id in object_ids:
+            func(object_id)
+    return handler
+
+
+def _rate_limit(side_effect):
+    configured = getattr(settings, 'INVENTORY_SIDE_EFFECT_RATE_LIMITS', {})
+    if side_effect in configured:
+        return configured[side_effect]
+    return _handlers[side_effect]['rate_limit']
+
+
+def _incr(key, amount=1, timeout=METRICS_TTL):
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, amount, timeout=timeout)
+        return amount
+
+
+class _PendingBatch:
+    """Object ids marked dirty per (side effect, tenant), waiting for a flush"""
+    
+    def __init__(self):
+        self.object_ids = defaultdict(set)
+        self.requested = defaultdict(int)
+    
+    def add(self, side_effect, tenant_id, object_id):
+        self.object_ids[(side_effect, tenant_id)].add(object_id)
+        self.requested[(side_effect, tenant_id)] += 1
+    
+    def register_on_commit(self, connection):
+        """
+        Flush when the connection's transaction commits. The thread-local
+        keeps only a weak reference: the pending on_commit callback is what
+        keeps the batch alive, so a rollback discarding the callback also
+        ends the batch.
+        """
+        self.alias = connection.alias
+        _transaction_batches()[connection.alias] = weakref.ref(self)
+        transaction.on_commit(self.flush_on_commit, using=connection.alias)
+    
+    @staticmethod
+    def pending_on(connection):
+        """The batch whose on_commit flush is still pending on the connection"""
+        ref = _transaction_batches().get(connection.alias)
+        return ref() if ref is not None else None
+    
+    def flush_on_commit(self):
+        batches = _transaction_batches()
+        ref = batches.get(self.alias)
+        if ref is not None and ref() is self:
+            del batches[self.alias]
+        self.flush()
+    
+    def flush(self):
+        batches, self.object_ids = self.object_ids, defaultdict(set)
+        requested, self.requested = self.requested, defaultdict(int)
+        
+        for (side_effect, tenant_id), object_ids in batches.items():
+            try:
+                _emit(side_effect, tenant_id, sorted(object_ids), requested[(side_effect, tenant_id)])
+            except Exception as e:
+                logger.error(
+                    f"Failed to dispatch side effect {side_effect} for tenant {tenant_id} "
+                    f"({len(object_ids)} objects): {str(e)}"
+                )
+
+
+def _transaction_batches():
+    """Per-thread weak references to the pending transaction batch of each connection"""
+    if not hasattr(_local, 'transaction_batches'):
+        _local.transaction_batches = {}
+    return _local.transaction_batches
+
+
+def _claim_slot(side_effect, tenant_id):
+    """
+    Claim a batch slot under the side effect's rate limit and return the
+    countdown in seconds until it (0 for the current minute).
+    """
+    limit = _rate_limit(side_effect)
+    now = time.time()
+    minute = int(now // 60)
+    
+    for ahead in range(MAX_DEFER_MINUTES):
+        key = f"{KEY_PREFIX}:slots:{side_effect}:{tenant_id}:{minute + ahead}"
+        if _incr(key, timeout=(ahead + 2) * 60) <= limit:
+            return 0 if ahead == 0 else (minute + ahead) * 60 - now
+    
+    # Everything within reach is taken; queue behind the furthest minute
+    return (minute + MAX_DEFER_MINUTES) * 60 - now
+
+
+def _emit(side_effect, tenant_id, object_ids, requested):
+    from ..tasks.side_effects import process_side_effect_batch
+    
+    countdown = _claim_slot(side_effect, tenant_id)
+    if countdown:
+        process_side_effect_batch.apply_async(
+            args=[side_effect, tenant_id, object_ids], countdown=countdown
+        )
+    else:
+        process_side_effect_batch.delay(side_effect, tenant_id, object_ids)
+    
+    # Without coalescing every mark would have been its own task
+    metrics_key = f"{KEY_PREFIX}:metrics:{side_effect}"
+    _incr(f"{metrics_key}:requested", requested)
+    _incr(f"{metrics_key}:coalesced", len(object_ids))
+    _incr(f"{metrics_key}:batches")
+    if countdown:
+        _incr(f"{metrics_key}:deferred")
+    
+    logger.debug(
+        f"Side effect {side_effect} for tenant {tenant_id}: {requested} marks, "
+        f"{len(object_ids)} objects, 1 batch"
+        + (f" deferred {countdown:.0f}s" if countdown else '')
+    )
+
+
+def mark_dirty(side_effect, tenant_id, object_id, using=None):
+    """
+    Mark an object for a side effect. The side effect runs once per batch
+    after the current transaction commits (or the request scope ends), or
+    immediately outside both.
+    """
+    if side_effect not in _handlers:
+        raise ValueError(f"Unknown side effect: {side_effect}")
+    
+    request_batch = getattr(_local, 'request_batch', None)
+    if request_batch is not None:
+        request_batch.add(side_effect, tenant_id, object_id)
+        return
+    
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        batch = _PendingBatch()
+        batch.add(side_effect, tenant_id, object_id)
+        batch.flush()
+        return
+    
+    batch = _PendingBatch.pending_on(connection)
+    if batch is None:
+        batch = _PendingBatch()
+        batch.register_on_commit(connection)
+    
+    batch.add(side_effect, tenant_id, object_id)
+
+
+@contextmanager
+def coalesce_side_effects(using=None):
+    """
+    Collect side effect marks until the outermost scope exits, across any
+    number of transactions, then dispatch them as one batch per side effect
+    and tenant (after commit, if the scope exits inside a transaction).
+    """
+    if getattr(_local, 'request_batch', None) is not None:
+        yield
+        return
+    
+    batch = _PendingBatch()
+    _local.request_batch = batch
+    try:
+        yield
+    finally:
+        _local.request_batch = None
+        # Work committed before an exception still needs its side effects
+        if transaction.get_connection(using).in_atomic_block:
+            transaction.on_commit(batch.flush, using=using)
+        else:
+            batch.flush()
+
+
+def side_effect_metrics(side_effects=None):
+    """
+    Coalescing counters per side effect over the last day: marks requested,
+    distinct objects dispatched, batches sent, batches deferred by the rate
+    limit, and the tasks saved compared to one task per mark.
+    """
+    metrics = {}
+    for side_effect in side_effects or sorted(_handlers):
+        keys = {field: f"{KEY_PREFIX}:metrics:{side_effect}:{field}" for field in METRIC_FIELDS}
+        values = cache.get_many(list(keys.values()))
+        counts = {field: values.get(key, 0) for field, key in keys.items()}
+        
+        saved = counts['requested'] - counts['batches']
+        counts['tasks_saved'] = saved
+        counts['saved_percent'] = round(saved / counts['requested'] * 100, 1) if counts['requested'] else 0.0
+        metrics[side_effect] = counts
+    
+    return metrics
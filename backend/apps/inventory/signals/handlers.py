@@ -184,6 +184,49 @@ class IntegrationSignalMixin:
             
         except Exception as e:
             logger.error(f"Failed to queue integration sync: {str(e)}")
+    
+    @staticmethod
+    def queue_integration_batch_sync(integration_type: str, tenant_id: int, model_label: str,
+                                     instance_ids: list, action: str = 'update',
+                                     priority: str = 'normal'):
+        """Queue one integration sync for many instances of a model"""
+        try:
+            from ..tasks.celery import sync_integration_task
+            
+            sync_data = {
+                'integration_type': integration_type,
+                'tenant_id': tenant_id,
+                'instance_ids': list(instance_ids),
+                'model_name': model_label,
+                'action': action,
+                'priority': priority,
+                'created_at': timezone.now().isoformat()
+            }
+            
+            # Queue for async processing
+            sync_integration_task.delay(sync_data)
+            
+        except Exception as e:
+            logger.error(f"Failed to queue integration batch sync: {str(e)}")
+    
+    @staticmethod
+    def register_batch_sync(integration_type: str, model_label: str, action: str = 'update',
+                            priority: str = 'normal', rate_limit: Optional[int] = None) -> str:
+        """
+        Register a coalesced side effect syncing batches of ``model_label``
+        instances to ``integration_type`` and return its name for mark_dirty.
+        """
+        from .dispatcher import register_side_effect
+        
+        side_effect = f"sync:{integration_type}:{model_label}:{action}"
+        
+        def handler(tenant_id, object_ids):
+            IntegrationSignalMixin.queue_integration_batch_sync(
+                integration_type, tenant_id, model_label, object_ids, action, priority
+            )
+        
+        register_side_effect(side_effect, handler, rate_limit)
+        return side_effect
 
 class CacheInvalidationMixin:
     """Mixin for cache invalidation operations"""
@@ -12,9 +12,23 @@ from ..models import (
 from .handlers import (
     BaseSignalHandler, TenantSignalMixin, IntegrationSignalMixin
 )
+from .dispatcher import mark_dirty, register_side_effect
 
 logger = logging.getLogger(__name__)
 
+# Syncs coalesced per transaction (see dispatcher.py)
+ECOMMERCE_PLATFORM_STOCK_SYNC = 'sync:ecommerce_platforms:stock'
+ERP_MOVEMENT_SYNC = IntegrationSignalMixin.register_batch_sync('erp', StockMovement._meta.label, 'create')
+FINANCE_MOVEMENT_SYNC = IntegrationSignalMixin.register_batch_sync(
+    'finance', StockMovement._meta.label, 'create', priority='high'
+)
+ANALYTICS_MOVEMENT_SYNC = IntegrationSignalMixin.register_batch_sync(
+    'analytics', StockMovement._meta.label, 'create'
+)
+ANALYTICS_STOCK_SYNC = IntegrationSignalMixin.register_batch_sync(
+    'analytics', StockItem._meta.label, 'update'
+)
+
 # E-commerce Integration Signals
 @receiver(post_save, sender=StockItem)
 @BaseSignalHandler.safe_signal_execution
@@ -28,15 +42,7 @@ def sync_stock_to_ecommerce(sender, instance, created, **kwargs):
         return
     
     # Queue sync to all configured e-commerce platforms
-    platforms = _get_configured_ecommerce_platforms(instance.tenant)
-    
-    for platform in platforms:
-        IntegrationSignalMixin.queue_integration_sync(
-            f'ecommerce_{platform}', 
-            instance, 
-            'update',
-            priority='high'
-        )
+    mark_dirty(ECOMMERCE_PLATFORM_STOCK_SYNC, instance.tenant_id, instance.id)
 
 @receiver(post_save, sender=Product)
 @BaseSignalHandler.safe_signal_execution
@@ -93,9 +99,7 @@ def sync_movement_to_erp(sender, instance, created, **kwargs):
         return
     
     if instance.status == 'COMPLETED':
-        IntegrationSignalMixin.queue_integration_sync(
-            'erp', instance, 'create'
-        )
+        mark_dirty(ERP_MOVEMENT_SYNC, instance.tenant_id, instance.id)
 
 # Finance Integration Signals
 @receiver(post_save, sender=StockReceipt)
@@ -122,10 +126,7 @@ def sync_movement_to_finance(sender, instance, created, **kwargs):
     cogs_movement_types = ['ISSUE', 'ADJUSTMENT_NEGATIVE', 'DAMAGED', 'EXPIRED']
     
     if instance.movement_type in cogs_movement_types and instance.status == 'COMPLETED':
-        IntegrationSignalMixin.queue_integration_sync(
-            'finance', instance, 'create',
-            priority='high'
-        )
+        mark_dirty(FINANCE_MOVEMENT_SYNC, instance.tenant_id, instance.id)
 
 # CRM Integration Signals
 @receiver(post_save, sender=Product)
@@ -160,9 +161,7 @@ def sync_movement_to_analytics(sender, instance, created, **kwargs):
         return
     
     if instance.status == 'COMPLETED':
-        IntegrationSignalMixin.queue_integration_sync(
-            'analytics', instance, 'create'
-        )
+        mark_dirty(ANALYTICS_MOVEMENT_SYNC, instance.tenant_id, instance.id)
 
 @receiver(post_save, sender=StockItem)
 @BaseSignalHandler.safe_signal_execution
@@ -175,9 +174,7 @@ def sync_stock_to_analytics(sender, instance, created, **kwargs):
     if not created and hasattr(instance, '_original_quantity'):
         quantity_change = abs(instance.quantity_on_hand - instance._original_quantity)
         if quantity_change >= 1:  # Configurable threshold
-            IntegrationSignalMixin.queue_integration_sync(
-                'analytics', instance, 'update'
-            )
+            mark_dirty(ANALYTICS_STOCK_SYNC, instance.tenant_id, instance.id)
 
 # Warehouse Management System Integration
 @receiver(post_save, sender=StockTransfer)
@@ -308,6 +305,19 @@ def _get_configured_ecommerce_platforms(tenant):
     # This would fetch from tenant settings or configuration
     return ['shopify', 'woocommerce']  # Example
 
+def _sync_stock_to_ecommerce_platforms(tenant_id, stock_item_ids):
+    """Batch handler: one sync per configured e-commerce platform"""
+    from apps.core.models import Tenant
+    
+    tenant = Tenant.objects.get(id=tenant_id)
+    for platform in _get_configured_ecommerce_platforms(tenant):
+        IntegrationSignalMixin.queue_integration_batch_sync(
+            f'ecommerce_{platform}', tenant_id, StockItem._meta.label,
+            stock_item_ids, 'update', priority='high'
+        )
+
+register_side_effect(ECOMMERCE_PLATFORM_STOCK_SYNC, _sync_stock_to_ecommerce_platforms)
+
 def _is_3pl_warehouse(warehouse):
     """Check if warehouse is managed by 3PL"""
     return warehouse.warehouse_type == 'THIRD_PARTY' if warehouse else False
@@ -9,13 +9,30 @@ from ..models import (
     StockItem, StockMovement, StockMovementItem, 
     StockValuationLayer, InventoryAlert
 )
+from ..tasks.classification import request_classification_update
 from .handlers import (
     BaseSignalHandler, TenantSignalMixin, AuditSignalMixin,
     NotificationSignalMixin, IntegrationSignalMixin
 )
+from .dispatcher import mark_dirty, register_side_effect, each_object
 
 logger = logging.getLogger(__name__)
 
+# Side effects coalesced per transaction (registered below, with the tasks)
+STOCK_ANALYTICS = 'stock_analytics'
+VALUATION_LAYERS = 'valuation_layers'
+STOCK_ALERTS = 'stock_alerts'
+STOCK_CHANGES = 'stock_changes'
+REORDER_ALERTS = 'reorder_alerts'
+AVERAGE_COST = 'average_cost'
+ECOMMERCE_STOCK_SYNC = IntegrationSignalMixin.register_batch_sync(
+    'ecommerce', StockItem._meta.label, 'update', priority='high'
+)
+ERP_STOCK_SYNC = IntegrationSignalMixin.register_batch_sync('erp', StockItem._meta.label, 'update')
+FINANCE_VALUATION_SYNC = IntegrationSignalMixin.register_batch_sync(
+    'finance', StockValuationLayer._meta.label, 'update', priority='high'
+)
+
 @receiver(post_save, sender=StockMovement)
 @BaseSignalHandler.safe_signal_execution
 def stock_movement_post_save(sender, instance, created, **kwargs):
@@ -49,7 +66,7 @@ def stock_movement_post_save(sender, instance, created, **kwargs):
     
     # Update related analytics
     if instance.status == 'COMPLETED':
-        _update_stock_analytics.delay(instance.tenant_id, instance.id)
+        mark_dirty(STOCK_ANALYTICS, instance.tenant_id, instance.id)
 
 @receiver(post_save, sender=StockMovementItem)
 @BaseSignalHandler.safe_signal_execution
@@ -63,14 +80,16 @@ def stock_movement_item_post_save(sender, instance, created, **kwargs):
         with transaction.atomic():
             _update_stock_levels_from_movement_item(instance)
         
+        tenant_id = instance.stock_item.tenant_id
+        
         # Update valuation layers
-        _update_valuation_layers.delay(instance.id)
+        mark_dirty(VALUATION_LAYERS, tenant_id, instance.id)
         
         # Check for alerts
-        _check_stock_alerts.delay(instance.stock_item_id)
+        mark_dirty(STOCK_ALERTS, tenant_id, instance.stock_item_id)
         
-        # Update ABC classification if needed
-        _update_abc_classification.delay(instance.stock_item.tenant_id)
+        # Update ABC classification (debounced per tenant)
+        request_classification_update(tenant_id)
 
 @receiver(pre_save, sender=StockItem)
 @BaseSignalHandler.safe_signal_execution
@@ -118,15 +137,13 @@ def stock_item_post_save(sender, instance, created, **kwargs):
     else:
         # Track changes for audit
         if instance.pk:
-            _track_stock_changes.delay(instance.id)
+            mark_dirty(STOCK_CHANGES, instance.tenant_id, instance.id)
         
         # Check for reorder alerts
-        _check_reorder_alerts.delay(instance.id)
+        mark_dirty(REORDER_ALERTS, instance.tenant_id, instance.id)
         
         # Update e-commerce inventory
-        IntegrationSignalMixin.queue_integration_sync(
-            'ecommerce', instance, 'update'
-        )
+        mark_dirty(ECOMMERCE_STOCK_SYNC, instance.tenant_id, instance.id)
     
     # Invalidate cache
     cache_patterns = [
@@ -165,12 +182,10 @@ def valuation_layer_post_save(sender, instance, created, **kwargs):
     
     if created or instance.quantity_remaining != getattr(instance, '_original_quantity_remaining', 0):
         # Update stock item average cost
-        _update_stock_item_average_cost.delay(instance.stock_item_id)
+        mark_dirty(AVERAGE_COST, instance.tenant_id, instance.stock_item_id)
         
         # Sync to finance module
-        IntegrationSignalMixin.queue_integration_sync(
-            'finance', instance, 'update', priority='high'
-        )
+        mark_dirty(FINANCE_VALUATION_SYNC, instance.tenant_id, instance.id)
 
 # Helper functions for async processing
 def _update_stock_levels_from_movement_item(movement_item):
@@ -273,6 +288,17 @@ except ImportError:
         func = locals()[func_name]
         func.delay = func  # Make synchronous call look like async
 
+def _update_stock_analytics_batch(tenant_id, movement_ids):
+    for movement_id in movement_ids:
+        _update_stock_analytics(tenant_id, movement_id)
+
+register_side_effect(STOCK_ANALYTICS, _update_stock_analytics_batch)
+register_side_effect(VALUATION_LAYERS, each_object(_update_valuation_layers))
+register_side_effect(STOCK_ALERTS, each_object(_check_stock_alerts))
+register_side_effect(STOCK_CHANGES, each_object(_track_stock_changes))
+register_side_effect(REORDER_ALERTS, each_object(_check_reorder_alerts))
+register_side_effect(AVERAGE_COST, each_object(_update_stock_item_average_cost))
+
 # Real-time stock monitoring
 @receiver(post_save, sender=StockItem)
 @BaseSignalHandler.safe_signal_execution
@@ -307,7 +333,7 @@ def _create_stock_alert(stock_item, alert_type):
         if alert_type == 'LOW_STOCK':
             alert_service.create_low_stock_alert(stock_item)
         elif alert_type == 'OVERSTOCK':
-            alert_service._create_overstock_alert(None, stock_item)
+            alert_service.create_overstock_alert(stock_item)
         
     except Exception as e:
         logger.error(f"Failed to create stock alert: {str(e)}")
@@ -351,19 +377,10 @@ def sync_stock_to_external_systems(sender, instance, created, **kwargs):
         'last_updated': timezone.now().isoformat()
     }
     
-    IntegrationSignalMixin.queue_integration_sync(
-        'ecommerce',
-        instance,
-        'update',
-        priority='high'
-    )
+    mark_dirty(ECOMMERCE_STOCK_SYNC, instance.tenant_id, instance.id)
     
     # Sync to ERP system
-    IntegrationSignalMixin.queue_integration_sync(
-        'erp',
-        instance,
-        'update'
-    )
+    mark_dirty(ERP_STOCK_SYNC, instance.tenant_id, instance.id)
 
 # Performance optimization signals
 @receiver(post_save, sender=StockMovement)
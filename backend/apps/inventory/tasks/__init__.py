@@ -0,0 +1,14 @@
+"""
+Inventory Module Tasks - Entry Point
+Celery task modules organized by domain
+"""
+
+from .classification import *
+from .side_effects import *
+from .valuation import *
+
+__all__ = [
+    'classification',
+    'side_effects',
+    'valuation',
+]
@@ -0,0 +1,55 @@
+"""
+Inventory Side Effect Tasks
+Batched execution of coalesced signal side effects
+"""
+
+import logging
+import time
+from celery import shared_task
+from django_tenants.utils import schema_context
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['process_side_effect_batch']
+
+
+@shared_task(bind=True)
+def process_side_effect_batch(self, side_effect: str, tenant_id: int, object_ids: list):
+    """Run one side effect for every object in a coalesced batch"""
+    from ..signals.dispatcher import get_side_effect_handler
+    
+    handler = get_side_effect_handler(side_effect)
+    if handler is None:
+        logger.error(f"No handler registered for side effect {side_effect}")
+        return {
+            'success': False,
+            'error': f"Unknown side effect: {side_effect}"
+        }
+    
+    try:
+        from apps.core.models import Tenant
+        
+        tenant = Tenant.objects.get(id=tenant_id)
+        
+        with schema_context(tenant.schema_name):
+            started = time.monotonic()
+            handler(tenant_id, object_ids)
+            seconds = time.monotonic() - started
+        
+        logger.info(
+            f"Side effect {side_effect} for tenant {tenant.schema_name}: "
+            f"{len(object_ids)} objects in {seconds:.2f}s"
+        )
+        return {
+            'success': True,
+            'side_effect': side_effect,
+            'objects': len(object_ids),
+            'seconds': seconds
+        }
+    
+    except Exception as e:
+        logger.error(f"Error running side effect {side_effect} for tenant {tenant_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
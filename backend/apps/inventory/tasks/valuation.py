@@ -0,0 +1,24 @@
+"""
+Inventory Valuation Tasks
+Nightly rebuild of the inventory value snapshot
+"""
+
+import logging
+from celery import shared_task
+from django.core.management import call_command
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['rebuild_inventory_snapshots']
+
+
+@shared_task(bind=True)
+def rebuild_inventory_snapshots(self):
+    """Recompute every tenant's inventory value snapshot from open layers"""
+    try:
+        call_command('rebuild_inventory_snapshots')
+        return {'success': True}
+        
+    except Exception as e:
+        logger.error(f"Error rebuilding inventory snapshots: {str(e)}")
+        raise self.retry(exc=e, countdown=600, max_retries=2)
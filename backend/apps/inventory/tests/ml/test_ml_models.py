@@ -11,9 +11,10 @@ import os
 from ...ml.models.random_forest import RandomForestForecaster
 from ...ml.models.xgboost_model import XGBoostForecaster
 from ...ml.models.ensemble_model import EnsembleForecaster
-from ...ml.feature_engineering import FeatureEngineer
-from ...ml.model_registry import ModelRegistry, ModelMetadata
-from ...ml.training_pipeline import TrainingPipeline, TrainingConfig
+from ...ml.feature_engineering import WARMUP_ROWS, FeatureEngineer, holiday_distances
+from ...ml.model_registry import ModelCache, ModelRegistry, ModelMetadata
+from ...ml.training_pipeline import TrainingPipeline, TrainingConfig, TrainingScheduler, demand_fingerprint
+from ...ml.demand_data import DemandMatrixBuilder
 from ..factories import *
 
 @pytest.mark.ml
@@ -242,6 +243,78 @@ class TestFeatureEngineering:
         assert featured_data['day_of_week'].max() <= 6
         assert featured_data['is_weekend'].isin([0, 1]).all()
     
+    def test_holiday_distances_match_calendar_scan(self):
+        """Vectorised holiday lookups equal a day-by-day scan of the calendar."""
+        holiday_days = np.array([10, 11, 40, 500], dtype=np.int64)
+        day_numbers = np.arange(0, 900, dtype=np.int64)
+        holiday_set = set(holiday_days.tolist())
+        
+        def scan(day, step):
+            for i in range(1, 366):
+                if day + step * i in holiday_set:
+                    return i
+            return 365
+        
+        is_holiday, days_to_next, days_from_last = holiday_distances(day_numbers, holiday_days)
+        
+        assert is_holiday.tolist() == [int(day in holiday_set) for day in day_numbers.tolist()]
+        assert days_to_next.tolist() == [scan(day, 1) for day in day_numbers.tolist()]
+        assert days_from_last.tolist() == [scan(day, -1) for day in day_numbers.tolist()]
+    
+    def test_grouped_lag_features_match_per_product(self, raw_demand_data):
+        """One grouped pass gives the same lag/rolling/EWM values as per-product runs."""
+        feature_engineer = FeatureEngineer(1, holiday_country='US')
+        second_product = raw_demand_data.assign(product_id=2, demand=raw_demand_data['demand'] * 3)
+        data = pd.concat([raw_demand_data, second_product], ignore_index=True)
+        
+        grouped = feature_engineer.create_grouped_lag_features(data, 'demand')
+        
+        for product_id, product_data in data.groupby('product_id'):
+            expected = feature_engineer.create_lag_features(product_data, 'demand')
+            actual = grouped[grouped['product_id'] == product_id]
+            lag_columns = [col for col in expected.columns if col not in data.columns]
+            
+            assert all(actual[col].dtype == np.float32 for col in lag_columns)
+            np.testing.assert_allclose(
+                actual[lag_columns].to_numpy(dtype=float),
+                expected[lag_columns].to_numpy(dtype=float),
+                rtol=1e-5, atol=1e-4
+            )
+    
+    def test_engineer_features_by_product(self, raw_demand_data):
+        """Per-product results are slices of one frame with shared columns."""
+        feature_engineer = FeatureEngineer(1, holiday_country='US')
+        data = pd.concat(
+            [raw_demand_data.assign(product_id=product_id) for product_id in (3, 1, 2)],
+            ignore_index=True
+        )
+        
+        engineered = feature_engineer.engineer_features_by_product(
+            data, include_product=False, k_best=10
+        )
+        
+        assert sorted(engineered) == [1, 2, 3]
+        assert len({tuple(frame.columns) for frame in engineered.values()}) == 1
+        assert all(len(frame) == len(raw_demand_data) for frame in engineered.values())
+        assert all(frame['product_id'].eq(product_id).all() for product_id, frame in engineered.items())
+    
+    def test_engineer_features_by_product_drops_warmup_rows(self, raw_demand_data):
+        """Training frames start once every lag and rolling window is complete."""
+        feature_engineer = FeatureEngineer(1, holiday_country='US')
+        data = pd.concat(
+            [raw_demand_data.assign(product_id=product_id) for product_id in (2, 1)],
+            ignore_index=True
+        )
+        
+        engineered = feature_engineer.engineer_features_by_product(
+            data, include_product=False, select_features=False, drop_warmup=True
+        )
+        
+        for frame in engineered.values():
+            assert len(frame) == len(raw_demand_data) - WARMUP_ROWS
+            assert frame['date'].min() == raw_demand_data['date'].sort_values().iloc[WARMUP_ROWS]
+            assert frame['demand_rolling_mean_90'].notna().all()
+    
     def test_lag_feature_creation(self, raw_demand_data, tenant):
         """Test lag feature creation."""
         feature_engineer = FeatureEngineer(tenant.id)
@@ -496,6 +569,88 @@ class TestModelRegistry:
         remaining_models = temp_registry.list_models()
         assert len(remaining_models) <= 5
 
+    def test_indexed_lookup_by_tenant_and_product(self, temp_registry, sample_model):
+        """Lookups by tenant and product use the index, not created_by substrings."""
+        def metadata_for(tenant_id, tag):
+            return ModelMetadata(
+                model_id='',
+                model_name=f'model_{tenant_id}_{tag}',
+                version='1.0.0',
+                algorithm='RandomForest',
+                parameters={'tag': tag},
+                training_data_hash='abc123',
+                feature_names=[],
+                performance_metrics={'mae': 2.5},
+                training_timestamp=datetime.now(),
+                model_size_bytes=0,
+                python_version='3.9.0',
+                dependencies={},
+                created_by=f'training_pipeline_{tenant_id}',
+                tags=[tag, 'randomforest'],
+                description='Index test',
+                status='active'
+            )
+        
+        product_model_id = temp_registry.register_model(sample_model, metadata_for(1, 'product_7'))
+        temp_registry.register_model(sample_model, metadata_for(11, 'product_7'))
+        global_model_id = temp_registry.register_model(sample_model, metadata_for(1, 'global_model'))
+        
+        product_models = temp_registry.list_models(status='active', tenant_id=1, product_id=7)
+        global_models = temp_registry.list_models(status='active', tenant_id=1, is_global=True)
+        
+        assert [m.model_id for m in product_models] == [product_model_id]
+        assert [m.model_id for m in global_models] == [global_model_id]
+        
+        batch_models = temp_registry.list_models(status='active', tenant_id=1, product_ids=[7, 8])
+        assert [m.model_id for m in batch_models] == [product_model_id]
+        
+        # The index can be rebuilt from the metadata files alone
+        assert temp_registry.rebuild_index() == 3
+        assert len(temp_registry.list_models(tenant_id=1)) == 2
+    
+    def test_get_model_warms_cache(self, temp_registry, sample_model):
+        """A second get_model is served from the in-memory cache."""
+        metadata = ModelMetadata(
+            model_id='',
+            model_name='cache_test',
+            version='1.0.0',
+            algorithm='RandomForest',
+            parameters={},
+            training_data_hash='abc123',
+            feature_names=[],
+            performance_metrics={'mae': 2.5},
+            training_timestamp=datetime.now(),
+            model_size_bytes=0,
+            python_version='3.9.0',
+            dependencies={},
+            created_by='test_user',
+            tags=[],
+            description='Cache test',
+            status='training'
+        )
+        model_id = temp_registry.register_model(sample_model, metadata)
+        
+        first, _ = temp_registry.get_model(model_id)
+        with patch('joblib.load') as load:
+            second, _ = temp_registry.get_model(model_id)
+        
+        assert second is first
+        load.assert_not_called()
+    
+    def test_model_cache_evicts_least_recently_used(self):
+        """The cache stays within its entry and byte budgets."""
+        model_cache = ModelCache(max_models=3, max_bytes=250)
+        
+        model_cache.put('a', 'model_a', 100)
+        model_cache.put('b', 'model_b', 100)
+        assert model_cache.get('a') == 'model_a'
+        model_cache.put('c', 'model_c', 100)  # Over 250 bytes: evicts b
+        
+        assert model_cache.get('b') is None
+        assert model_cache.get('a') == 'model_a'
+        assert model_cache.total_bytes == 200
+        assert model_cache.stats()['evictions'] == 1
+
 @pytest.mark.ml  
 class TestTrainingPipeline:
     """Test ML training pipeline functionality."""
@@ -515,6 +670,54 @@ class TestTrainingPipeline:
             max_workers=1
         )
     
+    def test_demand_matrix_densify(self):
+        """Every observed pair gets every day; gaps are zero demand with carried cost."""
+        from datetime import date
+        
+        daily_demand = pd.DataFrame({
+            'product_id': [2, 1, 1],
+            'warehouse_id': [1, 1, 1],
+            'date': pd.to_datetime(['2024-01-02', '2024-01-02', '2024-01-04']),
+            'demand': [5.0, 3.0, 4.0],
+            'unit_cost': [10.0, 2.0, 3.0],
+        })
+        
+        dense = DemandMatrixBuilder.densify(daily_demand, date(2024, 1, 1), date(2024, 1, 5))
+        
+        assert list(dense.columns) == ['date', 'product_id', 'warehouse_id', 'demand', 'unit_cost']
+        assert len(dense) == 10
+        
+        product_1 = dense[dense['product_id'] == 1]
+        assert product_1['demand'].tolist() == [0.0, 3.0, 0.0, 4.0, 0.0]
+        assert product_1['unit_cost'].tolist() == [2.0, 2.0, 2.0, 3.0, 3.0]
+    
+    def test_demand_snapshot_only_queries_new_days(self):
+        """A second build reuses the snapshot and queries from its last day on."""
+        pytest.importorskip('pyarrow')
+        from datetime import date
+        
+        def daily(days):
+            return pd.DataFrame({
+                'product_id': 1,
+                'warehouse_id': 1,
+                'date': pd.to_datetime([f'2024-01-{day:02d}' for day in days]),
+                'demand': [float(day) for day in days],
+                'unit_cost': 1.0,
+            })
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            builder = DemandMatrixBuilder(1, snapshot_path=temp_dir)
+            
+            with patch.object(builder, 'query_daily_demand', return_value=daily([1, 2, 3])) as query:
+                builder.build(date(2024, 1, 1), date(2024, 1, 3))
+                query.assert_called_once_with(date(2024, 1, 1), date(2024, 1, 3))
+            
+            with patch.object(builder, 'query_daily_demand', return_value=daily([3, 4])) as query:
+                dense = builder.build(date(2024, 1, 2), date(2024, 1, 4))
+                query.assert_called_once_with(date(2024, 1, 3), date(2024, 1, 4))
+            
+            assert dense['demand'].tolist() == [2.0, 3.0, 4.0]
+    
     @patch('apps.inventory.ml.training_pipeline.TrainingPipeline._extract_training_data')
     def test_training_pipeline_execution(self, mock_extract_data, training_config, ml_test_data):
         """Test complete training pipeline execution."""
@@ -582,6 +785,56 @@ class TestTrainingPipeline:
         assert 1 in training_results['product_models']
         assert 'RandomForest' in training_results['product_models'][1]['models']
 
+    def test_incremental_plan_retrains_changed_and_drifted_products(self, training_config):
+        """Unchanged products are skipped; changed or drifted ones warm start."""
+        from datetime import datetime, timedelta
+        
+        trained_at = datetime.now() - timedelta(days=10)
+        dates = pd.date_range(end=datetime.now().date(), periods=60, freq='D')
+        
+        def product_frame():
+            return pd.DataFrame({'date': dates, 'demand': 10.0, 'lag_1': 10.0})
+        
+        processed_data = {product_id: product_frame() for product_id in (1, 2, 3, 4)}
+        
+        def metadata(product_id):
+            return ModelMetadata(
+                model_id=f"model_{product_id}",
+                model_name=f"RandomForest_product_{product_id}",
+                version='1.0.0',
+                algorithm='RandomForest',
+                parameters={},
+                training_data_hash=demand_fingerprint(product_frame(), trained_at.date() - timedelta(days=1)),
+                feature_names=['lag_1'],
+                performance_metrics={'mae': 1.0},
+                training_timestamp=trained_at,
+                model_size_bytes=0,
+                python_version='3.11',
+                dependencies={},
+                created_by=f"training_pipeline_{training_config.tenant_id}",
+                tags=[f"product_{product_id}", 'randomforest'],
+                description='',
+                status='active'
+            )
+        
+        # Product 2's history was corrected, product 3's recent demand doubled,
+        # product 4 has no model
+        processed_data[2].loc[10, 'demand'] = 30.0
+        processed_data[3].loc[processed_data[3]['date'] > trained_at, 'demand'] = 20.0
+        
+        model = MagicMock()
+        model.predict.side_effect = lambda X: np.full(len(X), 10.0)
+        registry = MagicMock()
+        registry.list_models.return_value = [metadata(product_id) for product_id in (1, 2, 3)]
+        registry.get_model.return_value = (model, None)
+        
+        plan = TrainingScheduler(registry).plan_retraining(training_config, processed_data)
+        
+        assert set(plan['retrain']) == {2, 3, 4}
+        assert plan['skipped'] == [1]
+        assert plan['warm_start'] == {2: {'RandomForest': 'model_2'}, 3: {'RandomForest': 'model_3'}}
+        assert plan['compute_saved_percent'] == 25.0
+
 @pytest.mark.ml
 class TestMLIntegration:
     """Test ML integration with inventory system."""
@@ -657,6 +910,51 @@ class TestMLIntegration:
         assert len(prediction_request.products) == 2
         assert prediction_request.forecast_horizon == 7
     
+    def test_batch_prediction_stacks_products_sharing_a_model(self):
+        """Products on one model are predicted in a single call with unchanged results."""
+        import asyncio
+        from ...ml.production_serving import ModelServingService, PredictionRequest
+        
+        class SpreadModel:
+            def __init__(self):
+                self.predict_calls = 0
+            
+            def predict(self, X):
+                self.predict_calls += 1
+                return X['day_of_week'].to_numpy(dtype=float) + X['product_id'].to_numpy()
+            
+            def predict_with_confidence(self, X, confidence_level=0.95):
+                predictions = self.predict(X)
+                lower_bound, upper_bound = self.confidence_interval(predictions, confidence_level)
+                return predictions, lower_bound, upper_bound
+            
+            def confidence_interval(self, predictions, confidence_level=0.95):
+                return predictions - predictions.std(), predictions + predictions.std()
+        
+        model = SpreadModel()
+        metadata = MagicMock()
+        metadata.model_id = 'global_model'
+        metadata.performance_metrics = {'mae': 2.5}
+        
+        serving_service = ModelServingService()
+        serving_service.redis_client = None
+        serving_service.model_registry = MagicMock()
+        serving_service.model_registry.get_model.return_value = (model, metadata)
+        feature_engineer = serving_service._get_feature_engineer(1)
+        
+        def predict(products):
+            request = PredictionRequest({'tenant_id': 1, 'products': products, 'forecast_horizon': 14})
+            with patch.object(serving_service, '_group_products_by_model',
+                              return_value=({'global_model': (metadata, products)}, [])):
+                return asyncio.run(serving_service.predict_batch(request, products, feature_engineer))
+        
+        batch = predict([1, 2, 3])
+        assert model.predict_calls == 1
+        assert list(batch) == [1, 2, 3]
+        
+        for product_id in [1, 2, 3]:
+            assert predict([product_id])[product_id]['forecast'] == batch[product_id]['forecast']
+    
     def test_ml_model_performance_tracking(self, mock_ml_model):
         """Test ML model performance tracking."""
         from ...ml.base import ModelPerformanceTracker
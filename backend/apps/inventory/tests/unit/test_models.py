@@ -2,13 +2,17 @@
 import pytest
 from decimal import Decimal, InvalidOperation
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from datetime import timedelta
 
 from ...models.catalog.products import Product
 from ...models.stock.items import StockItem
 from ...models.stock.movements import StockMovement
+from ...models.reservations.allocation import BatchReservationAllocator
+from ...models.reservations.reservations import StockReservation, StockReservationItem
+from ...models.adjustments.adjustments import StockAdjustment, StockAdjustmentItem
+from ...models.adjustments.cycle_counts import CycleCount, CycleCountItem
 from ..factories import *
 
 @pytest.mark.django_db
@@ -300,4 +304,307 @@ class TestStockMovement:
         )
         
         expected_cost = Decimal('318.75')
-        assert movement.total_cost == expected_cost
\ No newline at end of file
+        assert movement.total_cost == expected_cost
+
+
+class TestBatchReservationAllocator:
+    
+    NOW = timezone.now()
+    
+    @classmethod
+    def _stock(cls, pk, created_days_ago, cost, expiry=None, grade=None):
+        from types import SimpleNamespace
+        
+        batch = SimpleNamespace(expiry_date=expiry, quality_grade=grade) if (expiry or grade) else None
+        return SimpleNamespace(
+            pk=pk, id=pk,
+            created_at=cls.NOW - timedelta(days=created_days_ago),
+            average_cost=Decimal(cost),
+            batch=batch
+        )
+    
+    def test_strategy_ordering_matches_database_order(self):
+        """Ties keep primary key order; NULLs sort last ascending, first descending."""
+        today = timezone.now().date()
+        candidates = [
+            self._stock(1, 5, '2.00', expiry=today + timedelta(days=10), grade='B'),
+            self._stock(2, 5, '1.00'),
+            self._stock(3, 9, '2.00', expiry=today + timedelta(days=3), grade='A'),
+        ]
+        allocator = BatchReservationAllocator(tenant_id=1)
+        
+        def order(strategy):
+            return [stock.pk for stock in allocator._order_candidates(candidates, strategy)]
+        
+        assert order('FIFO') == [3, 1, 2]
+        assert order('LIFO') == [1, 2, 3]
+        assert order('FEFO') == [3, 1, 2]
+        assert order('CHEAPEST') == [2, 1, 3]
+        assert order('HIGHEST_QUALITY') == [2, 1, 3]
+        assert order('NEAREST') == [1, 2, 3]
+    
+    def _allocate_scenario(self, tenant, user, allocate):
+        """
+        Build two products with three stock items each and a reservation whose
+        lines span several stock items, compete for the same stock and
+        backorder; run ``allocate`` and return the outcome keyed by position.
+        """
+        warehouse = WarehouseFactory(tenant=tenant)
+        location = StockLocationFactory(warehouse=warehouse)
+        unit = UnitOfMeasureFactory(tenant=tenant)
+        products = [ProductFactory(tenant=tenant) for _ in range(2)]
+        
+        stock_items = [
+            StockItemFactory(
+                tenant=tenant, product=product, warehouse=warehouse, location=location,
+                quantity_on_hand=quantity, quantity_available=quantity,
+                quantity_reserved=Decimal('0'), average_cost=Decimal(cost)
+            )
+            for product in products
+            for quantity, cost in [(Decimal('10'), '4.00'), (Decimal('5'), '3.00'), (Decimal('8'), '5.00')]
+        ]
+        
+        reservation = StockReservation.objects.create(
+            tenant=tenant,
+            reservation_type='SALES_ORDER',
+            fulfillment_strategy='FIFO',
+            warehouse=warehouse,
+            required_date=timezone.now() + timedelta(days=1),
+            expiry_date=timezone.now() + timedelta(days=7),
+            status='ACTIVE'
+        )
+        for line_number, (product, quantity) in enumerate([
+            (products[0], '12'), (products[0], '9'), (products[1], '30'), (products[0], '4'),
+        ], start=1):
+            StockReservationItem.objects.create(
+                tenant=tenant, reservation=reservation, line_number=line_number,
+                product=product, unit=unit, quantity_requested=Decimal(quantity),
+                estimated_unit_cost=Decimal('4.00')
+            )
+        
+        items = list(reservation.items.order_by('line_number'))
+        for item in items:
+            item.reservation = reservation
+        allocate(items, user)
+        
+        position = {stock_item.id: index for index, stock_item in enumerate(stock_items)}
+        refreshed = StockItem.objects.in_bulk(position)
+        
+        return {
+            'lines': [
+                (item.line_number, item.quantity_allocated, item.quantity_backordered, item.status)
+                for item in reservation.items.order_by('line_number')
+            ],
+            'stock': [
+                (refreshed[stock_item.id].quantity_available, refreshed[stock_item.id].quantity_reserved)
+                for stock_item in stock_items
+            ],
+            'movements': list(
+                (number, position[stock_item_id], quantity)
+                for number, stock_item_id, quantity in StockMovement.objects.filter(
+                    tenant=tenant, movement_type='RESERVE', stock_item_id__in=position
+                ).order_by('movement_number').values_list('movement_number', 'stock_item_id', 'quantity')
+            ),
+        }
+    
+    @pytest.mark.django_db
+    def test_batch_allocation_matches_sequential(self, tenant, user):
+        """allocate() leaves the same quantities and movement numbers as allocating line by line."""
+        def sequential(items, user):
+            for item in items:
+                item.allocate_stock(user)
+        
+        def batch(items, user):
+            BatchReservationAllocator(tenant.id, user).allocate(items)
+        
+        outcomes = []
+        for allocate in (sequential, batch):
+            savepoint = transaction.savepoint()
+            outcomes.append(self._allocate_scenario(tenant, user, allocate))
+            transaction.savepoint_rollback(savepoint)
+        
+        sequential_outcome, batch_outcome = outcomes
+        
+        assert batch_outcome == sequential_outcome
+        assert [line[1] for line in batch_outcome['lines']] == [
+            Decimal('12'), Decimal('9'), Decimal('23'), Decimal('2')
+        ]
+        assert len(batch_outcome['movements']) == 8
+
+
+class TestAssignMovementNumbers:
+    """Test consecutive numbering of movements for bulk inserts."""
+    
+    def test_numbers_continue_from_next_sequence(self, monkeypatch):
+        """Movements are numbered consecutively from the next free number."""
+        monkeypatch.setattr(
+            StockMovement, 'generate_movement_number',
+            lambda self: 'MOV-20240105-000041'
+        )
+        movements = [StockMovement(tenant_id=1) for _ in range(3)]
+        
+        StockMovement.assign_movement_numbers(movements)
+        
+        assert [movement.movement_number for movement in movements] == [
+            'MOV-20240105-000041',
+            'MOV-20240105-000042',
+            'MOV-20240105-000043',
+        ]
+
+
+@pytest.mark.django_db
+class TestBulkCycleCountAdjustments:
+    """Bulk cycle count and adjustment posting must leave stock as the per-item path did."""
+    
+    QUANTITIES = [('10', '4.00'), ('20', '2.50'), ('5', '8.00'), ('8', '1.25'), ('0', '3.00')]
+    COUNTS = ['10', '17', '6', '12']
+    
+    def _count_scenario(self, tenant, user, run):
+        """Build one count over five stock items (one empty), ``run`` it and return the outcome by position."""
+        warehouse = WarehouseFactory(tenant=tenant)
+        location = StockLocationFactory(warehouse=warehouse)
+        stock_items = [
+            StockItemFactory(
+                tenant=tenant, product=ProductFactory(tenant=tenant),
+                warehouse=warehouse, location=location,
+                quantity_on_hand=Decimal(quantity), quantity_available=Decimal(quantity),
+                quantity_reserved=Decimal('0'), quantity_allocated=Decimal('0'),
+                average_cost=Decimal(cost)
+            )
+            for quantity, cost in self.QUANTITIES
+        ]
+        count = CycleCount.objects.create(
+            tenant=tenant,
+            warehouse=warehouse,
+            scheduled_date=timezone.now().date(),
+            variance_tolerance_percentage=Decimal('5'),
+            variance_tolerance_amount=Decimal('10')
+        )
+        counts = {stock_item.id: Decimal(counted) for stock_item, counted in zip(stock_items, self.COUNTS)}
+        
+        run(count, counts, user)
+        
+        position = {stock_item.id: index for index, stock_item in enumerate(stock_items)}
+        return {
+            'count_items': sorted(
+                (position[row[0]],) + row[1:]
+                for row in count.items.values_list(
+                    'stock_item_id', 'system_quantity', 'counted_quantity', 'variance_quantity',
+                    'variance_percentage', 'variance_value', 'variance_status',
+                    'recount_required', 'adjustment_approved'
+                )
+            ),
+            'adjustment_items': [
+                (row[0], position[row[1]]) + row[2:]
+                for row in StockAdjustmentItem.objects.filter(
+                    adjustment__cycle_count=count
+                ).order_by('line_number').values_list(
+                    'line_number', 'stock_item_id', 'quantity_before', 'quantity_adjustment',
+                    'quantity_after', 'value_impact', 'is_applied'
+                )
+            ],
+            'stock': [
+                StockItem.objects.filter(pk=stock_item.pk).values_list(
+                    'quantity_on_hand', 'quantity_available', 'total_value', 'last_movement_type'
+                ).get()
+                for stock_item in stock_items
+            ],
+            'movements': [
+                (number, movement_type, position[stock_item_id], quantity, total_cost)
+                for number, movement_type, stock_item_id, quantity, total_cost in StockMovement.objects.filter(
+                    stock_item_id__in=position
+                ).order_by('movement_number').values_list(
+                    'movement_number', 'movement_type', 'stock_item_id', 'quantity', 'total_cost'
+                )
+            ],
+        }
+    
+    @staticmethod
+    def sequential(count, counts, user):
+        """The per-item path: get_or_create, record_count, approve_variance, apply_adjustment."""
+        for stock_item in StockItem.objects.filter(
+            tenant_id=count.tenant_id, warehouse=count.warehouse,
+            is_active=True, quantity_on_hand__gt=0
+        ).order_by('id'):
+            CycleCountItem.objects.get_or_create(
+                tenant_id=count.tenant_id,
+                cycle_count=count,
+                stock_item=stock_item,
+                defaults={
+                    'location': stock_item.location,
+                    'batch': stock_item.batch,
+                    'system_quantity': stock_item.quantity_on_hand,
+                    'unit_cost': stock_item.average_cost,
+                }
+            )
+        
+        for item in count.items.order_by('id'):
+            item.record_count(counts[item.stock_item_id], user)
+        
+        for item in count.items.exclude(variance_status='NO_VARIANCE').order_by('id'):
+            item.approve_variance(user, 'Confirmed by recount')
+        
+        adjustment = StockAdjustment.objects.create(
+            tenant_id=count.tenant_id,
+            adjustment_type='CORRECTION',
+            warehouse=count.warehouse,
+            cycle_count=count,
+            business_reason=f"Cycle count adjustment from {count.count_number}",
+            created_by=user
+        )
+        for count_item in count.items.filter(adjustment_approved=True).exclude(
+            variance_quantity=0
+        ).select_related('stock_item__product').order_by('id'):
+            StockAdjustmentItem.objects.create(
+                tenant_id=count.tenant_id,
+                adjustment=adjustment,
+                stock_item=count_item.stock_item,
+                location=count_item.location,
+                batch=count_item.batch,
+                quantity_before=count_item.system_quantity,
+                quantity_adjustment=count_item.variance_quantity,
+                unit_cost_before=count_item.unit_cost,
+                unit_cost_after=count_item.unit_cost,
+                unit_id=count_item.stock_item.product.unit_id,
+                reason=f"Cycle count variance - {count_item.variance_reason or 'No reason specified'}"
+            )
+        
+        for item in adjustment.items.order_by('line_number'):
+            item.apply_adjustment(user)
+    
+    @staticmethod
+    def bulk(count, counts, user):
+        """The set-based path."""
+        count.generate_count_items()
+        count.record_counts(
+            {
+                item_id: counts[stock_item_id]
+                for item_id, stock_item_id in count.items.values_list('id', 'stock_item_id')
+            },
+            user
+        )
+        count.approve_variances(user, 'Confirmed by recount')
+        count.generate_adjustments(user)
+        
+        adjustment = StockAdjustment.objects.get(cycle_count=count)
+        if adjustment.status != 'POSTED':
+            adjustment.status = 'APPROVED'
+            adjustment.save(update_fields=['status'])
+            adjustment.post_adjustment(user)
+    
+    def test_bulk_paths_match_sequential(self, tenant, user):
+        outcomes = []
+        for run in (self.sequential, self.bulk):
+            savepoint = transaction.savepoint()
+            outcomes.append(self._count_scenario(tenant, user, run))
+            transaction.savepoint_rollback(savepoint)
+        
+        sequential_outcome, bulk_outcome = outcomes
+        
+        assert bulk_outcome == sequential_outcome
+        assert [stock[0] for stock in bulk_outcome['stock']] == [
+            Decimal('10'), Decimal('17'), Decimal('6'), Decimal('12'), Decimal('0')
+        ]
+        assert [movement[1:4] for movement in bulk_outcome['movements']] == [
+            ('ADJUST_OUT', 1, Decimal('3')), ('ADJUST_IN', 2, Decimal('1')), ('ADJUST_IN', 3, Decimal('4')),
+        ]
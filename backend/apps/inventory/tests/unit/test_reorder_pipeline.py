@@ -0,0 +1,59 @@
+# apps/inventory/tests/unit/test_reorder_pipeline.py
+import pytest
+from decimal import Decimal
+
+np = pytest.importorskip('numpy')
+hypothesis = pytest.importorskip('hypothesis')
+from hypothesis import given, strategies as st
+
+from ...models.stock.reorder_service import (
+    DEFAULT_REORDER_POINT, compute_reorder_parameters, compute_reorder_parameters_scalar
+)
+
+
+consumption = st.integers(min_value=0, max_value=100000)
+rows = st.lists(
+    st.tuples(
+        consumption, consumption, consumption,
+        st.integers(min_value=1, max_value=120),
+        st.decimals(min_value=Decimal('0.00'), max_value=Decimal('5000'), places=2)
+    ),
+    min_size=1, max_size=50
+)
+
+
+def columns(raw_rows):
+    return [list(column) for column in zip(*raw_rows)]
+
+
+class TestReorderParameters:
+    """Vectorised reorder parameters must follow the scalar formulas in utils.calculations."""
+
+    @given(raw_rows=rows, multiplier=st.sampled_from([0.8, 1.0, 1.5]))
+    def test_matches_scalar_formulas(self, raw_rows, multiplier):
+        vectorised = compute_reorder_parameters(*columns(raw_rows), seasonal_multiplier=multiplier)
+        scalar = compute_reorder_parameters_scalar(*columns(raw_rows), seasonal_multiplier=multiplier)
+
+        assert list(vectorised['eoq']) == scalar['eoq']
+        # Float vs Decimal arithmetic may round an exact .5 differently
+        for key in ('safety_stock', 'reorder_point'):
+            assert np.all(np.abs(vectorised[key] - np.array(scalar[key])) <= 1)
+
+    def test_known_values(self):
+        # 900 consumed in 90 days -> 10/day, 14 day lead time
+        params = compute_reorder_parameters(
+            [300], [900], [3650], [14], [Decimal('20.00')]
+        )
+
+        # SS = 1.65 * (10 * 0.2) * sqrt(14) = 12.35 -> 12; ROP = 140 + 12
+        assert params['safety_stock'][0] == 12
+        assert params['reorder_point'][0] == 152
+        # EOQ = sqrt(2 * 3650 * 50 / 5) = 270.18 -> 270
+        assert params['eoq'][0] == 270
+
+    def test_items_without_usage_get_default_reorder_point(self):
+        params = compute_reorder_parameters([0], [0], [0], [14], [Decimal('20.00')])
+
+        assert params['reorder_point'][0] == float(DEFAULT_REORDER_POINT)
+        assert params['safety_stock'][0] == 0
+        assert params['eoq'][0] == 0
@@ -5,10 +5,12 @@ from unittest.mock import Mock, patch, MagicMock
 from django.utils import timezone
 from datetime import timedelta
 
+from ...models.stock import StockMovement
 from ...services.stock.movement_service import StockMovementService
 from ...services.stock.valuation_service import StockValuationService
 from ...services.purchasing.order_service import PurchaseOrderService
 from ...services.analytics.abc_service import ABCAnalysisService
+from ...services.alerts.alert_service import AlertService
 from ..factories import *
 
 @pytest.mark.django_db
@@ -168,6 +170,63 @@ class TestStockMovementService:
         for product in products:
             stock_item = product.stock_items.first()
             assert stock_item.quantity_on_hand == Decimal('90.0000')
+    
+    def test_post_movements_bulk_query_count_is_constant(self, tenant, user):
+        """Bulk posting should not issue more queries as the number of lines grows."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        warehouse = WarehouseFactory(tenant=tenant)
+        location = StockLocationFactory(warehouse=warehouse)
+        stock_items = [
+            StockItemFactory(
+                tenant=tenant,
+                warehouse=warehouse,
+                location=location,
+                quantity_on_hand=Decimal('100.0000')
+            )
+            for _ in range(20)
+        ]
+        
+        service = StockMovementService(tenant=tenant, user=user)
+        
+        def receipt(lines):
+            return [{
+                'movement_type': 'RECEIPT',
+                'warehouse_id': warehouse.id,
+                'items': [
+                    {
+                        'stock_item_id': stock_item.id,
+                        'quantity': Decimal('5.0000'),
+                        'unit_cost': Decimal('10.00')
+                    }
+                    for stock_item in stock_items[:lines]
+                ]
+            }]
+        
+        with patch.object(StockMovementService, '_check_and_generate_alerts_for_items'):
+            with CaptureQueriesContext(connection) as small:
+                small_result = service.post_movements_bulk(receipt(2))
+            
+            with CaptureQueriesContext(connection) as large:
+                large_result = service.post_movements_bulk(receipt(20))
+        
+        assert small_result.is_success, small_result.message
+        assert large_result.is_success, large_result.message
+        assert large_result.message == "Posted 1 movements with 20 items"
+        
+        movement = StockMovement.objects.get(pk=large_result.data[0].pk)
+        assert movement.quantity == Decimal('100.0000')
+        assert movement.total_cost == Decimal('1000.00')
+        assert movement.movement_number
+        
+        # Valuation is one pass per stock item (layer insert, average cost
+        # read and write); validation, inserts and stock updates are constant
+        assert len(large) - len(small) <= 18 * 3
+        
+        for stock_item in stock_items[:2]:
+            stock_item.refresh_from_db()
+            assert stock_item.quantity_on_hand == Decimal('110.0000')
 
 @pytest.mark.django_db
 class TestStockValuationService:
@@ -334,6 +393,54 @@ class TestPurchaseOrderService:
         po.refresh_from_db()
         assert po.status == 'PARTIALLY_RECEIVED'
 
+@pytest.mark.django_db
+class TestAlertService:
+    """Test AlertService rule evaluation."""
+    
+    def test_low_stock_rule_creates_alerts_once_and_resolves_cleared(self, tenant, user):
+        """Open alerts are not duplicated and cleared conditions auto-resolve."""
+        from ...models import AlertRule, InventoryAlert, StockItem
+        
+        warehouse = WarehouseFactory(tenant=tenant)
+        stock_items = [
+            StockItemFactory(
+                tenant=tenant,
+                warehouse=warehouse,
+                quantity_on_hand=Decimal('5.0000'),
+                reorder_level=Decimal('10.0000')
+            )
+            for _ in range(5)
+        ]
+        rule = AlertRule.objects.create(
+            tenant=tenant,
+            name='Low stock',
+            alert_type='LOW_STOCK',
+            severity='HIGH',
+            condition_field='quantity_on_hand',
+            condition_operator='LTE',
+            cooldown_minutes=0
+        )
+        
+        service = AlertService(tenant=tenant, user=user)
+        
+        with patch.object(AlertService, '_send_alert_notifications'):
+            first = service._process_single_rule(rule)
+            second = service._process_single_rule(rule)
+        
+        assert first.data['alerts_created'] == 5
+        assert second.data['alerts_created'] == 0
+        assert InventoryAlert.objects.filter(alert_rule=rule, status='OPEN').count() == 5
+        
+        StockItem.objects.filter(pk=stock_items[0].pk).update(quantity_on_hand=Decimal('50.0000'))
+        
+        with patch.object(AlertService, '_send_alert_notifications'):
+            third = service._process_single_rule(rule)
+        
+        assert third.data['alerts_resolved'] == 1
+        assert InventoryAlert.objects.get(
+            alert_rule=rule, stock_item=stock_items[0]
+        ).status == 'AUTO_RESOLVED'
+
 @pytest.mark.django_db  
 class TestABCAnalysisService:
     """Test ABC Analysis Service functionality."""
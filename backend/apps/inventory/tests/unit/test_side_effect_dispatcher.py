@@ -0,0 +1,78 @@
+# apps/inventory/tests/unit/test_side_effect_dispatcher.py
+import pytest
+from django.db import transaction
+
+from ...signals import dispatcher
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    """Record dispatched batches instead of queueing tasks."""
+    calls = []
+    monkeypatch.setattr(
+        dispatcher, '_emit',
+        lambda side_effect, tenant_id, object_ids, requested: calls.append(
+            (side_effect, tenant_id, object_ids, requested)
+        )
+    )
+    # Register into a copy so the test handlers are gone after the test
+    monkeypatch.setattr(dispatcher, '_handlers', dict(dispatcher._handlers))
+    dispatcher.register_side_effect('test_alerts', lambda tenant_id, object_ids: None)
+    dispatcher.register_side_effect('test_sync', lambda tenant_id, object_ids: None)
+    return calls
+
+
+class TestSideEffectDispatcher:
+    """Marks in one scope collapse into one batch per side effect and tenant."""
+    
+    def test_marks_are_deduplicated_per_side_effect_and_tenant(self, emitted):
+        with dispatcher.coalesce_side_effects():
+            for stock_item_id in [3, 1, 3, 2, 1]:
+                dispatcher.mark_dirty('test_alerts', 7, stock_item_id)
+            dispatcher.mark_dirty('test_alerts', 8, 1)
+            dispatcher.mark_dirty('test_sync', 7, 3)
+            
+            assert emitted == []
+        
+        assert sorted(emitted) == [
+            ('test_alerts', 7, [1, 2, 3], 5),
+            ('test_alerts', 8, [1], 1),
+            ('test_sync', 7, [3], 1),
+        ]
+    
+    def test_nested_scopes_flush_once(self, emitted):
+        with dispatcher.coalesce_side_effects():
+            dispatcher.mark_dirty('test_alerts', 7, 1)
+            with dispatcher.coalesce_side_effects():
+                dispatcher.mark_dirty('test_alerts', 7, 2)
+            
+            assert emitted == []
+        
+        assert emitted == [('test_alerts', 7, [1, 2], 2)]
+    
+    def test_unknown_side_effect_is_rejected(self, emitted):
+        with pytest.raises(ValueError):
+            dispatcher.mark_dirty('no_such_side_effect', 7, 1)
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_transaction_marks_flush_once_on_commit(self, emitted):
+        with transaction.atomic():
+            dispatcher.mark_dirty('test_alerts', 7, 1)
+            with transaction.atomic():
+                dispatcher.mark_dirty('test_alerts', 7, 2)
+            
+            assert emitted == []
+        
+        assert emitted == [('test_alerts', 7, [1, 2], 2)]
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_rolled_back_batch_is_not_reused(self, emitted):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                dispatcher.mark_dirty('test_alerts', 7, 1)
+                raise RuntimeError
+        
+        with transaction.atomic():
+            dispatcher.mark_dirty('test_alerts', 7, 2)
+        
+        assert emitted == [('test_alerts', 7, [2], 1)]
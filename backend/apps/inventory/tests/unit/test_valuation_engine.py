@@ -0,0 +1,104 @@
+# apps/inventory/tests/unit/test_valuation_engine.py
+import pytest
+from decimal import Decimal
+
+from ...services.stock.valuation_engine import plan_consumption
+
+hypothesis = pytest.importorskip('hypothesis')
+from hypothesis import given, strategies as st
+
+
+quantities = st.decimals(min_value=Decimal('0.001'), max_value=Decimal('10000'), places=3)
+costs = st.decimals(min_value=Decimal('0.00'), max_value=Decimal('5000'), places=2)
+layer_lists = st.lists(st.tuples(quantities, costs), min_size=0, max_size=60)
+
+
+def legacy_consume(layers, quantity):
+    """Layer-by-layer walk as done by the previous _process_outbound_movement"""
+    layers = [dict(layer) for layer in layers]
+    remaining_to_consume = quantity
+    total_cost = Decimal('0')
+    consumed = []
+
+    for layer in layers:
+        if remaining_to_consume <= 0:
+            break
+        consume_quantity = min(remaining_to_consume, layer['quantity_remaining'])
+        layer['quantity_remaining'] -= consume_quantity
+        consumed.append((layer['id'], consume_quantity, consume_quantity * layer['unit_cost']))
+        total_cost += consume_quantity * layer['unit_cost']
+        remaining_to_consume -= consume_quantity
+
+    open_layers = [layer for layer in layers if layer['quantity_remaining'] > 0]
+    total_quantity = sum(layer['quantity_remaining'] for layer in open_layers)
+    total_value = sum(layer['quantity_remaining'] * layer['unit_cost'] for layer in open_layers)
+    average_cost = total_value / total_quantity if total_quantity > 0 else None
+
+    return consumed, total_cost, average_cost
+
+
+def engine_consume(layers, quantity):
+    """Mirror of LayerConsumptionEngine.consume with the SQL window evaluated in Python"""
+    open_quantity = sum((layer['quantity_remaining'] for layer in layers), Decimal('0'))
+    open_value = sum((layer['quantity_remaining'] * layer['unit_cost'] for layer in layers), Decimal('0'))
+
+    # cumulative_quantity < quantity + quantity_remaining
+    needed = []
+    cumulative = Decimal('0')
+    for layer in layers:
+        cumulative += layer['quantity_remaining']
+        if cumulative < quantity + layer['quantity_remaining']:
+            needed.append((layer['id'], layer['quantity_remaining'], layer['unit_cost']))
+
+    slices, total_cost = plan_consumption(needed, quantity)
+    consumed_quantity = sum((layer_slice.quantity for layer_slice in slices), Decimal('0'))
+
+    remaining_quantity = open_quantity - consumed_quantity
+    average_cost = (open_value - total_cost) / remaining_quantity if remaining_quantity > 0 else None
+
+    consumed = [(layer_slice.layer_id, layer_slice.quantity, layer_slice.cost) for layer_slice in slices]
+    return consumed, total_cost, average_cost
+
+
+def build_layers(raw_layers, costing_method):
+    layers = [
+        {'id': index + 1, 'quantity_remaining': quantity, 'unit_cost': unit_cost}
+        for index, (quantity, unit_cost) in enumerate(raw_layers)
+    ]
+    if costing_method == 'LIFO':
+        layers.reverse()
+    return layers
+
+
+class TestLayerConsumptionEngine:
+    """Set-based consumption must match the sequential layer walk exactly."""
+
+    @pytest.mark.parametrize('costing_method', ['FIFO', 'LIFO', 'WEIGHTED_AVERAGE'])
+    @given(raw_layers=layer_lists, quantity=quantities)
+    def test_matches_sequential_consumption(self, costing_method, raw_layers, quantity):
+        layers = build_layers(raw_layers, costing_method)
+
+        assert engine_consume(layers, quantity) == legacy_consume(layers, quantity)
+
+    @given(raw_layers=layer_lists, quantity=quantities)
+    def test_never_consumes_more_than_requested_or_available(self, raw_layers, quantity):
+        layers = build_layers(raw_layers, 'FIFO')
+        slices, _ = plan_consumption(
+            ((layer['id'], layer['quantity_remaining'], layer['unit_cost']) for layer in layers),
+            quantity
+        )
+        available = sum((layer['quantity_remaining'] for layer in layers), Decimal('0'))
+
+        assert sum((layer_slice.quantity for layer_slice in slices), Decimal('0')) == min(quantity, available)
+
+    def test_fifo_split(self):
+        layers = [
+            (1, Decimal('50.000'), Decimal('10.00')),
+            (2, Decimal('30.000'), Decimal('12.00')),
+            (3, Decimal('20.000'), Decimal('15.00')),
+        ]
+
+        slices, total_cost = plan_consumption(layers, Decimal('60.000'))
+
+        assert [(s.layer_id, s.quantity) for s in slices] == [(1, Decimal('50.000')), (2, Decimal('10.000'))]
+        assert total_cost == Decimal('620.00000')
@@ -0,0 +1,100 @@
+# apps/inventory/tests/unit/test_valuation_engine_db.py
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+
+from ...models import StockValuationLayer
+from ...services.stock.valuation_engine import LayerConsumptionEngine
+from ..factories import *
+
+
+def fifo_oracle(layers, quantity):
+    """Consume ``quantity`` from ``(id, quantity_remaining, unit_cost)`` layers in the given order"""
+    consumed = []
+    total_cost = Decimal('0')
+    remaining = {layer_id: layer_quantity for layer_id, layer_quantity, _ in layers}
+    
+    for layer_id, layer_quantity, unit_cost in layers:
+        take = min(quantity, layer_quantity)
+        if take <= 0:
+            break
+        consumed.append((layer_id, take, take * unit_cost))
+        total_cost += take * unit_cost
+        remaining[layer_id] -= take
+        quantity -= take
+    
+    return consumed, total_cost, remaining
+
+
+@pytest.mark.django_db
+class TestLayerConsumptionEngineDatabase:
+    """The SQL window and locking path must deplete the same layers as the layer walk."""
+    
+    LAYERS = [
+        (Decimal('50.000'), Decimal('10.00')),
+        (Decimal('30.000'), Decimal('12.00')),
+        (Decimal('20.000'), Decimal('15.00')),
+        (Decimal('40.000'), Decimal('9.50')),
+    ]
+    
+    def create_layers(self, tenant, stock_item, costing_method):
+        received_at = timezone.now() - timedelta(days=len(self.LAYERS))
+        return [
+            StockValuationLayer.objects.create(
+                tenant=tenant,
+                stock_item=stock_item,
+                quantity_in=quantity,
+                quantity_remaining=quantity,
+                unit_cost=unit_cost,
+                total_cost=quantity * unit_cost,
+                layer_date=received_at + timedelta(days=index),
+                costing_method=costing_method
+            )
+            for index, (quantity, unit_cost) in enumerate(self.LAYERS)
+        ]
+    
+    @pytest.mark.parametrize('costing_method', ['FIFO', 'LIFO'])
+    @pytest.mark.parametrize('quantity', [
+        Decimal('0.500'), Decimal('50.000'), Decimal('60.000'),
+        Decimal('100.000'), Decimal('140.000'), Decimal('175.000'),
+    ])
+    def test_consume_matches_oracle(self, tenant, costing_method, quantity):
+        stock_item = StockItemFactory(tenant=tenant)
+        layers = self.create_layers(tenant, stock_item, costing_method)
+        
+        oracle_layers = [(layer.id, layer.quantity_remaining, layer.unit_cost) for layer in layers]
+        if costing_method == 'LIFO':
+            oracle_layers.reverse()
+        expected_consumed, expected_cost, expected_remaining = fifo_oracle(
+            oracle_layers, quantity
+        )
+        
+        engine = LayerConsumptionEngine(tenant, costing_method)
+        with transaction.atomic():
+            result = engine.consume(stock_item, quantity, None)
+        
+        assert [
+            (consumed['layer_id'], consumed['quantity'], consumed['cost'])
+            for consumed in result['layers_consumed']
+        ] == expected_consumed
+        assert result['total_cost'] == expected_cost
+        
+        assert dict(
+            StockValuationLayer.objects.filter(
+                id__in=[layer.id for layer in layers]
+            ).values_list('id', 'quantity_remaining')
+        ) == expected_remaining
+    
+    def test_fetch_needed_layers_stops_at_covering_prefix(self, tenant):
+        stock_item = StockItemFactory(tenant=tenant)
+        layers = self.create_layers(tenant, stock_item, 'FIFO')
+        
+        rows = LayerConsumptionEngine(tenant, 'FIFO').fetch_needed_layers(stock_item, Decimal('60.000'))
+        
+        assert [row['id'] for row in rows] == [layers[0].id, layers[1].id]
+        assert rows[0]['open_quantity'] == Decimal('140.000')
+        assert rows[0]['open_value'] == sum(
+            (quantity * unit_cost for quantity, unit_cost in self.LAYERS), Decimal('0')
+        )
@@ -4,6 +4,12 @@ from datetime import date, timedelta
 from typing import List, Dict, Any, Tuple, Optional, Union
 from .constants import DEFAULT_VALUES, BUSINESS_RULES
 
+# Service level factors (Z-scores)
+SERVICE_LEVEL_Z_FACTORS = {
+    0.50: 0.00, 0.80: 0.84, 0.85: 1.04, 0.90: 1.28,
+    0.95: 1.65, 0.97: 1.88, 0.99: 2.33, 0.995: 2.58
+}
+
 def calculate_eoq(annual_demand: Union[Decimal, float], 
                  ordering_cost: Union[Decimal, float],
                  holding_cost_per_unit: Union[Decimal, float]) -> Decimal:
@@ -50,13 +56,7 @@ def calculate_safety_stock(average_daily_usage: Union[Decimal, float],
         if avg_usage <= 0 or lead_time_days <= 0:
             return Decimal('0')
         
-        # Service level factors (Z-scores)
-        service_level_factors = {
-            0.50: 0.00, 0.80: 0.84, 0.85: 1.04, 0.90: 1.28,
-            0.95: 1.65, 0.97: 1.88, 0.99: 2.33, 0.995: 2.58
-        }
-        
-        z_factor = service_level_factors.get(service_level, 1.65)  # Default to 95%
+        z_factor = SERVICE_LEVEL_Z_FACTORS.get(service_level, 1.65)  # Default to 95%
         
         if demand_variability is not None:
             # Use provided demand variability
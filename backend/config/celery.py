@@ -60,6 +60,10 @@ CELERY_BEAT_SCHEDULE.update({
         'task': 'apps.ecommerce.tasks.update_product_metrics',
         'schedule': crontab(minute=0, hour=4),  # Daily at 4 AM
     },
+    'reconcile-product-ratings': {
+        'task': 'apps.ecommerce.tasks.reconcile_product_ratings',
+        'schedule': crontab(minute=30, hour=4),  # Daily at 4:30 AM
+    },
     'calculate-lead-scores': {
         'task': 'apps.crm.tasks.scoring_tasks.calculate_lead_scores',
         'schedule': crontab(minute=0, hour='*/2'),  # Every 2 hours
@@ -92,10 +96,18 @@ CELERY_BEAT_SCHEDULE.update({
         'task': 'apps.core.tasks.sync_tenant_usage',
         'schedule': crontab(minute=0, hour=0),  # Midnight daily
     },
+    'flush-api-usage': {
+        'task': 'apps.core.tasks.flush_api_usage',
+        'schedule': crontab(minute='*'),  # Every minute
+    },
     'backup-tenant-data': {
         'task': 'apps.core.tasks.backup_tenant_data',
         'schedule': crontab(minute=0, hour=3),  # 3 AM daily
     },
+    'rebuild-inventory-snapshots': {
+        'task': 'apps.inventory.tasks.valuation.rebuild_inventory_snapshots',
+        'schedule': crontab(minute=30, hour=1),  # Daily at 1:30 AM
+    },
     
     # Weekly Tasks
     'generate-weekly-analytics': {
@@ -61,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'middlewares.side_effect_middleware.SideEffectCoalescingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -217,6 +218,51 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Tenant resolution cache (see apps/core/tenant_cache.py)
+TENANT_RESOLUTION_CACHE = {
+    'LOCAL_TTL': 5,                     # Seconds in per-process memory
+    'SHARED_TTL': 300,                  # Seconds in the shared cache
+    'LOCAL_MAX_ENTRIES': 10000,
+    'LAST_ACCESS_FLUSH_INTERVAL': 60,   # Seconds between membership last_access flushes
+}
+
+# API usage metering (see apps/core/metering.py)
+USAGE_METERING_ENABLED = True
+USAGE_METERING_LOCAL_FLUSH_INTERVAL = 60  # Seconds, only used without Redis
+USAGE_METERING_FLUSH_LOCK_TIMEOUT = 300  # Seconds a flush may hold the Redis flush lock
+
+# Stock ABC/XYZ recalculation runs at most once per interval per tenant
+INVENTORY_CLASSIFICATION_DEBOUNCE_SECONDS = 300
+
+# Coalesced inventory signal side effects (see apps/inventory/signals/dispatcher.py):
+# batches per side effect and tenant per minute, default 60
+INVENTORY_SIDE_EFFECT_RATE_LIMITS = {
+    'reorder_alerts': 12,
+    'stock_changes': 12,
+}
+
+# Loaded ML models kept per process (see apps/inventory/ml/model_registry.py)
+ML_MODEL_CACHE = {
+    'MAX_MODELS': 256,
+    'MAX_BYTES': 1024 * 1024 * 1024,  # Estimated from model file sizes
+}
+
+# Holiday calendar (python-holidays country code) for ML calendar features,
+# optionally per tenant id
+ML_HOLIDAY_CALENDAR = {
+    'DEFAULT_COUNTRY': 'US',
+    'TENANT_COUNTRIES': {},
+}
+
+# Parquet snapshots of aggregated daily demand reused between training runs
+ML_DEMAND_SNAPSHOT_PATH = MEDIA_ROOT / 'ml_demand'
+
+# Storefront facet index (see apps/ecommerce/infrastructure/persistence/search/facets.py)
+ECOMMERCE_FACETS = {
+    'PRICE_BUCKETS': [0, 25, 50, 100, 250, 500, 1000],  # Bucket lower bounds; the last is open ended
+    'RESULT_TTL': 60,                                   # Seconds a filter set's result is cached
+}
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Development
 
@@ -0,0 +1,17 @@
+# middlewares/side_effect_middleware.py
+
+from apps.inventory.signals.dispatcher import coalesce_side_effects
+
+
+class SideEffectCoalescingMiddleware:
+    """
+    Collect inventory signal side effects for the whole request and dispatch
+    them once, as one batch per side effect and tenant, when it ends.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        with coalesce_side_effects():
+            return self.get_response(request)
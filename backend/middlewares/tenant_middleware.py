@@ -1,11 +1,13 @@
 # middlewares/tenant_middleware.py
 
 from django.http import JsonResponse
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from django_tenants.utils import get_tenant_model, get_tenant_domain_model
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken
-from apps.auth.models import Membership
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from apps.core.tenant_cache import tenant_resolution_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -104,15 +106,14 @@ class TenantContextMiddleware(MiddlewareMixin):
                     return None
                 
                 # Look for tenant with this subdomain
-                try:
-                    domain = Domain.objects.get(domain=host, is_primary=True)
-                    return domain.tenant
-                except Domain.DoesNotExist:
-                    # Try to find by tenant slug
-                    try:
-                        return Tenant.objects.get(slug=subdomain, status__in=['active', 'trial'])
-                    except Tenant.DoesNotExist:
-                        pass
+                tenant = tenant_resolution_cache.get_tenant_by_domain(host)
+                if tenant:
+                    return tenant
+                
+                # Try to find by tenant slug
+                tenant = tenant_resolution_cache.get_tenant_by_slug(subdomain)
+                if tenant and tenant.status in ['active', 'trial']:
+                    return tenant
             
         except Exception as e:
             logger.warning(f"Error getting tenant from domain: {e}")
@@ -124,19 +125,24 @@ class TenantContextMiddleware(MiddlewareMixin):
         Get tenant from JWT token
         """
         try:
-            # Use JWTAuthentication to get user and token
+            # Validate the token and check the user through the resolution
+            # cache instead of loading the user row on every request
             jwt_auth = JWTAuthentication()
-            auth_result = jwt_auth.authenticate(request)
+            header = jwt_auth.get_header(request)
+            raw_token = jwt_auth.get_raw_token(header) if header else None
             
-            if auth_result:
-                user, validated_token = auth_result
+            if raw_token:
+                validated_token = jwt_auth.get_validated_token(raw_token)
+                user_id = validated_token.payload.get(jwt_settings.USER_ID_CLAIM)
+                if user_id is None or not tenant_resolution_cache.is_user_active(user_id):
+                    return None
+                
                 tenant_id = validated_token.payload.get('tenant_id')
                 
                 if tenant_id:
-                    try:
-                        return Tenant.objects.get(id=tenant_id, status__in=['active', 'trial'])
-                    except Tenant.DoesNotExist:
-                        pass
+                    tenant = tenant_resolution_cache.get_tenant(tenant_id)
+                    if tenant and tenant.status in ['active', 'trial']:
+                        return tenant
         
         except (InvalidToken, Exception) as e:
             logger.debug(f"Error getting tenant from JWT: {e}")
@@ -150,9 +156,9 @@ class TenantContextMiddleware(MiddlewareMixin):
         try:
             tenant_slug = request.META.get('HTTP_X_TENANT_SLUG')
             if tenant_slug:
-                return Tenant.objects.get(slug=tenant_slug, status__in=['active', 'trial'])
-        except Tenant.DoesNotExist:
-            pass
+                tenant = tenant_resolution_cache.get_tenant_by_slug(tenant_slug)
+                if tenant and tenant.status in ['active', 'trial']:
+                    return tenant
         except Exception as e:
             logger.warning(f"Error getting tenant from header: {e}")
         
@@ -162,30 +168,24 @@ class TenantContextMiddleware(MiddlewareMixin):
         """
         Validate if user has access to the tenant
         """
-        try:
-            membership = Membership.objects.get(
-                user=user,
-                tenant_id=tenant.id,
-                is_active=True,
-                status='active'
-            )
-            
-            # Check if membership is expired
-            if membership.is_expired:
-                return False
-            
-            # Update last access
-            from django.utils import timezone
-            membership.last_access = timezone.now()
-            membership.save(update_fields=['last_access'])
-            
-            # Add membership to request for later use
-            user.current_membership = membership
-            
-            return True
-            
-        except Membership.DoesNotExist:
+        if not user.is_active:
+            return False
+        
+        membership = tenant_resolution_cache.get_membership(user.id, tenant.id)
+        if membership is None:
             return False
+        
+        # Check if membership is expired
+        if membership.expires_at and membership.expires_at <= timezone.now():
+            return False
+        
+        # Update last access (written in batches by the background flusher)
+        tenant_resolution_cache.touch_membership(membership)
+        
+        # Add membership to request for later use
+        user.current_membership = membership
+        
+        return True
 
 
 class TenantDatabaseRoutingMiddleware(MiddlewareMixin):
@@ -225,44 +225,16 @@ class TenantUsageTrackingMiddleware(MiddlewareMixin):
     
     def track_api_call(self, tenant, request):
         """
-        Track API call for billing
+        Track API call for billing.
+        
+        Only bumps a buffered counter; ``apps.core.tasks.flush_api_usage``
+        writes the aggregated counts to TenantUsage.
         """
         try:
-            from apps.core.models import TenantUsage
-            from django.utils import timezone
-            from datetime import datetime
-            
-            # Get current billing period
-            now = timezone.now()
-            period_start = datetime(now.year, now.month, 1, tzinfo=now.tzinfo)
-            
-            if now.month == 12:
-                next_year = now.year + 1
-                next_month = 1
-            else:
-                next_year = now.year
-                next_month = now.month + 1
-            
-            period_end = datetime(next_year, next_month, 1, tzinfo=now.tzinfo)
-            
-            # Get or create usage record
-            usage, created = TenantUsage.objects.get_or_create(
-                tenant=tenant,
-                billing_period_start=period_start,
-                defaults={
-                    'billing_period_end': period_end,
-                    'api_calls_count': 0
-                }
-            )
-            
-            # Increment API call count
-            usage.api_calls_count += 1
-            usage.save(update_fields=['api_calls_count'])
+            from apps.core.metering import metering_enabled, usage_meter
             
-            # Check if tenant is exceeding limits
-            if usage.api_calls_count > tenant.max_api_calls_per_month:
-                logger.warning(f"Tenant {tenant.slug} exceeded API call limit")
-                # Could implement rate limiting here
+            if metering_enabled():
+                usage_meter.record_api_call(tenant)
         
         except Exception as e:
             logger.error(f"Error tracking API usage: {e}")